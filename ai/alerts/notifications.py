@@ -9,6 +9,17 @@ from ai.schemas.alert import AlertCreate, RecipientBase
 logger = logging.getLogger(__name__)
 
 
+def wants_alert(recipient: RecipientBase, severity: str) -> bool:
+    """Whether a recipient is active and has opted in to alerts of `severity`."""
+    if not recipient.is_active:
+        return False
+    if severity == "warning" and not recipient.notify_warning:
+        return False
+    if severity == "critical" and not recipient.notify_critical:
+        return False
+    return True
+
+
 class NotificationService:
     def __init__(self):
         self.fonnte_token = os.getenv("FONNTE_API_TOKEN")
@@ -23,13 +34,7 @@ class NotificationService:
         """Send notifications to all active recipients via configured channels."""
 
         for recipient in recipients:
-            if not recipient.is_active:
-                continue
-
-            # Check preferences
-            if alert.severity == "warning" and not recipient.notify_warning:
-                continue
-            if alert.severity == "critical" and not recipient.notify_critical:
+            if not wants_alert(recipient, alert.severity):
                 continue
 
             # Send WhatsApp
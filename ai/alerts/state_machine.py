@@ -80,17 +80,18 @@ class AlertStateMachine:
         self._fallback_cache[sensor_id] = state
 
     async def process_anomaly(
-        self, sensor_id: int, severity: str, message: str
+        self, sensor_id: int, severity: str, message: str, now: Optional[datetime] = None
     ) -> Optional[AlertCreate]:
         """
         Decide if an alert should be triggered based on current state and anomaly severity.
         Returns AlertCreate if alert needed, None otherwise.
+        `now` defaults to the wall clock; replays pass the reading's timestamp.
         """
         current_state_info = await self._get_state(sensor_id)
 
         current_state = current_state_info["state"]
         last_alert_at = current_state_info["last_alert_at"]
-        now = datetime.now(timezone.utc)
+        now = now or datetime.now(timezone.utc)
 
         new_state = severity.lower()
 
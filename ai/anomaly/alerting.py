@@ -0,0 +1,84 @@
+"""
+From one reading's detector hits to its alerts, for ingest and backtest replays alike.
+
+Given every hit of a reading, in detector order:
+
+- statistical hits on a parameter whose probe has been faulty for a while are
+  dropped (`SensorHealthMonitor.suppressed_parameters`); threshold hits always
+  stand, and their messages name a suspect probe,
+- episodes the reading ended are closed and each hit is folded into its
+  episode (`AnomalyEpisodes`); only the hit opening an episode, or one an
+  episode's notify interval later, reaches the alert state machine,
+- a reading without hits lets the state machine recover.
+
+Storing the alerts and sending their notifications is left to the caller.
+"""
+
+from collections.abc import Iterable, Sequence
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..alerts.state_machine import AlertStateMachine
+from ..schemas.alert import AlertCreate, AnomalyCreate
+from .batch import THRESHOLD_METHODS
+from .episodes import AnomalyEpisodes
+from .health import SensorHealthMonitor
+
+
+class ReadingAlerts(NamedTuple):
+    anomalies: list[AnomalyCreate]  # hits left after the health check
+    alerts: list[AlertCreate]  # in the order raised; "info" is a recovery
+    written: int  # anomaly rows written
+
+
+async def decide_alerts(
+    db: Optional[AsyncSession],
+    sensor_id: int,
+    parameters: Iterable[str],
+    anomalies: Sequence[AnomalyCreate],
+    health: SensorHealthMonitor,
+    episodes: AnomalyEpisodes,
+    alert_sm: AlertStateMachine,
+    now: Optional[datetime] = None,
+) -> ReadingAlerts:
+    """
+    The alerts a reading of `parameters` raises. `now` is the state machine's
+    clock: the wall clock by default, the reading's timestamp in replays.
+    """
+    suppressed = health.suppressed_parameters(sensor_id)
+    if suppressed:
+        # A probe faulty for a while only feeds the statistical detectors noise;
+        # threshold breaches stand, since a real event can look like a fault.
+        anomalies = [
+            anom
+            for anom in anomalies
+            if anom.detection_method in THRESHOLD_METHODS or anom.parameter not in suppressed
+        ]
+    else:
+        anomalies = list(anomalies)
+    faulty = health.faulty_parameters(sensor_id)
+
+    written = await episodes.close_ended(db, sensor_id, parameters, anomalies)
+    if not anomalies:
+        alert = await alert_sm.process_recovery(sensor_id)
+        return ReadingAlerts(anomalies, [alert] if alert else [], written)
+
+    alerts = []
+    for anom in anomalies:
+        episode = await episodes.record(db, anom)
+        written += episode.written
+        if not episode.notify:
+            # A continuing episode inside the cooldown cannot raise an alert.
+            continue
+
+        severity = "critical" if "critical" in (anom.detection_method or "") else "warning"
+        message = f"{anom.parameter.upper()} {severity}: {anom.value:.2f}"
+        if anom.parameter in faulty:
+            message += " (probe health: faulty)"
+
+        alert = await alert_sm.process_anomaly(sensor_id, severity, message, now=now)
+        if alert:
+            alerts.append(alert)
+    return ReadingAlerts(anomalies, alerts, written)
@@ -0,0 +1,475 @@
+"""
+Offline replay of stored readings through the detectors and alerting.
+
+Before thresholds or detector settings change, a backtest answers how many
+anomalies, alerts and notifications each candidate configuration would have
+produced over a date range, and how early it would have caught known events.
+
+Every configuration replays the same readings:
+
+- readings are streamed per sensor in `BACKTEST_CHUNK_SIZE` chunks, ordered by
+  time, and each chunk is fed to every configuration in turn,
+- threshold checks run vectorized per chunk (`AnomalyDetector.detect_threshold_batch`);
+  the stateful detectors and sensor health step reading by reading, in the
+  same order as ingest,
+- each reading's hits then go through ingest's own decision path
+  (`anomaly.alerting.decide_alerts`): faulty-probe suppression, episodes and
+  the alert state machine, on the reading's clock,
+- sensors are independent, so they run in parallel on a process pool.
+
+Nothing is written: sessions are read-only, detectors never snapshot to
+Redis, episodes and alert state live in memory (`ReplayEpisodes`,
+`ReplayAlertStateMachine`) and notifications are counted rather than sent.
+Forecast residual checks are not replayed, since only the latest stored
+forecasts are meaningful for them, and health sees no battery or signal
+levels, which are not stored with readings.
+"""
+
+import asyncio
+import itertools
+import logging
+import multiprocessing
+import os
+from collections import Counter, defaultdict
+from collections.abc import Iterable, Mapping, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, NamedTuple, Optional
+
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..alerts.notifications import wants_alert
+from ..alerts.state_machine import AlertStateMachine
+from ..db.connection import AsyncSessionLocal, engine
+from ..db.models import NotificationRecipient, Reading, ThresholdRule
+from ..db.parameters import parameter_registry
+from ..db.timeseries import (
+    MEASUREMENT_COLUMNS,
+    ReadingColumns,
+    epoch_microseconds,
+    rows_to_columns,
+)
+from ..schemas.alert import AlertCreate, AnomalyCreate, RecipientBase, RecipientResponse
+from ..schemas.threshold import ThresholdRuleCreate
+from .alerting import decide_alerts
+from .detector import AnomalyDetector
+from .episodes import ANOMALY_EPISODES_ENABLED, AnomalyEpisodes, Episode, EpisodeKey
+from .health import SENSOR_HEALTH_ENABLED, SensorHealthMonitor
+from .isolation import ISOLATION_ENABLED, IsolationScorer
+from .multivariate import MULTIVARIATE_ENABLED, MultivariateDetector
+from .rate_of_change import RATE_OF_CHANGE_ENABLED, RateOfChangeDetector, RateRule
+from .rules import RuleSet, ThresholdRules, compile_rules
+from .streaming import STREAMING_DETECTORS_ENABLED, StreamingDetectors
+
+logger = logging.getLogger(__name__)
+
+BACKTEST_CHUNK_SIZE = int(os.getenv("BACKTEST_CHUNK_SIZE", "10000"))
+BACKTEST_WORKERS = int(os.getenv("BACKTEST_WORKERS", str(os.cpu_count() or 1)))
+# A detection counts towards a known event from this long before it...
+BACKTEST_EVENT_LOOKBACK_HOURS = float(os.getenv("BACKTEST_EVENT_LOOKBACK_HOURS", "72"))
+# ...until this long after it (a negative lead time: caught late).
+BACKTEST_EVENT_GRACE_HOURS = float(os.getenv("BACKTEST_EVENT_GRACE_HOURS", "24"))
+
+
+@dataclass(frozen=True)
+class BacktestConfig:
+    """
+    One detector and alerting setup to replay. Defaults are the production
+    settings; `rules` are layered over the stored threshold rules, replacing
+    any stored rule for the same sensor and parameter.
+    """
+
+    name: str
+    rules: tuple[ThresholdRuleCreate, ...] = ()
+    streaming: bool = STREAMING_DETECTORS_ENABLED
+    rate_of_change: bool = RATE_OF_CHANGE_ENABLED
+    # None keeps the configured rules (`rate_of_change.load_rate_rules`).
+    rate_rules: Optional[tuple[RateRule, ...]] = None
+    multivariate: bool = MULTIVARIATE_ENABLED
+    isolation: bool = ISOLATION_ENABLED
+    health: bool = SENSOR_HEALTH_ENABLED
+    episodes: bool = ANOMALY_EPISODES_ENABLED
+    cooldown_minutes: float = AlertStateMachine.COOLDOWN_MINUTES
+
+    @classmethod
+    def from_dict(cls, fields: Mapping[str, Any]) -> "BacktestConfig":
+        """From JSON fields; `rules` and `rate_rules` are lists of schema / `RateRule` dicts."""
+        fields = dict(fields)
+        fields["rules"] = tuple(
+            ThresholdRuleCreate.model_validate(rule) for rule in fields.get("rules", ())
+        )
+        if fields.get("rate_rules") is not None:
+            fields["rate_rules"] = tuple(RateRule(**rule) for rule in fields["rate_rules"])
+        return cls(**fields)
+
+
+class KnownEvent(NamedTuple):
+    """A confirmed incident (e.g. an AMD event found on site) to measure lead time against."""
+
+    sensor_id: int
+    timestamp: datetime
+    label: str = ""
+
+
+@dataclass
+class EventOutcome:
+    event: KnownEvent
+    first_anomaly_at: Optional[datetime] = None
+    first_alert_at: Optional[datetime] = None
+
+    @property
+    def anomaly_lead_time(self) -> Optional[timedelta]:
+        """How long before the event the first anomaly came; None if missed."""
+        if self.first_anomaly_at is None:
+            return None
+        return self.event.timestamp - self.first_anomaly_at
+
+    @property
+    def alert_lead_time(self) -> Optional[timedelta]:
+        if self.first_alert_at is None:
+            return None
+        return self.event.timestamp - self.first_alert_at
+
+
+@dataclass
+class ConfigReport:
+    """What one configuration would have produced; per sensor, then merged."""
+
+    name: str
+    sensors: int = 0
+    readings: int = 0
+    anomalies: Counter = field(default_factory=Counter)  # by detection method
+    alerts: Counter = field(default_factory=Counter)  # by severity, "info" = recovery
+    notifications: int = 0  # messages, one per recipient and channel
+    events: list[EventOutcome] = field(default_factory=list)
+
+    def merge(self, other: "ConfigReport"):
+        self.sensors += other.sensors
+        self.readings += other.readings
+        self.anomalies.update(other.anomalies)
+        self.alerts.update(other.alerts)
+        self.notifications += other.notifications
+        self.events.extend(other.events)
+
+    def to_dict(self) -> dict[str, Any]:
+        def minutes(lead: Optional[timedelta]) -> Optional[float]:
+            return None if lead is None else round(lead.total_seconds() / 60, 1)
+
+        return {
+            "name": self.name,
+            "sensors": self.sensors,
+            "readings": self.readings,
+            "anomalies": sum(self.anomalies.values()),
+            "anomalies_by_method": dict(self.anomalies),
+            "alerts": sum(count for severity, count in self.alerts.items() if severity != "info"),
+            "alerts_by_severity": dict(self.alerts),
+            "notifications": self.notifications,
+            "events": [
+                {
+                    "sensor_id": outcome.event.sensor_id,
+                    "timestamp": outcome.event.timestamp.isoformat(),
+                    "label": outcome.event.label,
+                    "anomaly_lead_minutes": minutes(outcome.anomaly_lead_time),
+                    "alert_lead_minutes": minutes(outcome.alert_lead_time),
+                }
+                for outcome in sorted(self.events, key=lambda outcome: outcome.event.timestamp)
+            ],
+        }
+
+
+class ReplayAlertStateMachine(AlertStateMachine):
+    """`AlertStateMachine` with its state in memory only, so replays never touch Redis."""
+
+    def __init__(self, cooldown_minutes: float = AlertStateMachine.COOLDOWN_MINUTES):
+        super().__init__()
+        self.COOLDOWN_MINUTES = cooldown_minutes
+
+    async def _get_state(self, sensor_id: int):
+        return self._fallback_cache.get(sensor_id, {"state": "normal", "last_alert_at": None})
+
+    async def _set_state(self, sensor_id: int, state: dict):
+        self._fallback_cache[sensor_id] = state
+
+
+class ReplayEpisodes(AnomalyEpisodes):
+    """
+    `AnomalyEpisodes` in memory only, with stand-in row ids, so replays pass
+    no session; no other worker closes or extends their episodes.
+    """
+
+    def __init__(self, enabled: bool = ANOMALY_EPISODES_ENABLED, **kwargs: Any):
+        super().__init__(enabled, **kwargs)
+        self._ids = itertools.count(1)
+
+    def _touch(self, db: None, key: EpisodeKey):
+        pass
+
+    async def _refresh(
+        self, db: None, key: EpisodeKey, episode: Episode
+    ) -> tuple[Optional[Episode], bool]:
+        return episode, False
+
+    async def _continue_stored(
+        self, db: None, key: EpisodeKey, timestamp: datetime
+    ) -> Optional[tuple[int, float]]:
+        return None
+
+    async def _insert(
+        self, db: None, anomaly: AnomalyCreate, closed: bool = False
+    ) -> Optional[int]:
+        return None if closed else next(self._ids)
+
+    async def _close_stored(
+        self,
+        db: None,
+        sensor_id: int,
+        reported: Optional[set[str]],
+        hit_keys: set[EpisodeKey],
+    ) -> int:
+        return 0
+
+    async def _flush(
+        self, db: None, key: EpisodeKey, episode: Episode, close: bool = False
+    ) -> bool:
+        if episode.anomaly_id is None or not (episode.pending or close):
+            return False
+        if episode.pending:
+            episode.written_at = episode.pending_end
+            episode.clear_pending()
+        return True
+
+
+class SensorReplay:
+    """One configuration's detectors, alert state and tallies for one sensor."""
+
+    def __init__(
+        self,
+        sensor_id: int,
+        config: BacktestConfig,
+        rules: RuleSet,
+        recipients: Sequence[RecipientBase] = (),
+        events: Iterable[KnownEvent] = (),
+        lookback: timedelta = timedelta(hours=BACKTEST_EVENT_LOOKBACK_HOURS),
+        grace: timedelta = timedelta(hours=BACKTEST_EVENT_GRACE_HOURS),
+    ):
+        self.sensor_id = sensor_id
+        thresholds = ThresholdRules()
+        thresholds.rules = rules
+        isolation = IsolationScorer(enabled=config.isolation)
+        isolation.load_model(sensor_id)
+        self.detector = AnomalyDetector(
+            streaming=StreamingDetectors(enabled=config.streaming),
+            rate_of_change=RateOfChangeDetector(config.rate_rules, enabled=config.rate_of_change),
+            multivariate=MultivariateDetector(enabled=config.multivariate),
+            rules=thresholds,
+            isolation=isolation,
+        )
+        self.health = SensorHealthMonitor(enabled=config.health)
+        self.episodes = ReplayEpisodes(enabled=config.episodes)
+        # In production the notify interval is the state machine's cooldown.
+        self.episodes.notify_interval = timedelta(minutes=config.cooldown_minutes)
+        self.alert_sm = ReplayAlertStateMachine(config.cooldown_minutes)
+        self.recipients = recipients
+        self.report = ConfigReport(config.name, sensors=1)
+        self.report.events = [EventOutcome(event) for event in events]
+        self.lookback = lookback
+        self.grace = grace
+
+    async def feed(self, rows: Sequence[tuple[Any, ...]], columns: ReadingColumns):
+        """
+        Replay a chunk of (timestamp, *MEASUREMENT_COLUMNS) rows; `columns` is
+        the same chunk from `rows_to_columns`.
+        """
+        batch = self.detector.detect_threshold_batch(
+            self.sensor_id, columns.timestamps, columns.values
+        )
+        thresholds = defaultdict(list)
+        for row, anomaly in zip(batch.rows.tolist(), batch.to_anomalies()):
+            thresholds[row].append(anomaly)
+
+        detector = self.detector
+        for i, (timestamp, *values) in enumerate(rows):
+            reading = {
+                parameter: value
+                for parameter, value in zip(MEASUREMENT_COLUMNS, values)
+                if value is not None
+            }
+            hits = thresholds.get(i, [])
+            hits += detector.detect_stateful_anomalies(self.sensor_id, reading, timestamp)
+            self.health.observe(self.sensor_id, epoch_microseconds(timestamp), reading)
+            await self._step(timestamp, reading, hits)
+        self.report.readings += len(rows)
+
+    async def _step(
+        self, timestamp: datetime, reading: dict[str, float], hits: list[AnomalyCreate]
+    ):
+        """Ingest's alerting for one reading (`decide_alerts`), on the reading's clock."""
+        decision = await decide_alerts(
+            None,
+            self.sensor_id,
+            reading,
+            hits,
+            self.health,
+            self.episodes,
+            self.alert_sm,
+            now=timestamp,
+        )
+        if decision.anomalies:
+            self.report.anomalies.update(anom.detection_method for anom in decision.anomalies)
+            for outcome in self._open_events(timestamp):
+                if outcome.first_anomaly_at is None:
+                    outcome.first_anomaly_at = timestamp
+        for alert in decision.alerts:
+            self._alerted(alert, timestamp)
+
+    def _alerted(self, alert: AlertCreate, timestamp: datetime):
+        self.report.alerts[alert.severity] += 1
+        self.report.notifications += sum(
+            bool(recipient.phone) + bool(recipient.email)
+            for recipient in self.recipients
+            if wants_alert(recipient, alert.severity)
+        )
+        if alert.severity != "info":
+            for outcome in self._open_events(timestamp):
+                if outcome.first_alert_at is None:
+                    outcome.first_alert_at = timestamp
+
+    def _open_events(self, timestamp: datetime) -> Iterable[EventOutcome]:
+        return (
+            outcome
+            for outcome in self.report.events
+            if outcome.event.timestamp - self.lookback
+            <= timestamp
+            <= outcome.event.timestamp + self.grace
+        )
+
+
+async def _read_only(session: AsyncSession):
+    """Make a replay's transaction read-only where the database can enforce it."""
+    if session.bind.dialect.name == "postgresql":
+        await session.execute(text("SET TRANSACTION READ ONLY"))
+
+
+async def replay_sensor(
+    sensor_id: int,
+    start: datetime,
+    end: datetime,
+    plans: Sequence[tuple[BacktestConfig, RuleSet]],
+    recipients: Sequence[RecipientBase] = (),
+    events: Iterable[KnownEvent] = (),
+    session_factory=AsyncSessionLocal,
+    chunk_size: int = BACKTEST_CHUNK_SIZE,
+) -> list[ConfigReport]:
+    """Replay one sensor's readings in [start, end) through every planned configuration."""
+    events = [event for event in events if event.sensor_id == sensor_id]
+    replays = [
+        SensorReplay(sensor_id, config, rules, recipients, events) for config, rules in plans
+    ]
+    query = (
+        select(Reading.timestamp, *(getattr(Reading, column) for column in MEASUREMENT_COLUMNS))
+        .where(Reading.sensor_id == sensor_id, Reading.timestamp >= start, Reading.timestamp < end)
+        .order_by(Reading.timestamp)
+        .execution_options(yield_per=chunk_size)
+    )
+    async with session_factory() as session:
+        await _read_only(session)
+        result = await session.stream(query)
+        async for partition in result.partitions(chunk_size):
+            rows = [tuple(row) for row in partition]
+            columns = rows_to_columns(rows)
+            for replay in replays:
+                await replay.feed(rows, columns)
+    return [replay.report for replay in replays]
+
+
+def _replay_sensor_in_worker(*args: Any) -> list[ConfigReport]:
+    """Process-pool entry point: runs `replay_sensor` on the worker's own engine."""
+
+    async def run():
+        try:
+            return await replay_sensor(*args)
+        finally:
+            # Pooled connections belong to this task's event loop.
+            await engine.dispose()
+
+    return asyncio.run(run())
+
+
+async def run_backtest(
+    start: datetime,
+    end: datetime,
+    configs: Sequence[BacktestConfig],
+    sensor_ids: Optional[Sequence[int]] = None,
+    events: Sequence[KnownEvent] = (),
+    workers: int = BACKTEST_WORKERS,
+    session_factory=AsyncSessionLocal,
+) -> list[ConfigReport]:
+    """
+    Replay [start, end) for `sensor_ids` (default: every sensor with readings
+    in the range) under each configuration, one report per configuration.
+
+    With more than one worker, sensors run in spawned processes that connect
+    through `DATABASE_URL`; `session_factory` is then only used here, to load
+    the stored rules, recipients and sensor list.
+    """
+    async with session_factory() as session:
+        await _read_only(session)
+        specs = await parameter_registry.load(session)
+        result = await session.execute(select(ThresholdRule).order_by(ThresholdRule.id))
+        stored_rules = result.scalars().all()
+        result = await session.execute(
+            select(NotificationRecipient).where(NotificationRecipient.is_active == True)  # noqa: E712
+        )
+        recipients = [
+            RecipientBase(**RecipientResponse.model_validate(r).model_dump(exclude={"id"}))
+            for r in result.scalars().all()
+        ]
+        if sensor_ids is None:
+            result = await session.execute(
+                select(Reading.sensor_id)
+                .where(Reading.timestamp >= start, Reading.timestamp < end)
+                .distinct()
+                .order_by(Reading.sensor_id)
+            )
+            sensor_ids = list(result.scalars().all())
+
+    plans = [(config, compile_rules(specs, [*stored_rules, *config.rules])) for config in configs]
+    reports = [ConfigReport(config.name) for config in configs]
+    workers = min(workers, len(sensor_ids))
+    logger.info(
+        f"Backtesting {len(configs)} configuration(s) over {len(sensor_ids)} sensor(s) "
+        f"with {max(workers, 1)} worker(s)"
+    )
+
+    if workers <= 1:
+        per_sensor = [
+            await replay_sensor(sensor_id, start, end, plans, recipients, events, session_factory)
+            for sensor_id in sensor_ids
+        ]
+    else:
+        loop = asyncio.get_running_loop()
+        # Spawned, not forked: workers must not share this process's connections.
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            per_sensor = await asyncio.gather(
+                *(
+                    loop.run_in_executor(
+                        pool,
+                        _replay_sensor_in_worker,
+                        sensor_id,
+                        start,
+                        end,
+                        plans,
+                        recipients,
+                        events,
+                    )
+                    for sensor_id in sensor_ids
+                )
+            )
+
+    for sensor_reports in per_sensor:
+        for report, sensor_report in zip(reports, sensor_reports):
+            report.merge(sensor_report)
+    return reports
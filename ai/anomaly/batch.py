@@ -0,0 +1,229 @@
+"""
+Threshold checks over columnar batches of readings.
+
+`detect_threshold_anomalies` builds a Pydantic model per hit, which is fine
+for one ingested reading but dominates backfills and historical re-scoring.
+Here every parameter's limits are applied to a whole column with NumPy masks
+and the hits come back as parallel arrays; objects are only built on request.
+"""
+
+from collections.abc import Mapping, Sequence
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, NamedTuple, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from ai.db.timeseries import epoch_microseconds
+from ai.schemas.alert import AnomalyCreate
+
+SEVERITY_NONE = 0
+SEVERITY_WARNING = 1
+SEVERITY_CRITICAL = 2
+
+# Indexed by severity.
+SEVERITY_SCORES = np.array([0.0, 5.0, 10.0])
+SEVERITY_METHODS = (None, "threshold_warning", "threshold_critical")
+THRESHOLD_METHODS = frozenset(SEVERITY_METHODS[1:])
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+class ThresholdLimits(NamedTuple):
+    """Bounds a value is checked against; None leaves that side unchecked."""
+
+    critical_low: Optional[float] = None
+    warning_low: Optional[float] = None
+    warning_high: Optional[float] = None
+    critical_high: Optional[float] = None
+
+    @classmethod
+    def from_spec(cls, spec: Any) -> "ThresholdLimits":
+        """Limits of anything with the four threshold attributes (e.g. a ParameterSpec)."""
+        return cls(spec.critical_low, spec.warning_low, spec.warning_high, spec.critical_high)
+
+    @property
+    def is_empty(self) -> bool:
+        return all(bound is None for bound in self)
+
+    def classify(self, value: float) -> int:
+        """Severity of a single value; critical bounds are checked first."""
+        if (self.critical_low is not None and value < self.critical_low) or (
+            self.critical_high is not None and value > self.critical_high
+        ):
+            return SEVERITY_CRITICAL
+        if (self.warning_low is not None and value < self.warning_low) or (
+            self.warning_high is not None and value > self.warning_high
+        ):
+            return SEVERITY_WARNING
+        return SEVERITY_NONE
+
+    def classify_array(self, values: np.ndarray) -> np.ndarray:
+        """`classify` over a float array; NaN (null) never matches."""
+        critical = np.zeros(values.shape, dtype=bool)
+        warning = np.zeros(values.shape, dtype=bool)
+        with np.errstate(invalid="ignore"):
+            if self.critical_low is not None:
+                critical |= values < self.critical_low
+            if self.critical_high is not None:
+                critical |= values > self.critical_high
+            if self.warning_low is not None:
+                warning |= values < self.warning_low
+            if self.warning_high is not None:
+                warning |= values > self.warning_high
+        severity = warning.astype(np.int8)
+        severity[critical] = SEVERITY_CRITICAL
+        return severity
+
+
+@dataclass(frozen=True)
+class BatchAnomalies:
+    """
+    Threshold hits as parallel arrays, ordered by input row then parameter.
+
+    `rows` indexes the input batch, `parameter_codes` indexes `parameters`,
+    timestamps are int64 epoch microseconds.
+    """
+
+    rows: np.ndarray
+    sensor_ids: np.ndarray
+    timestamps: np.ndarray
+    parameter_codes: np.ndarray
+    parameters: tuple[str, ...]
+    values: np.ndarray
+    severities: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    @property
+    def scores(self) -> np.ndarray:
+        return SEVERITY_SCORES[self.severities]
+
+    @property
+    def critical(self) -> np.ndarray:
+        return self.severities == SEVERITY_CRITICAL
+
+    def counts(self) -> dict[str, int]:
+        """Hits per parameter."""
+        tally = np.bincount(self.parameter_codes, minlength=len(self.parameters))
+        return {parameter: int(count) for parameter, count in zip(self.parameters, tally)}
+
+    def records(self) -> list[dict[str, Any]]:
+        """Plain dicts with the `Anomaly` column names, e.g. for a bulk insert."""
+        return [
+            {
+                "sensor_id": sensor_id,
+                "timestamp": _EPOCH + timedelta(microseconds=timestamp),
+                "parameter": self.parameters[code],
+                "value": value,
+                "anomaly_score": float(SEVERITY_SCORES[severity]),
+                "detection_method": SEVERITY_METHODS[severity],
+            }
+            for sensor_id, timestamp, code, value, severity in zip(
+                self.sensor_ids.tolist(),
+                self.timestamps.tolist(),
+                self.parameter_codes.tolist(),
+                self.values.tolist(),
+                self.severities.tolist(),
+            )
+        ]
+
+    def to_anomalies(self) -> list[AnomalyCreate]:
+        return [AnomalyCreate(**record) for record in self.records()]
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(
+            {
+                "sensor_id": self.sensor_ids,
+                "timestamp": pd.to_datetime(self.timestamps, unit="us", utc=True),
+                "parameter": pd.Categorical.from_codes(
+                    self.parameter_codes, categories=list(self.parameters)
+                ),
+                "value": self.values,
+                "anomaly_score": self.scores,
+                "detection_method": np.asarray(SEVERITY_METHODS, dtype=object)[self.severities],
+            }
+        )
+
+
+def as_epoch_microseconds(timestamps: Union[np.ndarray, Sequence[datetime]]) -> np.ndarray:
+    """int64 epoch microseconds from datetime64 arrays, datetimes or integers."""
+    array = np.asarray(timestamps)
+    if array.dtype.kind == "M":
+        return array.astype("datetime64[us]").view(np.int64)
+    if array.dtype.kind in "iu":
+        return array.astype(np.int64, copy=False)
+    return np.fromiter(
+        (epoch_microseconds(value) for value in timestamps), dtype=np.int64, count=len(array)
+    )
+
+
+def detect_threshold_batch(
+    sensor_ids: Union[int, np.ndarray, Sequence[int]],
+    timestamps: Union[np.ndarray, Sequence[datetime]],
+    values: Mapping[str, Any],
+    limits: Mapping[str, ThresholdLimits],
+) -> BatchAnomalies:
+    """
+    Check every column in `values` that has limits.
+
+    `sensor_ids` may be a single id for a one-sensor batch. Value columns are
+    float arrays with NaN for nulls (None in an object column is also null).
+    """
+    timestamps = as_epoch_microseconds(timestamps)
+    count = len(timestamps)
+    sensor_ids = np.broadcast_to(np.asarray(sensor_ids, dtype=np.int64), (count,))
+
+    parameters = tuple(
+        parameter for parameter in limits if parameter in values and not limits[parameter].is_empty
+    )
+    hit_rows, hit_codes, hit_values, hit_severities = [], [], [], []
+    for code, parameter in enumerate(parameters):
+        column = np.asarray(values[parameter], dtype=np.float64)
+        if column.shape != (count,):
+            raise ValueError(f"{parameter}: expected {count} values, got {column.shape}")
+        severity = limits[parameter].classify_array(column)
+        rows = np.flatnonzero(severity)
+        hit_rows.append(rows)
+        hit_codes.append(np.full(len(rows), code, dtype=np.int16))
+        hit_values.append(column[rows])
+        hit_severities.append(severity[rows])
+
+    if parameters:
+        rows = np.concatenate(hit_rows)
+        order = np.lexsort((np.concatenate(hit_codes), rows))
+        rows = rows[order]
+        codes = np.concatenate(hit_codes)[order]
+        hit_values = np.concatenate(hit_values)[order]
+        severities = np.concatenate(hit_severities)[order]
+    else:
+        rows = np.empty(0, dtype=np.int64)
+        codes = np.empty(0, dtype=np.int16)
+        hit_values = np.empty(0, dtype=np.float64)
+        severities = np.empty(0, dtype=np.int8)
+
+    return BatchAnomalies(
+        rows=rows,
+        sensor_ids=sensor_ids[rows],
+        timestamps=timestamps[rows],
+        parameter_codes=codes,
+        parameters=parameters,
+        values=hit_values,
+        severities=severities,
+    )
+
+
+def frame_columns(
+    frame: pd.DataFrame, parameters: Sequence[str]
+) -> tuple[np.ndarray, np.ndarray, dict[str, np.ndarray]]:
+    """(sensor_ids, epoch microseconds, value columns) of a wide readings frame."""
+    timestamps = pd.to_datetime(frame["timestamp"], utc=True)
+    micros = timestamps.dt.tz_localize(None).to_numpy(dtype="datetime64[us]").view(np.int64)
+    values = {
+        column: frame[column].to_numpy(dtype=np.float64, na_value=np.nan)
+        for column in parameters
+        if column in frame.columns
+    }
+    return frame["sensor_id"].to_numpy(dtype=np.int64), micros, values
@@ -1,68 +1,267 @@
+import numpy as np
 import pandas as pd
-from typing import List, Dict, Optional
-from datetime import datetime
+from typing import List, Dict, Mapping, Optional
+from datetime import datetime, timedelta, timezone
 from ai.schemas.alert import AnomalyCreate
+from ai.db.timeseries import epoch_microseconds
+from ai.anomaly.forecast_residual import FORECAST_RESIDUAL_METHOD
+from ai.anomaly.isolation import ISOLATION_METHOD
+from ai.anomaly.batch import (
+    SEVERITY_METHODS,
+    SEVERITY_NONE,
+    SEVERITY_SCORES,
+    BatchAnomalies,
+    ThresholdLimits,
+    detect_threshold_batch,
+    frame_columns,
+)
+from ai.anomaly.rules import ANOMALY_THRESHOLDS, ENFORCED_THRESHOLDS, ThresholdRules
 
-# Timeline-specified general water quality thresholds for demos, not AMD-specific.
-ANOMALY_THRESHOLDS = {
-    "ph": {
-        "warning_low": 5.5,  # Warning when pH dips below safe range
-        "critical_low": 4.5,  # Critical acidity threshold
-        "warning_high": 9.0,  # High pH (less common in AMD)
-        "critical_high": 10.0,
-    },
-    "turbidity": {
-        "warning_high": 50.0,  # Elevated turbidity warning
-        "critical_high": 100.0,  # Critical turbidity
-    },
-    "temperature": {
-        "warning_high": 35.0,  # High temperature warning
-        "critical_high": 40.0,
-    },
-}
+__all__ = ["ANOMALY_THRESHOLDS", "ENFORCED_THRESHOLDS", "AnomalyDetector"]
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
 
 
 class AnomalyDetector:
     """Hybrid anomaly detection using thresholds and TimeGPT."""
 
-    def __init__(self, timegpt_client=None):
+    def __init__(
+        self,
+        timegpt_client=None,
+        streaming=None,
+        rate_of_change=None,
+        forecast_intervals=None,
+        multivariate=None,
+        rules=None,
+        isolation=None,
+    ):
         self.timegpt = timegpt_client
+        # anomaly.streaming.StreamingDetectors; None disables the statistical checks.
+        self.streaming = streaming
+        # anomaly.rate_of_change.RateOfChangeDetector; None disables slope checks.
+        self.rate_of_change = rate_of_change
+        # anomaly.forecast_residual.ForecastIntervalIndex; None disables residual checks.
+        self.forecast_intervals = forecast_intervals
+        # anomaly.multivariate.MultivariateDetector; None disables the joint pH-turbidity check.
+        self.multivariate = multivariate
+        # anomaly.rules.ThresholdRules; without one only the built-in limits apply.
+        self.rules = rules if rules is not None else ThresholdRules()
+        # anomaly.isolation.IsolationScorer; None disables the trained per-sensor models.
+        self.isolation = isolation
 
-        self.thresholds = ANOMALY_THRESHOLDS
+    @property
+    def limits(self) -> Dict[str, ThresholdLimits]:
+        """Fleet-default enforced limits, in check order."""
+        return self.rules.rules.limits()
 
     def detect_threshold_anomalies(
         self, sensor_id: int, reading: Dict[str, float], timestamp: datetime
     ) -> List[AnomalyCreate]:
-        """Check reading against static thresholds."""
-        anomalies = []
+        """Check reading against the sensor's compiled threshold rules."""
+        return [
+            self._create_anomaly(
+                sensor_id,
+                timestamp,
+                hit.parameter,
+                reading[hit.parameter],
+                float(SEVERITY_SCORES[hit.severity]),
+                SEVERITY_METHODS[hit.severity],
+            )
+            for hit in self.rules.rules.classify(sensor_id, reading)
+        ]
 
-        # Check pH
-        if "ph" in reading and reading["ph"] is not None:
-            val = reading["ph"]
-            if val < self.thresholds["ph"]["critical_low"]:
-                anomalies.append(
-                    self._create_anomaly(
-                        sensor_id, timestamp, "ph", val, 10.0, "threshold_critical"
-                    )
-                )
-            elif val < self.thresholds["ph"]["warning_low"]:
-                anomalies.append(
-                    self._create_anomaly(sensor_id, timestamp, "ph", val, 5.0, "threshold_warning")
-                )
+    def detect_registry_anomalies(
+        self, sensor_id: int, reading: Dict[str, float], timestamp: datetime, specs: Dict
+    ) -> List[AnomalyCreate]:
+        """
+        Check long-format parameters against their registry thresholds.
 
-        # Check Turbidity
-        if "turbidity" in reading and reading["turbidity"] is not None:
-            val = reading["turbidity"]
-            if val > self.thresholds["turbidity"]["critical_high"]:
-                anomalies.append(
-                    self._create_anomaly(
-                        sensor_id, timestamp, "turbidity", val, 10.0, "threshold_critical"
-                    )
-                )
-            elif val > self.thresholds["turbidity"]["warning_high"]:
+        `specs` maps parameter keys to `db.parameters.ParameterSpec`; parameters
+        without thresholds are stored but never flagged.
+        """
+        limits = {key: ThresholdLimits.from_spec(spec) for key, spec in specs.items()}
+        return self._check(sensor_id, reading, timestamp, limits)
+
+    def detect_streaming_anomalies(
+        self, sensor_id: int, reading: Dict[str, float], timestamp: datetime
+    ) -> List[AnomalyCreate]:
+        """EWMA, rolling z-score and CUSUM hits for a reading (see `anomaly.streaming`)."""
+        if self.streaming is None:
+            return []
+        hits = self.streaming.observe(sensor_id, epoch_microseconds(timestamp), reading)
+        return [
+            self._create_anomaly(
+                sensor_id, timestamp, hit.parameter, hit.value, round(hit.score, 2), hit.method
+            )
+            for hit in hits
+        ]
+
+    def detect_rate_anomalies(
+        self, sensor_id: int, reading: Dict[str, float], timestamp: datetime
+    ) -> List[AnomalyCreate]:
+        """Slope and acceleration hits for a reading (see `anomaly.rate_of_change`)."""
+        if self.rate_of_change is None:
+            return []
+        hits = self.rate_of_change.observe(sensor_id, epoch_microseconds(timestamp), reading)
+        return [
+            self._create_anomaly(
+                sensor_id,
+                timestamp,
+                hit.parameter,
+                hit.value,
+                round(abs(hit.rate), 3),
+                f"{hit.method}_{hit.severity}",
+            )
+            for hit in hits
+        ]
+
+    def detect_forecast_residual_anomalies(
+        self, sensor_id: int, reading: Dict[str, float], timestamp: datetime
+    ) -> List[AnomalyCreate]:
+        """Readings far outside their stored forecast interval (see `anomaly.forecast_residual`)."""
+        if self.forecast_intervals is None:
+            return []
+        hits = self.forecast_intervals.check(sensor_id, epoch_microseconds(timestamp), reading)
+        return [
+            self._create_anomaly(
+                sensor_id,
+                timestamp,
+                hit.parameter,
+                hit.value,
+                round(hit.score, 2),
+                FORECAST_RESIDUAL_METHOD,
+            )
+            for hit in hits
+        ]
+
+    def detect_multivariate_anomalies(
+        self, sensor_id: int, reading: Dict[str, float], timestamp: datetime
+    ) -> List[AnomalyCreate]:
+        """
+        Joint pH-turbidity outlier (see `anomaly.multivariate`), recorded against
+        pH with the Mahalanobis distance as its score.
+        """
+        if self.multivariate is None:
+            return []
+        hit = self.multivariate.observe(sensor_id, epoch_microseconds(timestamp), reading)
+        if hit is None:
+            return []
+        return [
+            self._create_anomaly(
+                sensor_id, timestamp, "ph", hit.ph, round(hit.distance, 2), hit.method
+            )
+        ]
+
+    def detect_isolation_anomalies(
+        self, sensor_id: int, reading: Dict[str, float], timestamp: datetime
+    ) -> List[AnomalyCreate]:
+        """
+        Isolation Forest hit for a reading (see `anomaly.isolation`), recorded
+        against the parameter that sits furthest from its training data.
+        """
+        if self.isolation is None:
+            return []
+        hit = self.isolation.observe(sensor_id, epoch_microseconds(timestamp), reading)
+        if hit is None:
+            return []
+        return [
+            self._create_anomaly(
+                sensor_id,
+                timestamp,
+                hit.parameter,
+                hit.value,
+                round(hit.score, 3),
+                ISOLATION_METHOD,
+            )
+        ]
+
+    def detect_stateful_anomalies(
+        self, sensor_id: int, reading: Dict[str, float], timestamp: datetime
+    ) -> List[AnomalyCreate]:
+        """Hits of every detector beyond the thresholds, in the order ingest checks them."""
+        return [
+            *self.detect_streaming_anomalies(sensor_id, reading, timestamp),
+            *self.detect_rate_anomalies(sensor_id, reading, timestamp),
+            *self.detect_forecast_residual_anomalies(sensor_id, reading, timestamp),
+            *self.detect_multivariate_anomalies(sensor_id, reading, timestamp),
+            *self.detect_isolation_anomalies(sensor_id, reading, timestamp),
+        ]
+
+    def detect_isolation_batch(
+        self, sensor_id: int, timestamps: np.ndarray, values: Mapping[str, np.ndarray]
+    ) -> List[AnomalyCreate]:
+        """
+        Isolation Forest hits for a run of one sensor's readings, scored as one
+        batch of feature vectors. `timestamps` are int64 epoch microseconds
+        aligned with the `values` columns (NaN = null).
+        """
+        if self.isolation is None:
+            return []
+        hits = self.isolation.score_batch(sensor_id, values)
+        return [
+            self._create_anomaly(
+                sensor_id,
+                _EPOCH + timedelta(microseconds=int(timestamps[row])),
+                hit.parameter,
+                hit.value,
+                round(hit.score, 3),
+                ISOLATION_METHOD,
+            )
+            for row, hit in enumerate(hits)
+            if hit is not None
+        ]
+
+    def detect_threshold_batch(
+        self, sensor_ids, timestamps, values, specs: Optional[Dict] = None
+    ) -> BatchAnomalies:
+        """
+        Vectorized `detect_threshold_anomalies` (plus registry specs) for many readings.
+
+        `sensor_ids` is one id or an array aligned with `timestamps`; `values` maps
+        parameters to float columns (NaN = null). See `anomaly.batch`.
+        """
+        limits = self._batch_limits(specs, sensor_ids)
+        return detect_threshold_batch(sensor_ids, timestamps, values, limits)
+
+    def detect_threshold_frame(
+        self, frame: pd.DataFrame, specs: Optional[Dict] = None
+    ) -> BatchAnomalies:
+        """`detect_threshold_batch` for a wide frame with sensor_id and timestamp columns."""
+        parameters = [*self.rules.rules.parameters, *(specs or {})]
+        sensor_ids, timestamps, values = frame_columns(frame, parameters)
+        limits = self._batch_limits(specs, sensor_ids)
+        return detect_threshold_batch(sensor_ids, timestamps, values, limits)
+
+    def _batch_limits(self, specs: Optional[Dict], sensor_ids) -> Dict[str, ThresholdLimits]:
+        """Compiled limits (per row when sensors have their own rules), plus `specs`."""
+        limits = self.rules.rules.batch_limits(sensor_ids)
+        for key, spec in (specs or {}).items():
+            if key not in limits:
+                limits[key] = ThresholdLimits.from_spec(spec)
+        return limits
+
+    def _check(
+        self,
+        sensor_id: int,
+        reading: Dict[str, float],
+        timestamp: datetime,
+        limits: Dict[str, ThresholdLimits],
+    ) -> List[AnomalyCreate]:
+        anomalies = []
+        for param, param_limits in limits.items():
+            val = reading.get(param)
+            if val is None:
+                continue
+            severity = param_limits.classify(val)
+            if severity != SEVERITY_NONE:
                 anomalies.append(
                     self._create_anomaly(
-                        sensor_id, timestamp, "turbidity", val, 5.0, "threshold_warning"
+                        sensor_id,
+                        timestamp,
+                        param,
+                        val,
+                        float(SEVERITY_SCORES[severity]),
+                        SEVERITY_METHODS[severity],
                     )
                 )
 
@@ -0,0 +1,472 @@
+"""
+Anomaly episodes: one `anomalies` row per sustained breach, not per reading.
+
+While a sensor sits at pH 4.2 for six hours, every reading raises the same
+hit. An episode groups the consecutive hits of one (sensor, parameter,
+detection method):
+
+- the first hit inserts the row straight away (`timestamp` and `value` are the
+  first breach), so lists and summaries show the episode at once,
+- later hits only update the episode in memory: last sample time, sample
+  count, peak (the value furthest from the first) and highest score,
+- pending samples are written as one UPDATE at checkpoints, every
+  `EPISODE_CHECKPOINT_SAMPLES` samples or `EPISODE_CHECKPOINT_SECONDS` of
+  readings, and when the episode closes.
+
+An episode closes on a reading of its parameter without the hit, on a hit
+more than `EPISODE_MAX_GAP_SECONDS` after its last sample, or from the
+background checkpoint task once that long passes without one; closing marks
+the row `closed`. The UPDATE adds counts and takes maxima in SQL rather than
+writing absolute values, so API workers that each ingested part of an
+episode merge correctly; a worker meeting a breach it has no episode for
+first looks for a recent open row of the same key to continue. A recovery
+may reach a different worker than the breach, so it also closes the
+sensor's open rows in SQL, and a worker re-reads `closed` and
+`end_timestamp` before extending an episode it holds.
+
+In-memory episodes follow the caller's transaction: changes made through a
+session are undone if it ends without a commit, so a rolled-back ingest
+neither loses pending samples nor counts its alert as sent. When another
+session changed the same episode meanwhile, the episode is dropped instead
+and reloaded from its row on the next hit.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections.abc import Iterable, Sequence
+from datetime import datetime, timedelta
+from typing import Any, NamedTuple, Optional
+
+from sqlalchemy import case, event, func, literal, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, SessionTransaction
+
+from ..alerts.state_machine import AlertStateMachine
+from ..cache.response_cache import response_cache
+from ..db.connection import AsyncSessionLocal
+from ..db.models import Anomaly
+from ..schemas.alert import AnomalyCreate
+from ..utils.env import env_flag
+
+logger = logging.getLogger(__name__)
+
+ANOMALY_EPISODES_ENABLED = env_flag("ANOMALY_EPISODES_ENABLED")
+EPISODE_MAX_GAP_SECONDS = float(os.getenv("EPISODE_MAX_GAP_SECONDS", "900"))
+EPISODE_CHECKPOINT_SECONDS = float(os.getenv("EPISODE_CHECKPOINT_SECONDS", "300"))
+EPISODE_CHECKPOINT_SAMPLES = int(os.getenv("EPISODE_CHECKPOINT_SAMPLES", "100"))
+
+
+class EpisodeKey(NamedTuple):
+    sensor_id: int
+    parameter: str
+    detection_method: Optional[str]
+
+
+class EpisodeStep(NamedTuple):
+    """What recording a hit did: whether a row was written, and whether to alert."""
+
+    written: bool
+    notify: bool
+
+
+class Episode:
+    """An open episode and the samples not yet written to its row."""
+
+    __slots__ = (
+        "anomaly_id",
+        "end",
+        "first_value",
+        "notified_at",
+        "peak",
+        "pending",
+        "pending_end",
+        "score",
+        "touched",
+        "written_at",
+    )
+
+    def __init__(self, first_value: float, timestamp: datetime):
+        self.anomaly_id: Optional[int] = None
+        self.first_value = first_value
+        self.end = timestamp
+        self.written_at = timestamp
+        self.notified_at: Optional[datetime] = None
+        self.touched = time.monotonic()
+        self.clear_pending()
+
+    def copy(self) -> "Episode":
+        episode = Episode.__new__(Episode)
+        for name in self.__slots__:
+            setattr(episode, name, getattr(self, name))
+        return episode
+
+    def clear_pending(self):
+        self.pending = 0
+        self.pending_end: Optional[datetime] = None
+        self.peak: Optional[float] = None
+        self.score: Optional[float] = None
+
+    def add(self, anomaly: AnomalyCreate):
+        self.pending += 1
+        self.end = self.pending_end = anomaly.timestamp
+        if self.peak is None or abs(anomaly.value - self.first_value) > abs(
+            self.peak - self.first_value
+        ):
+            self.peak = anomaly.value
+        if anomaly.anomaly_score is not None:
+            self.score = max(self.score or anomaly.anomaly_score, anomaly.anomaly_score)
+        self.touched = time.monotonic()
+
+
+class _Undo:
+    """One session's record of an episode: its state before the session's first change."""
+
+    __slots__ = ("before", "interleaved", "version")
+
+    def __init__(self, before: Optional[Episode]):
+        self.before = before
+        # Version the session left the key at; others moving it on means interleaving.
+        self.version = 0
+        self.interleaved = False
+
+
+class AnomalyEpisodes:
+    """
+    Open episodes of this worker, keyed by `EpisodeKey`. Disabled, every hit
+    is its own row, as before episodes.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = ANOMALY_EPISODES_ENABLED,
+        max_gap_seconds: float = EPISODE_MAX_GAP_SECONDS,
+        checkpoint_seconds: float = EPISODE_CHECKPOINT_SECONDS,
+        checkpoint_samples: int = EPISODE_CHECKPOINT_SAMPLES,
+    ):
+        self.enabled = enabled
+        self.max_gap = timedelta(seconds=max_gap_seconds)
+        self.checkpoint_interval = timedelta(seconds=checkpoint_seconds)
+        self.checkpoint_samples = checkpoint_samples
+        # The state machine only alerts again for the same severity after its cooldown.
+        self.notify_interval = timedelta(minutes=AlertStateMachine.COOLDOWN_MINUTES)
+        self.episodes: dict[EpisodeKey, Episode] = {}
+        # Bumped before every change to a key, by whichever session makes it.
+        self._versions: dict[EpisodeKey, int] = {}
+
+    def clear(self):
+        self.episodes.clear()
+        self._versions.clear()
+
+    def _journal(self, db: AsyncSession) -> dict[EpisodeKey, _Undo]:
+        """The episodes the session's open transaction changed."""
+        session = db.sync_session
+        journal = session.info.get(self)
+        if journal is None:
+            journal = session.info[self] = {}
+
+            @event.listens_for(session, "after_commit")
+            def _committed(_session: Session):
+                journal.clear()
+
+            @event.listens_for(session, "after_transaction_end")
+            def _ended(_session: Session, transaction: SessionTransaction):
+                # Still holding entries at the end of the outer transaction: no commit.
+                if transaction.parent is None and journal:
+                    for key, undo in journal.items():
+                        if undo.interleaved or self._versions.get(key) != undo.version:
+                            # Restoring would discard another session's changes.
+                            self.episodes.pop(key, None)
+                        elif undo.before is None:
+                            self.episodes.pop(key, None)
+                        else:
+                            self.episodes[key] = undo.before
+                    journal.clear()
+
+        return journal
+
+    def _touch(self, db: AsyncSession, key: EpisodeKey):
+        """Call before changing an episode, so a rollback can restore it."""
+        if not db.sync_session.in_transaction():
+            # Begin now so the change is tied to a transaction even if no SQL runs.
+            db.sync_session.begin()
+        journal = self._journal(db)
+        version = self._versions.get(key, 0)
+        undo = journal.get(key)
+        if undo is None:
+            episode = self.episodes.get(key)
+            undo = journal[key] = _Undo(None if episode is None else episode.copy())
+        elif undo.version != version:
+            undo.interleaved = True
+        undo.version = self._versions[key] = version + 1
+
+    async def record(self, db: AsyncSession, anomaly: AnomalyCreate) -> EpisodeStep:
+        """Fold a hit into its episode, opening (or continuing) one as needed."""
+        if not self.enabled:
+            await self._insert(db, anomaly, closed=True)
+            return EpisodeStep(written=True, notify=True)
+
+        key = EpisodeKey(anomaly.sensor_id, anomaly.parameter, anomaly.detection_method)
+        self._touch(db, key)
+        episode = self.episodes.get(key)
+        written = False
+        if episode is not None and episode.anomaly_id is not None:
+            episode, written = await self._refresh(db, key, episode)
+        if episode is not None and anomaly.timestamp - episode.end > self.max_gap:
+            written = await self._close(db, key)
+            episode = None
+        if episode is not None:
+            if anomaly.timestamp < episode.end:
+                # Late or replayed reading: part of the episode already.
+                return EpisodeStep(written=written, notify=False)
+            episode.add(anomaly)
+            if episode.anomaly_id is not None and (
+                episode.pending >= self.checkpoint_samples
+                or anomaly.timestamp - episode.written_at >= self.checkpoint_interval
+            ):
+                written = await self._flush(db, key, episode) or written
+            notify = (
+                episode.notified_at is None
+                or anomaly.timestamp - episode.notified_at >= self.notify_interval
+            )
+            if notify:
+                episode.notified_at = anomaly.timestamp
+            return EpisodeStep(written=written, notify=notify)
+
+        # Registered before any await, so concurrent hits join this episode.
+        episode = self.episodes[key] = Episode(anomaly.value, anomaly.timestamp)
+        episode.notified_at = anomaly.timestamp
+        continued = await self._continue_stored(db, key, anomaly.timestamp)
+        if continued is not None:
+            episode.anomaly_id, episode.first_value = continued
+            episode.add(anomaly)
+            return EpisodeStep(written=written, notify=True)
+        episode.anomaly_id = await self._insert(db, anomaly)
+        return EpisodeStep(written=True, notify=True)
+
+    async def _refresh(
+        self, db: AsyncSession, key: EpisodeKey, episode: Episode
+    ) -> tuple[Optional[Episode], bool]:
+        """
+        The held episode brought up to date with its row, or None once the row
+        is closed (by a recovery another worker ingested) or gone; the flag
+        says whether pending samples were written to the closed row.
+        """
+        result = await db.execute(
+            select(Anomaly.closed, Anomaly.end_timestamp).where(Anomaly.id == episode.anomaly_id)
+        )
+        row = result.first()
+        current = self.episodes.get(key)
+        if current is not episode:
+            # Closed or replaced by a concurrent request while the row was read.
+            return current, False
+        if row is None or row.closed:
+            del self.episodes[key]
+            return None, row is not None and await self._flush(db, key, episode)
+        if row.end_timestamp is not None and row.end_timestamp > episode.end:
+            episode.end = row.end_timestamp
+        return episode, False
+
+    async def close_ended(
+        self,
+        db: AsyncSession,
+        sensor_id: int,
+        parameters: Iterable[str],
+        hits: Sequence[AnomalyCreate],
+    ) -> int:
+        """
+        Close the sensor's episodes whose hit is missing from a reading of
+        `parameters`; with no hits at all (a recovery) every episode of the
+        sensor closes. Rows other workers hold open are closed as well.
+        Returns how many rows were written.
+        """
+        if not self.enabled:
+            return 0
+        hit_keys = {EpisodeKey(hit.sensor_id, hit.parameter, hit.detection_method) for hit in hits}
+        reported = set(parameters)
+        ended = [
+            key
+            for key in self.episodes
+            if key.sensor_id == sensor_id
+            and key not in hit_keys
+            and (not hits or key.parameter in reported)
+        ]
+        written = 0
+        for key in ended:
+            written += await self._close(db, key)
+        return written + await self._close_stored(
+            db, sensor_id, reported if hits else None, hit_keys
+        )
+
+    async def _close_stored(
+        self,
+        db: AsyncSession,
+        sensor_id: int,
+        reported: Optional[set[str]],
+        hit_keys: set[EpisodeKey],
+    ) -> int:
+        """Close the sensor's open rows of `reported` (None: every parameter) not in `hit_keys`."""
+        query = update(Anomaly).where(Anomaly.sensor_id == sensor_id, Anomaly.closed.is_(False))
+        if reported is not None:
+            query = query.where(
+                Anomaly.parameter.in_(reported),
+                tuple_(Anomaly.parameter, Anomaly.detection_method).not_in(
+                    [(key.parameter, key.detection_method) for key in hit_keys]
+                ),
+            )
+        result = await db.execute(
+            query.values(closed=True).execution_options(synchronize_session=False)
+        )
+        return result.rowcount
+
+    async def checkpoint(self, db: AsyncSession, final: bool = False) -> int:
+        """
+        Write episodes with samples pending for a checkpoint interval and close
+        those idle for the maximum gap; returns how many rows were written.
+        `final` writes and forgets every episode but leaves the rows open, since
+        the breach may go on and another worker (or the restarted one) can
+        continue it.
+        """
+        now = time.monotonic()
+        written = 0
+        for key, episode in list(self.episodes.items()):
+            idle = now - episode.touched
+            if final:
+                self._touch(db, key)
+                del self.episodes[key]
+                written += await self._flush(db, key, episode)
+            elif idle >= self.max_gap.total_seconds():
+                written += await self._close(db, key)
+            elif episode.pending and idle >= self.checkpoint_interval.total_seconds():
+                written += await self._flush(db, key, episode)
+        return written
+
+    async def run_checkpoints(
+        self, session_factory=AsyncSessionLocal, interval: float = EPISODE_CHECKPOINT_SECONDS
+    ):
+        """Checkpoint every `interval` seconds until cancelled, then close every episode."""
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                await self._checkpoint_in(session_factory)
+        finally:
+            await self._checkpoint_in(session_factory, final=True)
+
+    async def _checkpoint_in(self, session_factory, final: bool = False):
+        try:
+            async with session_factory() as db:
+                written = await self.checkpoint(db, final=final)
+                await db.commit()
+            if written:
+                await response_cache.invalidate("anomalies")
+        except Exception as e:
+            logger.warning(f"Anomaly episode checkpoint failed: {e}")
+
+    async def _continue_stored(
+        self, db: AsyncSession, key: EpisodeKey, timestamp: datetime
+    ) -> Optional[tuple[int, float]]:
+        """(id, first value) of a recent open row of `key` another worker is still extending."""
+        # The stored end lags the real one by up to a checkpoint.
+        horizon = timestamp - self.max_gap - self.checkpoint_interval
+        result = await db.execute(
+            select(Anomaly.id, Anomaly.value)
+            .where(
+                Anomaly.sensor_id == key.sensor_id,
+                Anomaly.parameter == key.parameter,
+                Anomaly.detection_method == key.detection_method,
+                Anomaly.closed.is_(False),
+                Anomaly.timestamp <= timestamp,
+                Anomaly.end_timestamp >= horizon,
+            )
+            .order_by(Anomaly.timestamp.desc())
+            .limit(1)
+        )
+        row = result.first()
+        return (row.id, row.value) if row is not None else None
+
+    async def _insert(
+        self, db: AsyncSession, anomaly: AnomalyCreate, closed: bool = False
+    ) -> Optional[int]:
+        """Add the hit's row; an open one is flushed, and its id returned, so it can be extended."""
+        row = _new_row(anomaly, closed=closed)
+        db.add(row)
+        if closed:
+            return None
+        await db.flush()
+        return row.id
+
+    async def _close(self, db: AsyncSession, key: EpisodeKey) -> bool:
+        self._touch(db, key)
+        episode = self.episodes.pop(key)
+        return await self._flush(db, key, episode, close=True)
+
+    async def _flush(
+        self, db: AsyncSession, key: EpisodeKey, episode: Episode, close: bool = False
+    ) -> bool:
+        """
+        Write the pending samples (and mark the row closed when `close`); False
+        when there was nothing to write or the row is gone.
+        """
+        if episode.anomaly_id is None or not (episode.pending or close):
+            return False
+        self._touch(db, key)
+        values: dict[str, Any] = {"closed": True} if close else {}
+        if episode.pending:
+            end = literal(episode.pending_end, Anomaly.end_timestamp.type)
+            values["sample_count"] = Anomaly.sample_count + episode.pending
+            values["end_timestamp"] = case(
+                (Anomaly.end_timestamp < end, end), else_=Anomaly.end_timestamp
+            )
+            values["peak_value"] = case(
+                (
+                    func.abs(Anomaly.value - episode.peak)
+                    > func.abs(Anomaly.value - Anomaly.peak_value),
+                    episode.peak,
+                ),
+                else_=Anomaly.peak_value,
+            )
+        if episode.pending and episode.score is not None:
+            values["anomaly_score"] = case(
+                (Anomaly.anomaly_score < episode.score, episode.score),
+                else_=Anomaly.anomaly_score,
+            )
+        result = await db.execute(
+            update(Anomaly)
+            .where(Anomaly.id == episode.anomaly_id)
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        if episode.pending:
+            episode.written_at = episode.pending_end
+            episode.clear_pending()
+        if result.rowcount == 0:
+            # Deleted by retention, or its insert was rolled back.
+            self.episodes.pop(key, None)
+            return False
+        return True
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "open": len(self.episodes),
+            "pending_samples": sum(episode.pending for episode in self.episodes.values()),
+        }
+
+
+def _new_row(anomaly: AnomalyCreate, closed: bool = False) -> Anomaly:
+    return Anomaly(
+        sensor_id=anomaly.sensor_id,
+        timestamp=anomaly.timestamp,
+        parameter=anomaly.parameter,
+        value=anomaly.value,
+        anomaly_score=anomaly.anomaly_score,
+        detection_method=anomaly.detection_method,
+        end_timestamp=anomaly.timestamp,
+        peak_value=anomaly.value,
+        sample_count=1,
+        closed=closed,
+    )
+
+
+anomaly_episodes = AnomalyEpisodes()
@@ -0,0 +1,243 @@
+"""
+Forecast-residual detection against stored prediction intervals.
+
+The latest `Prediction` of every sensor parameter is held in memory as a
+sorted interval index: forecast step i covers [t_i, t_i+1), with the band
+interpolated linearly across it. Checking a reading is a bisect over Python
+lists, so ingest needs no database query or forecast API call.
+
+A reading is flagged when it lies outside the band by at least
+`FORECAST_RESIDUAL_MARGIN` half-widths of the band at that instant. Readings
+outside a forecast's horizon are not checked.
+
+The index is (re)loaded on startup and whenever the `forecast_events` bus
+reports that a sensor's forecasts were regenerated, on every worker.
+"""
+
+import bisect
+import logging
+import math
+import os
+from collections.abc import Mapping
+from datetime import datetime, timezone
+from typing import Any, NamedTuple, Optional
+
+from sqlalchemy import desc, func, select
+
+from ..db.connection import AsyncSessionLocal
+from ..db.models import Prediction
+from ..db.timeseries import epoch_microseconds
+from ..utils.env import env_flag
+
+logger = logging.getLogger(__name__)
+
+# Opt-in until the interval width has been checked against past readings.
+FORECAST_RESIDUAL_ENABLED = env_flag("FORECAST_RESIDUAL_ENABLED", default=False)
+FORECAST_RESIDUAL_MARGIN = float(os.getenv("FORECAST_RESIDUAL_MARGIN", "1.0"))
+# Bands narrower than this (in the parameter's units) are widened to it.
+MIN_HALF_WIDTH = 1e-6
+
+FORECAST_RESIDUAL_METHOD = "forecast_residual"
+
+
+class ResidualHit(NamedTuple):
+    parameter: str
+    value: float
+    lower: float
+    upper: float
+    # Distance outside the band, in half-widths of the band.
+    score: float
+
+
+def _epoch(value: Any) -> Optional[int]:
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    if not isinstance(value, datetime):
+        return None
+    return epoch_microseconds(value)
+
+
+class ForecastBand:
+    """One prediction's interval points, sorted by time, with missing bounds dropped."""
+
+    __slots__ = ("prediction_id", "created_at", "times", "lower", "upper")
+
+    def __init__(
+        self,
+        prediction_id: int,
+        created_at: int,
+        times: list[int],
+        lower: list[float],
+        upper: list[float],
+    ):
+        self.prediction_id = prediction_id
+        self.created_at = created_at
+        self.times = times
+        self.lower = lower
+        self.upper = upper
+
+    @classmethod
+    def from_prediction(cls, prediction: Prediction) -> Optional["ForecastBand"]:
+        timestamps, _, lower, upper = prediction.point_columns()
+        points = sorted(
+            (epoch, float(lo), float(hi))
+            for epoch, lo, hi in zip(map(_epoch, timestamps), lower, upper)
+            if epoch is not None and lo is not None and hi is not None
+        )
+        if not points:
+            return None
+        times, lows, highs = (list(column) for column in zip(*points))
+        created_at = _epoch(prediction.created_at)
+        return cls(prediction.id, created_at if created_at is not None else 0, times, lows, highs)
+
+    def interval(self, t: int) -> Optional[tuple[float, float]]:
+        """(lower, upper) at epoch microseconds `t`, or None outside the horizon."""
+        times = self.times
+        i = bisect.bisect_right(times, t) - 1
+        if i < 0 or t > times[-1]:
+            return None
+        if i == len(times) - 1 or t == times[i]:
+            return self.lower[i], self.upper[i]
+        fraction = (t - times[i]) / (times[i + 1] - times[i])
+        lower = self.lower[i] + fraction * (self.lower[i + 1] - self.lower[i])
+        upper = self.upper[i] + fraction * (self.upper[i + 1] - self.upper[i])
+        return lower, upper
+
+
+async def fetch_latest_predictions(
+    session, sensor_id: Optional[int] = None, now: Optional[datetime] = None
+) -> list[Prediction]:
+    """Latest unexpired prediction per (sensor, parameter), portable across backends."""
+    now = now or datetime.now(timezone.utc)
+    ranked = select(
+        Prediction.id,
+        func.row_number()
+        .over(
+            partition_by=(Prediction.sensor_id, Prediction.parameter),
+            order_by=desc(Prediction.created_at),
+        )
+        .label("rank"),
+    )
+    if sensor_id is not None:
+        ranked = ranked.where(Prediction.sensor_id == sensor_id)
+    ranked = ranked.subquery("ranked")
+
+    query = (
+        select(Prediction)
+        .join(ranked, ranked.c.id == Prediction.id)
+        .where(ranked.c.rank == 1, Prediction.forecast_end >= now)
+    )
+    result = await session.execute(query)
+    return list(result.scalars().all())
+
+
+class ForecastIntervalIndex:
+    """
+    sensor_id -> parameter -> `ForecastBand` of the latest prediction.
+
+    Replacing a sensor's bands never goes back to an older prediction, so a
+    slow full reload cannot undo a newer per-sensor refresh.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = FORECAST_RESIDUAL_ENABLED,
+        margin: float = FORECAST_RESIDUAL_MARGIN,
+        session_factory=AsyncSessionLocal,
+    ):
+        self.enabled = enabled
+        self.margin = margin
+        self.session_factory = session_factory
+        self.bands: dict[int, dict[str, ForecastBand]] = {}
+
+    @staticmethod
+    def _newest(
+        bands: dict[str, ForecastBand], previous: dict[str, ForecastBand]
+    ) -> dict[str, ForecastBand]:
+        for parameter, band in previous.items():
+            current = bands.get(parameter)
+            if current is not None and current.created_at < band.created_at:
+                bands[parameter] = band
+        return bands
+
+    def set_predictions(self, predictions: list[Prediction], sensor_id: Optional[int] = None):
+        """
+        Replace the index with `predictions`, or only `sensor_id`'s bands when
+        given; parameters without a prediction any more are dropped.
+        """
+        indexed: dict[int, dict[str, ForecastBand]] = {}
+        for prediction in predictions:
+            band = ForecastBand.from_prediction(prediction)
+            if band is not None:
+                indexed.setdefault(prediction.sensor_id, {})[prediction.parameter] = band
+        if sensor_id is not None:
+            indexed = {sensor_id: indexed.get(sensor_id, {})}
+        else:
+            indexed.update({sensor: {} for sensor in self.bands.keys() - indexed.keys()})
+        for sensor, bands in indexed.items():
+            bands = self._newest(bands, self.bands.get(sensor, {}))
+            if bands:
+                self.bands[sensor] = bands
+            else:
+                self.bands.pop(sensor, None)
+
+    async def load(self, sensor_id: Optional[int] = None):
+        """(Re)load one sensor's latest predictions, or every sensor's."""
+        if not self.enabled:
+            return
+        async with self.session_factory() as session:
+            predictions = await fetch_latest_predictions(session, sensor_id)
+        self.set_predictions(predictions, sensor_id)
+        logger.info(
+            f"Forecast interval index loaded for {sensor_id or 'all sensors'}: "
+            f"{self.stats()['bands']} bands"
+        )
+
+    async def reload(self):
+        """Reset handler: the bus may have missed refreshes while disconnected."""
+        try:
+            await self.load()
+        except Exception as e:
+            logger.error(f"Forecast interval index reload failed: {e}")
+
+    async def apply(self, event: dict[str, Any]):
+        """Event-bus handler for `forecast_events` payloads ({"sensor_id": ...})."""
+        await self.load(event.get("sensor_id"))
+
+    def check(
+        self, sensor_id: int, timestamp: int, values: Mapping[str, Optional[float]]
+    ) -> list[ResidualHit]:
+        """Readings far outside their forecast band at `timestamp` (epoch microseconds)."""
+        bands = self.bands.get(sensor_id) if self.enabled else None
+        if not bands:
+            return []
+        hits = []
+        for parameter, band in bands.items():
+            value = values.get(parameter)
+            if value is None or isinstance(value, bool) or math.isnan(value):
+                continue
+            interval = band.interval(timestamp)
+            if interval is None:
+                continue
+            lower, upper = interval
+            half_width = max((upper - lower) / 2, MIN_HALF_WIDTH)
+            excess = value - upper if value > upper else lower - value
+            if excess <= 0:
+                continue
+            score = excess / half_width
+            if score >= self.margin:
+                hits.append(ResidualHit(parameter, value, lower, upper, score))
+        return hits
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "sensors": len(self.bands),
+            "bands": sum(len(bands) for bands in self.bands.values()),
+        }
+
+
+forecast_intervals = ForecastIntervalIndex()
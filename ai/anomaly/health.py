@@ -0,0 +1,547 @@
+"""
+Sensor health diagnostics: is the probe itself trustworthy?
+
+A stuck probe reporting 7.00 forever looks perfectly healthy to the water
+quality detectors, and its readings feed forecasts and alerts all the same.
+Each sensor keeps a fixed handful of floats, updated in O(1) per reading:
+
+- per parameter, the current run of identical values (`flatline`) and an
+  exponentially weighted variance, which is implausibly small for a probe
+  that still jitters but no longer measures (`stuck`) or implausibly large
+  for a failing one (`erratic`),
+- the expected reporting interval, learned from in-control intervals unless
+  configured; a gap of `HEALTH_GAP_FACTOR` intervals is a `dropout`, and a
+  sensor silent for that long is `offline`,
+- a time-weighted linear regression of `battery_voltage`, whose slope
+  projects when the battery reaches its cutoff (`battery_decay`), plus
+  `battery_low` and `weak_signal` on smoothed levels.
+
+Issues make a sensor `degraded` (still measuring, needs a visit) or `faulty`
+(its flagged parameters should not be trusted). A real event can look like a
+fault too (a sudden drop reads as `erratic`, a value parked past a limit as a
+`flatline`), so threshold anomalies always stand and their alerts name the
+suspect probe; only the statistical detectors' hits on a parameter are
+dropped, and only once its fault has lasted `HEALTH_FAULT_PERSIST_READINGS`
+readings. Ingest announces status changes; like the other detectors the state
+is fed from `reading_events` in every worker and snapshotted to Redis.
+"""
+
+import json
+import logging
+import math
+import os
+from collections.abc import Mapping
+from datetime import datetime, timedelta, timezone
+from typing import Any, NamedTuple, Optional
+
+from ..db.timeseries import MEASUREMENT_COLUMNS
+from ..utils.env import env_flag
+from .streaming import RedisSnapshots
+
+logger = logging.getLogger(__name__)
+
+SENSOR_HEALTH_ENABLED = env_flag("SENSOR_HEALTH_ENABLED")
+HEALTH_WARMUP = int(os.getenv("HEALTH_WARMUP", "20"))
+HEALTH_EWMA_ALPHA = float(os.getenv("HEALTH_EWMA_ALPHA", "0.05"))
+HEALTH_FLATLINE_READINGS = int(os.getenv("HEALTH_FLATLINE_READINGS", "30"))
+HEALTH_FLATLINE_MINUTES = float(os.getenv("HEALTH_FLATLINE_MINUTES", "120"))
+# Consecutive faulty readings before a parameter's statistical hits are dropped.
+HEALTH_FAULT_PERSIST_READINGS = int(os.getenv("HEALTH_FAULT_PERSIST_READINGS", "10"))
+HEALTH_GAP_FACTOR = float(os.getenv("HEALTH_GAP_FACTOR", "3"))
+# 0 learns each sensor's interval from its own readings.
+HEALTH_EXPECTED_INTERVAL_SECONDS = float(os.getenv("HEALTH_EXPECTED_INTERVAL_SECONDS", "0"))
+# A dropout keeps the sensor degraded for this long after it ended.
+HEALTH_DROPOUT_HOURS = float(os.getenv("HEALTH_DROPOUT_HOURS", "24"))
+# Time constant of the battery regression's exponential forgetting.
+HEALTH_BATTERY_WINDOW_HOURS = float(os.getenv("HEALTH_BATTERY_WINDOW_HOURS", "72"))
+HEALTH_BATTERY_MIN_HOURS = float(os.getenv("HEALTH_BATTERY_MIN_HOURS", "6"))
+HEALTH_BATTERY_LOW_VOLTS = float(os.getenv("HEALTH_BATTERY_LOW_VOLTS", "3.4"))
+HEALTH_BATTERY_CUTOFF_VOLTS = float(os.getenv("HEALTH_BATTERY_CUTOFF_VOLTS", "3.2"))
+HEALTH_BATTERY_WARNING_DAYS = float(os.getenv("HEALTH_BATTERY_WARNING_DAYS", "7"))
+HEALTH_WEAK_SIGNAL_DBM = float(os.getenv("HEALTH_WEAK_SIGNAL_DBM", "-100"))
+
+# Plausible (min, max) short-term standard deviation of each probe.
+PLAUSIBLE_SIGMA = {"ph": (0.001, 1.0), "turbidity": (0.01, 50.0), "temperature": (0.005, 5.0)}
+
+STATUS_UNKNOWN = "unknown"
+STATUS_OK = "ok"
+STATUS_DEGRADED = "degraded"
+STATUS_FAULTY = "faulty"
+STATUS_OFFLINE = "offline"
+
+MICROS_PER_SECOND = 1_000_000
+MICROS_PER_DAY = 86_400 * MICROS_PER_SECOND
+# Intervals learned before gaps are judged.
+MIN_INTERVALS = 3
+MIN_BATTERY_READINGS = 10
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+class HealthIssue(NamedTuple):
+    code: str
+    severity: str  # STATUS_DEGRADED or STATUS_FAULTY
+    detail: str
+    parameter: Optional[str] = None
+
+
+class HealthTransition(NamedTuple):
+    previous: str
+    status: str
+
+
+class HealthReport(NamedTuple):
+    sensor_id: int
+    status: str
+    issues: list[HealthIssue]
+    last_seen: Optional[datetime]
+    expected_interval_seconds: Optional[float]
+    battery_voltage: Optional[float]
+    battery_slope_per_day: Optional[float]
+    days_to_battery_cutoff: Optional[float]
+    signal_strength: Optional[float]
+
+    @property
+    def faulty_parameters(self) -> set[str]:
+        return _faulty_parameters(self.issues)
+
+
+def _faulty_parameters(issues: list[HealthIssue]) -> set[str]:
+    return {
+        issue.parameter
+        for issue in issues
+        if issue.severity == STATUS_FAULTY and issue.parameter is not None
+    }
+
+
+def _micros_to_datetime(timestamp: int) -> datetime:
+    return _EPOCH + timedelta(microseconds=timestamp)
+
+
+class ParameterHealth:
+    """Flatline run and EW variance of one probe."""
+
+    __slots__ = ("count", "faulty_run", "mean", "run_length", "run_start", "run_value", "var")
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.var = 0.0
+        self.run_value = math.nan
+        self.run_length = 0
+        self.run_start = 0
+        # Consecutive readings with a fault issue, up to and including the latest.
+        self.faulty_run = 0
+
+    def update(self, timestamp: int, value: float):
+        if value == self.run_value:
+            self.run_length += 1
+        else:
+            self.run_value = value
+            self.run_length = 1
+            self.run_start = timestamp
+        if self.count == 0:
+            self.mean = value
+        else:
+            diff = value - self.mean
+            increment = HEALTH_EWMA_ALPHA * diff
+            self.mean += increment
+            self.var = (1 - HEALTH_EWMA_ALPHA) * (self.var + diff * increment)
+        self.count += 1
+
+    def issues(self, parameter: str, last_timestamp: int) -> list[HealthIssue]:
+        duration = (last_timestamp - self.run_start) / (60 * MICROS_PER_SECOND)
+        if self.run_length >= HEALTH_FLATLINE_READINGS and duration >= HEALTH_FLATLINE_MINUTES:
+            detail = f"{self.run_value:g} for {self.run_length} readings ({duration:.0f} min)"
+            return [HealthIssue("flatline", STATUS_FAULTY, detail, parameter)]
+        if self.count < HEALTH_WARMUP or parameter not in PLAUSIBLE_SIGMA:
+            return []
+        low, high = PLAUSIBLE_SIGMA[parameter]
+        sigma = math.sqrt(self.var)
+        if sigma < low:
+            return [HealthIssue("stuck", STATUS_FAULTY, f"sigma {sigma:.2g} < {low:g}", parameter)]
+        if sigma > high:
+            return [
+                HealthIssue("erratic", STATUS_FAULTY, f"sigma {sigma:.3g} > {high:g}", parameter)
+            ]
+        return []
+
+    def to_state(self) -> list[Any]:
+        run_value = None if math.isnan(self.run_value) else self.run_value
+        return [
+            self.count,
+            self.mean,
+            self.var,
+            run_value,
+            self.run_length,
+            self.run_start,
+            self.faulty_run,
+        ]
+
+    @classmethod
+    def from_state(cls, state: list[Any]) -> "ParameterHealth":
+        health = cls()
+        (
+            health.count,
+            health.mean,
+            health.var,
+            run_value,
+            health.run_length,
+            health.run_start,
+            *faulty_run,  # absent from snapshots taken before it was tracked
+        ) = state
+        health.faulty_run = faulty_run[0] if faulty_run else 0
+        health.run_value = math.nan if run_value is None else run_value
+        return health
+
+
+class BatteryTrend:
+    """
+    Exponentially forgetting least-squares line through (days, volts).
+
+    Times are days since `anchor` so the sums stay well conditioned.
+    """
+
+    __slots__ = ("anchor", "count", "last", "sum_t", "sum_tt", "sum_tv", "sum_v", "weight")
+
+    def __init__(self):
+        self.anchor = -1
+        self.last = 0.0
+        self.count = 0
+        self.weight = self.sum_t = self.sum_v = self.sum_tt = self.sum_tv = 0.0
+
+    def update(self, timestamp: int, volts: float):
+        if self.anchor < 0:
+            self.anchor = timestamp
+        t = (timestamp - self.anchor) / MICROS_PER_DAY
+        decay = math.exp(-(t - self.last) * 24 / HEALTH_BATTERY_WINDOW_HOURS)
+        self.weight = self.weight * decay + 1
+        self.sum_t = self.sum_t * decay + t
+        self.sum_v = self.sum_v * decay + volts
+        self.sum_tt = self.sum_tt * decay + t * t
+        self.sum_tv = self.sum_tv * decay + t * volts
+        self.last = t
+        self.count += 1
+
+    def level(self) -> Optional[float]:
+        """Smoothed voltage now: the fitted line at the last reading, or the mean."""
+        if not self.count:
+            return None
+        mean_v = self.sum_v / self.weight
+        slope = self.slope()
+        if slope is None:
+            return mean_v
+        return mean_v + slope * (self.last - self.sum_t / self.weight)
+
+    def slope(self) -> Optional[float]:
+        """Volts per day, once the readings span `HEALTH_BATTERY_MIN_HOURS`."""
+        if self.count < MIN_BATTERY_READINGS or self.last * 24 < HEALTH_BATTERY_MIN_HOURS:
+            return None
+        spread = self.weight * self.sum_tt - self.sum_t * self.sum_t
+        if spread <= 1e-12:
+            return None
+        return (self.weight * self.sum_tv - self.sum_t * self.sum_v) / spread
+
+    def to_state(self) -> list[Any]:
+        return [
+            self.anchor,
+            self.last,
+            self.count,
+            self.weight,
+            self.sum_t,
+            self.sum_v,
+            self.sum_tt,
+            self.sum_tv,
+        ]
+
+    @classmethod
+    def from_state(cls, state: list[Any]) -> "BatteryTrend":
+        trend = cls()
+        (
+            trend.anchor,
+            trend.last,
+            trend.count,
+            trend.weight,
+            trend.sum_t,
+            trend.sum_v,
+            trend.sum_tt,
+            trend.sum_tv,
+        ) = state
+        return trend
+
+
+class SensorHealthState:
+    """Everything known about one sensor's health; see the module docstring."""
+
+    __slots__ = (
+        "battery",
+        "gap_seconds",
+        "gaps",
+        "interval",
+        "intervals",
+        "last_gap_at",
+        "last_timestamp",
+        "last_transition",
+        "long_intervals",
+        "parameters",
+        "signal",
+        "status",
+    )
+
+    def __init__(self):
+        self.parameters: dict[str, ParameterHealth] = {}
+        self.last_timestamp = -1
+        # Learned reporting interval in seconds and how many intervals taught it.
+        self.interval = 0.0
+        self.intervals = 0
+        # Consecutive gaps; this many in a row means the cadence itself changed.
+        self.long_intervals = 0
+        self.gaps = 0
+        self.last_gap_at = -1  # end of the latest gap
+        self.gap_seconds = 0.0
+        self.battery = BatteryTrend()
+        self.signal: Optional[float] = None
+        self.status = STATUS_UNKNOWN
+        self.last_transition: Optional[HealthTransition] = None
+
+    def expected_interval(self) -> Optional[float]:
+        if HEALTH_EXPECTED_INTERVAL_SECONDS > 0:
+            return HEALTH_EXPECTED_INTERVAL_SECONDS
+        return self.interval if self.intervals >= MIN_INTERVALS else None
+
+    def update(self, timestamp: int, values: Mapping[str, Any]):
+        if self.last_timestamp >= 0:
+            seconds = (timestamp - self.last_timestamp) / MICROS_PER_SECOND
+            expected = self.expected_interval()
+            if expected is not None and seconds > HEALTH_GAP_FACTOR * expected:
+                self.gaps += 1
+                self.last_gap_at = timestamp
+                self.gap_seconds = seconds
+                self.long_intervals += 1
+                if self.long_intervals >= MIN_INTERVALS:
+                    self.interval = seconds
+                    self.long_intervals = 0
+            elif self.intervals == 0:
+                self.interval = seconds
+                self.intervals = 1
+            else:
+                # Only in-control intervals teach the expected one.
+                self.interval += 0.1 * (seconds - self.interval)
+                self.intervals += 1
+                self.long_intervals = 0
+        self.last_timestamp = timestamp
+
+        for parameter in MEASUREMENT_COLUMNS:
+            value = values.get(parameter)
+            if value is None or math.isnan(value):
+                continue
+            health = self.parameters.get(parameter)
+            if health is None:
+                health = self.parameters[parameter] = ParameterHealth()
+            health.update(timestamp, value)
+            health.faulty_run = health.faulty_run + 1 if health.issues(parameter, timestamp) else 0
+
+        volts = values.get("battery_voltage")
+        if volts is not None and not math.isnan(volts):
+            self.battery.update(timestamp, volts)
+        signal = values.get("signal_strength")
+        if signal is not None and not math.isnan(signal):
+            self.signal = (
+                signal
+                if self.signal is None
+                else self.signal + HEALTH_EWMA_ALPHA * (signal - self.signal)
+            )
+
+    def issues(self, now: int) -> tuple[str, list[HealthIssue]]:
+        """Status and issues as of `now` (epoch microseconds)."""
+        if self.last_timestamp < 0:
+            return STATUS_UNKNOWN, []
+        issues = []
+        for parameter, health in self.parameters.items():
+            issues.extend(health.issues(parameter, self.last_timestamp))
+
+        expected = self.expected_interval()
+        silent = (now - self.last_timestamp) / MICROS_PER_SECOND
+        offline = expected is not None and silent > HEALTH_GAP_FACTOR * expected
+        if offline:
+            issues.append(HealthIssue("offline", STATUS_DEGRADED, f"silent for {silent:.0f} s"))
+        if self.last_gap_at >= 0 and now - self.last_gap_at <= HEALTH_DROPOUT_HOURS * 3600e6:
+            detail = f"{self.gaps} gap(s), last {self.gap_seconds:.0f} s"
+            issues.append(HealthIssue("dropout", STATUS_DEGRADED, detail))
+
+        volts = self.battery.level()
+        if volts is not None and volts < HEALTH_BATTERY_LOW_VOLTS:
+            issues.append(HealthIssue("battery_low", STATUS_DEGRADED, f"{volts:.2f} V"))
+        days = self.days_to_battery_cutoff()
+        if days is not None and days < HEALTH_BATTERY_WARNING_DAYS:
+            issues.append(HealthIssue("battery_decay", STATUS_DEGRADED, f"cutoff in {days:.1f} d"))
+        if self.signal is not None and self.signal < HEALTH_WEAK_SIGNAL_DBM:
+            issues.append(HealthIssue("weak_signal", STATUS_DEGRADED, f"{self.signal:.0f} dBm"))
+
+        if offline:
+            status = STATUS_OFFLINE
+        elif any(issue.severity == STATUS_FAULTY for issue in issues):
+            status = STATUS_FAULTY
+        elif issues:
+            status = STATUS_DEGRADED
+        else:
+            status = STATUS_OK
+        return status, issues
+
+    def days_to_battery_cutoff(self) -> Optional[float]:
+        slope = self.battery.slope()
+        volts = self.battery.level()
+        if slope is None or slope >= 0 or volts is None:
+            return None
+        return max(volts - HEALTH_BATTERY_CUTOFF_VOLTS, 0.0) / -slope
+
+    def to_state(self) -> dict[str, Any]:
+        return {
+            "parameters": {
+                parameter: health.to_state() for parameter, health in self.parameters.items()
+            },
+            "sensor": [
+                self.last_timestamp,
+                self.interval,
+                self.intervals,
+                self.long_intervals,
+                self.gaps,
+                self.last_gap_at,
+                self.gap_seconds,
+                self.signal,
+                self.status,
+            ],
+            "battery": self.battery.to_state(),
+        }
+
+    @classmethod
+    def from_state(cls, state: Mapping[str, Any]) -> "SensorHealthState":
+        health = cls()
+        health.parameters = {
+            parameter: ParameterHealth.from_state(values)
+            for parameter, values in state["parameters"].items()
+        }
+        (
+            health.last_timestamp,
+            health.interval,
+            health.intervals,
+            health.long_intervals,
+            health.gaps,
+            health.last_gap_at,
+            health.gap_seconds,
+            health.signal,
+            health.status,
+        ) = state["sensor"]
+        health.battery = BatteryTrend.from_state(state["battery"])
+        return health
+
+
+class SensorHealthMonitor(RedisSnapshots):
+    """
+    Per-sensor `SensorHealthState`, fed from reading events and idempotent per
+    reading like `StreamingDetectors`; readings older than the last one seen
+    for a sensor are ignored.
+    """
+
+    SNAPSHOT_KEY = "anomaly:health"
+
+    def __init__(self, enabled: bool = SENSOR_HEALTH_ENABLED, redis_client=None):
+        super().__init__(enabled, redis_client)
+        self.states: dict[int, SensorHealthState] = {}
+
+    def observe(
+        self, sensor_id: int, timestamp: int, values: Mapping[str, Any]
+    ) -> Optional[HealthTransition]:
+        """
+        Apply the reading at `timestamp` (epoch microseconds); returns the
+        status change it caused, if any.
+        """
+        if not self.enabled:
+            return None
+        state = self.states.get(sensor_id)
+        if state is None:
+            state = self.states[sensor_id] = SensorHealthState()
+        if timestamp == state.last_timestamp:
+            return state.last_transition
+        if timestamp < state.last_timestamp:
+            return None
+        state.update(timestamp, values)
+        status, _ = state.issues(timestamp)
+        state.last_transition = None
+        if status != state.status:
+            state.last_transition = HealthTransition(state.status, status)
+            state.status = status
+        return state.last_transition
+
+    def apply(self, event: dict[str, Any]):
+        """Event-bus handler for `cache.hot_window.reading_event` payloads."""
+        self.observe(event["sensor_id"], event["timestamp"], event)
+
+    def report(self, sensor_id: int, now: Optional[int] = None) -> Optional[HealthReport]:
+        """Health as of `now` (epoch microseconds, default the wall clock)."""
+        state = self.states.get(sensor_id)
+        if state is None:
+            return None
+        if now is None:
+            now = (datetime.now(timezone.utc) - _EPOCH) // timedelta(microseconds=1)
+        status, issues = state.issues(now)
+        days = state.days_to_battery_cutoff()
+        return HealthReport(
+            sensor_id=sensor_id,
+            status=status,
+            issues=issues,
+            last_seen=_micros_to_datetime(state.last_timestamp),
+            expected_interval_seconds=state.expected_interval(),
+            battery_voltage=state.battery.level(),
+            battery_slope_per_day=state.battery.slope(),
+            days_to_battery_cutoff=days,
+            signal_strength=state.signal,
+        )
+
+    def reports(self, now: Optional[int] = None) -> list[HealthReport]:
+        return [self.report(sensor_id, now) for sensor_id in sorted(self.states)]
+
+    def faulty_parameters(self, sensor_id: int) -> set[str]:
+        """Parameters whose probe is faulty as of the sensor's latest reading."""
+        state = self.states.get(sensor_id)
+        if state is None or state.status != STATUS_FAULTY:
+            return set()
+        return _faulty_parameters(state.issues(state.last_timestamp)[1])
+
+    def suppressed_parameters(self, sensor_id: int) -> set[str]:
+        """
+        Faulty parameters whose fault has lasted `HEALTH_FAULT_PERSIST_READINGS`
+        readings; their statistical detector hits are noise.
+        """
+        state = self.states.get(sensor_id)
+        return {
+            parameter
+            for parameter in self.faulty_parameters(sensor_id)
+            if state.parameters[parameter].faulty_run >= HEALTH_FAULT_PERSIST_READINGS
+        }
+
+    def snapshot(self) -> dict[str, str]:
+        return {
+            str(sensor_id): json.dumps(state.to_state()) for sensor_id, state in self.states.items()
+        }
+
+    def restore(self, snapshot: Mapping[Any, Any]):
+        for raw_key, raw_state in snapshot.items():
+            key = raw_key.decode() if isinstance(raw_key, bytes) else raw_key
+            try:
+                state = SensorHealthState.from_state(json.loads(raw_state))
+            except (KeyError, TypeError, ValueError):
+                logger.warning(f"Dropping unreadable health state for sensor {key}")
+                continue
+            current = self.states.get(int(key))
+            # Readings applied since startup are newer than the snapshot.
+            if current is None or current.last_timestamp < state.last_timestamp:
+                self.states[int(key)] = state
+
+    def stats(self) -> dict[str, Any]:
+        statuses: dict[str, int] = {}
+        for state in self.states.values():
+            statuses[state.status] = statuses.get(state.status, 0) + 1
+        return {"enabled": self.enabled, "sensors": len(self.states), "statuses": statuses}
+
+
+sensor_health = SensorHealthMonitor()
@@ -0,0 +1,547 @@
+"""
+Unsupervised per-sensor anomaly model: an Isolation Forest on windowed features.
+
+Training happens offline (`ai.scripts.train_isolation`): each sensor's
+history becomes one feature row per reading from the trailing
+`ISOLATION_WINDOW` readings, and a forest is fitted to it. Every parameter
+contributes four features:
+
+- the value itself,
+- its deviation from the window mean,
+- the window standard deviation,
+- the step from the previous reading.
+
+Trees are stored as complete binary trees of fixed depth in flat NumPy
+arrays (split feature, split value, leaf path length), so scoring a batch is
+`depth` rounds of fancy indexing across every tree at once, on the CPU, with
+no estimator objects to unpickle. An early leaf splits at +inf so every row
+keeps walking left to a bottom leaf that carries the early leaf's path
+length.
+
+Artifacts are compressed `.npz` files in `ISOLATION_MODEL_DIR`, one per
+sensor. The online `IsolationScorer` loads them once at startup and keeps
+the trailing window for each modelled sensor; readings missing one of the
+model's parameters are skipped, in training as online. Windows are not
+snapshotted: they refill after `ISOLATION_WINDOW` readings.
+"""
+
+import asyncio
+import json
+import logging
+import math
+import multiprocessing
+import os
+from collections.abc import Mapping, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, NamedTuple, Optional
+
+import numpy as np
+
+from ..db.connection import AsyncSessionLocal, engine
+from ..db.timeseries import MEASUREMENT_COLUMNS, fetch_reading_columns
+from ..utils.env import env_flag
+
+logger = logging.getLogger(__name__)
+
+# Opt-in: a trained model is only trusted to alert once backtested on real data.
+ISOLATION_ENABLED = env_flag("ISOLATION_ENABLED", default=False)
+ISOLATION_MODEL_DIR = os.getenv(
+    "ISOLATION_MODEL_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "models")
+)
+ISOLATION_WINDOW = int(os.getenv("ISOLATION_WINDOW", "12"))
+ISOLATION_TREES = int(os.getenv("ISOLATION_TREES", "100"))
+ISOLATION_SAMPLE_SIZE = int(os.getenv("ISOLATION_SAMPLE_SIZE", "256"))
+# Share of training readings above the alarm score.
+ISOLATION_CONTAMINATION = float(os.getenv("ISOLATION_CONTAMINATION", "0.002"))
+ISOLATION_MIN_READINGS = int(os.getenv("ISOLATION_MIN_READINGS", "500"))
+ISOLATION_WORKERS = int(os.getenv("ISOLATION_WORKERS", str(os.cpu_count() or 1)))
+# Parameters null in more than this share of a sensor's history are left out of its model.
+ISOLATION_MAX_NULL_FRACTION = 0.5
+# Rows per scoring pass; bounds the (rows, trees) index arrays.
+SCORE_CHUNK = 4096
+
+ISOLATION_METHOD = "ml_isolation"
+MODEL_PREFIX = "isolation_sensor_"
+FEATURES = ("value", "deviation", "std", "step")
+
+_EULER_GAMMA = 0.5772156649015329
+
+
+def average_path_length(n: float) -> float:
+    """Mean unsuccessful-search path length in a BST of n points, c(n)."""
+    if n <= 1:
+        return 0.0
+    if n == 2:
+        return 1.0
+    return 2.0 * (math.log(n - 1) + _EULER_GAMMA) - 2.0 * (n - 1) / n
+
+
+def model_path(sensor_id: int, directory: str = ISOLATION_MODEL_DIR) -> Path:
+    return Path(directory) / f"{MODEL_PREFIX}{sensor_id}.npz"
+
+
+def window_features(values: np.ndarray, window: int = ISOLATION_WINDOW) -> np.ndarray:
+    """
+    Feature rows for a (readings, parameters) array, one per reading from the
+    `window`-th on, columns grouped by feature then parameter (see `FEATURES`).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) < window:
+        return np.empty((0, len(FEATURES) * values.shape[1]))
+    if len(values) == window:
+        # The online case; skips the strided view.
+        current = values[-1]
+        return np.concatenate(
+            [current, current - values.mean(axis=0), values.std(axis=0), current - values[-2]]
+        )[None, :]
+    # (rows, parameters, window) views, newest reading last.
+    windows = np.lib.stride_tricks.sliding_window_view(values, window, axis=0)
+    current = windows[..., -1]
+    return np.hstack(
+        [
+            current,
+            current - windows.mean(axis=-1),
+            windows.std(axis=-1),
+            current - windows[..., -2],
+        ]
+    )
+
+
+class IsolationHit(NamedTuple):
+    parameter: str
+    value: float
+    score: float
+
+
+class IsolationModel:
+    """One sensor's forest, alarm score and feature scaling; see the module docstring."""
+
+    def __init__(
+        self,
+        sensor_id: int,
+        parameters: Sequence[str],
+        split_features: np.ndarray,
+        split_values: np.ndarray,
+        path_lengths: np.ndarray,
+        sample_size: int,
+        threshold: float = 1.0,
+        feature_mean: Optional[np.ndarray] = None,
+        feature_std: Optional[np.ndarray] = None,
+        window: int = ISOLATION_WINDOW,
+        trained_readings: int = 0,
+    ):
+        self.sensor_id = sensor_id
+        self.parameters = tuple(parameters)
+        self.window = window
+        # (trees, 2**depth - 1) internal nodes and (trees, 2**depth) leaves.
+        self.split_features = split_features
+        self.split_values = split_values
+        self.path_lengths = path_lengths
+        self.sample_size = sample_size
+        self.threshold = threshold
+        width = len(FEATURES) * len(self.parameters)
+        self.feature_mean = feature_mean if feature_mean is not None else np.zeros(width)
+        self.feature_std = feature_std if feature_std is not None else np.ones(width)
+        self.trained_readings = trained_readings
+        trees, internal = split_features.shape
+        self.depth = internal.bit_length()
+        # Nodes are indexed across the flattened trees: the children of node g
+        # in tree t are 2g + 1 - t*internal (+1 going right), and its bottom
+        # leaf sits at g + t - internal in the flattened leaves.
+        self._roots = np.arange(trees) * internal
+        self._child_base = 1 - self._roots
+        self._leaf_base = np.arange(trees) - internal
+        # Native index dtype: gathers through int16 indices convert them first.
+        self._split_features = split_features.astype(np.intp).ravel()
+        self._split_values = split_values.ravel()
+        self._path_lengths = path_lengths.ravel()
+        self._normalizer = average_path_length(sample_size)
+
+    @classmethod
+    def fit(
+        cls,
+        sensor_id: int,
+        parameters: Sequence[str],
+        values: np.ndarray,
+        trees: int = ISOLATION_TREES,
+        sample_size: int = ISOLATION_SAMPLE_SIZE,
+        contamination: float = ISOLATION_CONTAMINATION,
+        window: int = ISOLATION_WINDOW,
+        seed: Optional[int] = None,
+    ) -> "IsolationModel":
+        """Fit to a (readings, parameters) array in time order, without nulls."""
+        features = window_features(values, window).astype(np.float32)
+        if not len(features):
+            raise ValueError(f"Need at least {window} readings to train")
+        rng = np.random.default_rng(seed)
+        sample_size = min(sample_size, len(features))
+        depth = max(math.ceil(math.log2(sample_size)), 1)
+        internal = 2**depth - 1
+        split_features = np.zeros((trees, internal), dtype=np.int16)
+        split_values = np.full((trees, internal), np.inf, dtype=np.float32)
+        path_lengths = np.zeros((trees, internal + 1), dtype=np.float32)
+        for tree in range(trees):
+            sample = features[rng.choice(len(features), sample_size, replace=False)]
+            _grow_tree(
+                sample, rng, split_features[tree], split_values[tree], path_lengths[tree], depth
+            )
+
+        model = cls(
+            sensor_id,
+            parameters,
+            split_features,
+            split_values,
+            path_lengths,
+            sample_size,
+            feature_mean=features.mean(axis=0),
+            feature_std=features.std(axis=0),
+            window=window,
+            trained_readings=len(values),
+        )
+        model.threshold = float(np.quantile(model.score(features), 1.0 - contamination))
+        return model
+
+    def score(self, features: np.ndarray) -> np.ndarray:
+        """Anomaly scores in (0, 1] for feature rows; about 0.5 is unremarkable."""
+        features = np.asarray(features, dtype=np.float32)
+        if len(features) > SCORE_CHUNK:
+            return np.concatenate(
+                [
+                    self.score(features[start : start + SCORE_CHUNK])
+                    for start in range(0, len(features), SCORE_CHUNK)
+                ]
+            )
+        split_features = self._split_features
+        split_values = self._split_values
+        if len(features) == 1:
+            # One reading, as online: plain 1-D gathers are several times cheaper.
+            row = features[0]
+            nodes = self._roots
+            for _ in range(self.depth):
+                right = row[split_features[nodes]] >= split_values[nodes]
+                nodes = 2 * nodes + self._child_base + right
+            mean_path = self._path_lengths[nodes + self._leaf_base].mean(keepdims=True)
+            return np.exp2(-mean_path / self._normalizer)
+        rows = np.arange(len(features))[:, None]
+        nodes = np.broadcast_to(self._roots, (len(features), len(self._roots)))
+        for _ in range(self.depth):
+            right = features[rows, split_features[nodes]] >= split_values[nodes]
+            nodes = 2 * nodes + self._child_base + right
+        mean_path = self._path_lengths[nodes + self._leaf_base].mean(axis=1)
+        return np.exp2(-mean_path / self._normalizer)
+
+    def attribute(self, features: np.ndarray) -> int:
+        """Index of the parameter whose features sit furthest from training, in sigmas."""
+        z = np.abs(features - self.feature_mean) / np.maximum(self.feature_std, 1e-9)
+        return int(z.reshape(len(FEATURES), len(self.parameters)).max(axis=0).argmax())
+
+    def hits(self, features: np.ndarray, values: np.ndarray) -> list[Optional[IsolationHit]]:
+        """Scored hits for aligned feature rows and current (readings, parameters) values."""
+        scores = self.score(features)
+        results: list[Optional[IsolationHit]] = [None] * len(scores)
+        for row in np.flatnonzero(scores > self.threshold):
+            column = self.attribute(features[row])
+            results[row] = IsolationHit(
+                self.parameters[column], float(values[row, column]), float(scores[row])
+            )
+        return results
+
+    def save(self, directory: str = ISOLATION_MODEL_DIR) -> Path:
+        path = model_path(self.sensor_id, directory)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        metadata = {
+            "sensor_id": self.sensor_id,
+            "parameters": list(self.parameters),
+            "window": self.window,
+            "sample_size": self.sample_size,
+            "threshold": self.threshold,
+            "trained_readings": self.trained_readings,
+        }
+        np.savez_compressed(
+            path,
+            metadata=np.array(json.dumps(metadata)),
+            split_features=self.split_features,
+            split_values=self.split_values,
+            path_lengths=self.path_lengths,
+            feature_mean=self.feature_mean.astype(np.float32),
+            feature_std=self.feature_std.astype(np.float32),
+        )
+        return path
+
+    @classmethod
+    def load(cls, path: str | Path) -> "IsolationModel":
+        with np.load(path, allow_pickle=False) as artifact:
+            metadata = json.loads(str(artifact["metadata"]))
+            return cls(
+                metadata["sensor_id"],
+                metadata["parameters"],
+                artifact["split_features"],
+                artifact["split_values"],
+                artifact["path_lengths"],
+                metadata["sample_size"],
+                threshold=metadata["threshold"],
+                feature_mean=artifact["feature_mean"],
+                feature_std=artifact["feature_std"],
+                window=metadata["window"],
+                trained_readings=metadata["trained_readings"],
+            )
+
+
+def _grow_tree(
+    sample: np.ndarray,
+    rng: np.random.Generator,
+    split_features: np.ndarray,
+    split_values: np.ndarray,
+    path_lengths: np.ndarray,
+    depth: int,
+):
+    """Fill one tree's node arrays from `sample`, breadth first."""
+    internal = len(split_features)
+    members: list[Optional[np.ndarray]] = [None] * (2 * internal + 1)
+    members[0] = np.arange(len(sample))
+    for node in range(internal):
+        rows = members[node]
+        if rows is None:
+            continue
+        level = (node + 1).bit_length() - 1
+        if len(rows) > 1:
+            low = sample[rows].min(axis=0)
+            high = sample[rows].max(axis=0)
+            candidates = np.flatnonzero(high > low)
+        else:
+            candidates = ()
+        if not len(candidates):
+            # Early leaf: split_values stays +inf, so rows walk left to the bottom.
+            bottom = node
+            while bottom < internal:
+                bottom = 2 * bottom + 1
+            path_lengths[bottom - internal] = level + average_path_length(len(rows))
+            continue
+        feature = rng.choice(candidates)
+        value = rng.uniform(low[feature], high[feature])
+        split_features[node] = feature
+        split_values[node] = value
+        right = sample[rows, feature] >= np.float32(value)
+        members[2 * node + 1] = rows[~right]
+        members[2 * node + 2] = rows[right]
+    for leaf in range(internal + 1):
+        rows = members[internal + leaf]
+        if rows is not None:
+            path_lengths[leaf] = depth + average_path_length(len(rows))
+
+
+class SensorWindow:
+    """The trailing readings of one modelled sensor, oldest first."""
+
+    __slots__ = ("count", "last_hit", "last_timestamp", "values")
+
+    def __init__(self, window: int, parameters: int):
+        self.values = np.zeros((window, parameters))
+        self.count = 0
+        self.last_timestamp = -1
+        self.last_hit: Optional[IsolationHit] = None
+
+    @property
+    def full(self) -> bool:
+        return self.count >= len(self.values)
+
+    def push(self, row: Sequence[float]):
+        self.values[:-1] = self.values[1:]
+        self.values[-1] = row
+        self.count += 1
+
+
+class IsolationScorer:
+    """
+    Online scoring with the stored models, fed from reading events and
+    idempotent per reading like the streaming detectors. Sensors without a
+    model cost a dictionary lookup.
+    """
+
+    def __init__(self, enabled: bool = ISOLATION_ENABLED, model_dir: str = ISOLATION_MODEL_DIR):
+        self.enabled = enabled
+        self.model_dir = model_dir
+        self.models: dict[int, IsolationModel] = {}
+        self.windows: dict[int, SensorWindow] = {}
+
+    def load_models(self) -> int:
+        """Load every artifact in `model_dir`; returns how many were loaded."""
+        if not self.enabled:
+            return 0
+        for path in sorted(Path(self.model_dir).glob(f"{MODEL_PREFIX}*.npz")):
+            try:
+                model = IsolationModel.load(path)
+            except (KeyError, OSError, ValueError) as e:
+                logger.warning(f"Skipping unreadable isolation model {path}: {e}")
+                continue
+            self.add_model(model)
+        logger.info(f"Loaded {len(self.models)} isolation model(s) from {self.model_dir}")
+        return len(self.models)
+
+    def load_model(self, sensor_id: int) -> bool:
+        """Load one sensor's artifact, e.g. for a replay of that sensor; False without one."""
+        path = model_path(sensor_id, self.model_dir)
+        if not self.enabled or not path.exists():
+            return False
+        self.add_model(IsolationModel.load(path))
+        return True
+
+    def add_model(self, model: IsolationModel):
+        self.models[model.sensor_id] = model
+        self.windows[model.sensor_id] = SensorWindow(model.window, len(model.parameters))
+
+    def observe(
+        self, sensor_id: int, timestamp: int, values: Mapping[str, Optional[float]]
+    ) -> Optional[IsolationHit]:
+        """The hit for the reading at `timestamp` (epoch microseconds), if any."""
+        model = self.models.get(sensor_id) if self.enabled else None
+        if model is None:
+            return None
+        window = self.windows[sensor_id]
+        if timestamp == window.last_timestamp:
+            return window.last_hit
+        if timestamp < window.last_timestamp:
+            return None
+        row = [values.get(parameter) for parameter in model.parameters]
+        if any(value is None or math.isnan(value) for value in row):
+            return None
+        window.push(row)
+        window.last_timestamp = timestamp
+        window.last_hit = None
+        if window.full:
+            current = window.values
+            window.last_hit = model.hits(window_features(current, model.window), current[-1:])[0]
+        return window.last_hit
+
+    def apply(self, event: dict[str, Any]):
+        """Event-bus handler for `cache.hot_window.reading_event` payloads."""
+        self.observe(event["sensor_id"], event["timestamp"], event)
+
+    def score_batch(
+        self, sensor_id: int, values: Mapping[str, np.ndarray]
+    ) -> list[Optional[IsolationHit]]:
+        """
+        Hits for a run of one sensor's readings in time order (NaN = null),
+        aligned with the input; independent of the online windows. Readings
+        without a full window before them are not scored.
+        """
+        count = len(next(iter(values.values()))) if values else 0
+        results: list[Optional[IsolationHit]] = [None] * count
+        model = self.models.get(sensor_id) if self.enabled else None
+        if model is None:
+            return results
+        matrix = np.column_stack(
+            [np.asarray(values[parameter], dtype=np.float64) for parameter in model.parameters]
+        )
+        complete = np.flatnonzero(~np.isnan(matrix).any(axis=1))
+        matrix = matrix[complete]
+        features = window_features(matrix, model.window)
+        scored = complete[model.window - 1 :]
+        for row, hit in zip(scored, model.hits(features, matrix[model.window - 1 :])):
+            results[row] = hit
+        return results
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "models": len(self.models),
+            "warming_up": sum(not window.full for window in self.windows.values()),
+        }
+
+
+isolation_scorer = IsolationScorer()
+
+
+# --- Training ---
+
+
+async def train_sensor(
+    sensor_id: int,
+    start: Optional[datetime],
+    end: Optional[datetime],
+    model_dir: str = ISOLATION_MODEL_DIR,
+    session_factory=AsyncSessionLocal,
+    seed: Optional[int] = None,
+) -> Optional[dict[str, Any]]:
+    """
+    Fit and save one sensor's model from its readings in [start, end); returns
+    a summary, or None when the history is too short.
+    """
+    async with session_factory() as session:
+        columns = await fetch_reading_columns(session, sensor_id, start, end)
+    parameters = [
+        parameter
+        for parameter in MEASUREMENT_COLUMNS
+        if len(columns)
+        and np.isnan(columns.values[parameter]).mean() <= ISOLATION_MAX_NULL_FRACTION
+    ]
+    if not parameters:
+        return None
+    values = np.column_stack([columns.values[parameter] for parameter in parameters])
+    values = values[~np.isnan(values).any(axis=1)]
+    if len(values) < max(ISOLATION_MIN_READINGS, ISOLATION_WINDOW):
+        logger.info(f"Sensor {sensor_id}: {len(values)} complete readings, not training")
+        return None
+    model = IsolationModel.fit(sensor_id, parameters, values, seed=seed)
+    path = model.save(model_dir)
+    return {
+        "sensor_id": sensor_id,
+        "parameters": parameters,
+        "readings": len(values),
+        "threshold": round(model.threshold, 4),
+        "path": str(path),
+        "bytes": path.stat().st_size,
+    }
+
+
+def _train_sensor_in_worker(
+    sensor_id: int, start, end, model_dir: str, seed: Optional[int]
+) -> Optional[dict[str, Any]]:
+    """Process-pool entry point: runs `train_sensor` on the worker's own engine."""
+
+    async def run():
+        try:
+            return await train_sensor(sensor_id, start, end, model_dir, seed=seed)
+        finally:
+            # Pooled connections belong to this task's event loop.
+            await engine.dispose()
+
+    return asyncio.run(run())
+
+
+async def train_models(
+    sensor_ids: Sequence[int],
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    model_dir: str = ISOLATION_MODEL_DIR,
+    workers: int = ISOLATION_WORKERS,
+    session_factory=AsyncSessionLocal,
+    seed: Optional[int] = None,
+) -> list[dict[str, Any]]:
+    """
+    Train every sensor in `sensor_ids`; summaries of the models written.
+
+    With more than one worker, sensors train in spawned processes that connect
+    through `DATABASE_URL`, as in `anomaly.backtest`.
+    """
+    workers = min(workers, len(sensor_ids))
+    if workers <= 1:
+        summaries = [
+            await train_sensor(sensor_id, start, end, model_dir, session_factory, seed)
+            for sensor_id in sensor_ids
+        ]
+    else:
+        loop = asyncio.get_running_loop()
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            summaries = await asyncio.gather(
+                *(
+                    loop.run_in_executor(
+                        pool, _train_sensor_in_worker, sensor_id, start, end, model_dir, seed
+                    )
+                    for sensor_id in sensor_ids
+                )
+            )
+    return [summary for summary in summaries if summary is not None]
@@ -0,0 +1,223 @@
+"""
+Joint pH–turbidity detection by Mahalanobis distance.
+
+AMD shows up as pH falling while turbidity rises (dissolved metals
+precipitate). Either move on its own can stay within its single-parameter
+limits, while the pair is far from how the two normally vary together.
+
+Each sensor keeps a bivariate mean and covariance in six floats:
+
+- warm-up: Welford's online co-moments over the first `MULTIVARIATE_WARMUP`
+  readings, with no verdicts,
+- afterwards: a slow exponentially weighted update that only learns from
+  in-control readings, like the `anomaly.streaming` baseline.
+
+A reading is scored against the state before it is folded in, by the 2x2
+inverse in closed form; variances are floored at the sensor resolution
+(`streaming.SIGMA_FLOOR`) so a flat signal cannot make every step an outlier.
+Hits in the AMD direction are reported as `mahalanobis_amd`.
+"""
+
+import json
+import logging
+import math
+import os
+from collections.abc import Mapping
+from typing import Any, NamedTuple, Optional
+
+from ..utils.env import env_flag
+from .streaming import DEFAULT_SIGMA_FLOOR, SIGMA_FLOOR, RedisSnapshots
+
+logger = logging.getLogger(__name__)
+
+# Opt-in until a backtest shows the distance cutoff suits the fleet.
+MULTIVARIATE_ENABLED = env_flag("MULTIVARIATE_ENABLED", default=False)
+MULTIVARIATE_WARMUP = int(os.getenv("MULTIVARIATE_WARMUP", "50"))
+# Distance, not squared: 3.72 is the 0.999 quantile of chi-square with 2 dof.
+MULTIVARIATE_THRESHOLD = float(os.getenv("MULTIVARIATE_THRESHOLD", "3.72"))
+MULTIVARIATE_BASELINE_ALPHA = float(os.getenv("MULTIVARIATE_BASELINE_ALPHA", "0.01"))
+# Correlations are clipped to this so the covariance stays invertible.
+MAX_CORRELATION = 0.999
+
+MAHALANOBIS_METHOD = "mahalanobis"
+MAHALANOBIS_AMD_METHOD = "mahalanobis_amd"
+
+
+class MultivariateHit(NamedTuple):
+    ph: float
+    turbidity: float
+    method: str
+    distance: float
+
+
+class CovarianceState:
+    """Bivariate (pH, turbidity) baseline of one sensor; see the module docstring."""
+
+    __slots__ = (
+        "count",
+        "cov_pt",
+        "last_hit",
+        "last_timestamp",
+        "mean_p",
+        "mean_t",
+        "var_p",
+        "var_t",
+    )
+
+    def __init__(self):
+        self.count = 0
+        self.mean_p = 0.0
+        self.mean_t = 0.0
+        # Co-moments during warm-up; (co)variances afterwards.
+        self.var_p = 0.0
+        self.var_t = 0.0
+        self.cov_pt = 0.0
+        self.last_timestamp = -1
+        self.last_hit: Optional[tuple[str, float]] = None
+
+    @property
+    def warmed_up(self) -> bool:
+        return self.count >= MULTIVARIATE_WARMUP
+
+    def distance(self, ph: float, turbidity: float, floor_p: float, floor_t: float) -> float:
+        """Mahalanobis distance of a reading from the current baseline."""
+        dp = ph - self.mean_p
+        dt = turbidity - self.mean_t
+        var_p = max(self.var_p, floor_p * floor_p)
+        var_t = max(self.var_t, floor_t * floor_t)
+        limit = MAX_CORRELATION * math.sqrt(var_p * var_t)
+        cov = min(max(self.cov_pt, -limit), limit)
+        determinant = var_p * var_t - cov * cov
+        squared = (var_t * dp * dp - 2 * cov * dp * dt + var_p * dt * dt) / determinant
+        return math.sqrt(max(squared, 0.0))
+
+    def update(
+        self, ph: float, turbidity: float, floor_p: float, floor_t: float
+    ) -> Optional[tuple[str, float]]:
+        """Score the reading against the current state, then fold it in."""
+        hit = None
+        dp = ph - self.mean_p
+        dt = turbidity - self.mean_t
+        if self.count >= MULTIVARIATE_WARMUP:
+            distance = self.distance(ph, turbidity, floor_p, floor_t)
+            if distance > MULTIVARIATE_THRESHOLD:
+                method = MAHALANOBIS_AMD_METHOD if dp < 0 < dt else MAHALANOBIS_METHOD
+                hit = (method, distance)
+            else:
+                beta = MULTIVARIATE_BASELINE_ALPHA
+                keep = 1 - beta
+                self.mean_p += beta * dp
+                self.mean_t += beta * dt
+                self.var_p = keep * (self.var_p + beta * dp * dp)
+                self.var_t = keep * (self.var_t + beta * dt * dt)
+                self.cov_pt = keep * (self.cov_pt + beta * dp * dt)
+        else:
+            n = self.count + 1
+            self.mean_p += dp / n
+            self.mean_t += dt / n
+            self.var_p += dp * (ph - self.mean_p)
+            self.var_t += dt * (turbidity - self.mean_t)
+            self.cov_pt += dp * (turbidity - self.mean_t)
+            if n == MULTIVARIATE_WARMUP:
+                divisor = max(n - 1, 1)
+                self.var_p /= divisor
+                self.var_t /= divisor
+                self.cov_pt /= divisor
+        self.count += 1
+        self.last_hit = hit
+        return hit
+
+    def to_state(self) -> list[Any]:
+        return [
+            self.count,
+            self.mean_p,
+            self.mean_t,
+            self.var_p,
+            self.var_t,
+            self.cov_pt,
+            self.last_timestamp,
+        ]
+
+    @classmethod
+    def from_state(cls, state: list[Any]) -> "CovarianceState":
+        covariance = cls()
+        (
+            covariance.count,
+            covariance.mean_p,
+            covariance.mean_t,
+            covariance.var_p,
+            covariance.var_t,
+            covariance.cov_pt,
+            covariance.last_timestamp,
+        ) = state
+        return covariance
+
+
+class MultivariateDetector(RedisSnapshots):
+    """
+    Per-sensor `CovarianceState`, fed from reading events and idempotent per
+    reading like `StreamingDetectors`. Readings missing either parameter are
+    skipped.
+    """
+
+    SNAPSHOT_KEY = "anomaly:multivariate"
+
+    def __init__(self, enabled: bool = MULTIVARIATE_ENABLED, redis_client=None):
+        super().__init__(enabled, redis_client)
+        self.states: dict[int, CovarianceState] = {}
+        self.floor_p = SIGMA_FLOOR.get("ph", DEFAULT_SIGMA_FLOOR)
+        self.floor_t = SIGMA_FLOOR.get("turbidity", DEFAULT_SIGMA_FLOOR)
+
+    def observe(
+        self, sensor_id: int, timestamp: int, values: Mapping[str, Optional[float]]
+    ) -> Optional[MultivariateHit]:
+        """The hit for the reading at `timestamp` (epoch microseconds), if any."""
+        if not self.enabled:
+            return None
+        ph = values.get("ph")
+        turbidity = values.get("turbidity")
+        if ph is None or turbidity is None or math.isnan(ph) or math.isnan(turbidity):
+            return None
+        state = self.states.get(sensor_id)
+        if state is None:
+            state = self.states[sensor_id] = CovarianceState()
+        if timestamp == state.last_timestamp:
+            hit = state.last_hit
+        elif timestamp < state.last_timestamp:
+            return None
+        else:
+            hit = state.update(ph, turbidity, self.floor_p, self.floor_t)
+            state.last_timestamp = timestamp
+        return MultivariateHit(ph, turbidity, *hit) if hit is not None else None
+
+    def apply(self, event: dict[str, Any]):
+        """Event-bus handler for `cache.hot_window.reading_event` payloads."""
+        self.observe(event["sensor_id"], event["timestamp"], event)
+
+    def snapshot(self) -> dict[str, str]:
+        return {
+            str(sensor_id): json.dumps(state.to_state()) for sensor_id, state in self.states.items()
+        }
+
+    def restore(self, snapshot: Mapping[Any, Any]):
+        for raw_key, raw_state in snapshot.items():
+            key = raw_key.decode() if isinstance(raw_key, bytes) else raw_key
+            try:
+                state = CovarianceState.from_state(json.loads(raw_state))
+            except (TypeError, ValueError):
+                logger.warning(f"Dropping unreadable multivariate state for sensor {key}")
+                continue
+            current = self.states.get(int(key))
+            # Readings applied since startup are newer than the snapshot.
+            if current is None or current.last_timestamp < state.last_timestamp:
+                self.states[int(key)] = state
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "sensors": len(self.states),
+            "warming_up": sum(not state.warmed_up for state in self.states.values()),
+        }
+
+
+multivariate_detector = MultivariateDetector()
@@ -0,0 +1,306 @@
+"""
+Rate-of-change and acceleration detection per sensor parameter.
+
+A pH falling from 7.0 to 5.6 within an hour is an acidification event even
+though 5.6 is still inside the fixed bands. Each rule fits a least-squares
+slope over a trailing time window, kept in a bounded deque with running sums,
+so every reading costs O(1) and no history query:
+
+- samples are weighted by their actual timestamps, so irregular spacing needs
+  no resampling,
+- a gap longer than `max_gap` clears the window instead of drawing a slope
+  across missing data,
+- no verdict is given until the window holds `min_points` samples spanning at
+  least `min_span` of the window.
+
+Acceleration rules fit a second slope over the first one's values, e.g. a
+turbidity rise that is itself speeding up. Like `anomaly.streaming`, state is
+fed from the `reading_events` bus so every worker sees every reading.
+"""
+
+import json
+import logging
+import math
+import os
+from collections import deque
+from collections.abc import Mapping, Sequence
+from dataclasses import dataclass
+from typing import Any, NamedTuple, Optional
+
+from ..utils.env import env_flag
+
+logger = logging.getLogger(__name__)
+
+# Opt-in: the default slope limits are uncalibrated guesses until backtested.
+RATE_OF_CHANGE_ENABLED = env_flag("RATE_OF_CHANGE_ENABLED", default=False)
+RATE_WINDOW_MAX_POINTS = int(os.getenv("RATE_WINDOW_MAX_POINTS", "256"))
+# Running sums are rebuilt from the window this often to shed rounding drift.
+RESUM_EVERY = 1024
+
+HOUR = 3600.0
+
+
+@dataclass(frozen=True)
+class RateRule:
+    """
+    Flags a parameter whose slope (order 1, per hour) or acceleration (order 2,
+    per hour squared) reaches a threshold. Negative thresholds flag falls,
+    positive ones rises.
+    """
+
+    parameter: str
+    warning: float
+    critical: Optional[float] = None
+    window_minutes: float = 60.0
+    order: int = 1
+    min_points: int = 4
+    min_span: float = 0.25
+    max_gap_minutes: Optional[float] = None
+
+    @property
+    def method(self) -> str:
+        # Short enough for "<method>_<severity>" in anomalies.detection_method (20 chars).
+        return "rate" if self.order == 1 else "accel"
+
+    @property
+    def key(self) -> str:
+        return f"{self.parameter}:{self.method}:{self.window_minutes:g}"
+
+    def severity(self, rate: float) -> Optional[str]:
+        critical, warning = self.critical, self.warning
+        if critical is not None and (rate <= critical if critical < 0 else rate >= critical):
+            return "critical"
+        if warning is not None and (rate <= warning if warning < 0 else rate >= warning):
+            return "warning"
+        return None
+
+
+DEFAULT_RATE_RULES = (
+    # 7.0 -> 5.6 within an hour is -1.4 pH/h.
+    RateRule("ph", warning=-0.5, critical=-1.0),
+    RateRule("turbidity", warning=20.0, critical=50.0),
+    RateRule("turbidity", warning=40.0, critical=100.0, order=2),
+)
+
+
+def load_rate_rules() -> tuple[RateRule, ...]:
+    """DEFAULT_RATE_RULES, or a JSON list of RateRule fields in RATE_OF_CHANGE_RULES."""
+    raw = os.getenv("RATE_OF_CHANGE_RULES")
+    if not raw:
+        return DEFAULT_RATE_RULES
+    try:
+        return tuple(RateRule(**fields) for fields in json.loads(raw))
+    except (TypeError, ValueError) as e:
+        logger.error(f"Invalid RATE_OF_CHANGE_RULES ({e}); using defaults")
+        return DEFAULT_RATE_RULES
+
+
+class RollingSlope:
+    """
+    Least-squares slope of (t, x) over a trailing window of `window` seconds.
+
+    Sums are kept relative to the oldest sample's time and re-based in O(1)
+    when it is evicted, so they stay small however long the stream runs.
+    """
+
+    __slots__ = (
+        "window",
+        "max_gap",
+        "max_points",
+        "min_points",
+        "min_span",
+        "points",
+        "origin",
+        "st",
+        "sx",
+        "stt",
+        "stx",
+        "updates",
+    )
+
+    def __init__(
+        self,
+        window: float,
+        max_gap: float,
+        min_points: int = 4,
+        min_span: float = 0.25,
+        max_points: int = RATE_WINDOW_MAX_POINTS,
+    ):
+        self.window = window
+        self.max_gap = max_gap
+        self.max_points = max_points
+        self.min_points = min_points
+        self.min_span = min_span * window
+        self.points: deque[tuple[float, float]] = deque()
+        self.clear()
+
+    def clear(self):
+        self.points.clear()
+        self.origin = 0.0
+        self.st = self.sx = self.stt = self.stx = 0.0
+        self.updates = 0
+
+    def _resum(self):
+        self.origin = self.points[0][0] if self.points else 0.0
+        self.st = self.sx = self.stt = self.stx = 0.0
+        for t, x in self.points:
+            rt = t - self.origin
+            self.st += rt
+            self.sx += x
+            self.stt += rt * rt
+            self.stx += rt * x
+
+    def add(self, t: float, x: float):
+        points = self.points
+        if points and t - points[-1][0] > self.max_gap:
+            self.clear()
+        if not points:
+            self.origin = t
+
+        # Locals instead of attribute updates: this runs for every reading and rule.
+        origin = self.origin
+        rt = t - origin
+        points.append((t, x))
+        st = self.st + rt
+        sx = self.sx + x
+        stt = self.stt + rt * rt
+        stx = self.stx + rt * x
+
+        horizon = t - self.window
+        if points[0][0] < horizon or len(points) > self.max_points:
+            while points[0][0] < horizon or len(points) > self.max_points:
+                old_t, old_x = points.popleft()
+                old_rt = old_t - origin
+                st -= old_rt
+                sx -= old_x
+                stt -= old_rt * old_rt
+                stx -= old_rt * old_x
+            # Shift the origin to the new oldest sample.
+            shift = points[0][0] - origin
+            n = len(points)
+            stt -= 2 * shift * st - n * shift * shift
+            stx -= shift * sx
+            st -= n * shift
+            self.origin = points[0][0]
+
+        self.st, self.sx, self.stt, self.stx = st, sx, stt, stx
+        self.updates += 1
+        if self.updates % RESUM_EVERY == 0:
+            self._resum()
+
+    def slope(self) -> Optional[float]:
+        """Units of x per second, or None while the window is too thin."""
+        n = len(self.points)
+        if n < self.min_points or self.points[-1][0] - self.points[0][0] < self.min_span:
+            return None
+        denominator = n * self.stt - self.st * self.st
+        if denominator <= 0:
+            return None
+        return (n * self.stx - self.st * self.sx) / denominator
+
+
+class RateHit(NamedTuple):
+    parameter: str
+    value: float
+    method: str
+    severity: str
+    rate: float
+
+
+class _RuleState:
+    __slots__ = ("rule", "scale", "slope", "outer", "last_timestamp", "last_hit")
+
+    def __init__(self, rule: RateRule):
+        self.rule = rule
+        self.scale = HOUR**rule.order
+        window = rule.window_minutes * 60
+        max_gap = (rule.max_gap_minutes or rule.window_minutes) * 60
+        self.slope = RollingSlope(window, max_gap, rule.min_points, rule.min_span)
+        # Acceleration: slope of the slope series over the same window.
+        self.outer = (
+            RollingSlope(window, max_gap, rule.min_points, rule.min_span)
+            if rule.order == 2
+            else None
+        )
+        self.last_timestamp = -1
+        self.last_hit: Optional[RateHit] = None
+
+    def update(self, t: float, value: float) -> Optional[RateHit]:
+        self.slope.add(t, value)
+        rate = self.slope.slope()
+        if rate is not None and self.outer is not None:
+            self.outer.add(t, rate)
+            rate = self.outer.slope()
+        if rate is None:
+            return None
+        rate *= self.scale
+        rule = self.rule
+        severity = rule.severity(rate)
+        if severity is None:
+            return None
+        return RateHit(rule.parameter, value, rule.method, severity, rate)
+
+
+class RateOfChangeDetector:
+    """
+    Per-sensor `RateRule` state, idempotent per reading like `StreamingDetectors`.
+
+    Readings older than the last one seen for a rule are ignored.
+    """
+
+    def __init__(
+        self, rules: Optional[Sequence[RateRule]] = None, enabled: bool = RATE_OF_CHANGE_ENABLED
+    ):
+        self.rules = tuple(rules) if rules is not None else load_rate_rules()
+        self.enabled = enabled
+        # sensor_id -> one state per rule, created on the rule's first value.
+        self.states: dict[int, list[Optional[_RuleState]]] = {}
+
+    def observe(
+        self, sensor_id: int, timestamp: int, values: Mapping[str, Optional[float]]
+    ) -> list[RateHit]:
+        """Hits for the reading at `timestamp` (epoch microseconds)."""
+        if not self.enabled:
+            return []
+        hits = []
+        t = timestamp / 1_000_000
+        states = self.states.get(sensor_id)
+        if states is None:
+            states = self.states[sensor_id] = [None] * len(self.rules)
+        for index, rule in enumerate(self.rules):
+            value = values.get(rule.parameter)
+            if value is None or math.isnan(value):
+                continue
+            state = states[index]
+            if state is None:
+                state = states[index] = _RuleState(rule)
+            if timestamp == state.last_timestamp:
+                hit = state.last_hit
+            elif timestamp < state.last_timestamp:
+                continue
+            else:
+                hit = state.last_hit = state.update(t, value)
+                state.last_timestamp = timestamp
+            if hit is not None:
+                hits.append(hit)
+        return hits
+
+    def apply(self, event: dict[str, Any]):
+        """Event-bus handler for `cache.hot_window.reading_event` payloads."""
+        self.observe(event["sensor_id"], event["timestamp"], event)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "rules": [rule.key for rule in self.rules],
+            "sensors": len(self.states),
+            "points": sum(
+                len(state.slope.points)
+                for states in self.states.values()
+                for state in states
+                if state is not None
+            ),
+        }
+
+
+rate_of_change_detector = RateOfChangeDetector()
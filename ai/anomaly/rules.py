@@ -0,0 +1,298 @@
+"""
+Threshold rules, compiled into flat lookup tables.
+
+Limits come in layers: the built-in defaults below (plus registry thresholds
+of long-format parameters), then fleet-wide rows of `threshold_rules`, then
+per-sensor rows. A rule replaces its parameter's limits as a whole. Compiling
+resolves the layers once into two arrays indexed [row, parameter, side]:
+
+- `bounds`: float64 limits, NaN where a side is unchecked,
+- `alerting`: whether breaching that side raises an anomaly, or only colours
+  the sensor's current state on the dashboard.
+
+Row 0 is the fleet default and every sensor with a rule of its own gets a row,
+so classifying a reading is a dict lookup and a few vectorized comparisons.
+Both the ingest detector and the current-state summary use the active
+`RuleSet`, which is swapped whole when `threshold_rule_events` reports an edit.
+"""
+
+import logging
+from collections.abc import Iterable, Mapping, Sequence
+from typing import Any, NamedTuple, Optional
+
+import numpy as np
+from sqlalchemy import select
+
+from ..db.connection import AsyncSessionLocal
+from ..db.models import ThresholdRule
+from ..db.parameters import parameter_registry
+from .batch import SEVERITY_CRITICAL, SEVERITY_NONE, SEVERITY_WARNING, ThresholdLimits
+
+logger = logging.getLogger(__name__)
+
+# Timeline-specified general water quality thresholds for demos, not AMD-specific.
+ANOMALY_THRESHOLDS = {
+    "ph": {
+        "warning_low": 5.5,  # Warning when pH dips below safe range
+        "critical_low": 4.5,  # Critical acidity threshold
+        "warning_high": 9.0,  # High pH (less common in AMD)
+        "critical_high": 10.0,
+    },
+    "turbidity": {
+        "warning_high": 50.0,  # Elevated turbidity warning
+        "critical_high": 100.0,  # Critical turbidity
+    },
+    "temperature": {
+        "warning_high": 35.0,  # High temperature warning
+        "critical_high": 40.0,
+    },
+}
+
+# Sides of ANOMALY_THRESHOLDS that raise anomalies. High pH and temperature are
+# only used for the dashboard status, not alerted on.
+ENFORCED_THRESHOLDS = {
+    "ph": ("critical_low", "warning_low"),
+    "turbidity": ("critical_high", "warning_high"),
+}
+
+# Order of the last axis of the compiled tables (and of ThresholdLimits).
+SIDES = ThresholdLimits._fields
+LOW_SIDES = slice(0, 2)
+HIGH_SIDES = slice(2, 4)
+
+
+class Rule(NamedTuple):
+    """One parameter's limits and which of its sides raise anomalies."""
+
+    limits: ThresholdLimits
+    alert_low: bool = True
+    alert_high: bool = True
+
+    @classmethod
+    def from_row(cls, row: Any) -> "Rule":
+        return cls(ThresholdLimits.from_spec(row), row.alert_low, row.alert_high)
+
+
+class RuleHit(NamedTuple):
+    parameter: str
+    value: float
+    severity: int
+
+
+def default_rules(specs: Iterable[Any] = ()) -> dict[str, Rule]:
+    """
+    Built-in limits of the wide columns, plus the thresholds of registry specs
+    (`db.parameters.ParameterSpec`) for every other parameter.
+    """
+    rules = {}
+    for parameter, thresholds in ANOMALY_THRESHOLDS.items():
+        enforced = ENFORCED_THRESHOLDS.get(parameter, ())
+        rules[parameter] = Rule(
+            ThresholdLimits(**thresholds),
+            alert_low=any(side.endswith("_low") for side in enforced),
+            alert_high=any(side.endswith("_high") for side in enforced),
+        )
+    for spec in specs:
+        limits = ThresholdLimits.from_spec(spec)
+        if spec.key not in rules and not limits.is_empty:
+            rules[spec.key] = Rule(limits)
+    return rules
+
+
+class RuleSet:
+    """Compiled defaults, fleet-wide and per-sensor rules; see the module docstring."""
+
+    def __init__(
+        self,
+        defaults: Mapping[str, Rule],
+        fleet: Optional[Mapping[str, Rule]] = None,
+        sensors: Optional[Mapping[int, Mapping[str, Rule]]] = None,
+    ):
+        fleet = {} if fleet is None else fleet
+        sensors = {} if sensors is None else sensors
+        self.fleet = dict(fleet)
+        self.sensors = {sensor_id: dict(rules) for sensor_id, rules in sensors.items()}
+        parameters = dict.fromkeys(defaults)
+        parameters.update(dict.fromkeys(fleet))
+        for rules in sensors.values():
+            parameters.update(dict.fromkeys(rules))
+        self.parameters = tuple(parameters)
+        self.index = {parameter: i for i, parameter in enumerate(self.parameters)}
+
+        self.sensor_rows = {sensor_id: row for row, sensor_id in enumerate(sensors, start=1)}
+        shape = (len(sensors) + 1, len(self.parameters), len(SIDES))
+        self.bounds = np.full(shape, np.nan)
+        self.alerting = np.zeros(shape, dtype=bool)
+        self._fill(0, {**defaults, **fleet})
+        for sensor_id, rules in sensors.items():
+            row = self.sensor_rows[sensor_id]
+            self.bounds[row] = self.bounds[0]
+            self.alerting[row] = self.alerting[0]
+            self._fill(row, rules)
+        # Bounds with the status-only sides blanked out, for anomaly checks.
+        self.enforced = np.where(self.alerting, self.bounds, np.nan)
+        self._sensor_keys = np.array(sorted(self.sensor_rows), dtype=np.int64)
+        self._sensor_key_rows = np.array(
+            [self.sensor_rows[key] for key in self._sensor_keys.tolist()], dtype=np.int64
+        )
+
+    def _fill(self, row: int, rules: Mapping[str, Rule]):
+        for parameter, rule in rules.items():
+            i = self.index[parameter]
+            self.bounds[row, i] = [np.nan if bound is None else bound for bound in rule.limits]
+            self.alerting[row, i, LOW_SIDES] = rule.alert_low
+            self.alerting[row, i, HIGH_SIDES] = rule.alert_high
+
+    def row(self, sensor_id: Optional[int]) -> int:
+        return self.sensor_rows.get(sensor_id, 0)
+
+    def classify(
+        self, sensor_id: Optional[int], values: Mapping[str, Any], enforced_only: bool = True
+    ) -> list[RuleHit]:
+        """
+        Breaches of one reading, in rule order. With `enforced_only` (the
+        anomaly check) status-only sides are ignored.
+        """
+        vector = np.fromiter(
+            (_as_float(values.get(parameter)) for parameter in self.parameters),
+            dtype=np.float64,
+            count=len(self.parameters),
+        )
+        table = self.enforced if enforced_only else self.bounds
+        bounds = table[self.row(sensor_id)]
+        column = vector[:, None]
+        with np.errstate(invalid="ignore"):
+            below = column < bounds[:, LOW_SIDES]
+            above = column > bounds[:, HIGH_SIDES]
+        critical = below[:, 0] | above[:, 1]
+        warning = below[:, 1] | above[:, 0]
+        severity = np.where(
+            critical, SEVERITY_CRITICAL, np.where(warning, SEVERITY_WARNING, SEVERITY_NONE)
+        )
+        return [
+            RuleHit(self.parameters[i], float(vector[i]), int(severity[i]))
+            for i in np.flatnonzero(severity).tolist()
+        ]
+
+    def limits(self, sensor_id: Optional[int] = None) -> dict[str, ThresholdLimits]:
+        """Enforced limits of a sensor's parameters that raise anomalies at all."""
+        bounds = self.enforced[self.row(sensor_id)]
+        return {
+            parameter: ThresholdLimits(*(None if np.isnan(bound) else bound for bound in side))
+            for parameter, side in zip(self.parameters, bounds.tolist())
+            if not np.isnan(side).all()
+        }
+
+    def batch_limits(self, sensor_ids: Any) -> dict[str, ThresholdLimits]:
+        """
+        `limits` for a batch: scalar bounds when no sensor has its own rules,
+        otherwise per-row arrays (NaN = unchecked) aligned with `sensor_ids`.
+        """
+        if not self.sensor_rows:
+            return self.limits()
+        ids = np.asarray(sensor_ids, dtype=np.int64)
+        keys = self._sensor_keys
+        position = np.clip(np.searchsorted(keys, ids), 0, len(keys) - 1)
+        rows = np.where(keys[position] == ids, self._sensor_key_rows[position], 0)
+        bounds = self.enforced[rows]
+        return {
+            parameter: ThresholdLimits(*(bounds[..., i, side] for side in range(len(SIDES))))
+            for parameter, i in self.index.items()
+            if not np.isnan(self.enforced[:, i]).all()
+        }
+
+    def describe(self, sensor_id: Optional[int] = None) -> list[dict[str, Any]]:
+        """Effective rules of a sensor (or the fleet default), with where each comes from."""
+        row = self.row(sensor_id)
+        described = []
+        for parameter, i in self.index.items():
+            bounds = self.bounds[row, i].tolist()
+            if np.isnan(bounds).all():
+                continue
+            if parameter in self.sensors.get(sensor_id, {}):
+                source = "sensor"
+            elif parameter in self.fleet:
+                source = "fleet"
+            else:
+                source = "default"
+            described.append(
+                {
+                    "parameter": parameter,
+                    **{
+                        side: None if np.isnan(bound) else bound
+                        for side, bound in zip(SIDES, bounds)
+                    },
+                    "alert_low": bool(self.alerting[row, i, 0]),
+                    "alert_high": bool(self.alerting[row, i, 2]),
+                    "source": source,
+                }
+            )
+        return described
+
+
+def _as_float(value: Any) -> float:
+    if value is None or isinstance(value, bool):
+        return np.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def compile_rules(specs: Iterable[Any], rows: Sequence[Any]) -> RuleSet:
+    """`RuleSet` from registry specs and `ThresholdRule` rows."""
+    fleet: dict[str, Rule] = {}
+    sensors: dict[int, dict[str, Rule]] = {}
+    for row in rows:
+        target = fleet if row.sensor_id is None else sensors.setdefault(row.sensor_id, {})
+        target[row.parameter] = Rule.from_row(row)
+    return RuleSet(default_rules(specs), fleet, sensors)
+
+
+class ThresholdRules:
+    """
+    The active `RuleSet` of this worker, rebuilt from the database on reload.
+
+    Until the first load it holds the built-in defaults, so detection works
+    without a database.
+    """
+
+    def __init__(self, session_factory=AsyncSessionLocal):
+        self.session_factory = session_factory
+        self.rules = RuleSet(default_rules())
+        self.version = 0
+
+    async def load(self):
+        async with self.session_factory() as session:
+            specs = await parameter_registry.load(session)
+            result = await session.execute(select(ThresholdRule).order_by(ThresholdRule.id))
+            rows = result.scalars().all()
+        # Swapped whole: readers always see one consistent rule set.
+        self.rules = compile_rules(specs, rows)
+        self.version += 1
+        logger.info(
+            f"Threshold rules compiled: {len(rows)} rules, "
+            f"{len(self.rules.sensor_rows)} sensors with their own limits"
+        )
+
+    async def reload(self):
+        """Reset and event handler; keeps the current rules if the database is unavailable."""
+        try:
+            await self.load()
+        except Exception as e:
+            logger.error(f"Threshold rule reload failed: {e}")
+
+    async def apply(self, event: dict[str, Any]):
+        """Event-bus handler for `threshold_rule_events`; any edit recompiles everything."""
+        await self.reload()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "version": self.version,
+            "parameters": len(self.rules.parameters),
+            "fleet_rules": len(self.rules.fleet),
+            "sensors": len(self.rules.sensor_rows),
+        }
+
+
+threshold_rules = ThresholdRules()
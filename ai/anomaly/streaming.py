@@ -0,0 +1,331 @@
+"""
+Streaming statistical detectors per sensor and parameter.
+
+Each (sensor, parameter) keeps a few floats and a short window, updated in
+O(1) per reading:
+
+- a baseline mean/variance (Welford during warm-up, then a slow EWMA that
+  only learns from in-control readings),
+- an EWMA control chart on the smoothed value, which catches slow drift such
+  as AMD onset long before a fixed threshold is crossed,
+- a rolling z-score against the last `window` readings, for sudden jumps,
+- a two-sided CUSUM in baseline sigma units, for small persistent shifts.
+
+Every API worker applies every reading from the `reading_events` bus, so the
+statistics see the complete stream no matter which worker ingested a reading.
+State is snapshotted to Redis periodically and restored on startup.
+"""
+
+import asyncio
+import json
+import logging
+import math
+import os
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from collections.abc import Mapping
+from typing import Any, NamedTuple, Optional
+
+import redis.asyncio as redis
+
+from ..db.timeseries import MEASUREMENT_COLUMNS
+from ..utils.env import env_flag
+
+logger = logging.getLogger(__name__)
+
+# Opt-in: their hits alert, so enable them once a backtest has tuned the limits.
+STREAMING_DETECTORS_ENABLED = env_flag("STREAMING_DETECTORS_ENABLED", default=False)
+STREAMING_WARMUP = int(os.getenv("STREAMING_WARMUP", "30"))
+STREAMING_EWMA_ALPHA = float(os.getenv("STREAMING_EWMA_ALPHA", "0.2"))
+STREAMING_EWMA_L = float(os.getenv("STREAMING_EWMA_L", "3.0"))
+STREAMING_ZSCORE_WINDOW = int(os.getenv("STREAMING_ZSCORE_WINDOW", "60"))
+STREAMING_ZSCORE_THRESHOLD = float(os.getenv("STREAMING_ZSCORE_THRESHOLD", "4.0"))
+STREAMING_CUSUM_K = float(os.getenv("STREAMING_CUSUM_K", "0.5"))
+STREAMING_CUSUM_H = float(os.getenv("STREAMING_CUSUM_H", "5.0"))
+# Weight of each in-control reading in the baseline once warm-up is over.
+STREAMING_BASELINE_ALPHA = float(os.getenv("STREAMING_BASELINE_ALPHA", "0.01"))
+STREAMING_SNAPSHOT_SECONDS = float(os.getenv("STREAMING_SNAPSHOT_SECONDS", "60"))
+
+# Sensor resolution; a flat signal must not turn every 0.01 step into 10 sigma.
+SIGMA_FLOOR = {"ph": 0.05, "turbidity": 1.0, "temperature": 0.2}
+DEFAULT_SIGMA_FLOOR = 1e-6
+
+EWMA_METHOD = "ewma"
+ZSCORE_METHOD = "zscore"
+CUSUM_METHOD = "cusum"
+
+
+class StreamingHit(NamedTuple):
+    parameter: str
+    value: float
+    method: str
+    score: float
+
+
+class ParameterStream:
+    """Detector state for one sensor parameter; see the module docstring."""
+
+    __slots__ = (
+        "count",
+        "mean",
+        "m2",
+        "ewma",
+        "cusum_high",
+        "cusum_low",
+        "window",
+        "window_sum",
+        "window_sumsq",
+        "last_timestamp",
+        "last_hits",
+    )
+
+    def __init__(self, window: int = STREAMING_ZSCORE_WINDOW):
+        self.count = 0
+        self.mean = 0.0
+        # Sum of squared deviations during warm-up; variance afterwards.
+        self.m2 = 0.0
+        self.ewma = 0.0
+        self.cusum_high = 0.0
+        self.cusum_low = 0.0
+        self.window: deque[float] = deque(maxlen=window)
+        self.window_sum = 0.0
+        self.window_sumsq = 0.0
+        self.last_timestamp = -1
+        self.last_hits: tuple[tuple[str, float], ...] = ()
+
+    @property
+    def warmed_up(self) -> bool:
+        return self.count >= STREAMING_WARMUP
+
+    def variance(self) -> float:
+        if self.warmed_up:
+            return self.m2
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    def update(self, value: float, sigma_floor: float) -> tuple[tuple[str, float], ...]:
+        """Score `value` against the current state, then fold it in."""
+        hits: list[tuple[str, float]] = []
+        if self.warmed_up:
+            sigma = max(math.sqrt(self.variance()), sigma_floor)
+            deviation = (value - self.mean) / sigma
+
+            alpha = STREAMING_EWMA_ALPHA
+            self.ewma = alpha * value + (1 - alpha) * self.ewma
+            ewma_score = abs(self.ewma - self.mean) / (sigma * math.sqrt(alpha / (2 - alpha)))
+            if ewma_score > STREAMING_EWMA_L:
+                hits.append((EWMA_METHOD, ewma_score))
+
+            size = len(self.window)
+            if size >= 2:
+                window_mean = self.window_sum / size
+                window_var = max(self.window_sumsq / size - window_mean * window_mean, 0.0)
+                z = abs(value - window_mean) / max(math.sqrt(window_var), sigma_floor)
+                if z > STREAMING_ZSCORE_THRESHOLD:
+                    hits.append((ZSCORE_METHOD, z))
+
+            self.cusum_high = max(0.0, self.cusum_high + deviation - STREAMING_CUSUM_K)
+            self.cusum_low = max(0.0, self.cusum_low - deviation - STREAMING_CUSUM_K)
+            cusum = max(self.cusum_high, self.cusum_low)
+            if cusum > STREAMING_CUSUM_H:
+                hits.append((CUSUM_METHOD, cusum))
+                self.cusum_high = self.cusum_low = 0.0
+
+            if not hits:
+                beta = STREAMING_BASELINE_ALPHA
+                delta = value - self.mean
+                self.mean += beta * delta
+                self.m2 = (1 - beta) * (self.m2 + beta * delta * delta)
+        else:
+            delta = value - self.mean
+            self.mean += delta / (self.count + 1)
+            self.m2 += delta * (value - self.mean)
+            if self.count + 1 == STREAMING_WARMUP:
+                self.m2 = self.m2 / max(self.count, 1)
+            self.ewma = self.mean
+
+        self.count += 1
+        if len(self.window) == self.window.maxlen:
+            dropped = self.window[0]
+            self.window_sum -= dropped
+            self.window_sumsq -= dropped * dropped
+        self.window.append(value)
+        self.window_sum += value
+        self.window_sumsq += value * value
+        self.last_hits = tuple(hits)
+        return self.last_hits
+
+    def to_state(self) -> list[Any]:
+        return [
+            self.count,
+            self.mean,
+            self.m2,
+            self.ewma,
+            self.cusum_high,
+            self.cusum_low,
+            self.last_timestamp,
+            list(self.window),
+        ]
+
+    @classmethod
+    def from_state(cls, state: list[Any]) -> "ParameterStream":
+        stream = cls()
+        (
+            stream.count,
+            stream.mean,
+            stream.m2,
+            stream.ewma,
+            stream.cusum_high,
+            stream.cusum_low,
+            stream.last_timestamp,
+            window,
+        ) = state
+        stream.window.extend(window)
+        stream.window_sum = sum(stream.window)
+        stream.window_sumsq = sum(value * value for value in stream.window)
+        return stream
+
+
+class RedisSnapshots(ABC):
+    """
+    Periodic snapshots of detector state into the Redis hash `SNAPSHOT_KEY`.
+
+    Subclasses provide `snapshot()` (field -> JSON) and `restore()`, which must
+    keep local state that is newer than the snapshot.
+    """
+
+    SNAPSHOT_KEY = ""
+    REDIS_RETRY_SECONDS = 30
+
+    def __init__(self, enabled: bool, redis_client=None):
+        self.enabled = enabled
+        self.redis = redis_client
+        self.redis_url = os.getenv("REDIS_URL", "redis://localhost:6379")
+        self._redis_retry_at = 0.0
+
+    @abstractmethod
+    def snapshot(self) -> dict[str, str]:
+        """State to save, as Redis hash field -> JSON."""
+
+    @abstractmethod
+    def restore(self, snapshot: Mapping[Any, Any]):
+        """Merge a saved snapshot, keeping local state that is newer."""
+
+    async def _ensure_redis(self) -> bool:
+        if self.redis is None and time.monotonic() >= self._redis_retry_at:
+            self.redis = redis.from_url(self.redis_url)
+        return self.redis is not None
+
+    def _drop_redis(self, error: Exception):
+        logger.warning(f"Detector state {self.SNAPSHOT_KEY} unavailable in Redis: {error}")
+        self.redis = None
+        self._redis_retry_at = time.monotonic() + self.REDIS_RETRY_SECONDS
+
+    async def load(self):
+        if not self.enabled or not await self._ensure_redis():
+            return
+        try:
+            snapshot = await self.redis.hgetall(self.SNAPSHOT_KEY)
+            self.restore(snapshot)
+            logger.info(f"Restored {len(snapshot)} detector states from {self.SNAPSHOT_KEY}")
+        except Exception as e:
+            self._drop_redis(e)
+
+    async def save(self):
+        snapshot = self.snapshot()
+        if not snapshot or not await self._ensure_redis():
+            return
+        try:
+            await self.redis.hset(self.SNAPSHOT_KEY, mapping=snapshot)
+        except Exception as e:
+            self._drop_redis(e)
+
+    async def run_snapshots(self, interval: float = STREAMING_SNAPSHOT_SECONDS):
+        """Save state every `interval` seconds until cancelled, then once more."""
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                await self.save()
+        finally:
+            await self.save()
+
+
+class StreamingDetectors(RedisSnapshots):
+    """
+    All sensors' `ParameterStream`s, fed from reading events.
+
+    `observe()` is idempotent per reading: a reading already applied from the
+    event bus returns the hits computed then, and readings older than the last
+    one seen for a parameter are ignored (the statistics assume time order).
+    """
+
+    SNAPSHOT_KEY = "anomaly:streaming"
+
+    def __init__(
+        self,
+        parameters: tuple[str, ...] = MEASUREMENT_COLUMNS,
+        enabled: bool = STREAMING_DETECTORS_ENABLED,
+        redis_client=None,
+    ):
+        super().__init__(enabled, redis_client)
+        self.parameters = parameters
+        self.streams: dict[tuple[int, str], ParameterStream] = {}
+
+    def observe(
+        self, sensor_id: int, timestamp: int, values: Mapping[str, Optional[float]]
+    ) -> list[StreamingHit]:
+        """Hits for the reading at `timestamp` (epoch microseconds)."""
+        if not self.enabled:
+            return []
+        hits = []
+        for parameter in self.parameters:
+            value = values.get(parameter)
+            if value is None or math.isnan(value):
+                continue
+            key = (sensor_id, parameter)
+            stream = self.streams.get(key)
+            if stream is None:
+                stream = self.streams[key] = ParameterStream()
+            if timestamp == stream.last_timestamp:
+                found = stream.last_hits
+            elif timestamp < stream.last_timestamp:
+                continue
+            else:
+                found = stream.update(value, SIGMA_FLOOR.get(parameter, DEFAULT_SIGMA_FLOOR))
+                stream.last_timestamp = timestamp
+            hits.extend(StreamingHit(parameter, value, method, score) for method, score in found)
+        return hits
+
+    def apply(self, event: dict[str, Any]):
+        """Event-bus handler for `cache.hot_window.reading_event` payloads."""
+        self.observe(event["sensor_id"], event["timestamp"], event)
+
+    def snapshot(self) -> dict[str, str]:
+        return {
+            f"{sensor_id}:{parameter}": json.dumps(stream.to_state())
+            for (sensor_id, parameter), stream in self.streams.items()
+        }
+
+    def restore(self, snapshot: Mapping[Any, Any]):
+        for raw_key, raw_state in snapshot.items():
+            key = raw_key.decode() if isinstance(raw_key, bytes) else raw_key
+            sensor_id, _, parameter = key.partition(":")
+            try:
+                stream = ParameterStream.from_state(json.loads(raw_state))
+            except (TypeError, ValueError):
+                logger.warning(f"Dropping unreadable streaming state for {key}")
+                continue
+            current = self.streams.get((int(sensor_id), parameter))
+            # Readings applied since startup are newer than the snapshot.
+            if current is None or current.last_timestamp < stream.last_timestamp:
+                self.streams[(int(sensor_id), parameter)] = stream
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "streams": len(self.streams),
+            "warming_up": sum(not stream.warmed_up for stream in self.streams.values()),
+        }
+
+
+streaming_detectors = StreamingDetectors()
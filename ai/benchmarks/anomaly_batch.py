@@ -0,0 +1,88 @@
+"""
+Compare per-reading threshold checks with the vectorized batch path.
+
+Usage:
+    python -m ai.benchmarks.anomaly_batch [--sizes 10000 100000 525600]
+
+525,600 readings is a year of one sensor at one reading per minute. "dicts"
+calls detect_threshold_anomalies once per reading, as a naive re-score would;
+"batch" returns hit arrays and "batch+objs" also builds the AnomalyCreate
+models for the hits.
+"""
+
+import argparse
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from ai.anomaly.detector import AnomalyDetector
+
+REPEATS = 3
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def _data(size: int):
+    rng = np.random.default_rng(0)
+    minutes = np.arange(size) * np.timedelta64(1, "m")
+    timestamps = np.datetime64(START.replace(tzinfo=None), "us") + minutes
+    values = {
+        # About 2% of pH and 4% of turbidity readings cross a threshold.
+        "ph": rng.normal(7.0, 0.7, size),
+        "turbidity": rng.gamma(2.0, 10.0, size),
+        "temperature": rng.normal(27.0, 2.0, size),
+    }
+    return timestamps, values
+
+
+def _dicts(detector: AnomalyDetector, timestamps, values) -> int:
+    columns = {key: column.tolist() for key, column in values.items()}
+    hits = 0
+    for i in range(len(timestamps)):
+        reading = {key: column[i] for key, column in columns.items()}
+        hits += len(detector.detect_threshold_anomalies(1, reading, START + timedelta(minutes=i)))
+    return hits
+
+
+def _batch(detector: AnomalyDetector, timestamps, values) -> int:
+    return len(detector.detect_threshold_batch(1, timestamps, values))
+
+
+def _batch_objects(detector: AnomalyDetector, timestamps, values) -> int:
+    return len(detector.detect_threshold_batch(1, timestamps, values).to_anomalies())
+
+
+def run(sizes: list[int]) -> None:
+    detector = AnomalyDetector()
+    print(f"{'readings':>9} {'path':<11} {'best s':>8} {'readings/s':>14} {'speedup':>8}")
+    for size in sizes:
+        timestamps, values = _data(size)
+        baseline = None
+        expected = None
+        for name, check in (
+            ("dicts", _dicts),
+            ("batch", _batch),
+            ("batch+objs", _batch_objects),
+        ):
+            timings = []
+            for _ in range(REPEATS):
+                began = time.perf_counter()
+                hits = check(detector, timestamps, values)
+                timings.append(time.perf_counter() - began)
+            expected = expected if expected is not None else hits
+            assert hits == expected, (name, hits, expected)
+            best = min(timings)
+            baseline = baseline or best
+            print(
+                f"{size:>9} {name:<11} {best:>8.3f} {size / best:>14,.0f} {baseline / best:>7.1f}x"
+            )
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark threshold anomaly checks")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 525_600])
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    run(parse_args().sizes)
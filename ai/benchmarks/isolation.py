@@ -0,0 +1,81 @@
+"""
+Cost of Isolation Forest training and scoring per reading, on the CPU.
+
+Usage:
+    python -m ai.benchmarks.isolation [--readings 100000] [--trees 100] [--stream 5000]
+
+A synthetic sensor history (pH, turbidity, temperature at one reading a
+minute) is fitted once, then scored three ways: "online" feeds readings one
+at a time through `IsolationScorer.observe` as ingest does, "batch" scores a
+whole history through `score_batch`, and "forest" times `IsolationModel.score`
+alone on precomputed feature rows.
+"""
+
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from ai.anomaly.isolation import IsolationModel, IsolationScorer, window_features
+
+PARAMETERS = ("ph", "turbidity", "temperature")
+
+
+def _history(readings: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    minutes = np.arange(readings)
+    daily = np.sin(2 * np.pi * minutes / 1440)
+    return np.column_stack(
+        [
+            7.0 + 0.05 * daily + rng.normal(0, 0.03, readings),
+            15.0 + rng.gamma(2.0, 2.0, readings),
+            27.0 + 1.5 * daily + rng.normal(0, 0.2, readings),
+        ]
+    )
+
+
+def _per_reading(elapsed: float, count: int) -> str:
+    return f"{elapsed / count * 1e6:.1f} µs/reading ({count / elapsed:,.0f} readings/s)"
+
+
+def run(readings: int, trees: int, stream: int) -> None:
+    history = _history(readings)
+    began = time.perf_counter()
+    model = IsolationModel.fit(1, PARAMETERS, history, trees=trees, seed=0)
+    fitted = time.perf_counter() - began
+    with tempfile.TemporaryDirectory() as directory:
+        size = model.save(directory).stat().st_size
+    print(f"fit: {readings:,} readings, {trees} trees in {fitted:.2f} s; artifact {size:,} bytes")
+
+    scorer = IsolationScorer(enabled=True)
+    scorer.add_model(model)
+    fresh = _history(stream, seed=1)
+    rows = [dict(zip(PARAMETERS, row)) for row in fresh.tolist()]
+    began = time.perf_counter()
+    for timestamp, row in enumerate(rows):
+        scorer.observe(1, timestamp, row)
+    print(f"online: {_per_reading(time.perf_counter() - began, stream)}")
+
+    columns = {parameter: history[:, i] for i, parameter in enumerate(PARAMETERS)}
+    began = time.perf_counter()
+    scorer.score_batch(1, columns)
+    print(f"batch:  {_per_reading(time.perf_counter() - began, readings)}")
+
+    features = window_features(history).astype(np.float32)
+    began = time.perf_counter()
+    model.score(features)
+    print(f"forest: {_per_reading(time.perf_counter() - began, len(features))}")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark Isolation Forest scoring")
+    parser.add_argument("--readings", type=int, default=100_000, help="Training history length")
+    parser.add_argument("--trees", type=int, default=100)
+    parser.add_argument("--stream", type=int, default=5000, help="Readings scored online")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    run(args.readings, args.trees, args.stream)
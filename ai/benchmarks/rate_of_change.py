@@ -0,0 +1,103 @@
+"""
+Throughput of the rate-of-change detector at fleet scale.
+
+Usage:
+    python -m ai.benchmarks.rate_of_change [--sensors 1000] [--hours 24]
+
+Readings arrive interleaved across sensors about once a minute each, with
+jitter and occasional dropouts, and go through the default rules (pH slope,
+turbidity slope and acceleration). "refit" is the naive alternative that
+re-fits np.polyfit over each rule's window on every reading; it runs on a
+subset of the fleet because it is orders of magnitude slower.
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from ai.anomaly.rate_of_change import DEFAULT_RATE_RULES, RateOfChangeDetector
+
+REFIT_SENSORS = 20
+
+
+def _stream(sensors: int, hours: float, seed: int = 0):
+    """(sensor_ids, epoch microseconds, ph, turbidity) in arrival order."""
+    rng = np.random.default_rng(seed)
+    per_sensor = int(hours * 60)
+    offsets = np.cumsum(rng.uniform(40, 80, (sensors, per_sensor)), axis=1)
+    # Drop ~1% of readings to exercise gaps.
+    keep = rng.random((sensors, per_sensor)) > 0.01
+    sensor_ids = np.broadcast_to(np.arange(1, sensors + 1)[:, None], offsets.shape)[keep]
+    seconds = (1.7e9 + offsets)[keep]
+    order = np.argsort(seconds, kind="stable")
+    count = len(order)
+    ph = 7.0 + rng.normal(0, 0.05, count)
+    turbidity = 20.0 + rng.gamma(2.0, 2.0, count)
+    return (
+        sensor_ids[order].tolist(),
+        (seconds[order] * 1_000_000).astype(np.int64).tolist(),
+        ph.tolist(),
+        turbidity.tolist(),
+    )
+
+
+def _incremental(sensor_ids, timestamps, ph, turbidity) -> float:
+    detector = RateOfChangeDetector(rules=DEFAULT_RATE_RULES, enabled=True)
+    began = time.perf_counter()
+    for sensor_id, timestamp, ph_value, turbidity_value in zip(
+        sensor_ids, timestamps, ph, turbidity
+    ):
+        detector.observe(sensor_id, timestamp, {"ph": ph_value, "turbidity": turbidity_value})
+    return time.perf_counter() - began
+
+
+def _refit(sensor_ids, timestamps, ph, turbidity) -> float:
+    windows: dict[tuple[int, str], list[tuple[float, float]]] = {}
+    began = time.perf_counter()
+    for sensor_id, timestamp, ph_value, turbidity_value in zip(
+        sensor_ids, timestamps, ph, turbidity
+    ):
+        t = timestamp / 1_000_000
+        for rule in DEFAULT_RATE_RULES:
+            value = ph_value if rule.parameter == "ph" else turbidity_value
+            points = windows.setdefault((sensor_id, rule.key), [])
+            points.append((t, value))
+            horizon = t - rule.window_minutes * 60
+            while points[0][0] < horizon:
+                points.pop(0)
+            if len(points) >= rule.min_points:
+                times, values = np.array(points).T
+                np.polyfit(times - times[0], values, 1)
+    return time.perf_counter() - began
+
+
+def run(sensors: int, hours: float) -> None:
+    stream = _stream(sensors, hours)
+    readings = len(stream[0])
+    elapsed = _incremental(*stream)
+    print(
+        f"incremental: {readings:,} readings from {sensors} sensors in {elapsed:.2f} s "
+        f"({readings / elapsed:,.0f} readings/s, {elapsed / readings * 1e6:.1f} µs/reading)"
+    )
+
+    subset = _stream(min(sensors, REFIT_SENSORS), hours)
+    small = len(subset[0])
+    incremental = _incremental(*subset) / small
+    refit = _refit(*subset) / small
+    print(
+        f"refit ({min(sensors, REFIT_SENSORS)} sensors): {refit * 1e6:.1f} µs/reading vs "
+        f"{incremental * 1e6:.1f} µs incremental ({refit / incremental:.0f}x)"
+    )
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark rate-of-change detection")
+    parser.add_argument("--sensors", type=int, default=1000)
+    parser.add_argument("--hours", type=float, default=24)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    run(args.sensors, args.hours)
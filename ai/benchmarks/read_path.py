@@ -0,0 +1,128 @@
+"""
+Compare ORM and column reads of a sensor's readings.
+
+Usage:
+    python -m ai.benchmarks.read_path [--sizes 10000 100000 1000000] [--database-url URL]
+
+Without --database-url the benchmark fills a throwaway SQLite file (needs
+aiosqlite). Point it at a scratch Postgres database for production-like numbers;
+the readings it inserts use a dedicated sensor_id and are deleted afterwards.
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, desc, insert, select, text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from ai.db.models import Reading
+from ai.db.timeseries import fetch_reading_columns, fetch_reading_rows
+
+BENCH_SENSOR_ID = 999_999
+INSERT_BATCH = 50_000
+REPEATS = 3
+
+SQLITE_READINGS_DDL = """
+CREATE TABLE IF NOT EXISTS readings (
+    id INTEGER PRIMARY KEY,
+    sensor_id INTEGER NOT NULL,
+    timestamp DATETIME NOT NULL,
+    ph FLOAT,
+    turbidity FLOAT,
+    temperature FLOAT,
+    battery_voltage FLOAT,
+    signal_strength INTEGER
+)
+"""
+
+
+async def _fill(engine, size: int) -> datetime:
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    async with engine.begin() as conn:
+        await conn.execute(delete(Reading).where(Reading.sensor_id == BENCH_SENSOR_ID))
+        for offset in range(0, size, INSERT_BATCH):
+            await conn.execute(
+                insert(Reading),
+                [
+                    {
+                        "sensor_id": BENCH_SENSOR_ID,
+                        "timestamp": start + timedelta(minutes=i),
+                        "ph": 7.0 + (i % 50) / 100,
+                        "turbidity": 20.0 + i % 30,
+                        "temperature": 27.0,
+                        "battery_voltage": 3.7,
+                        "signal_strength": -65,
+                    }
+                    for i in range(offset, min(offset + INSERT_BATCH, size))
+                ],
+            )
+    return start
+
+
+async def _orm(session: AsyncSession, start: datetime) -> int:
+    result = await session.execute(
+        select(Reading)
+        .where(Reading.sensor_id == BENCH_SENSOR_ID, Reading.timestamp >= start)
+        .order_by(desc(Reading.timestamp))
+    )
+    return len(result.scalars().all())
+
+
+async def _rows(session: AsyncSession, start: datetime) -> int:
+    return len(await fetch_reading_rows(session, BENCH_SENSOR_ID, start, descending=True))
+
+
+async def _columns(session: AsyncSession, start: datetime) -> int:
+    return len(await fetch_reading_columns(session, BENCH_SENSOR_ID, start))
+
+
+async def run(sizes: list[int], database_url: str) -> None:
+    engine = create_async_engine(database_url)
+    if engine.dialect.name == "sqlite":
+        async with engine.begin() as conn:
+            await conn.execute(text(SQLITE_READINGS_DDL))
+
+    print(f"{'rows':>9} {'path':<8} {'best s':>8} {'rows/s':>12} {'speedup':>8}")
+    try:
+        for size in sizes:
+            start = await _fill(engine, size)
+            baseline = None
+            for name, reader in (("orm", _orm), ("rows", _rows), ("columns", _columns)):
+                timings = []
+                for _ in range(REPEATS):
+                    async with AsyncSession(engine) as session:
+                        began = time.perf_counter()
+                        count = await reader(session, start)
+                        timings.append(time.perf_counter() - began)
+                assert count == size, (name, count)
+                best = min(timings)
+                baseline = baseline or best
+                print(
+                    f"{size:>9} {name:<8} {best:>8.3f} {size / best:>12,.0f} "
+                    f"{baseline / best:>7.1f}x"
+                )
+    finally:
+        async with engine.begin() as conn:
+            await conn.execute(delete(Reading).where(Reading.sensor_id == BENCH_SENSOR_ID))
+        await engine.dispose()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark reading fetch paths")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--database-url", help="Async SQLAlchemy URL (default: temp SQLite)")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.database_url:
+        asyncio.run(run(args.sizes, args.database_url))
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            url = f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.db')}"
+            asyncio.run(run(args.sizes, url))
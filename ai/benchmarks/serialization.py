@@ -0,0 +1,150 @@
+"""
+Compare response_model serialization with the row-tuple fast JSON path.
+
+Usage:
+    python -m ai.benchmarks.serialization [--sizes 10000 100000]
+
+"before" mirrors what FastAPI does for a response_model endpoint: validate the
+ORM objects into Pydantic models, dump them to JSON-compatible Python, then
+json.dumps in JSONResponse. "after" encodes the selected row tuples directly.
+"""
+
+import argparse
+import json
+import time
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from typing import List
+
+from pydantic import TypeAdapter
+
+from ai.main import ANOMALY_RESPONSE_FIELDS, READING_RESPONSE_FIELDS
+from ai.schemas.alert import AnomalyResponse
+from ai.schemas.forecast import PredictionResponse
+from ai.schemas.sensor import ReadingResponse
+from ai.utils.fast_json import dump_records, dumps, orjson
+
+REPEATS = 5
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def _json_response_render(content) -> bytes:
+    return json.dumps(
+        content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def _before(adapter: TypeAdapter, objects) -> bytes:
+    validated = adapter.validate_python(objects, from_attributes=True)
+    return _json_response_render(adapter.dump_python(validated, mode="json"))
+
+
+def _best(func) -> float:
+    timings = []
+    for _ in range(REPEATS):
+        began = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - began)
+    return min(timings)
+
+
+def _report(name: str, count: int, before: float, after: float) -> None:
+    print(
+        f"{name:<12} {count:>8} {count / before:>14,.0f} {count / after:>14,.0f} "
+        f"{before / after:>7.1f}x"
+    )
+
+
+def bench_readings(size: int) -> None:
+    rows = [
+        (i, START + timedelta(minutes=i), 7.0 + i % 7 / 10, 25.0, 27.0, 3.7, -65)
+        for i in range(size)
+    ]
+    objects = [
+        SimpleNamespace(
+            id=r[0],
+            sensor_id=1,
+            timestamp=r[1],
+            ph=r[2],
+            turbidity=r[3],
+            temperature=r[4],
+            battery_voltage=r[5],
+            signal_strength=r[6],
+        )
+        for r in rows
+    ]
+    adapter = TypeAdapter(List[ReadingResponse])
+    before = _best(lambda: _before(adapter, objects))
+    after = _best(
+        lambda: dump_records(READING_RESPONSE_FIELDS, ((*r[1:], r[0], 1, r[2]) for r in rows))
+    )
+    _report("readings", size, before, after)
+
+
+def bench_anomalies(size: int) -> None:
+    rows = [
+        (
+            1,
+            START + timedelta(minutes=i),
+            "ph",
+            4.2,
+            0.9,
+            "threshold_critical",
+            i,
+            START,
+            START + timedelta(minutes=i + 30),
+            3.9,
+            31,
+        )
+        for i in range(size)
+    ]
+    objects = [SimpleNamespace(**dict(zip(ANOMALY_RESPONSE_FIELDS, r))) for r in rows]
+    adapter = TypeAdapter(List[AnomalyResponse])
+    before = _best(lambda: _before(adapter, objects))
+    after = _best(lambda: dump_records(ANOMALY_RESPONSE_FIELDS, rows))
+    _report("anomalies", size, before, after)
+
+
+def bench_predictions(size: int) -> None:
+    count = max(size // 168, 1)
+    points = [
+        {"timestamp": START + timedelta(hours=h), "value": 7.0, "lower": 6.5, "upper": 7.5}
+        for h in range(168)
+    ]
+    predictions = [
+        {
+            "sensor_id": 1,
+            "forecast_start": START,
+            "forecast_end": START + timedelta(hours=167),
+            "parameter": "ph",
+            "model_version": "timegpt-1",
+            "forecast_values": points,
+            "id": i,
+            "created_at": START,
+        }
+        for i in range(count)
+    ]
+    objects = [SimpleNamespace(**p) for p in predictions]
+    adapter = TypeAdapter(List[PredictionResponse])
+    before = _best(lambda: _before(adapter, objects))
+    after = _best(lambda: dumps(predictions))
+    _report("forecast pts", count * 168, before, after)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark JSON serialization paths")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    args = parser.parse_args()
+
+    print(f"encoder: {'orjson' if orjson else 'json (stdlib fallback)'}")
+    print(
+        f"{'endpoint':<12} {'items':>8} {'before items/s':>14} {'after items/s':>14} {'speedup':>8}"
+    )
+    for size in args.sizes:
+        bench_readings(size)
+        bench_anomalies(size)
+        bench_predictions(size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, Optional
+
+import numpy as np
+from sqlalchemy import select
+
+from ..db.connection import AsyncSessionLocal
+from ..db.models import Sensor
+from ..db.timeseries import READING_COLUMNS, epoch_microseconds, fetch_reading_rows
+
+logger = logging.getLogger(__name__)
+
+# Float32 columns kept per reading; signal_strength is stored as float so NaN can mark nulls.
+HOT_VALUE_COLUMNS = ("ph", "turbidity", "temperature", "battery_voltage", "signal_strength")
+HOT_WINDOW_HOURS = float(os.getenv("HOT_WINDOW_HOURS", "24"))
+HOT_WINDOW_MAX_POINTS = int(os.getenv("HOT_WINDOW_MAX_POINTS", "4096"))
+INITIAL_CAPACITY = 64
+
+_UTC = timezone.utc
+
+
+def _to_datetimes(timestamps: np.ndarray) -> list[datetime]:
+    """Epoch microseconds as aware UTC datetimes, like the database returns them."""
+    naive = timestamps.astype("datetime64[us]").astype(object).tolist()
+    return [value.replace(tzinfo=_UTC) for value in naive]
+
+
+def _to_python_floats(values: np.ndarray) -> list[Optional[float]]:
+    """
+    float32 values as the decimals they were written as (7 significant digits).
+
+    Widening 7.1f gives 7.099999904632568; rounding to an integer multiple of a
+    power of ten and dividing by it yields the float64 closest to 7.1 again.
+    """
+    wide = values.astype(np.float64)
+    finite = np.isfinite(wide) & (wide != 0)
+    magnitude = np.floor(np.log10(np.abs(wide, where=finite, out=np.ones_like(wide))))
+    scale = 10.0 ** np.clip(6 - magnitude, 0, 15)
+    rounded = np.where(finite, np.round(wide * scale) / scale, wide).astype(object)
+    rounded[np.isnan(wide)] = None
+    return rounded.tolist()
+
+
+class SensorRingBuffer:
+    """
+    Fixed-size, time-ordered ring of one sensor's recent readings.
+
+    Storage starts small and doubles up to `max_points`; after that the oldest
+    reading is overwritten. `covered_from` is the earliest instant for which the
+    buffer is known to hold every reading, so a window query can tell whether it
+    may be answered from memory.
+    """
+
+    def __init__(self, covered_from: int, max_points: int = HOT_WINDOW_MAX_POINTS):
+        self.max_points = max_points
+        self.covered_from = covered_from
+        self.size = 0
+        self.head = 0  # index of the oldest element
+        self._allocate(min(INITIAL_CAPACITY, max_points))
+
+    def _allocate(self, capacity: int):
+        self.timestamps = np.zeros(capacity, dtype=np.int64)
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.values = {column: np.zeros(capacity, dtype=np.float32) for column in HOT_VALUE_COLUMNS}
+
+    @property
+    def capacity(self) -> int:
+        return len(self.timestamps)
+
+    @property
+    def nbytes(self) -> int:
+        return (
+            self.timestamps.nbytes
+            + self.ids.nbytes
+            + sum(column.nbytes for column in self.values.values())
+        )
+
+    def _order(self) -> np.ndarray:
+        return (self.head + np.arange(self.size)) % self.capacity
+
+    def _grow(self):
+        order = self._order()
+        timestamps, ids = self.timestamps[order], self.ids[order]
+        values = {column: array[order] for column, array in self.values.items()}
+        self._allocate(min(self.capacity * 2, self.max_points))
+        self.timestamps[: self.size] = timestamps
+        self.ids[: self.size] = ids
+        for column, array in values.items():
+            self.values[column][: self.size] = array
+        self.head = 0
+
+    def reset(self, covered_from: int):
+        """Forget every reading and claim coverage only from `covered_from` on."""
+        self.covered_from = covered_from
+        self.size = 0
+        self.head = 0
+
+    def last_timestamp(self) -> Optional[int]:
+        if not self.size:
+            return None
+        return int(self.timestamps[(self.head + self.size - 1) % self.capacity])
+
+    def append(self, timestamp: int, reading_id: int, values: dict[str, Optional[float]]) -> bool:
+        """
+        Add a reading newer than everything held; returns False if it cannot be.
+
+        Duplicates (same timestamp and id as the newest entry) and readings older
+        than the covered range are ignored. A reading inside the covered range but
+        older than the newest entry would break the time ordering; the caller must
+        then reset the buffer.
+        """
+        if timestamp < self.covered_from:
+            return True
+        last = self.last_timestamp()
+        if last is not None:
+            if timestamp < last:
+                return False
+            newest = (self.head + self.size - 1) % self.capacity
+            if timestamp == last and int(self.ids[newest]) == reading_id:
+                return True
+
+        if self.size == self.capacity and self.capacity < self.max_points:
+            self._grow()
+
+        if self.size == self.capacity:
+            evicted = int(self.timestamps[self.head])
+            self.covered_from = max(self.covered_from, evicted + 1)
+            slot = self.head
+            self.head = (self.head + 1) % self.capacity
+        else:
+            slot = (self.head + self.size) % self.capacity
+            self.size += 1
+
+        self.timestamps[slot] = timestamp
+        self.ids[slot] = reading_id
+        for column in HOT_VALUE_COLUMNS:
+            value = values.get(column)
+            self.values[column][slot] = np.nan if value is None else value
+        return True
+
+    def select(self, start: int) -> np.ndarray:
+        """Ring indices of readings at or after `start`, oldest first."""
+        order = self._order()
+        first = int(np.searchsorted(self.timestamps[order], start, side="left"))
+        return order[first:]
+
+    def rows(self, indices: np.ndarray) -> list[tuple[Any, ...]]:
+        """Materialize ring indices as tuples in READING_COLUMNS order."""
+        timestamps = _to_datetimes(self.timestamps[indices])
+        ids = self.ids[indices].tolist()
+        columns = {
+            column: _to_python_floats(array[indices]) for column, array in self.values.items()
+        }
+        signal = [None if v is None else int(v) for v in columns["signal_strength"]]
+        return list(
+            zip(
+                ids,
+                timestamps,
+                columns["ph"],
+                columns["turbidity"],
+                columns["temperature"],
+                columns["battery_voltage"],
+                signal,
+            )
+        )
+
+
+class HotWindow:
+    """
+    In-memory window of the last HOT_WINDOW_HOURS of readings for every sensor.
+
+    Loaded from the database at startup and then fed by reading events, so recent
+    windows, counts and "latest N" lookups skip the database. Every lookup returns
+    None when the buffer cannot prove it covers the request; callers then fall
+    back to the database. Disabled when HOT_WINDOW_HOURS is 0.
+    """
+
+    def __init__(self, hours: float = HOT_WINDOW_HOURS, max_points: int = HOT_WINDOW_MAX_POINTS):
+        self.hours = hours
+        self.max_points = max_points
+        self.buffers: dict[int, SensorRingBuffer] = {}
+        self.ready = False
+        self.loaded_from: Optional[int] = None
+        self.resets = 0
+        self._pending: Optional[list[dict[str, Any]]] = None
+        self._load_task: Optional[asyncio.Task] = None
+        # Bumped whenever events may have been missed; a load that started
+        # before the bump cannot make the window ready.
+        self._stale_marks = 0
+        self._reload_requested = False
+
+    @property
+    def enabled(self) -> bool:
+        return self.hours > 0
+
+    def _window_start(self, now: Optional[datetime] = None) -> datetime:
+        return (now or datetime.now(_UTC)) - timedelta(hours=self.hours)
+
+    async def load(self, session_factory=AsyncSessionLocal):
+        """(Re)build every sensor's buffer from the database."""
+        if not self.enabled:
+            return
+        self.ready = False
+        self._pending = []
+        stale_marks = self._stale_marks
+        start = self._window_start()
+        covered_from = epoch_microseconds(start)
+        buffers: dict[int, SensorRingBuffer] = {}
+        try:
+            async with session_factory() as session:
+                result = await session.execute(select(Sensor.id))
+                for sensor_id in result.scalars().all():
+                    rows = await fetch_reading_rows(session, sensor_id, start)
+                    buffer = SensorRingBuffer(covered_from, self.max_points)
+                    for row in rows:
+                        buffer.append(
+                            epoch_microseconds(row[1]),
+                            row[0],
+                            dict(zip(READING_COLUMNS[2:], row[2:])),
+                        )
+                    buffers[sensor_id] = buffer
+        except Exception:
+            self._pending = None
+            raise
+
+        self.buffers = buffers
+        self.loaded_from = covered_from
+        pending, self._pending = self._pending, None
+        for event in pending:
+            self.apply(event)
+        self.ready = self._stale_marks == stale_marks
+        stats = self.stats()
+        logger.info(
+            f"Hot window loaded: {stats['sensors']} sensors, {stats['points']} points, "
+            f"{stats['bytes'] / 1024:.0f} KiB"
+        )
+
+    def mark_stale(self):
+        """Stop serving lookups until the next load, e.g. while events can be missed."""
+        self._stale_marks += 1
+        self.ready = False
+
+    def reload(self):
+        """Schedule a background reload, e.g. after missed events."""
+        if not self.enabled:
+            return
+        if self._load_task is not None and not self._load_task.done():
+            # The running load may predate what was missed: load again after it.
+            self.mark_stale()
+            self._reload_requested = True
+            return
+        self.ready = False
+        self._load_task = asyncio.create_task(self.load())
+
+        def _finished(task: asyncio.Task):
+            if not task.cancelled() and task.exception():
+                logger.error(f"Hot window load failed: {task.exception()}")
+            if self._reload_requested:
+                self._reload_requested = False
+                self.reload()
+
+        self._load_task.add_done_callback(_finished)
+
+    def apply(self, event: dict[str, Any]):
+        """Append a reading event (see `reading_event()`)."""
+        if not self.enabled:
+            return
+        if self._pending is not None:
+            self._pending.append(event)
+            return
+        if self.loaded_from is None:
+            return
+
+        sensor_id = int(event["sensor_id"])
+        buffer = self.buffers.get(sensor_id)
+        if buffer is None:
+            # A sensor registered after the load has no readings older than the load.
+            buffer = self.buffers[sensor_id] = SensorRingBuffer(self.loaded_from, self.max_points)
+        timestamp = int(event["timestamp"])
+        if not buffer.append(timestamp, int(event["id"]), event):
+            # A late reading landed inside the covered range; serve that range from
+            # the database from now on.
+            logger.info(f"Out-of-order reading for sensor {sensor_id}; resetting its hot window")
+            buffer.reset(buffer.last_timestamp() + 1)
+            self.resets += 1
+
+    def _buffer_for(self, sensor_id: int, start: datetime) -> Optional[SensorRingBuffer]:
+        if not self.ready:
+            return None
+        buffer = self.buffers.get(sensor_id)
+        if buffer is None or epoch_microseconds(start) < buffer.covered_from:
+            return None
+        return buffer
+
+    def window(self, sensor_id: int, start: datetime) -> Optional[list[tuple[Any, ...]]]:
+        """Readings at or after `start`, newest first, in READING_COLUMNS order."""
+        buffer = self._buffer_for(sensor_id, start)
+        if buffer is None:
+            return None
+        return buffer.rows(buffer.select(epoch_microseconds(start))[::-1])
+
+    def count(self, sensor_id: int, parameter: str, start: datetime) -> Optional[int]:
+        """Number of non-null `parameter` values at or after `start`."""
+        buffer = self._buffer_for(sensor_id, start)
+        if buffer is None:
+            return None
+        indices = buffer.select(epoch_microseconds(start))
+        return int(np.count_nonzero(~np.isnan(buffer.values[parameter][indices])))
+
+    def latest(self, sensor_id: int, limit: int) -> Optional[list[tuple[Any, ...]]]:
+        """The newest `limit` readings, newest first, when at least that many are held."""
+        if not self.ready:
+            return None
+        buffer = self.buffers.get(sensor_id)
+        if buffer is None or buffer.size < limit:
+            return None
+        return buffer.rows(buffer._order()[::-1][:limit])
+
+    def stats(self) -> dict[str, Any]:
+        buffers = list(self.buffers.values())
+        return {
+            "enabled": self.enabled,
+            "ready": self.ready,
+            "hours": self.hours,
+            "max_points_per_sensor": self.max_points,
+            "sensors": len(buffers),
+            "points": sum(buffer.size for buffer in buffers),
+            "resets": self.resets,
+            "bytes": sum(buffer.nbytes for buffer in buffers),
+            "max_bytes": len(buffers) * self.max_points * (8 + 8 + 4 * len(HOT_VALUE_COLUMNS)),
+        }
+
+
+def reading_event(sensor_id: int, reading_id: int, timestamp: datetime, **values) -> dict[str, Any]:
+    """Serializable reading event for the event bus."""
+    return {
+        "sensor_id": sensor_id,
+        "id": reading_id,
+        "timestamp": epoch_microseconds(timestamp),
+        **{column: values.get(column) for column in HOT_VALUE_COLUMNS},
+    }
+
+
+hot_window = HotWindow()
@@ -0,0 +1,184 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from collections.abc import Awaitable, Callable, Mapping, Sequence
+from typing import Any, Optional
+
+import redis.asyncio as redis
+
+from ..utils.env import env_flag
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """
+    Caches serialized endpoint responses in Redis, keyed by endpoint and parameters.
+
+    Every key embeds the current generation of the namespaces it depends on
+    (e.g. "alerts", "settings:<user>"). Writers call `invalidate()`, which bumps
+    those generations so all previously cached variants become unreachable and
+    simply expire. Concurrent misses for the same key share a single load.
+
+    Generations only mean something when every worker shares them, so while
+    Redis is unavailable responses are loaded uncached and carry no ETag;
+    invalidations made meanwhile are replayed once it is back.
+    """
+
+    KEY_PREFIX = "cache:resp"
+    GENERATION_PREFIX = "cache:gen"
+    REDIS_RETRY_SECONDS = 30
+
+    def __init__(self, redis_client=None, ttl_seconds: Optional[int] = None):
+        self.redis = redis_client
+        self.redis_url = os.getenv("REDIS_URL", "redis://localhost:6379")
+        self.ttl_seconds = ttl_seconds or int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "60"))
+        self.enabled = env_flag("RESPONSE_CACHE_ENABLED")
+        self._redis_retry_at = 0.0
+        # Namespaces invalidated while Redis was unreachable.
+        self._missed_invalidations: set[str] = set()
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    async def _ensure_redis(self):
+        if self.redis is not None or time.monotonic() < self._redis_retry_at:
+            return
+        try:
+            self.redis = redis.from_url(self.redis_url, decode_responses=False)
+            await self.redis.ping()
+            logger.info("Redis connected for ResponseCache")
+        except Exception as e:
+            logger.warning(f"Redis unavailable for response cache: {e}. Caching is off.")
+            self.redis = None
+            self._redis_retry_at = time.monotonic() + self.REDIS_RETRY_SECONDS
+            return
+        if self._missed_invalidations:
+            await self.invalidate(*self._missed_invalidations)
+
+    def _drop_redis(self, error: Exception):
+        logger.warning(f"Response cache Redis error: {error}. Caching is off.")
+        self.redis = None
+        self._redis_retry_at = time.monotonic() + self.REDIS_RETRY_SECONDS
+
+    async def generations(self, namespaces: Sequence[str]) -> Optional[list[int]]:
+        """Current generation counter of each namespace; None while Redis is unavailable."""
+        await self._ensure_redis()
+        if self.redis is None:
+            return None
+        try:
+            keys = [f"{self.GENERATION_PREFIX}:{ns}" for ns in namespaces]
+            values = await self.redis.mget(keys)
+            return [int(value) if value else 0 for value in values]
+        except Exception as e:
+            self._drop_redis(e)
+            return None
+
+    async def invalidate(self, *namespaces: str):
+        """Bump namespace generations so every cached response built on them is stale."""
+        await self._ensure_redis()
+        if self.redis is not None:
+            try:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    for ns in namespaces:
+                        pipe.incr(f"{self.GENERATION_PREFIX}:{ns}")
+                    await pipe.execute()
+                self._missed_invalidations.difference_update(namespaces)
+                return
+            except Exception as e:
+                self._drop_redis(e)
+        self._missed_invalidations.update(namespaces)
+
+    def build_key(
+        self, namespaces: Sequence[str], generations: Sequence[int], params: Mapping[str, Any]
+    ) -> str:
+        digest = hashlib.sha1(
+            json.dumps([list(generations), params], sort_keys=True, default=str).encode()
+        ).hexdigest()[:20]
+        return f"{self.KEY_PREFIX}:{'|'.join(namespaces)}:{digest}"
+
+    def etag(
+        self, namespaces: Sequence[str], generations: Sequence[int], params: Mapping[str, Any]
+    ) -> str:
+        """Weak validator for a response; it changes whenever a namespace is invalidated."""
+        return f'W/"{self.build_key(namespaces, generations, params).rsplit(":", 1)[1]}"'
+
+    async def _get(self, key: str) -> Optional[bytes]:
+        if self.redis is None:
+            return None
+        try:
+            return await self.redis.get(key)
+        except Exception as e:
+            self._drop_redis(e)
+            return None
+
+    async def _set(self, key: str, body: bytes, ttl_seconds: Optional[int] = None):
+        if self.redis is None:
+            return
+        try:
+            await self.redis.set(key, body, ex=ttl_seconds or self.ttl_seconds)
+        except Exception as e:
+            self._drop_redis(e)
+
+    async def get_or_load(
+        self,
+        namespaces: Sequence[str],
+        params: Mapping[str, Any],
+        loader: Callable[[], Awaitable[bytes]],
+        generations: Optional[Sequence[int]] = None,
+        ttl_seconds: Optional[int] = None,
+    ) -> bytes:
+        """
+        Return the cached body for (namespaces, params), loading it at most once.
+
+        `ttl_seconds` shortens the lifetime for bodies that also go stale with time.
+        Loads uncached while Redis is unavailable.
+        """
+        if not self.enabled:
+            return await loader()
+
+        if generations is None:
+            generations = await self.generations(namespaces)
+            if generations is None:
+                return await loader()
+        key = self.build_key(namespaces, generations, params)
+
+        body = await self._get(key)
+        if body is not None:
+            return body
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise
+                # The request doing the load went away; load on our own.
+                return await loader()
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            body = await loader()
+            await self._set(key, body, ttl_seconds)
+            future.set_result(body)
+            return body
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            future.exception()  # mark retrieved when nobody else was waiting
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    def clear_local(self):
+        """Drop in-process cache state."""
+        self._missed_invalidations.clear()
+        self._inflight.clear()
+
+
+response_cache = ResponseCache()
@@ -3,9 +3,11 @@ from typing import Any
 
 from sqlalchemy import desc, select
 
+from ai.cache.hot_window import hot_window
 from ai.chatbot.knowledge_base import KnowledgeBase
 from ai.db.connection import AsyncSessionLocal
-from ai.db.models import Alert, Reading
+from ai.db.models import Alert
+from ai.db.timeseries import READING_COLUMNS, fetch_reading_rows
 
 logger = logging.getLogger(__name__)
 
@@ -17,15 +19,11 @@ async def retrieve_knowledge(query: str) -> list[str]:
 
 
 async def get_sensor_data(sensor_id: int, limit: int = 10) -> list[dict[str, Any]]:
-    async with AsyncSessionLocal() as session:
-        result = await session.execute(
-            select(Reading)
-            .where(Reading.sensor_id == sensor_id)
-            .order_by(desc(Reading.timestamp))
-            .limit(limit)
-        )
-        readings = result.scalars().all()
-    return [_serialize_reading(reading) for reading in readings]
+    rows = hot_window.latest(sensor_id, limit)
+    if rows is None:
+        async with AsyncSessionLocal() as session:
+            rows = await fetch_reading_rows(session, sensor_id, descending=True, limit=limit)
+    return [_serialize_reading(sensor_id, row) for row in rows]
 
 
 async def get_recent_alerts(sensor_id: int, limit: int = 5) -> list[dict[str, Any]]:
@@ -40,16 +38,13 @@ async def get_recent_alerts(sensor_id: int, limit: int = 5) -> list[dict[str, An
     return [_serialize_alert(alert) for alert in alerts]
 
 
-def _serialize_reading(reading: Reading) -> dict[str, Any]:
+def _serialize_reading(sensor_id: int, row: tuple[Any, ...]) -> dict[str, Any]:
+    reading = dict(zip(READING_COLUMNS, row))
     return {
-        "id": reading.id,
-        "sensor_id": reading.sensor_id,
-        "timestamp": reading.timestamp.isoformat(),
-        "ph": reading.ph,
-        "turbidity": reading.turbidity,
-        "temperature": reading.temperature,
-        "battery_voltage": reading.battery_voltage,
-        "signal_strength": reading.signal_strength,
+        "id": reading["id"],
+        "sensor_id": sensor_id,
+        **reading,
+        "timestamp": reading["timestamp"].isoformat(),
     }
 
 
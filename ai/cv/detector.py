@@ -1,11 +1,12 @@
 import hashlib
-import os
 import io
 import logging
 from dataclasses import dataclass
 from pathlib import Path
 from PIL import Image
 
+from ..utils.env import env_flag
+
 
 logger = logging.getLogger(__name__)
 
@@ -31,7 +32,7 @@ class YellowBoyDetector:
         self._model_dir = Path(__file__).parent.parent / "models"
         self._model_path = self._model_dir / "best.pt"
         self._model = None
-        self._force_mock = os.getenv("AQUAMINE_FORCE_MOCK", "0") == "1"
+        self._force_mock = env_flag("AQUAMINE_FORCE_MOCK", default=False)
 
     @property
     def version(self) -> str:
@@ -0,0 +1,330 @@
+"""
+Connection-pool and statement metrics for the SQLAlchemy engine.
+
+Pool checkouts are timed by `TimedQueuePool`, statements by cursor events, and
+each statement is tagged with the route template of the request that issued it
+(set by `RouteLabelMiddleware`; work outside a request is "background"). The
+slowest statements are kept with their parameters for the debug endpoint.
+
+Metrics are per process: with several uvicorn workers each one reports its own.
+"""
+
+import heapq
+import itertools
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, Pool, QueuePool
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from ..utils.env import env_flag
+
+DB_METRICS_ENABLED = env_flag("DB_METRICS_ENABLED")
+SLOW_QUERY_LOG_SIZE = int(os.getenv("SLOW_QUERY_LOG_SIZE", "20"))
+# Statements faster than this never enter the slow-query log.
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "50"))
+SLOW_QUERY_MAX_CHARS = 2000
+
+# Seconds; Prometheus' default buckets extended down for sub-millisecond work.
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+BACKGROUND_LABEL = "background"
+UNMATCHED_LABEL = "unmatched"
+
+_request_scope: ContextVar[Optional[Scope]] = ContextVar("db_request_scope", default=None)
+
+
+def current_route() -> str:
+    """Route template of the request being served, for labelling statements."""
+    scope = _request_scope.get()
+    if scope is None:
+        return BACKGROUND_LABEL
+    # The router adds the matched route to the same scope dict once it resolves.
+    route = scope.get("route")
+    return getattr(route, "path", None) or UNMATCHED_LABEL
+
+
+class RouteLabelMiddleware:
+    """Makes the current request's scope visible to the engine's cursor events."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = _request_scope.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_scope.reset(token)
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram in the Prometheus layout."""
+
+    __slots__ = ("counts", "count", "total")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+
+    def cumulative(self) -> list[int]:
+        return list(itertools.accumulate(self.counts))
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-quantile; None past the last bucket."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        for bound, seen in zip(LATENCY_BUCKETS, self.cumulative()):
+            if seen >= rank:
+                return bound
+        return None
+
+    def summary(self) -> dict[str, Any]:
+        return {
+            "count": self.count,
+            "total_seconds": round(self.total, 6),
+            "p50_le_seconds": self.quantile(0.5),
+            "p99_le_seconds": self.quantile(0.99),
+        }
+
+
+class DatabaseMetrics:
+    """Process-wide pool and statement metrics; see the module docstring."""
+
+    def __init__(self, slow_log_size: int = SLOW_QUERY_LOG_SIZE):
+        self.slow_log_size = slow_log_size
+        self.slow_threshold = SLOW_QUERY_THRESHOLD_MS / 1000
+        self.checkout = Histogram()
+        self.checkout_timeouts = 0
+        self.statements: dict[str, Histogram] = {}
+        self.statement_errors: dict[str, int] = {}
+        self._slow: list[tuple[float, int, dict[str, Any]]] = []
+        self._slow_seq = itertools.count()
+        self._pools: list[Pool] = []
+        # Sync engines used by scripts may record from worker threads.
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self.checkout = Histogram()
+            self.checkout_timeouts = 0
+            self.statements = {}
+            self.statement_errors = {}
+            self._slow = []
+
+    def observe_checkout(self, seconds: float, timed_out: bool = False):
+        with self._lock:
+            self.checkout.observe(seconds)
+            if timed_out:
+                self.checkout_timeouts += 1
+
+    def observe_statement(self, route: str, seconds: float, statement: str, parameters: Any):
+        with self._lock:
+            histogram = self.statements.get(route)
+            if histogram is None:
+                histogram = self.statements[route] = Histogram()
+            histogram.observe(seconds)
+
+            if seconds < self.slow_threshold or self.slow_log_size <= 0:
+                return
+            if len(self._slow) >= self.slow_log_size and seconds <= self._slow[0][0]:
+                return
+            entry = {
+                "duration_ms": round(seconds * 1000, 3),
+                "route": route,
+                "statement": statement[:SLOW_QUERY_MAX_CHARS],
+                "parameters": repr(parameters)[:SLOW_QUERY_MAX_CHARS],
+                "at": datetime.now(timezone.utc).isoformat(),
+            }
+            item = (seconds, next(self._slow_seq), entry)
+            if len(self._slow) >= self.slow_log_size:
+                heapq.heapreplace(self._slow, item)
+            else:
+                heapq.heappush(self._slow, item)
+
+    def observe_error(self, route: str):
+        with self._lock:
+            self.statement_errors[route] = self.statement_errors.get(route, 0) + 1
+
+    def slow_queries(self) -> list[dict[str, Any]]:
+        """The slowest statements seen so far, slowest first."""
+        with self._lock:
+            return [entry for _, _, entry in sorted(self._slow, reverse=True)]
+
+    def pool_status(self) -> list[dict[str, Any]]:
+        status = []
+        for pool in self._pools:
+            if not isinstance(pool, QueuePool):
+                status.append({"pool": type(pool).__name__})
+                continue
+            status.append(
+                {
+                    "pool": type(pool).__name__,
+                    "size": pool.size(),
+                    "checked_in": pool.checkedin(),
+                    "checked_out": pool.checkedout(),
+                    # Negative until the base pool has been filled once.
+                    "overflow": max(pool.overflow(), 0),
+                    "max_overflow": pool._max_overflow,
+                }
+            )
+        return status
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            checkout = self.checkout.summary()
+            statements = {
+                route: {**histogram.summary(), "errors": self.statement_errors.get(route, 0)}
+                for route, histogram in sorted(self.statements.items())
+            }
+            timeouts = self.checkout_timeouts
+        return {
+            "pid": os.getpid(),
+            "pools": self.pool_status(),
+            "checkout": {**checkout, "timeouts": timeouts},
+            "statements": statements,
+            "slow_queries": self.slow_queries(),
+        }
+
+    def render_prometheus(self) -> str:
+        """Text exposition format (version 0.0.4)."""
+        lines: list[str] = []
+
+        def gauge(name: str, help_text: str, samples: list[tuple[str, float]]):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.extend(f"{name}{labels} {value}" for labels, value in samples)
+
+        def histogram(name: str, help_text: str, series: dict[str, Histogram], label: str):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for label_value, hist in series.items():
+                prefix = f'{label}="{_escape(label_value)}",' if label else ""
+                bounds = [*(repr(bound) for bound in LATENCY_BUCKETS), "+Inf"]
+                for bound, seen in zip(bounds, hist.cumulative()):
+                    lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {seen}')
+                suffix = f"{{{prefix.rstrip(',')}}}" if prefix else ""
+                lines.append(f"{name}_sum{suffix} {hist.total}")
+                lines.append(f"{name}_count{suffix} {hist.count}")
+
+        pools = [pool for pool in self.pool_status() if "size" in pool]
+        for key, help_text in (
+            ("size", "Configured number of persistent connections."),
+            ("checked_out", "Connections currently checked out."),
+            ("checked_in", "Idle connections held by the pool."),
+            ("overflow", "Connections open beyond the pool size."),
+            ("max_overflow", "Configured overflow limit."),
+        ):
+            gauge(
+                f"aquamine_db_pool_{key}",
+                help_text,
+                [(f'{{pool="{index}"}}', pool[key]) for index, pool in enumerate(pools)],
+            )
+
+        with self._lock:
+            histogram(
+                "aquamine_db_pool_checkout_seconds",
+                "Time to check a connection out of the pool.",
+                {"": self.checkout},
+                "",
+            )
+            lines.append(
+                "# HELP aquamine_db_pool_checkout_timeouts_total Checkouts that hit pool_timeout."
+            )
+            lines.append("# TYPE aquamine_db_pool_checkout_timeouts_total counter")
+            lines.append(f"aquamine_db_pool_checkout_timeouts_total {self.checkout_timeouts}")
+            histogram(
+                "aquamine_db_statement_seconds",
+                "Statement execution time by route.",
+                dict(sorted(self.statements.items())),
+                "route",
+            )
+            lines.append("# HELP aquamine_db_statement_errors_total Failed statements by route.")
+            lines.append("# TYPE aquamine_db_statement_errors_total counter")
+            for route, errors in sorted(self.statement_errors.items()):
+                lines.append(
+                    f'aquamine_db_statement_errors_total{{route="{_escape(route)}"}} {errors}'
+                )
+
+        return "\n".join(lines) + "\n"
+
+    def instrument(self, engine: Engine) -> Engine:
+        """Attach statement timing to a (sync) engine and track its pool."""
+        if not DB_METRICS_ENABLED:
+            return engine
+        self._pools.append(engine.pool)
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+        event.listen(engine, "handle_error", self._handle_error)
+        return engine
+
+    def _after_cursor_execute(self, conn, _cursor, statement, parameters, _context, _executemany):
+        started = conn.info.get("query_started")
+        if started:
+            self.observe_statement(
+                current_route(), time.perf_counter() - started.pop(), statement, parameters
+            )
+
+    def _handle_error(self, context):
+        started = context.connection.info.get("query_started") if context.connection else None
+        if started:
+            started.pop()
+        self.observe_error(current_route())
+
+
+def _before_cursor_execute(conn, _cursor, _statement, _parameters, _context, _executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _escape(label_value: str) -> str:
+    return label_value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool that reports how long each checkout waited."""
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except PoolTimeoutError:
+            db_metrics.observe_checkout(time.perf_counter() - started, timed_out=True)
+            raise
+        db_metrics.observe_checkout(time.perf_counter() - started)
+        return connection
+
+
+db_metrics = DatabaseMetrics()
@@ -1,15 +1,18 @@
 from datetime import datetime
 from typing import Optional, List, Any
 from sqlalchemy import (
+    ARRAY,
     Integer,
     String,
     Float,
     Boolean,
     DateTime,
     ForeignKey,
+    Index,
     Text,
     event,
     text,
+    true,
 )
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.types import JSON
@@ -56,6 +59,73 @@ class Reading(Base):
     sensor: Mapped["Sensor"] = relationship(back_populates="readings")
 
 
+class Parameter(Base):
+    """
+    Registry of measured parameters.
+
+    ph, turbidity and temperature live in wide `readings` columns (`column` names
+    them); every other parameter is stored one value per row in `reading_values`,
+    so a new probe type only needs a row here.
+    """
+
+    __tablename__ = "parameters"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    key: Mapped[str] = mapped_column(String(20), unique=True, nullable=False)
+    name: Mapped[str] = mapped_column(String(100), nullable=False)
+    unit: Mapped[Optional[str]] = mapped_column(String(20))
+    column: Mapped[Optional[str]] = mapped_column(String(20))
+    warning_low: Mapped[Optional[float]] = mapped_column(Float)
+    critical_low: Mapped[Optional[float]] = mapped_column(Float)
+    warning_high: Mapped[Optional[float]] = mapped_column(Float)
+    critical_high: Mapped[Optional[float]] = mapped_column(Float)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+
+class ThresholdRule(Base):
+    """
+    Limits of one parameter, fleet-wide (no sensor) or for one sensor.
+
+    A rule replaces the built-in limits of its parameter as a whole; the
+    alert flags say whether breaching a side raises an anomaly or only shows
+    in the sensor's current state. Compiled by `anomaly.rules`.
+    """
+
+    __tablename__ = "threshold_rules"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    sensor_id: Mapped[Optional[int]] = mapped_column(ForeignKey("sensors.id"), nullable=True)
+    parameter: Mapped[str] = mapped_column(String(20), nullable=False)
+    warning_low: Mapped[Optional[float]] = mapped_column(Float)
+    critical_low: Mapped[Optional[float]] = mapped_column(Float)
+    warning_high: Mapped[Optional[float]] = mapped_column(Float)
+    critical_high: Mapped[Optional[float]] = mapped_column(Float)
+    alert_low: Mapped[bool] = mapped_column(Boolean, default=True, nullable=False)
+    alert_high: Mapped[bool] = mapped_column(Boolean, default=True, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
+
+
+Index(
+    "uq_threshold_rules_sensor_parameter",
+    ThresholdRule.sensor_id,
+    ThresholdRule.parameter,
+    unique=True,
+)
+
+
+class ReadingValue(Base):
+    """One value of a registry parameter without a wide `readings` column."""
+
+    __tablename__ = "reading_values"
+
+    sensor_id: Mapped[int] = mapped_column(ForeignKey("sensors.id"), primary_key=True)
+    parameter_id: Mapped[int] = mapped_column(ForeignKey("parameters.id"), primary_key=True)
+    timestamp: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True)
+    value: Mapped[float] = mapped_column(Float, nullable=False)
+
+
 class Prediction(Base):
     __tablename__ = "predictions"
 
@@ -65,11 +135,75 @@ class Prediction(Base):
     forecast_start: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
     forecast_end: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
     parameter: Mapped[str] = mapped_column(String(20), nullable=False)
-    forecast_values: Mapped[Any] = mapped_column(JSON, nullable=False)
+    # Forecast points are stored column-wise (one array element per horizon step)
+    # instead of a JSON list of dicts, so reads skip per-point parsing. Values
+    # are double precision: REAL would hand 7.1 back as 7.099999904632568.
+    point_timestamps: Mapped[Optional[List[datetime]]] = mapped_column(
+        ARRAY(DateTime(timezone=True))
+    )
+    point_values: Mapped[Optional[List[float]]] = mapped_column(ARRAY(Float))
+    point_lower: Mapped[Optional[List[Optional[float]]]] = mapped_column(ARRAY(Float))
+    point_upper: Mapped[Optional[List[Optional[float]]]] = mapped_column(ARRAY(Float))
+    # Rows written before the columnar layout keep their points here until backfilled.
+    legacy_forecast_values: Mapped[Optional[Any]] = mapped_column(
+        "forecast_values", JSON, nullable=True
+    )
     model_version: Mapped[Optional[str]] = mapped_column(String(50))
 
     sensor: Mapped["Sensor"] = relationship(back_populates="predictions")
 
+    def set_forecast_points(self, points: Any) -> None:
+        """Store forecast points (objects with timestamp/value/lower/upper) column-wise."""
+        self.point_timestamps = [p.timestamp for p in points]
+        self.point_values = [float(p.value) for p in points]
+        self.point_lower = [None if p.lower is None else float(p.lower) for p in points]
+        self.point_upper = [None if p.upper is None else float(p.upper) for p in points]
+        self.legacy_forecast_values = None
+
+    def point_columns(
+        self,
+    ) -> tuple[list[Any], list[Any], list[Any], list[Any]]:
+        """Return (timestamps, values, lower, upper) as parallel lists."""
+        if self.point_values is not None:
+            size = len(self.point_values)
+            return (
+                list(self.point_timestamps or []),
+                list(self.point_values),
+                list(self.point_lower or [None] * size),
+                list(self.point_upper or [None] * size),
+            )
+
+        timestamps: list[Any] = []
+        values: list[Any] = []
+        lower: list[Any] = []
+        upper: list[Any] = []
+        for point in self.legacy_forecast_values or []:
+            if not isinstance(point, dict):
+                continue
+            timestamps.append(point.get("timestamp"))
+            values.append(point.get("value"))
+            lower.append(point.get("lower"))
+            upper.append(point.get("upper"))
+        return timestamps, values, lower, upper
+
+    @property
+    def forecast_values(self) -> list[dict[str, Any]]:
+        timestamps, values, lower, upper = self.point_columns()
+        return [
+            {"timestamp": ts, "value": value, "lower": lo, "upper": hi}
+            for ts, value, lo, hi in zip(timestamps, values, lower, upper)
+            if value is not None
+        ]
+
+
+# Serves "latest prediction per parameter" (DISTINCT ON parameter ... created_at DESC).
+Index(
+    "ix_predictions_sensor_parameter_created",
+    Prediction.sensor_id,
+    Prediction.parameter,
+    Prediction.created_at.desc(),
+)
+
 
 class Anomaly(Base):
     __tablename__ = "anomalies"
@@ -82,10 +216,35 @@ class Anomaly(Base):
     anomaly_score: Mapped[Optional[float]] = mapped_column(Float)
     detection_method: Mapped[Optional[str]] = mapped_column(String(20))
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    # A row is an episode of consecutive hits (see anomaly.episodes): `timestamp`
+    # and `value` are the first breach, `anomaly_score` the highest score.
+    end_timestamp: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    peak_value: Mapped[Optional[float]] = mapped_column(Float)
+    sample_count: Mapped[int] = mapped_column(Integer, default=1, server_default="1")
+    # Set once a reading without the hit (or a long gap) ends the episode; only
+    # open rows are continued by other workers.
+    closed: Mapped[bool] = mapped_column(Boolean, default=True, server_default=true())
 
     sensor: Mapped["Sensor"] = relationship(back_populates="anomalies")
 
 
+# Keyset pagination walks anomalies and alerts newest-first on (timestamp, id).
+Index("ix_anomalies_timestamp_id", Anomaly.timestamp.desc(), Anomaly.id.desc())
+Index(
+    "ix_anomalies_sensor_timestamp_id",
+    Anomaly.sensor_id,
+    Anomaly.timestamp.desc(),
+    Anomaly.id.desc(),
+)
+# Ingest closes a sensor's open episodes on every recovery reading.
+Index(
+    "ix_anomalies_open",
+    Anomaly.sensor_id,
+    postgresql_where=Anomaly.closed.is_(False),
+    sqlite_where=Anomaly.closed.is_(False),
+)
+
+
 class Alert(Base):
     __tablename__ = "alerts"
 
@@ -101,6 +260,9 @@ class Alert(Base):
     sensor: Mapped["Sensor"] = relationship(back_populates="alerts")
 
 
+Index("ix_alerts_created_id", Alert.created_at.desc(), Alert.id.desc())
+
+
 class NotificationRecipient(Base):
     __tablename__ = "notification_recipients"
 
@@ -150,6 +312,8 @@ class SensorAlertState(Base):
 def create_hypertable_listener(_target, connection, **_kw):
     # Only try to create hypertable if TimescaleDB extension is available
     # We use execute with text() for DDL
+    if connection.dialect.name != "postgresql":
+        return
     try:
         connection.execute(
             text(
@@ -165,3 +329,33 @@ def create_hypertable_listener(_target, connection, **_kw):
         connection.execute(text("SELECT add_retention_policy('readings', INTERVAL '2 years');"))
     except Exception as e:
         print(f"Warning: Could not convert to hypertable (might be missing extension): {e}")
+
+
+@event.listens_for(ReadingValue.__table__, "after_create")
+def create_reading_values_hypertable_listener(_target, connection, **_kw):
+    # Segmenting by (sensor_id, parameter_id) keeps each series contiguous after
+    # compression, so one parameter's window decompresses only its own segments.
+    if connection.dialect.name != "postgresql":
+        return
+    try:
+        connection.execute(
+            text(
+                "SELECT create_hypertable('reading_values', 'timestamp', "
+                "chunk_time_interval => INTERVAL '7 days', if_not_exists => TRUE);"
+            )
+        )
+        connection.execute(
+            text(
+                "ALTER TABLE reading_values SET (timescaledb.compress, "
+                "timescaledb.compress_orderby = 'timestamp DESC', "
+                "timescaledb.compress_segmentby = 'sensor_id, parameter_id');"
+            )
+        )
+        connection.execute(
+            text("SELECT add_compression_policy('reading_values', INTERVAL '3 days');")
+        )
+        connection.execute(
+            text("SELECT add_retention_policy('reading_values', INTERVAL '2 years');")
+        )
+    except Exception as e:
+        print(f"Warning: Could not convert to hypertable (might be missing extension): {e}")
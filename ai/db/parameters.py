@@ -0,0 +1,246 @@
+"""
+Registry of water-quality parameters and access to long-format values.
+
+The three original parameters keep their wide `readings` columns. Anything
+else a probe reports (conductivity, ORP, dissolved oxygen, ...) is stored in
+the narrow `reading_values` hypertable keyed by a registry id, so adding a
+parameter is an insert into `parameters` rather than a schema change.
+"""
+
+import logging
+import re
+from collections.abc import Iterable, Mapping, Sequence
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Optional
+
+import numpy as np
+from sqlalchemy import insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .models import Parameter, ReadingValue
+from .timeseries import MEASUREMENT_COLUMNS, ReadingColumns, fetch_reading_columns, rows_to_columns
+
+logger = logging.getLogger(__name__)
+
+PARAMETER_KEY_PATTERN = re.compile(r"^[a-z][a-z0-9_]{0,19}$")
+
+
+@dataclass(frozen=True)
+class ParameterSpec:
+    key: str
+    name: str
+    unit: Optional[str] = None
+    column: Optional[str] = None
+    warning_low: Optional[float] = None
+    critical_low: Optional[float] = None
+    warning_high: Optional[float] = None
+    critical_high: Optional[float] = None
+    id: Optional[int] = None
+
+    @property
+    def is_wide(self) -> bool:
+        return self.column is not None
+
+    @classmethod
+    def from_row(cls, row: Parameter) -> "ParameterSpec":
+        return cls(
+            key=row.key,
+            name=row.name,
+            unit=row.unit,
+            column=row.column,
+            warning_low=row.warning_low,
+            critical_low=row.critical_low,
+            warning_high=row.warning_high,
+            critical_high=row.critical_high,
+            id=row.id,
+        )
+
+
+# Seeded by scripts/init_db.py. The wide parameters' built-in limits come from
+# anomaly.rules.default_rules and are overridden by threshold_rules rows, for the
+# fleet or per sensor, so they are not repeated here.
+DEFAULT_PARAMETERS = (
+    ParameterSpec("ph", "pH", column="ph"),
+    ParameterSpec("turbidity", "Turbidity", "NTU", column="turbidity"),
+    ParameterSpec("temperature", "Temperature", "°C", column="temperature"),
+    ParameterSpec(
+        "conductivity", "Conductivity", "µS/cm", warning_high=1500.0, critical_high=2500.0
+    ),
+    ParameterSpec("orp", "Oxidation-reduction potential", "mV"),
+    ParameterSpec(
+        "dissolved_oxygen", "Dissolved oxygen", "mg/L", warning_low=5.0, critical_low=2.0
+    ),
+    ParameterSpec("sulfate", "Sulfate", "mg/L", warning_high=250.0, critical_high=500.0),
+)
+
+
+def _insert_ignoring_duplicates(
+    dialect_name: str, model: Any, rows: list[dict[str, Any]], index_elements: list[str]
+):
+    if dialect_name == "postgresql":
+        return (
+            postgresql.insert(model)
+            .values(rows)
+            .on_conflict_do_nothing(index_elements=index_elements)
+        )
+    if dialect_name == "sqlite":
+        return (
+            sqlite.insert(model).values(rows).on_conflict_do_nothing(index_elements=index_elements)
+        )
+    return insert(model).values(rows)
+
+
+class ParameterRegistry:
+    """
+    Per-process cache of the `parameters` table.
+
+    Lookups that miss reload from the database, so a parameter registered by
+    another worker is picked up on first use. Unknown keys reported by a probe
+    are registered on the fly when `auto_register` is set.
+    """
+
+    def __init__(self, auto_register: bool = True):
+        self.auto_register = auto_register
+        self._by_key: dict[str, ParameterSpec] = {}
+
+    def cached(self) -> list[ParameterSpec]:
+        return list(self._by_key.values())
+
+    def invalidate(self):
+        self._by_key.clear()
+
+    async def load(self, db: AsyncSession) -> list[ParameterSpec]:
+        result = await db.execute(select(Parameter).order_by(Parameter.id))
+        self._by_key = {row.key: ParameterSpec.from_row(row) for row in result.scalars().all()}
+        return self.cached()
+
+    async def get(self, db: AsyncSession, key: str) -> Optional[ParameterSpec]:
+        if key not in self._by_key:
+            await self.load(db)
+        return self._by_key.get(key)
+
+    async def resolve(self, db: AsyncSession, keys: Iterable[str]) -> dict[str, ParameterSpec]:
+        """Specs for `keys`, registering unknown well-formed keys if allowed."""
+        keys = set(keys)
+        if not keys <= self._by_key.keys():
+            await self.load(db)
+        missing = keys - self._by_key.keys()
+        if missing and self.auto_register:
+            valid = sorted(key for key in missing if PARAMETER_KEY_PATTERN.match(key))
+            if valid:
+                logger.info(f"Registering new parameters: {', '.join(valid)}")
+                rows = [{"key": key, "name": key.replace("_", " ").capitalize()} for key in valid]
+                await db.execute(
+                    _insert_ignoring_duplicates(db.bind.dialect.name, Parameter, rows, ["key"])
+                )
+                await self.load(db)
+        skipped = keys - self._by_key.keys()
+        if skipped:
+            logger.warning(f"Dropping unregistered parameters: {', '.join(sorted(skipped))}")
+        return {key: self._by_key[key] for key in keys if key in self._by_key}
+
+    async def reading_values(
+        self,
+        db: AsyncSession,
+        sensor_id: int,
+        timestamp: datetime,
+        values: Mapping[str, Optional[float]],
+    ) -> list[dict[str, Any]]:
+        """Long-format rows for the non-wide entries of a probe's readings."""
+        extras = {
+            key: value
+            for key, value in values.items()
+            if key not in MEASUREMENT_COLUMNS and value is not None
+        }
+        if not extras:
+            return []
+        specs = await self.resolve(db, extras)
+        return [
+            {
+                "sensor_id": sensor_id,
+                "parameter_id": spec.id,
+                "timestamp": timestamp,
+                "value": extras[key],
+            }
+            for key, spec in specs.items()
+            if not spec.is_wide
+        ]
+
+    async def store_reading_values(
+        self,
+        db: AsyncSession,
+        sensor_id: int,
+        timestamp: datetime,
+        values: Mapping[str, Optional[float]],
+    ) -> int:
+        """
+        Insert the long-format values of a reading. Devices resend readings on
+        reconnect; values already stored for that timestamp are kept.
+        """
+        rows = await self.reading_values(db, sensor_id, timestamp, values)
+        if rows:
+            await db.execute(
+                _insert_ignoring_duplicates(
+                    db.bind.dialect.name,
+                    ReadingValue,
+                    rows,
+                    ["sensor_id", "parameter_id", "timestamp"],
+                )
+            )
+        return len(rows)
+
+
+async def fetch_parameter_columns(
+    db: AsyncSession,
+    sensor_id: int,
+    specs: Sequence[ParameterSpec],
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+) -> dict[str, ReadingColumns]:
+    """
+    Each parameter's values for [start, end) as its own `ReadingColumns`.
+
+    Long-format parameters share one query ordered by (parameter_id, timestamp),
+    which walks the reading_values primary key; wide ones use the readings table.
+    """
+    series: dict[str, ReadingColumns] = {}
+
+    wide = [spec.column for spec in specs if spec.is_wide]
+    if wide:
+        columns = await fetch_reading_columns(db, sensor_id, start, end, parameters=wide)
+        for spec in specs:
+            if spec.is_wide:
+                present = ~np.isnan(columns.values[spec.column])
+                series[spec.key] = ReadingColumns(
+                    timestamps=columns.timestamps[present],
+                    values={spec.key: columns.values[spec.column][present]},
+                )
+
+    long_specs = {spec.id: spec for spec in specs if not spec.is_wide}
+    if long_specs:
+        query = select(ReadingValue.parameter_id, ReadingValue.timestamp, ReadingValue.value).where(
+            ReadingValue.sensor_id == sensor_id,
+            ReadingValue.parameter_id.in_(list(long_specs)),
+        )
+        if start is not None:
+            query = query.where(ReadingValue.timestamp >= start)
+        if end is not None:
+            query = query.where(ReadingValue.timestamp < end)
+        query = query.order_by(ReadingValue.parameter_id, ReadingValue.timestamp)
+        result = await db.execute(query)
+
+        grouped: dict[int, list[tuple[Any, ...]]] = {
+            parameter_id: [] for parameter_id in long_specs
+        }
+        for parameter_id, timestamp, value in result.all():
+            grouped[parameter_id].append((timestamp, value))
+        for parameter_id, rows in grouped.items():
+            spec = long_specs[parameter_id]
+            series[spec.key] = rows_to_columns(rows, (spec.key,))
+
+    return series
+
+
+parameter_registry = ParameterRegistry()
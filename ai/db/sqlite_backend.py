@@ -0,0 +1,155 @@
+"""
+SQLite storage backend for single-process edge nodes and container-free tests.
+
+The models are written for Postgres/TimescaleDB. Rather than fork them, this
+module adapts the few Postgres-only constructs when the engine is SQLite:
+
+- `DateTime(timezone=True)` is stored as naive UTC text and read back as an
+  aware UTC datetime (SQLite's own DATETIME type silently drops the offset).
+- `ARRAY(...)` columns are stored as JSON lists.
+- `readings` has a composite (id, timestamp) primary key for TimescaleDB;
+  SQLite can only autoincrement a lone INTEGER PRIMARY KEY, so on SQLite `id`
+  alone is the key (it is unique anyway).
+
+Hypertable DDL is skipped by the listeners in `models.py`; queries that need
+LATERAL or DISTINCT ON check `dialect_name()` and use a window function.
+"""
+
+import json
+from datetime import datetime, timezone
+
+from sqlalchemy import event
+from sqlalchemy.dialects.sqlite import DATETIME
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.pool import StaticPool
+from sqlalchemy.schema import CreateColumn, PrimaryKeyConstraint
+from sqlalchemy.types import ARRAY, DateTime
+
+_UTC = timezone.utc
+
+
+def _to_naive_utc(value: datetime) -> datetime:
+    if value.tzinfo is not None:
+        value = value.astimezone(_UTC).replace(tzinfo=None)
+    return value
+
+
+class UTCDateTime(DATETIME):
+    """SQLite DATETIME that normalizes to UTC instead of dropping the offset."""
+
+    def bind_processor(self, dialect):
+        process = super().bind_processor(dialect)
+
+        def bind(value):
+            if isinstance(value, datetime):
+                value = _to_naive_utc(value)
+            return process(value) if process else value
+
+        return bind
+
+    def result_processor(self, dialect, coltype):
+        process = super().result_processor(dialect, coltype)
+        aware = self.timezone
+
+        def result(value):
+            value = process(value) if process else value
+            if aware and isinstance(value, datetime):
+                value = value.replace(tzinfo=_UTC)
+            return value
+
+        return result
+
+
+class JSONArray(ARRAY):
+    """ARRAY stored as a JSON list; datetime items round-trip as UTC ISO strings."""
+
+    __visit_name__ = "JSON"
+
+    def bind_processor(self, dialect):
+        is_datetime = isinstance(self.item_type, DateTime)
+
+        def bind(value):
+            if value is None:
+                return None
+            items = list(value)
+            if is_datetime:
+                items = [
+                    None if item is None else _to_naive_utc(item).isoformat() for item in items
+                ]
+            return json.dumps(items)
+
+        return bind
+
+    def result_processor(self, dialect, coltype):
+        is_datetime = isinstance(self.item_type, DateTime)
+
+        def result(value):
+            if value is None:
+                return None
+            items = json.loads(value)
+            if is_datetime:
+                items = [
+                    None if item is None else datetime.fromisoformat(item).replace(tzinfo=_UTC)
+                    for item in items
+                ]
+            return items
+
+        return result
+
+
+@compiles(ARRAY, "sqlite")
+def _array_type(type_, compiler, **kw):
+    return "JSON"
+
+
+def _rowid_alias(column) -> bool:
+    """True for the explicit autoincrement column of a composite primary key."""
+    return (
+        column.primary_key
+        and column.autoincrement is True
+        and len(column.table.primary_key.columns) > 1
+    )
+
+
+@compiles(CreateColumn, "sqlite")
+def _create_column(element, compiler, **kw):
+    column = element.element
+    if _rowid_alias(column):
+        return f"{compiler.preparer.format_column(column)} INTEGER PRIMARY KEY AUTOINCREMENT"
+    return compiler.visit_create_column(element, **kw)
+
+
+@compiles(PrimaryKeyConstraint, "sqlite")
+def _primary_key_constraint(constraint, compiler, **kw):
+    if any(_rowid_alias(column) for column in constraint.columns):
+        return None  # declared inline on the column instead
+    return compiler.visit_primary_key_constraint(constraint, **kw)
+
+
+def _set_pragmas(dbapi_connection, _connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    # WAL lets the read endpoints run while ingest writes; ignored for :memory:.
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
+
+
+def configure_engine(engine: AsyncEngine) -> AsyncEngine:
+    """Install the type adaptations and connection pragmas on a SQLite engine."""
+    dialect = engine.dialect
+    dialect.colspecs = {**dialect.colspecs, DateTime: UTCDateTime, ARRAY: JSONArray}
+    event.listen(engine.sync_engine, "connect", _set_pragmas)
+    return engine
+
+
+def create_sqlite_engine(url: str, **kwargs) -> AsyncEngine:
+    """An aiosqlite engine; in-memory databases share one connection."""
+    if url.startswith("sqlite://"):
+        url = url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    if url.rstrip("/").endswith(("aiosqlite:", ":memory:")):
+        kwargs.setdefault("poolclass", StaticPool)
+    kwargs.setdefault("connect_args", {"check_same_thread": False})
+    return configure_engine(create_async_engine(url, **kwargs))
@@ -0,0 +1,114 @@
+"""
+Column-oriented reads of sensor readings that bypass the ORM.
+
+`select(Reading)` builds a mapped object per row and registers it in the
+session's identity map, which dominates the cost of loading long windows.
+These helpers select only the needed columns and hand back plain tuples or
+NumPy column arrays.
+"""
+
+from collections.abc import Sequence
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Optional
+
+import numpy as np
+from sqlalchemy import desc, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .models import Reading
+
+READING_COLUMNS = (
+    "id",
+    "timestamp",
+    "ph",
+    "turbidity",
+    "temperature",
+    "battery_voltage",
+    "signal_strength",
+)
+MEASUREMENT_COLUMNS = ("ph", "turbidity", "temperature")
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_ONE_MICROSECOND = timedelta(microseconds=1)
+
+
+def epoch_microseconds(value: datetime) -> int:
+    """UTC microseconds since the epoch; naive values are taken as UTC."""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return (value - _EPOCH) // _ONE_MICROSECOND
+
+
+@dataclass(frozen=True)
+class ReadingColumns:
+    """Readings as parallel arrays: int64 epoch microseconds and float64 values (NaN = null)."""
+
+    timestamps: np.ndarray
+    values: dict[str, np.ndarray]
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+
+async def fetch_reading_rows(
+    db: AsyncSession,
+    sensor_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    columns: Sequence[str] = READING_COLUMNS,
+    descending: bool = False,
+    limit: Optional[int] = None,
+) -> list[tuple[Any, ...]]:
+    """Readings for [start, end) as tuples in `columns` order, sorted by timestamp."""
+    query = select(*(getattr(Reading, column) for column in columns)).where(
+        Reading.sensor_id == sensor_id
+    )
+    if start is not None:
+        query = query.where(Reading.timestamp >= start)
+    if end is not None:
+        query = query.where(Reading.timestamp < end)
+    query = query.order_by(desc(Reading.timestamp) if descending else Reading.timestamp)
+    if limit is not None:
+        query = query.limit(limit)
+
+    result = await db.execute(query)
+    return [tuple(row) for row in result.all()]
+
+
+def rows_to_columns(
+    rows: Sequence[Sequence[Any]], parameters: Sequence[str] = MEASUREMENT_COLUMNS
+) -> ReadingColumns:
+    """Transpose (timestamp, *parameters) rows into NumPy columns."""
+    count = len(rows)
+    if not count:
+        return ReadingColumns(
+            timestamps=np.empty(0, dtype=np.int64),
+            values={parameter: np.empty(0, dtype=np.float64) for parameter in parameters},
+        )
+
+    transposed = list(zip(*rows))
+    timestamps = np.fromiter(
+        (epoch_microseconds(value) for value in transposed[0]), dtype=np.int64, count=count
+    )
+    values = {
+        parameter: np.fromiter(
+            (np.nan if value is None else value for value in column),
+            dtype=np.float64,
+            count=count,
+        )
+        for parameter, column in zip(parameters, transposed[1:])
+    }
+    return ReadingColumns(timestamps=timestamps, values=values)
+
+
+async def fetch_reading_columns(
+    db: AsyncSession,
+    sensor_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    parameters: Sequence[str] = MEASUREMENT_COLUMNS,
+) -> ReadingColumns:
+    """Readings for [start, end) in timestamp order as NumPy column arrays."""
+    rows = await fetch_reading_rows(db, sensor_id, start, end, columns=("timestamp", *parameters))
+    return rows_to_columns(rows, parameters)
@@ -0,0 +1,3 @@
+from .readings import EXPORT_COLUMNS, iter_reading_batches, stream_csv, stream_parquet
+
+__all__ = ["EXPORT_COLUMNS", "iter_reading_batches", "stream_csv", "stream_parquet"]
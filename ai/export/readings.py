@@ -0,0 +1,186 @@
+import csv
+import importlib
+import io
+import logging
+import os
+import zlib
+from collections.abc import AsyncIterator, Sequence
+from datetime import datetime
+from typing import Any
+
+from sqlalchemy import select
+
+from ai.db.connection import AsyncSessionLocal
+from ai.db.models import Reading
+from ai.schemas.base import format_datetime
+from ai.storage.cold_store import cold_store
+
+try:
+    pa: Any = importlib.import_module("pyarrow")
+    pq: Any = importlib.import_module("pyarrow.parquet")
+except ModuleNotFoundError:
+    pa = None
+    pq = None
+
+logger = logging.getLogger(__name__)
+
+EXPORT_COLUMNS = (
+    "timestamp",
+    "ph",
+    "turbidity",
+    "temperature",
+    "battery_voltage",
+    "signal_strength",
+)
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "10000"))
+
+
+def parquet_available() -> bool:
+    return pq is not None
+
+
+async def iter_reading_batches(
+    sensor_id: int,
+    start: datetime,
+    end: datetime,
+    batch_size: int = EXPORT_BATCH_SIZE,
+) -> AsyncIterator[Sequence[tuple]]:
+    """Yield readings in timestamp order, `batch_size` rows at a time.
+
+    The part of the window before the cold storage boundary is read from the
+    Parquet archive, the rest from the database.
+    """
+    boundary = cold_store.boundary()
+    if boundary is not None and start < boundary:
+        async for batch in cold_store.iter_batches(
+            sensor_id, start, min(end, boundary), batch_size
+        ):
+            yield [row[1:] for row in batch]  # drop the archived row id
+        start = max(start, boundary)
+
+    if start < end:
+        async for batch in _iter_database_batches(sensor_id, start, end, batch_size):
+            yield batch
+
+
+async def _iter_database_batches(
+    sensor_id: int, start: datetime, end: datetime, batch_size: int
+) -> AsyncIterator[Sequence[tuple]]:
+    """Rows come from a server-side cursor, so memory is bounded by one batch."""
+    query = (
+        select(*(getattr(Reading, column) for column in EXPORT_COLUMNS))
+        .where(
+            Reading.sensor_id == sensor_id,
+            Reading.timestamp >= start,
+            Reading.timestamp < end,
+        )
+        .order_by(Reading.timestamp)
+        .execution_options(yield_per=batch_size)
+    )
+
+    async with AsyncSessionLocal() as session:
+        result = await session.stream(query)
+        async for partition in result.partitions(batch_size):
+            yield [tuple(row) for row in partition]
+
+
+async def stream_csv(
+    batches: AsyncIterator[Sequence[tuple]], compress: bool = True
+) -> AsyncIterator[bytes]:
+    """Encode row batches as CSV, gzip-compressing on the fly when requested."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+
+    def encode(rows: Sequence[Sequence[Any]]) -> bytes:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        writer.writerows(rows)
+        data = buffer.getvalue().encode("utf-8")
+        return compressor.compress(data) if compressor else data
+
+    header = encode([EXPORT_COLUMNS])
+    if header:
+        yield header
+
+    async for batch in batches:
+        chunk = encode(
+            [(format_datetime(row[0]), *("" if v is None else v for v in row[1:])) for row in batch]
+        )
+        if chunk:
+            yield chunk
+
+    if compressor:
+        yield compressor.flush()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object that hands written bytes back to the caller."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._buffer = bytearray()
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._buffer.extend(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+def _parquet_schema() -> Any:
+    return pa.schema(
+        [
+            ("timestamp", pa.timestamp("us", tz="UTC")),
+            ("ph", pa.float64()),
+            ("turbidity", pa.float64()),
+            ("temperature", pa.float64()),
+            ("battery_voltage", pa.float64()),
+            ("signal_strength", pa.int32()),
+        ]
+    )
+
+
+def rows_to_table(rows: Sequence[Sequence[Any]], schema: Any = None) -> Any:
+    """Convert row tuples (in EXPORT_COLUMNS order) to a pyarrow Table."""
+    schema = schema or _parquet_schema()
+    columns = list(zip(*rows)) if rows else [()] * len(schema)
+    return pa.Table.from_arrays(
+        [pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+        schema=schema,
+    )
+
+
+async def stream_parquet(
+    batches: AsyncIterator[Sequence[tuple]], compression: str = "zstd"
+) -> AsyncIterator[bytes]:
+    """Encode row batches as Parquet, one row group per batch."""
+    if pq is None:
+        raise RuntimeError("Parquet export requires pyarrow")
+
+    schema = _parquet_schema()
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression=compression)
+    try:
+        async for batch in batches:
+            if not batch:
+                continue
+            writer.write_table(rows_to_table(batch, schema), row_group_size=len(batch))
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    finally:
+        writer.close()
+
+    chunk = sink.drain()
+    if chunk:
+        yield chunk
@@ -4,9 +4,28 @@ from sqlalchemy import select
 from ..db.models import Sensor, Reading
 from ..schemas.sensor import SensorDataIngest
 from ..db.connection import AsyncSessionLocal
+from ..db.parameters import parameter_registry
+from ..cache.response_cache import response_cache
+from ..cache.hot_window import hot_window, reading_event
+from ..anomaly.streaming import streaming_detectors
+from ..anomaly.rate_of_change import rate_of_change_detector
+from ..anomaly.multivariate import multivariate_detector
+from ..anomaly.isolation import isolation_scorer
+from ..anomaly.health import sensor_health
+from ..realtime.event_bus import reading_events
 
 logger = logging.getLogger(__name__)
 
+# In-memory state in the API workers that is fed from reading events.
+READING_EVENT_CONSUMERS = (
+    hot_window,
+    streaming_detectors,
+    rate_of_change_detector,
+    multivariate_detector,
+    isolation_scorer,
+    sensor_health,
+)
+
 
 async def process_mqtt_message(payload: SensorDataIngest):
     """
@@ -21,6 +40,7 @@ async def process_mqtt_message(payload: SensorDataIngest):
                 select(Sensor).where(Sensor.sensor_id == payload.sensor_id)
             )
             sensor = result.scalar_one_or_none()
+            registered = sensor is None
 
             # Auto-register if not found
             if not sensor:
@@ -50,7 +70,29 @@ async def process_mqtt_message(payload: SensorDataIngest):
                 else None,
             )
             session.add(reading)
+            # Parameters without a readings column go to the long-format table.
+            await parameter_registry.store_reading_values(
+                session, sensor.id, payload.timestamp, payload.readings
+            )
             await session.commit()
+            if registered:
+                await response_cache.invalidate("readings", f"readings:{sensor.id}", "sensors")
+            else:
+                await response_cache.invalidate("readings", f"readings:{sensor.id}")
+            # API workers consume these; this may also run in the MQTT listener process.
+            if any(consumer.enabled for consumer in READING_EVENT_CONSUMERS):
+                await reading_events.publish(
+                    reading_event(
+                        sensor.id,
+                        reading.id,
+                        reading.timestamp,
+                        ph=reading.ph,
+                        turbidity=reading.turbidity,
+                        temperature=reading.temperature,
+                        battery_voltage=reading.battery_voltage,
+                        signal_strength=reading.signal_strength,
+                    )
+                )
             logger.info(f"Stored reading for {payload.sensor_id} at {payload.timestamp}")
             return True
 
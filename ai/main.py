@@ -10,30 +10,46 @@ from fastapi import (
     File,
     Depends,
     HTTPException,
+    Query,
     WebSocket,
     WebSocketDisconnect,
     BackgroundTasks,
 )
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
 from sqlalchemy.exc import SQLAlchemyError
-from pydantic import ValidationError
+from pydantic import TypeAdapter, ValidationError
 import io
 import logging
 import os
 import re
 import time
+import numpy as np
 from PIL import Image
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, desc, delete, or_, func
+from sqlalchemy import and_, select, desc, delete, or_, func, true, tuple_
+from sqlalchemy.orm import aliased
 
 # Import CV modules
 from .schemas.cv import BoundingBox, ImageAnalysisResponse
 from .cv.detector import YellowBoyDetector, ImageDecodeError
 from .utils.responses import error_response
+from .utils.pagination import MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, decode_cursor, page_cursor
+from .utils.fast_json import dumps as fast_dumps, json_records_response
+from .utils.compression import CompressionMiddleware
+from .utils.env import env_flag
 from .chatbot.orchestrator import ChatOrchestrator
 
 # Import IoT/ML modules
-from .db.connection import get_db
+from .db.connection import dialect_name, get_db
+from .db.instrumentation import RouteLabelMiddleware, db_metrics
+from .db.timeseries import (
+    MEASUREMENT_COLUMNS,
+    epoch_microseconds,
+    fetch_reading_columns,
+    fetch_reading_rows,
+)
+from .db.parameters import fetch_parameter_columns, parameter_registry
 from .db.models import (
     Sensor,
     Reading,
@@ -42,10 +58,13 @@ from .db.models import (
     Anomaly,
     NotificationRecipient,
     SensorAlertState,
+    ThresholdRule,
     UserSettings,
 )
 from .schemas.sensor import SensorResponse, ReadingResponse, SensorDataIngest
 from .schemas.forecast import PredictionResponse
+from .schemas.fleet import FleetLastAnomaly, FleetLatestReading, FleetSensorSnapshot
+from .schemas.parameter import ParameterPoint, ParameterResponse
 from .schemas.alert import (
     AlertResponse,
     AlertCreate,
@@ -55,20 +74,46 @@ from .schemas.alert import (
     RecipientResponse,
 )
 from .schemas.settings import UserSettingsResponse, UserSettingsUpdate
+from .schemas.threshold import (
+    EffectiveThreshold,
+    ThresholdLimitsBase,
+    ThresholdRuleCreate,
+    ThresholdRuleResponse,
+)
 from .schemas.help import FaqItem, FaqResponse
+from .schemas.health import SensorHealthResponse
 from .schemas.base import BaseSchema
 from .iot.mqtt_bridge import process_mqtt_message
+from .export.readings import iter_reading_batches, parquet_available, stream_csv, stream_parquet
+from .storage.cold_store import cold_store
 from .forecasting.timegpt_client import TimeGPTClient
-from .anomaly.detector import AnomalyDetector, ANOMALY_THRESHOLDS
+from .anomaly.detector import AnomalyDetector
 from .alerts.state_machine import AlertStateMachine
 from .alerts.notifications import NotificationService
 from .realtime.websocket import manager as ws_manager
+from .cache.response_cache import response_cache
+from .cache.hot_window import hot_window
+from .anomaly.streaming import streaming_detectors
+from .anomaly.rate_of_change import rate_of_change_detector
+from .anomaly.forecast_residual import forecast_intervals
+from .anomaly.isolation import isolation_scorer
+from .anomaly.multivariate import multivariate_detector
+from .anomaly.health import sensor_health
+from .anomaly.alerting import decide_alerts
+from .anomaly.batch import SEVERITY_CRITICAL
+from .anomaly.episodes import anomaly_episodes
+from .anomaly.rules import threshold_rules
+from .realtime.event_bus import forecast_events, reading_events, threshold_rule_events
 
 logger = logging.getLogger(__name__)
 
 REFRESH_INTERVAL_MIN_SECONDS = 5
 REFRESH_INTERVAL_MAX_SECONDS = 60
 QUIET_HOURS_PATTERN = re.compile(r"^(?:[01]\d|2[0-3]):[0-5]\d$")
+EXPORT_DEFAULT_WINDOW_DAYS = 30
+FORECAST_TIMELINE_CACHE_TTL_SECONDS = int(os.getenv("FORECAST_TIMELINE_CACHE_TTL_SECONDS", "15"))
+# The slow-query log includes bound parameters (phone numbers, emails, ...).
+DEBUG_ENDPOINTS_ENABLED = env_flag("DEBUG_ENDPOINTS_ENABLED", default=False)
 
 
 def verify_user_id(user_id: str, x_user_id: Optional[str] = Header(None, alias="x-user-id")) -> str:
@@ -101,12 +146,68 @@ async def lifespan(app: FastAPI):
 
     task.add_done_callback(task_done_callback)
 
+    tasks = [task]
+    # Loaded directly as well, so custom limits apply even while Redis is down.
+    await threshold_rules.reload()
+    threshold_rule_events.subscribe(threshold_rules.apply)
+    threshold_rule_events.on_reset(threshold_rules.reload)
+    rules_task = asyncio.create_task(threshold_rule_events.listen())
+    rules_task.add_done_callback(task_done_callback)
+    tasks.append(rules_task)
+    if hot_window.enabled:
+        reading_events.subscribe(hot_window.apply)
+        reading_events.on_reset(hot_window.reload)
+        # Lookups fall back to the database until the resubscribe reloads the window.
+        reading_events.on_disconnect(hot_window.mark_stale)
+    if streaming_detectors.enabled:
+        await streaming_detectors.load()
+        reading_events.subscribe(streaming_detectors.apply)
+        snapshot_task = asyncio.create_task(streaming_detectors.run_snapshots())
+        snapshot_task.add_done_callback(task_done_callback)
+        tasks.append(snapshot_task)
+    if rate_of_change_detector.enabled:
+        reading_events.subscribe(rate_of_change_detector.apply)
+    if multivariate_detector.enabled:
+        await multivariate_detector.load()
+        reading_events.subscribe(multivariate_detector.apply)
+        multivariate_task = asyncio.create_task(multivariate_detector.run_snapshots())
+        multivariate_task.add_done_callback(task_done_callback)
+        tasks.append(multivariate_task)
+    if isolation_scorer.enabled and isolation_scorer.load_models():
+        reading_events.subscribe(isolation_scorer.apply)
+    if sensor_health.enabled:
+        await sensor_health.load()
+        reading_events.subscribe(sensor_health.apply)
+        health_task = asyncio.create_task(sensor_health.run_snapshots())
+        health_task.add_done_callback(task_done_callback)
+        tasks.append(health_task)
+    if anomaly_episodes.enabled:
+        episodes_task = asyncio.create_task(anomaly_episodes.run_checkpoints())
+        episodes_task.add_done_callback(task_done_callback)
+        tasks.append(episodes_task)
+    if reading_events.has_handlers:
+        # The listener's first subscribe triggers the hot window's initial load via on_reset.
+        events_task = asyncio.create_task(reading_events.listen())
+        events_task.add_done_callback(task_done_callback)
+        tasks.append(events_task)
+    if forecast_intervals.enabled:
+        # Loaded directly as well, so residual checks run even while Redis is down.
+        await forecast_intervals.reload()
+        forecast_events.subscribe(forecast_intervals.apply)
+        # Reloads the index after every reconnect.
+        forecast_events.on_reset(forecast_intervals.reload)
+        forecasts_task = asyncio.create_task(forecast_events.listen())
+        forecasts_task.add_done_callback(task_done_callback)
+        tasks.append(forecasts_task)
+
     try:
         yield
     finally:
-        task.cancel()
-        with suppress(asyncio.CancelledError):
-            await task
+        for background in tasks:
+            background.cancel()
+        for background in tasks:
+            with suppress(asyncio.CancelledError):
+                await background
 
 
 app = FastAPI(title="AquaMine AI API", lifespan=lifespan)
@@ -119,17 +220,62 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", NEXT_CURSOR_HEADER],
 )
+app.add_middleware(CompressionMiddleware, path_prefix="/api/v1")
+app.add_middleware(RouteLabelMiddleware)
 
 cv_detector = YellowBoyDetector()
 timegpt = TimeGPTClient()
-anomaly_detector = AnomalyDetector(timegpt_client=timegpt)
+anomaly_detector = AnomalyDetector(
+    timegpt_client=timegpt,
+    streaming=streaming_detectors,
+    rate_of_change=rate_of_change_detector,
+    forecast_intervals=forecast_intervals,
+    multivariate=multivariate_detector,
+    rules=threshold_rules,
+    isolation=isolation_scorer,
+)
 alert_sm = AlertStateMachine()
 notifier = NotificationService()
 chat_orchestrator = ChatOrchestrator()
 
 # --- Helpers ---
 
+_sensor_list_adapter = TypeAdapter(List[SensorResponse])
+_alert_list_adapter = TypeAdapter(List[AlertResponse])
+_recipient_list_adapter = TypeAdapter(List[RecipientResponse])
+_fleet_snapshot_adapter = TypeAdapter(List[FleetSensorSnapshot])
+
+# Field order of ReadingResponse / AnomalyResponse, for encoding straight from row tuples.
+READING_RESPONSE_FIELDS = (
+    "timestamp",
+    "ph",
+    "turbidity",
+    "temperature",
+    "battery_voltage",
+    "signal_strength",
+    "id",
+    "sensor_id",
+    "ph_level",
+)
+ANOMALY_RESPONSE_FIELDS = (
+    "sensor_id",
+    "timestamp",
+    "parameter",
+    "value",
+    "anomaly_score",
+    "detection_method",
+    "id",
+    "created_at",
+    "end_timestamp",
+    "peak_value",
+    "sample_count",
+)
+
+# Everything the fleet snapshot is built from; a write to any of them invalidates it.
+FLEET_SNAPSHOT_NAMESPACES = ["sensors", "readings", "anomalies", "alerts"]
+
 
 def calculate_severity(confidence: float) -> Literal["none", "mild", "moderate", "severe"]:
     """Calculate severity based on detection confidence.
@@ -150,57 +296,45 @@ def calculate_severity(confidence: float) -> Literal["none", "mild", "moderate",
         return "severe"
 
 
-def _calculate_forecast_confidence(
-    value: float, lower: Optional[float], upper: Optional[float], data_quality: float = 1.0
-) -> float:
-    if lower is None or upper is None:
-        base_confidence = 0.7
-    else:
-        span = abs(upper - lower)
-        base = max(abs(value), 1.0)
-        base_confidence = 1 - min(span / base, 1.0)
+def _calculate_forecast_confidences(
+    values: np.ndarray, lower: np.ndarray, upper: np.ndarray, data_quality: float = 1.0
+) -> np.ndarray:
+    span = np.abs(upper - lower)
+    base = np.maximum(np.abs(values), 1.0)
+    base_confidence = 1 - np.minimum(span / base, 1.0)
+    # Points without a prediction interval get a flat prior.
+    base_confidence = np.where(np.isnan(base_confidence), 0.7, base_confidence)
     data_quality = max(min(data_quality, 1.0), 0.0)
     confidence = base_confidence * (0.5 + 0.5 * data_quality)
-    return round(max(confidence, 0.0), 2)
+    return np.round(np.maximum(confidence, 0.0), 2)
 
 
 def _format_forecast_points(
-    forecast_values: list[dict[str, object]], data_quality: float = 1.0
+    prediction: Optional[Prediction], data_quality: float = 1.0
 ) -> list[dict[str, object]]:
-    points = []
-    for point in forecast_values or []:
-        if isinstance(point, dict):
-            timestamp = point.get("timestamp")
-            value = point.get("value")
-            lower = point.get("lower")
-            upper = point.get("upper")
-        else:
-            timestamp = getattr(point, "timestamp", None)
-            value = getattr(point, "value", None)
-            lower = getattr(point, "lower", None)
-            upper = getattr(point, "upper", None)
-
-        if value is None:
-            continue
-
-        if not isinstance(value, (int, float)):
-            continue
-
-        lower_val = float(lower) if isinstance(lower, (int, float)) else None
-        upper_val = float(upper) if isinstance(upper, (int, float)) else None
-        value_val = float(value)
-
-        points.append(
-            {
-                "timestamp": timestamp,
-                "ph_pred": value_val,
-                "confidence": _calculate_forecast_confidence(
-                    value_val, lower_val, upper_val, data_quality=data_quality
-                ),
-            }
-        )
+    if prediction is None:
+        return []
+
+    timestamps, values, lower, upper = prediction.point_columns()
+    if not values:
+        return []
+
+    value_arr = np.array(values, dtype=float)
+    confidence = _calculate_forecast_confidences(
+        value_arr,
+        np.array(lower, dtype=float),
+        np.array(upper, dtype=float),
+        data_quality=data_quality,
+    )
+    valid = ~np.isnan(value_arr)
 
-    return points
+    return [
+        {"timestamp": timestamp, "ph_pred": value, "confidence": conf}
+        for timestamp, value, conf, keep in zip(
+            timestamps, value_arr.tolist(), confidence.tolist(), valid.tolist()
+        )
+        if keep
+    ]
 
 
 def _format_anomaly_label(parameter: Optional[str]) -> str:
@@ -237,6 +371,99 @@ def _format_anomaly_summary(anomaly: Optional[Anomaly]) -> dict[str, object]:
     return {"score": score, "severity": severity, "reason": reason}
 
 
+def _dump_json(adapter: TypeAdapter, value) -> bytes:
+    return adapter.dump_json(adapter.validate_python(value, from_attributes=True))
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against our ETag (RFC 9110 13.1.2)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(
+        candidate.strip().removeprefix("W/") == opaque for candidate in if_none_match.split(",")
+    )
+
+
+def _pack_page(body: bytes, next_cursor: Optional[str]) -> bytes:
+    """Prefix a page body with its next cursor so both are cached together."""
+    return (next_cursor or "").encode() + b"\n" + body
+
+
+async def _cached_json_response(
+    namespaces: List[str],
+    params: dict[str, object],
+    load,
+    if_none_match: Optional[str] = None,
+    paged: bool = False,
+    ttl_seconds: Optional[int] = None,
+) -> Response:
+    """
+    Serve a cached JSON body with an ETag derived from the namespace generations.
+
+    A matching If-None-Match is answered with 304 before the body is loaded, so
+    unchanged polls cost one Redis MGET and no database work. Without Redis there
+    are no shared generations, so the body is loaded fresh and sent without an
+    ETag. Paged loaders return `_pack_page()` output and the cursor is sent as a
+    response header.
+    """
+    headers = {"Cache-Control": "private, no-cache"}
+    generations = await response_cache.generations(namespaces)
+    if generations is not None:
+        headers["ETag"] = response_cache.etag(namespaces, generations, params)
+        if _etag_matches(if_none_match, headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+
+    body = await response_cache.get_or_load(
+        namespaces, params, load, generations=generations, ttl_seconds=ttl_seconds
+    )
+    if paged:
+        next_cursor, body = body.split(b"\n", 1)
+        if next_cursor:
+            headers[NEXT_CURSOR_HEADER] = next_cursor.decode()
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def _keyset_page(
+    query,
+    timestamp_column,
+    id_column,
+    limit: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+):
+    """
+    Restrict `query` to one newest-first page of [start, end) after `cursor`.
+
+    Seeks on the (timestamp, id) row value instead of using OFFSET, so every page
+    is a bounded index range scan regardless of how deep the client has paged.
+    """
+    start = _as_utc(start) if start is not None else None
+    end = _as_utc(end) if end is not None else None
+    if start is not None and end is not None and start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    if start is not None:
+        query = query.where(timestamp_column >= start)
+    if end is not None:
+        query = query.where(timestamp_column < end)
+    if cursor:
+        try:
+            cursor_timestamp, cursor_id = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor") from None
+        query = query.where(tuple_(timestamp_column, id_column) < (cursor_timestamp, cursor_id))
+    return query.order_by(desc(timestamp_column), desc(id_column)).limit(limit + 1)
+
+
+def _as_utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
 def _validate_quiet_hours(value: Optional[str], label: str) -> None:
     if value is None:
         return
@@ -274,18 +501,7 @@ async def _get_or_create_settings(
     return settings
 
 
-async def _get_latest_reading(db: AsyncSession, sensor_id: int) -> Optional[Reading]:
-    query = (
-        select(Reading)
-        .where(Reading.sensor_id == sensor_id)
-        .order_by(desc(Reading.timestamp))
-        .limit(1)
-    )
-    result = await db.execute(query)
-    return result.scalar_one_or_none()
-
-
-def _format_current_sensor_state(latest: Optional[Reading]) -> dict[str, object]:
+def _format_current_sensor_state(latest: Optional[Reading], sensor_id: int) -> dict[str, object]:
     if not latest:
         return {
             "score": 0.0,
@@ -294,33 +510,10 @@ def _format_current_sensor_state(latest: Optional[Reading]) -> dict[str, object]
             "last_updated": None,
         }
 
-    candidates: list[tuple[float, str, str]] = []
-    label = _format_anomaly_label("ph")
-    if latest.ph is not None:
-        if latest.ph < ANOMALY_THRESHOLDS["ph"]["critical_low"]:
-            candidates.append((10.0, "critical", f"{label} critical: {latest.ph:.2f}"))
-        elif latest.ph < ANOMALY_THRESHOLDS["ph"]["warning_low"]:
-            candidates.append((5.0, "warning", f"{label} warning: {latest.ph:.2f}"))
-        if latest.ph > ANOMALY_THRESHOLDS["ph"]["critical_high"]:
-            candidates.append((10.0, "critical", f"{label} critical: {latest.ph:.2f}"))
-        elif latest.ph > ANOMALY_THRESHOLDS["ph"]["warning_high"]:
-            candidates.append((5.0, "warning", f"{label} warning: {latest.ph:.2f}"))
-
-    label = _format_anomaly_label("turbidity")
-    if latest.turbidity is not None:
-        if latest.turbidity > ANOMALY_THRESHOLDS["turbidity"]["critical_high"]:
-            candidates.append((10.0, "critical", f"{label} critical: {latest.turbidity:.1f}"))
-        elif latest.turbidity > ANOMALY_THRESHOLDS["turbidity"]["warning_high"]:
-            candidates.append((5.0, "warning", f"{label} warning: {latest.turbidity:.1f}"))
-
-    label = _format_anomaly_label("temperature")
-    if latest.temperature is not None:
-        if latest.temperature > ANOMALY_THRESHOLDS["temperature"]["critical_high"]:
-            candidates.append((10.0, "critical", f"{label} critical: {latest.temperature:.1f}"))
-        elif latest.temperature > ANOMALY_THRESHOLDS["temperature"]["warning_high"]:
-            candidates.append((5.0, "warning", f"{label} warning: {latest.temperature:.1f}"))
-
-    if not candidates:
+    # All sides count here, including the status-only ones (e.g. high pH).
+    values = {parameter: getattr(latest, parameter) for parameter in MEASUREMENT_COLUMNS}
+    hits = threshold_rules.rules.classify(sensor_id, values, enforced_only=False)
+    if not hits:
         return {
             "score": 0.0,
             "severity": "normal",
@@ -328,15 +521,181 @@ def _format_current_sensor_state(latest: Optional[Reading]) -> dict[str, object]
             "last_updated": latest.timestamp,
         }
 
-    score, severity, reason = max(candidates, key=lambda item: item[0])
+    # The first parameter with the worst severity, in rule order.
+    hit = max(hits, key=lambda hit: hit.severity)
+    severity = "critical" if hit.severity == SEVERITY_CRITICAL else "warning"
+    precision = 2 if hit.parameter == "ph" else 1
     return {
-        "score": score,
+        "score": 10.0 if severity == "critical" else 5.0,
         "severity": severity,
-        "reason": reason,
+        "reason": f"{_format_anomaly_label(hit.parameter)} {severity}: {hit.value:.{precision}f}",
         "last_updated": latest.timestamp,
     }
 
 
+def _latest_per_sensor(columns, sensor_column, order_by, name: str, lateral: bool):
+    """
+    Newest row per sensor as a joinable subquery and its ON clause.
+
+    On Postgres a LATERAL subquery makes each lookup a single index probe on
+    (sensor_id, timestamp DESC). Backends without LATERAL rank rows with a
+    window function instead, which scans the table but needs no extension.
+    """
+    if lateral:
+        subquery = (
+            select(*columns)
+            .where(sensor_column == Sensor.id)
+            .order_by(*order_by)
+            .limit(1)
+            .lateral(name)
+        )
+        return subquery, true(), list(subquery.c)
+
+    subquery = select(
+        *columns,
+        sensor_column.label("ranked_sensor_id"),
+        func.row_number().over(partition_by=sensor_column, order_by=order_by).label("rank"),
+    ).subquery(name)
+    on = and_(subquery.c.ranked_sensor_id == Sensor.id, subquery.c.rank == 1)
+    return subquery, on, list(subquery.c)[: len(columns)]
+
+
+def _fleet_snapshot_query(lateral: bool = True):
+    """
+    One row per sensor with its latest reading, last anomaly and unacknowledged alert count.
+
+    The per-sensor lookups are joined subqueries (see `_latest_per_sensor`), so
+    the whole fleet comes back in one statement instead of a request per sensor.
+    """
+    latest_reading, reading_on, reading_columns = _latest_per_sensor(
+        [
+            Reading.timestamp,
+            Reading.ph,
+            Reading.turbidity,
+            Reading.temperature,
+            Reading.battery_voltage,
+            Reading.signal_strength,
+        ],
+        Reading.sensor_id,
+        [desc(Reading.timestamp)],
+        "latest_reading",
+        lateral,
+    )
+    last_anomaly, anomaly_on, anomaly_columns = _latest_per_sensor(
+        [
+            Anomaly.timestamp.label("anomaly_timestamp"),
+            Anomaly.parameter.label("anomaly_parameter"),
+            Anomaly.value.label("anomaly_value"),
+            Anomaly.anomaly_score,
+            Anomaly.detection_method,
+        ],
+        Anomaly.sensor_id,
+        [desc(Anomaly.timestamp), desc(Anomaly.id)],
+        "last_anomaly",
+        lateral,
+    )
+    active_alerts = (
+        select(Alert.sensor_id, func.count().label("active_alerts"))
+        .where(Alert.acknowledged_at.is_(None))
+        .group_by(Alert.sensor_id)
+        .subquery("active_alerts")
+    )
+    return (
+        select(
+            Sensor,
+            *reading_columns,
+            *anomaly_columns,
+            func.coalesce(active_alerts.c.active_alerts, 0).label("active_alerts"),
+        )
+        .select_from(Sensor)
+        .outerjoin(latest_reading, reading_on)
+        .outerjoin(last_anomaly, anomaly_on)
+        .outerjoin(active_alerts, active_alerts.c.sensor_id == Sensor.id)
+        .order_by(Sensor.id)
+    )
+
+
+def _format_fleet_snapshot_row(row) -> FleetSensorSnapshot:
+    sensor = row.Sensor
+    has_reading = row.timestamp is not None
+    state = _format_current_sensor_state(row if has_reading else None, sensor.id)
+    return FleetSensorSnapshot(
+        id=sensor.id,
+        sensor_id=sensor.sensor_id,
+        name=sensor.name,
+        latitude=sensor.latitude,
+        longitude=sensor.longitude,
+        is_active=sensor.is_active,
+        severity=state["severity"],
+        severity_score=state["score"],
+        severity_reason=state["reason"],
+        active_alerts=int(row.active_alerts or 0),
+        latest_reading=FleetLatestReading(
+            timestamp=row.timestamp,
+            ph=row.ph,
+            turbidity=row.turbidity,
+            temperature=row.temperature,
+            battery_voltage=row.battery_voltage,
+            signal_strength=row.signal_strength,
+        )
+        if has_reading
+        else None,
+        last_anomaly=FleetLastAnomaly(
+            timestamp=row.anomaly_timestamp,
+            parameter=row.anomaly_parameter,
+            value=row.anomaly_value,
+            anomaly_score=row.anomaly_score,
+            detection_method=row.detection_method,
+        )
+        if row.anomaly_timestamp is not None
+        else None,
+    )
+
+
+async def _get_latest_predictions(
+    db: AsyncSession, sensor_id: int, parameter: Optional[str] = None
+) -> list[Prediction]:
+    """Latest prediction for each parameter of a sensor (DISTINCT ON parameter)."""
+    if dialect_name(db) != "postgresql":
+        return await _get_latest_predictions_ranked(db, sensor_id, parameter)
+
+    query = (
+        select(Prediction)
+        .where(Prediction.sensor_id == sensor_id)
+        .distinct(Prediction.parameter)
+        .order_by(Prediction.parameter, desc(Prediction.created_at))
+    )
+    if parameter is not None:
+        query = query.where(Prediction.parameter == parameter)
+
+    result = await db.execute(query)
+    return list(result.scalars().all())
+
+
+async def _get_latest_predictions_ranked(
+    db: AsyncSession, sensor_id: int, parameter: Optional[str] = None
+) -> list[Prediction]:
+    """`_get_latest_predictions` for backends without DISTINCT ON."""
+    ranked = select(
+        Prediction.id,
+        func.row_number()
+        .over(partition_by=Prediction.parameter, order_by=desc(Prediction.created_at))
+        .label("rank"),
+    ).where(Prediction.sensor_id == sensor_id)
+    if parameter is not None:
+        ranked = ranked.where(Prediction.parameter == parameter)
+    ranked = ranked.subquery("ranked")
+
+    query = (
+        select(Prediction)
+        .join(ranked, ranked.c.id == Prediction.id)
+        .where(ranked.c.rank == 1)
+        .order_by(Prediction.parameter)
+    )
+    result = await db.execute(query)
+    return list(result.scalars().all())
+
+
 async def _get_latest_anomaly(
     db: AsyncSession, sensor_id: Optional[int] = None
 ) -> Optional[Anomaly]:
@@ -451,6 +810,48 @@ def health_check() -> dict[str, str]:
     return {"status": "ok"}
 
 
+@app.get("/metrics", include_in_schema=False)
+def get_metrics() -> Response:
+    """Prometheus scrape target; each worker process reports its own numbers."""
+    return Response(db_metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/api/v1/debug/db")
+def get_db_debug() -> dict:
+    """Pool state, per-route statement latency and the slowest statements."""
+    if not DEBUG_ENDPOINTS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return db_metrics.snapshot()
+
+
+@app.get("/api/v1/anomaly/detectors/stats")
+def get_detector_stats() -> dict:
+    """State of this worker's anomaly detectors and their supporting indexes, by component."""
+    return {
+        "streaming": streaming_detectors.stats(),
+        "rate_of_change": rate_of_change_detector.stats(),
+        "forecast_residual": forecast_intervals.stats(),
+        "multivariate": multivariate_detector.stats(),
+        "isolation": isolation_scorer.stats(),
+        "threshold_rules": threshold_rules.stats(),
+        "sensor_health": sensor_health.stats(),
+        "anomaly_episodes": anomaly_episodes.stats(),
+    }
+
+
+@app.get("/api/v1/anomaly/streaming/stats", deprecated=True)
+def get_streaming_detector_stats() -> dict:
+    """Former name of /api/v1/anomaly/detectors/stats, with streaming stats at the top level."""
+    stats = get_detector_stats()
+    return {**stats.pop("streaming"), **stats}
+
+
+@app.get("/api/v1/hot-window/stats")
+def get_hot_window_stats() -> dict:
+    """Size and state of this worker's in-memory window of recent readings."""
+    return hot_window.stats()
+
+
 @app.get("/api/v1/help/faq", response_model=FaqResponse)
 def get_faq() -> FaqResponse:
     return FaqResponse(items=FAQ_ITEMS)
@@ -536,22 +937,131 @@ async def analyze_image(file: UploadFile | None = File(None)):
 
 
 @app.get("/api/v1/sensors", response_model=List[SensorResponse])
-async def list_sensors(db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(Sensor).order_by(Sensor.id))
-    return result.scalars().all()
+async def list_sensors(
+    db: AsyncSession = Depends(get_db),
+    if_none_match: Optional[str] = Header(None, alias="if-none-match"),
+):
+    async def load() -> bytes:
+        result = await db.execute(select(Sensor).order_by(Sensor.id))
+        return _dump_json(_sensor_list_adapter, result.scalars().all())
+
+    return await _cached_json_response(["sensors"], {}, load, if_none_match)
+
+
+@app.get("/api/v1/fleet/snapshot", response_model=List[FleetSensorSnapshot])
+async def get_fleet_snapshot(
+    db: AsyncSession = Depends(get_db),
+    if_none_match: Optional[str] = Header(None, alias="if-none-match"),
+):
+    """Current state of every sensor for the overview page, in a single query."""
+
+    async def load() -> bytes:
+        result = await db.execute(_fleet_snapshot_query(dialect_name(db) == "postgresql"))
+        snapshots = [_format_fleet_snapshot_row(row) for row in result.all()]
+        return _fleet_snapshot_adapter.dump_json(snapshots)
+
+    return await _cached_json_response(FLEET_SNAPSHOT_NAMESPACES, {}, load, if_none_match)
+
+
+@app.get("/api/v1/fleet/health", response_model=List[SensorHealthResponse])
+def get_fleet_health():
+    """Probe, connectivity and battery health of every sensor this worker has seen."""
+    return [SensorHealthResponse.model_validate(report) for report in sensor_health.reports()]
+
+
+@app.get("/api/v1/sensors/{sensor_id}/health", response_model=SensorHealthResponse)
+async def get_sensor_health(sensor_id: int, db: AsyncSession = Depends(get_db)):
+    report = sensor_health.report(sensor_id)
+    if report is not None:
+        return SensorHealthResponse.model_validate(report)
+    if await db.get(Sensor, sensor_id) is None:
+        raise HTTPException(status_code=404, detail="Sensor not found")
+    return SensorHealthResponse(sensor_id=sensor_id, status="unknown")
 
 
 @app.get("/api/v1/sensors/{sensor_id}/readings", response_model=List[ReadingResponse])
 async def get_sensor_readings(sensor_id: int, hours: int = 24, db: AsyncSession = Depends(get_db)):
     start_time = datetime.now(timezone.utc) - timedelta(hours=hours)
-    query = (
-        select(Reading)
-        .where(Reading.sensor_id == sensor_id, Reading.timestamp >= start_time)
-        .order_by(desc(Reading.timestamp))
+    boundary = cold_store.boundary()
+    hot_start = max(start_time, boundary) if boundary else start_time
+    rows = hot_window.window(sensor_id, hot_start)
+    if rows is None:
+        rows = await fetch_reading_rows(db, sensor_id, hot_start, descending=True)
+    if boundary is not None and start_time < boundary and cold_store.available():
+        cold_rows = await asyncio.to_thread(cold_store.read_range, sensor_id, start_time, boundary)
+        rows.extend(reversed(cold_rows))
+    # rows are in READING_COLUMNS order: id, timestamp, ph, ...; ph_level mirrors ph.
+    return json_records_response(
+        READING_RESPONSE_FIELDS, ((*row[1:], row[0], sensor_id, row[2]) for row in rows)
     )
 
-    result = await db.execute(query)
-    return result.scalars().all()
+
+@app.get("/api/v1/parameters", response_model=List[ParameterResponse])
+async def list_parameters(db: AsyncSession = Depends(get_db)):
+    return await parameter_registry.load(db)
+
+
+@app.get(
+    "/api/v1/sensors/{sensor_id}/parameters/{parameter}/readings",
+    response_model=List[ParameterPoint],
+)
+async def get_parameter_readings(
+    sensor_id: int, parameter: str, hours: int = 24, db: AsyncSession = Depends(get_db)
+):
+    """One parameter's series, whether it is a readings column or long-format."""
+    spec = await parameter_registry.get(db, parameter)
+    if spec is None:
+        raise HTTPException(status_code=404, detail="Parameter not found")
+
+    start_time = datetime.now(timezone.utc) - timedelta(hours=hours)
+    series = (await fetch_parameter_columns(db, sensor_id, [spec], start_time))[spec.key]
+    timestamps = series.timestamps.astype("datetime64[us]").tolist()  # naive UTC
+    return json_records_response(
+        ("timestamp", "value"), zip(timestamps, series.values[spec.key].tolist())
+    )
+
+
+@app.get("/api/v1/sensors/{sensor_id}/readings/export")
+async def export_sensor_readings(
+    sensor_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    format: Literal["csv", "parquet"] = "csv",
+    compress: bool = True,
+    db: AsyncSession = Depends(get_db),
+):
+    """Stream a sensor's readings for [start, end) as CSV (gzip) or Parquet."""
+    end = _as_utc(end) if end else datetime.now(timezone.utc)
+    start = _as_utc(start) if start else end - timedelta(days=EXPORT_DEFAULT_WINDOW_DAYS)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+
+    if await db.get(Sensor, sensor_id) is None:
+        raise HTTPException(status_code=404, detail="Sensor not found")
+
+    batches = iter_reading_batches(sensor_id, start, end)
+    filename = f"sensor_{sensor_id}_readings_{start:%Y%m%d}_{end:%Y%m%d}"
+
+    if format == "parquet":
+        if not parquet_available():
+            raise HTTPException(status_code=501, detail="Parquet export requires pyarrow")
+        return StreamingResponse(
+            stream_parquet(batches),
+            media_type="application/vnd.apache.parquet",
+            headers={"Content-Disposition": f'attachment; filename="{filename}.parquet"'},
+        )
+
+    if compress:
+        return StreamingResponse(
+            stream_csv(batches, compress=True),
+            media_type="application/gzip",
+            headers={"Content-Disposition": f'attachment; filename="{filename}.csv.gz"'},
+        )
+    return StreamingResponse(
+        stream_csv(batches, compress=False),
+        media_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="{filename}.csv"'},
+    )
 
 
 @app.post("/api/v1/sensors/ingest")
@@ -578,119 +1088,87 @@ async def ingest_sensor_data(
             await db.commit()
             await db.refresh(db_state)
 
+        present = {key: value for key, value in payload.readings.items() if value is not None}
         anomalies = anomaly_detector.detect_threshold_anomalies(
+            sensor.id, present, payload.timestamp
+        )
+        anomalies += anomaly_detector.detect_stateful_anomalies(
+            sensor.id, present, payload.timestamp
+        )
+        metadata = payload.metadata or {}
+        health = sensor_health.observe(
             sensor.id,
-            {key: value for key, value in payload.readings.items() if value is not None},
-            payload.timestamp,
+            epoch_microseconds(payload.timestamp),
+            {
+                **present,
+                "battery_voltage": metadata.get("battery_voltage"),
+                "signal_strength": metadata.get("signal_strength"),
+            },
         )
+        if health:
+            await ws_manager.publish_update(
+                "sensor_health",
+                {"sensor_id": sensor.id, "status": health.status, "previous": health.previous},
+            )
+        extras = {key: value for key, value in present.items() if key not in MEASUREMENT_COLUMNS}
+        if extras:
+            # Compiled rules already cover registry thresholds; this catches
+            # parameters registered since the last compile.
+            specs = await parameter_registry.resolve(db, extras)
+            uncompiled = {
+                key: spec for key, spec in specs.items() if key not in threshold_rules.rules.index
+            }
+            anomalies += anomaly_detector.detect_registry_anomalies(
+                sensor.id, extras, payload.timestamp, uncompiled
+            )
 
-        alert_triggered = None  # Track if any alert happened to update DB
+        decision = await decide_alerts(
+            db, sensor.id, present, anomalies, sensor_health, anomaly_episodes, alert_sm
+        )
+        anomalies = decision.anomalies
+        anomalies_written = decision.written
 
-        if anomalies:
-            for anom in anomalies:
-                db_anomaly = Anomaly(
-                    sensor_id=anom.sensor_id,
-                    timestamp=anom.timestamp,
-                    parameter=anom.parameter,
-                    value=anom.value,
-                    anomaly_score=anom.anomaly_score,
-                    detection_method=anom.detection_method,
-                )
-                db.add(db_anomaly)
-
-                severity = "critical" if "critical" in (anom.detection_method or "") else "warning"
-                message = f"{anom.parameter.upper()} {severity}: {anom.value:.2f}"
-
-                alert = await alert_sm.process_anomaly(sensor.id, severity, message)
-                if alert:
-                    alert_triggered = alert  # Keep track
-                    db_alert = Alert(
-                        sensor_id=alert.sensor_id,
-                        severity=alert.severity,
-                        previous_state=alert.previous_state,
-                        message=alert.message,
-                    )
-                    db.add(db_alert)
-                    await db.commit()
-                    await db.refresh(db_alert)
-
-                    # Fetch recipients
-                    recipients_result = await db.execute(
-                        select(NotificationRecipient).where(NotificationRecipient.is_active == True)
-                    )
-                    recipients = recipients_result.scalars().all()
-
-                    # Convert DB recipients to Pydantic
-                    pydantic_recipients = [
-                        RecipientBase(
-                            **RecipientResponse.model_validate(r).model_dump(exclude={"id"})
-                        )
-                        for r in recipients
-                    ]
-
-                    # Convert DB alert to Pydantic
-                    pydantic_alert = AlertCreate(
-                        sensor_id=db_alert.sensor_id,
-                        severity=db_alert.severity,
-                        previous_state=db_alert.previous_state,
-                        message=db_alert.message,
-                    )
-
-                    background_tasks.add_task(
-                        notifier.send_notifications, pydantic_alert, pydantic_recipients
-                    )
-
-                    await ws_manager.publish_update(
-                        "alert",
-                        {
-                            "severity": alert.severity,
-                            "message": alert.message,
-                            "sensor_id": sensor.id,
-                        },
-                    )
-        else:
-            # Check for recovery
-            alert = await alert_sm.process_recovery(sensor.id)
-            if alert:
-                alert_triggered = alert  # Keep track
-                db_alert = Alert(
-                    sensor_id=alert.sensor_id,
-                    severity=alert.severity,
-                    previous_state=alert.previous_state,
-                    message=alert.message,
-                )
-                db.add(db_alert)
-                await db.commit()
-                await db.refresh(db_alert)
+        alert_triggered = None  # Track if any alert happened to update DB
+        for alert in decision.alerts:
+            alert_triggered = alert  # Keep track
+            db_alert = Alert(
+                sensor_id=alert.sensor_id,
+                severity=alert.severity,
+                previous_state=alert.previous_state,
+                message=alert.message,
+            )
+            db.add(db_alert)
+            await db.commit()
+            await db.refresh(db_alert)
 
-                # Fetch recipients
-                recipients_result = await db.execute(
-                    select(NotificationRecipient).where(NotificationRecipient.is_active == True)
-                )
-                recipients = recipients_result.scalars().all()
-
-                # Convert DB recipients to Pydantic
-                pydantic_recipients = [
-                    RecipientBase(**RecipientResponse.model_validate(r).model_dump(exclude={"id"}))
-                    for r in recipients
-                ]
-
-                # Convert DB alert to Pydantic
-                pydantic_alert = AlertCreate(
-                    sensor_id=db_alert.sensor_id,
-                    severity=db_alert.severity,
-                    previous_state=db_alert.previous_state,
-                    message=db_alert.message,
-                )
+            # Fetch recipients
+            recipients_result = await db.execute(
+                select(NotificationRecipient).where(NotificationRecipient.is_active == True)
+            )
+            recipients = recipients_result.scalars().all()
+
+            # Convert DB recipients to Pydantic
+            pydantic_recipients = [
+                RecipientBase(**RecipientResponse.model_validate(r).model_dump(exclude={"id"}))
+                for r in recipients
+            ]
+
+            # Convert DB alert to Pydantic
+            pydantic_alert = AlertCreate(
+                sensor_id=db_alert.sensor_id,
+                severity=db_alert.severity,
+                previous_state=db_alert.previous_state,
+                message=db_alert.message,
+            )
 
-                background_tasks.add_task(
-                    notifier.send_notifications, pydantic_alert, pydantic_recipients
-                )
+            background_tasks.add_task(
+                notifier.send_notifications, pydantic_alert, pydantic_recipients
+            )
 
-                await ws_manager.publish_update(
-                    "alert",
-                    {"severity": alert.severity, "message": alert.message, "sensor_id": sensor.id},
-                )
+            await ws_manager.publish_update(
+                "alert",
+                {"severity": alert.severity, "message": alert.message, "sensor_id": sensor.id},
+            )
 
         # 3. Update Alert State in DB if changed
         if alert_triggered:
@@ -706,6 +1184,14 @@ async def ingest_sensor_data(
 
         await db.commit()
 
+        changed_namespaces = []
+        if anomalies_written:
+            changed_namespaces.append("anomalies")
+        if alert_triggered:
+            changed_namespaces.append("alerts")
+        if changed_namespaces:
+            await response_cache.invalidate(*changed_namespaces)
+
         await ws_manager.publish_update("sensor_reading", payload.model_dump(mode="json"))
 
         return {"status": "ingested", "anomalies_detected": len(anomalies)}
@@ -722,88 +1208,97 @@ async def ingest_sensor_data(
 
 
 @app.get("/api/v1/forecast/{sensor_id}", response_model=List[PredictionResponse])
-async def get_forecast(sensor_id: int, db: AsyncSession = Depends(get_db)):
-    # Get latest forecast
-    query = (
-        select(Prediction)
-        .where(Prediction.sensor_id == sensor_id)
-        .order_by(desc(Prediction.created_at))
-        .limit(3)
-    )  # One for each param
+async def get_forecast(
+    sensor_id: int,
+    db: AsyncSession = Depends(get_db),
+    if_none_match: Optional[str] = Header(None, alias="if-none-match"),
+):
+    async def load() -> bytes:
+        predictions = await _get_latest_predictions(db, sensor_id)
+        return fast_dumps(
+            [
+                {
+                    "sensor_id": prediction.sensor_id,
+                    "forecast_start": prediction.forecast_start,
+                    "forecast_end": prediction.forecast_end,
+                    "parameter": prediction.parameter,
+                    "model_version": prediction.model_version,
+                    "forecast_values": prediction.forecast_values,
+                    "id": prediction.id,
+                    "created_at": prediction.created_at,
+                }
+                for prediction in predictions
+            ]
+        )
 
-    result = await db.execute(query)
-    return result.scalars().all()
+    return await _cached_json_response(
+        ["forecast", f"forecast:{sensor_id}"], {}, load, if_none_match
+    )
 
 
-@app.post("/api/v1/forecast", response_model=TimelineForecastResponse)
-async def get_forecast_compatibility(
-    payload: ForecastCompatibilityRequest, db: AsyncSession = Depends(get_db)
-):
-    latest_reading = await _get_latest_reading(db, payload.sensor_id)
-    anomaly_summary = _format_current_sensor_state(latest_reading)
-
-    history_hours = None
-    if latest_reading:
-        history_window_start = datetime.now(timezone.utc) - timedelta(hours=168)
-        earliest_result = await db.execute(
-            select(Reading.timestamp)
-            .where(
-                Reading.sensor_id == payload.sensor_id,
-                Reading.timestamp >= history_window_start,
-            )
-            .order_by(Reading.timestamp)
-            .limit(1)
-        )
-        earliest = earliest_result.scalar_one_or_none()
-        if earliest:
-            history_hours = max(
-                int((latest_reading.timestamp - earliest).total_seconds() / 3600), 1
-            )
+def _forecast_timeline_query(sensor_id: int, now: datetime):
+    """
+    Everything POST /api/v1/forecast needs in one round trip.
 
-    data_window_start = datetime.now(timezone.utc) - timedelta(hours=24)
-    count_result = await db.execute(
+    A one-row anchor carries the 168 h earliest timestamp and the 24 h pH count
+    as scalar subqueries; the latest reading and latest pH prediction are outer
+    joined to it so the row exists even for a sensor without data.
+    """
+    earliest = (
+        select(func.min(Reading.timestamp))
+        .where(Reading.sensor_id == sensor_id, Reading.timestamp >= now - timedelta(hours=168))
+        .scalar_subquery()
+    )
+    recent_ph_count = (
         select(func.count())
         .select_from(Reading)
         .where(
-            Reading.sensor_id == payload.sensor_id,
-            Reading.timestamp >= data_window_start,
+            Reading.sensor_id == sensor_id,
+            Reading.timestamp >= now - timedelta(hours=24),
             Reading.ph.is_not(None),
         )
+        .scalar_subquery()
+    )
+    stats = select(earliest.label("earliest"), recent_ph_count.label("recent_ph_count")).subquery(
+        "stats"
     )
-    recent_ph_count = int(count_result.scalar_one() or 0)
-    if recent_ph_count < 12:
-        warning = "Insufficient data for pH forecast (need 24h of data)"
-        latest_snapshot = (
-            LatestReadingSnapshot(
-                timestamp=latest_reading.timestamp,
-                ph=latest_reading.ph,
-                turbidity=latest_reading.turbidity,
-                temperature=latest_reading.temperature,
-            )
-            if latest_reading
-            else None
-        )
-        return {
-            "forecast": [],
-            "anomaly": anomaly_summary,
-            "latest_reading": latest_snapshot,
-            "history_hours": history_hours,
-            "warning": warning,
-        }
 
-    prediction_query = (
+    latest_reading_sq = (
+        select(Reading)
+        .where(Reading.sensor_id == sensor_id)
+        .order_by(desc(Reading.timestamp))
+        .limit(1)
+        .subquery("latest_reading")
+    )
+    latest_prediction_sq = (
         select(Prediction)
-        .where(Prediction.sensor_id == payload.sensor_id, Prediction.parameter == "ph")
+        .where(Prediction.sensor_id == sensor_id, Prediction.parameter == "ph")
         .order_by(desc(Prediction.created_at))
         .limit(1)
+        .subquery("latest_prediction")
     )
-    result = await db.execute(prediction_query)
-    prediction = result.scalar_one_or_none()
-    data_quality = min(recent_ph_count / 24.0, 1.0)
-    forecast = _format_forecast_points(
-        prediction.forecast_values if prediction else [], data_quality=data_quality
+    latest_reading = aliased(Reading, latest_reading_sq)
+    latest_prediction = aliased(Prediction, latest_prediction_sq)
+
+    return (
+        select(latest_reading, latest_prediction, stats.c.earliest, stats.c.recent_ph_count)
+        .select_from(stats)
+        .outerjoin(latest_reading_sq, true())
+        .outerjoin(latest_prediction_sq, true())
     )
 
+
+def _build_forecast_timeline(
+    sensor_id: int,
+    latest_reading: Optional[Reading],
+    prediction: Optional[Prediction],
+    earliest: Optional[datetime],
+    recent_ph_count: int,
+) -> TimelineForecastResponse:
+    history_hours = None
+    if latest_reading and earliest:
+        history_hours = max(int((latest_reading.timestamp - earliest).total_seconds() / 3600), 1)
+
     latest_snapshot = (
         LatestReadingSnapshot(
             timestamp=latest_reading.timestamp,
@@ -815,13 +1310,47 @@ async def get_forecast_compatibility(
         else None
     )
 
-    return {
-        "forecast": forecast,
-        "anomaly": anomaly_summary,
-        "latest_reading": latest_snapshot,
-        "history_hours": history_hours,
-        "warning": None,
-    }
+    if recent_ph_count < 12:
+        return TimelineForecastResponse(
+            forecast=[],
+            anomaly=_format_current_sensor_state(latest_reading, sensor_id),
+            latest_reading=latest_snapshot,
+            history_hours=history_hours,
+            warning="Insufficient data for pH forecast (need 24h of data)",
+        )
+
+    data_quality = min(recent_ph_count / 24.0, 1.0)
+    return TimelineForecastResponse(
+        forecast=_format_forecast_points(prediction, data_quality=data_quality),
+        anomaly=_format_current_sensor_state(latest_reading, sensor_id),
+        latest_reading=latest_snapshot,
+        history_hours=history_hours,
+        warning=None,
+    )
+
+
+@app.post("/api/v1/forecast", response_model=TimelineForecastResponse)
+async def get_forecast_compatibility(
+    payload: ForecastCompatibilityRequest, db: AsyncSession = Depends(get_db)
+):
+    sensor_id = payload.sensor_id
+
+    async def load() -> bytes:
+        result = await db.execute(_forecast_timeline_query(sensor_id, datetime.now(timezone.utc)))
+        latest_reading, prediction, earliest, recent_ph_count = result.one()
+        timeline = _build_forecast_timeline(
+            sensor_id, latest_reading, prediction, earliest, int(recent_ph_count or 0)
+        )
+        return timeline.model_dump_json().encode()
+
+    # The 24 h count also drifts with the clock, hence the short TTL on top of
+    # invalidation by ingest and forecast generation.
+    return await _cached_json_response(
+        [f"readings:{sensor_id}", "forecast", f"forecast:{sensor_id}"],
+        {"view": "timeline"},
+        load,
+        ttl_seconds=FORECAST_TIMELINE_CACHE_TTL_SECONDS,
+    )
 
 
 @app.post("/api/v1/forecast/generate")
@@ -829,39 +1358,45 @@ async def generate_forecast_endpoint(
     sensor_id: int, _background_tasks: BackgroundTasks, db: AsyncSession = Depends(get_db)
 ):
     """Generate forecast for a sensor."""
-    # 1. Fetch historical data (7 days)
+    # 1. Fetch historical data (7 days), wide columns plus long-format parameters
     start_time = datetime.now(timezone.utc) - timedelta(days=7)
-    query = (
-        select(Reading)
-        .where(Reading.sensor_id == sensor_id, Reading.timestamp >= start_time)
-        .order_by(Reading.timestamp)
+    columns = await fetch_reading_columns(db, sensor_id, start_time)
+    long_specs = [spec for spec in await parameter_registry.load(db) if not spec.is_wide]
+    extra_series = await fetch_parameter_columns(db, sensor_id, long_specs, start_time)
+    series = {
+        parameter: (columns.timestamps, columns.values[parameter])
+        for parameter in MEASUREMENT_COLUMNS
+    }
+    series.update(
+        {key: (extra.timestamps, extra.values[key]) for key, extra in extra_series.items()}
     )
-    result = await db.execute(query)
-    readings = result.scalars().all()
 
-    if not readings:
+    if not any(len(timestamps) for timestamps, _ in series.values()):
         return {"status": "error", "message": "No data found for forecasting"}
 
     # 2. Prepare data for TimeGPT
-    # We need a DataFrame with unique_id, ds, y
-    data = []
-    sensor_str = f"sensor_{sensor_id}"
-    for r in readings:
-        # Flatten parameters
-        if r.ph is not None:
-            data.append({"unique_id": f"{sensor_str}_ph", "ds": r.timestamp, "y": r.ph})
-        if r.turbidity is not None:
-            data.append(
-                {"unique_id": f"{sensor_str}_turbidity", "ds": r.timestamp, "y": r.turbidity}
-            )
-        if r.temperature is not None:
-            data.append(
-                {"unique_id": f"{sensor_str}_temperature", "ds": r.timestamp, "y": r.temperature}
-            )
-
+    # We need a long DataFrame with unique_id, ds, y; nulls are dropped per parameter
     import pandas as pd
 
-    df = pd.DataFrame(data)
+    sensor_str = f"sensor_{sensor_id}"
+    frames = []
+    for parameter, (timestamps, values) in series.items():
+        present = ~np.isnan(values)
+        if present.any():
+            frames.append(
+                pd.DataFrame(
+                    {
+                        "unique_id": f"{sensor_str}_{parameter}",
+                        "ds": pd.to_datetime(timestamps[present], unit="us", utc=True),
+                        "y": values[present],
+                    }
+                )
+            )
+    df = (
+        pd.concat(frames, ignore_index=True)
+        if frames
+        else pd.DataFrame(columns=["unique_id", "ds", "y"])
+    )
 
     # 3. Generate Forecast (Async)
     # We run this in background or await if fast enough. Mock is fast.
@@ -871,70 +1406,101 @@ async def generate_forecast_endpoint(
     # 4. Store Predictions
     count = 0
     for uid, points in forecasts.items():
-        # uid: sensor_1_ph -> parameter: ph
-        parameter = uid.split("_")[-1]
-
-        # Serialize values
-        forecast_values = [p.model_dump(mode="json") for p in points]
+        # uid: sensor_1_dissolved_oxygen -> parameter: dissolved_oxygen
+        parameter = uid.removeprefix(f"{sensor_str}_")
 
         prediction = Prediction(
             sensor_id=sensor_id,
             forecast_start=points[0].timestamp,
             forecast_end=points[-1].timestamp,
             parameter=parameter,
-            forecast_values=forecast_values,
             model_version="timegpt-1",
         )
+        prediction.set_forecast_points(points)
         db.add(prediction)
         count += 1
 
     await db.commit()
+    await response_cache.invalidate(f"forecast:{sensor_id}")
+    # Every worker's forecast interval index picks up the new bands.
+    await forecast_events.publish({"sensor_id": sensor_id})
 
     return {"status": "success", "predictions_generated": count}
 
 
 @app.get("/api/v1/anomaly", response_model=TimelineAnomalySummary)
-async def get_anomaly_summary(sensor_id: Optional[int] = None, db: AsyncSession = Depends(get_db)):
-    anomaly = await _get_latest_anomaly(db, sensor_id)
-    return _format_anomaly_summary(anomaly)
+async def get_anomaly_summary(
+    sensor_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_db),
+    if_none_match: Optional[str] = Header(None, alias="if-none-match"),
+):
+    async def load() -> bytes:
+        anomaly = await _get_latest_anomaly(db, sensor_id)
+        summary = TimelineAnomalySummary.model_validate(_format_anomaly_summary(anomaly))
+        return summary.model_dump_json().encode()
+
+    return await _cached_json_response(["anomalies"], {"sensor_id": sensor_id}, load, if_none_match)
 
 
 @app.get("/api/v1/anomalies", response_model=List[AnomalyResponse])
 async def list_anomalies(
     sensor_id: Optional[int] = None,
     parameter: Optional[str] = None,
-    limit: int = 100,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
     db: AsyncSession = Depends(get_db),
 ):
-    query = select(Anomaly).order_by(desc(Anomaly.timestamp)).limit(limit)
+    query = select(*(getattr(Anomaly, field) for field in ANOMALY_RESPONSE_FIELDS))
     if sensor_id:
         query = query.where(Anomaly.sensor_id == sensor_id)
     if parameter:
         query = query.where(Anomaly.parameter == parameter)
+    query = _keyset_page(query, Anomaly.timestamp, Anomaly.id, limit, start, end, cursor)
 
     result = await db.execute(query)
-    return result.scalars().all()
+    anomalies, next_cursor = page_cursor(list(result.all()), limit, "timestamp")
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+    return json_records_response(ANOMALY_RESPONSE_FIELDS, anomalies, headers=headers)
 
 
 @app.get("/api/v1/alerts", response_model=List[AlertResponse])
 async def list_alerts(
-    severity: Optional[str] = None, limit: int = 50, db: AsyncSession = Depends(get_db)
+    severity: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_db),
+    if_none_match: Optional[str] = Header(None, alias="if-none-match"),
 ):
-    query = select(Alert).order_by(desc(Alert.created_at)).limit(limit)
+    query = select(Alert)
     if severity:
         query = query.where(Alert.severity == severity)
+    query = _keyset_page(query, Alert.created_at, Alert.id, limit, start, end, cursor)
 
-    result = await db.execute(query)
-    return result.scalars().all()
+    async def load() -> bytes:
+        result = await db.execute(query)
+        alerts, next_cursor = page_cursor(list(result.scalars().all()), limit, "created_at")
+        return _pack_page(_dump_json(_alert_list_adapter, alerts), next_cursor)
+
+    params = {"severity": severity, "start": start, "end": end, "cursor": cursor, "limit": limit}
+    return await _cached_json_response(["alerts"], params, load, if_none_match, paged=True)
 
 
 @app.get("/api/v1/settings/{user_id}", response_model=UserSettingsResponse)
 async def get_user_settings(
-    user_id: str = Depends(verify_user_id), db: AsyncSession = Depends(get_db)
+    user_id: str = Depends(verify_user_id),
+    db: AsyncSession = Depends(get_db),
+    if_none_match: Optional[str] = Header(None, alias="if-none-match"),
 ):
-    settings = await _get_or_create_settings(db, user_id, timezone_value="UTC")
-    _ensure_settings_timestamps(settings)
-    return UserSettingsResponse.model_validate(settings)
+    async def load() -> bytes:
+        settings = await _get_or_create_settings(db, user_id, timezone_value="UTC")
+        _ensure_settings_timestamps(settings)
+        return UserSettingsResponse.model_validate(settings).model_dump_json().encode()
+
+    return await _cached_json_response([f"settings:{user_id}"], {}, load, if_none_match)
 
 
 @app.patch("/api/v1/settings/{user_id}", response_model=UserSettingsResponse)
@@ -989,6 +1555,7 @@ async def update_user_settings(
 
     db.add(settings)
     await db.commit()
+    await response_cache.invalidate(f"settings:{user_id}")
     await db.refresh(settings)
     _ensure_settings_timestamps(settings)
     return UserSettingsResponse.model_validate(settings)
@@ -999,15 +1566,21 @@ async def create_recipient(recipient: RecipientCreate, db: AsyncSession = Depend
     db_recipient = NotificationRecipient(**recipient.model_dump())
     db.add(db_recipient)
     await db.commit()
+    await response_cache.invalidate("recipients")
     await db.refresh(db_recipient)
     return RecipientResponse.model_validate(db_recipient)
 
 
 @app.get("/api/v1/recipients", response_model=List[RecipientResponse])
-async def list_recipients(db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(NotificationRecipient).order_by(NotificationRecipient.id))
-    recipients = result.scalars().all()
-    return [RecipientResponse.model_validate(r) for r in recipients]
+async def list_recipients(
+    db: AsyncSession = Depends(get_db),
+    if_none_match: Optional[str] = Header(None, alias="if-none-match"),
+):
+    async def load() -> bytes:
+        result = await db.execute(select(NotificationRecipient).order_by(NotificationRecipient.id))
+        return _dump_json(_recipient_list_adapter, result.scalars().all())
+
+    return await _cached_json_response(["recipients"], {}, load, if_none_match)
 
 
 @app.patch("/api/v1/recipients/{recipient_id}", response_model=RecipientResponse)
@@ -1026,6 +1599,7 @@ async def update_recipient(
 
     db.add(recipient)
     await db.commit()
+    await response_cache.invalidate("recipients")
     await db.refresh(recipient)
     return RecipientResponse.model_validate(recipient)
 
@@ -1041,9 +1615,91 @@ async def delete_recipient(recipient_id: int, db: AsyncSession = Depends(get_db)
 
     await db.delete(recipient)
     await db.commit()
+    await response_cache.invalidate("recipients")
     return {"status": "deleted"}
 
 
+async def _threshold_rules_changed(sensor_id: Optional[int]):
+    """Recompile rules on every worker and drop views derived from them."""
+    await threshold_rule_events.publish({"sensor_id": sensor_id})
+    # Forecast views embed the current anomaly state; "forecast" covers every sensor's.
+    forecasts = "forecast" if sensor_id is None else f"forecast:{sensor_id}"
+    await response_cache.invalidate("sensors", forecasts)
+
+
+async def _get_threshold_rule(db: AsyncSession, rule_id: int) -> ThresholdRule:
+    rule = await db.get(ThresholdRule, rule_id)
+    if not rule:
+        raise HTTPException(status_code=404, detail="Threshold rule not found")
+    return rule
+
+
+@app.get("/api/v1/threshold-rules", response_model=List[ThresholdRuleResponse])
+async def list_threshold_rules(sensor_id: Optional[int] = None, db: AsyncSession = Depends(get_db)):
+    query = select(ThresholdRule).order_by(ThresholdRule.id)
+    if sensor_id is not None:
+        query = query.where(ThresholdRule.sensor_id == sensor_id)
+    result = await db.execute(query)
+    return [ThresholdRuleResponse.model_validate(rule) for rule in result.scalars().all()]
+
+
+@app.post("/api/v1/threshold-rules", response_model=ThresholdRuleResponse, status_code=201)
+async def create_threshold_rule(rule: ThresholdRuleCreate, db: AsyncSession = Depends(get_db)):
+    if rule.sensor_id is not None and not await db.get(Sensor, rule.sensor_id):
+        raise HTTPException(status_code=404, detail="Sensor not found")
+    if await parameter_registry.get(db, rule.parameter) is None:
+        raise HTTPException(status_code=404, detail="Parameter not found")
+
+    # The unique index does not cover fleet-wide rules (NULL sensor_id), so check here.
+    existing = await db.execute(
+        select(ThresholdRule.id).where(
+            ThresholdRule.sensor_id.is_(None)
+            if rule.sensor_id is None
+            else ThresholdRule.sensor_id == rule.sensor_id,
+            ThresholdRule.parameter == rule.parameter,
+        )
+    )
+    if existing.first():
+        raise HTTPException(status_code=409, detail="A rule for this parameter already exists")
+
+    db_rule = ThresholdRule(**rule.model_dump())
+    db.add(db_rule)
+    await db.commit()
+    await db.refresh(db_rule)
+    await _threshold_rules_changed(db_rule.sensor_id)
+    return ThresholdRuleResponse.model_validate(db_rule)
+
+
+@app.put("/api/v1/threshold-rules/{rule_id}", response_model=ThresholdRuleResponse)
+async def update_threshold_rule(
+    rule_id: int, limits: ThresholdLimitsBase, db: AsyncSession = Depends(get_db)
+):
+    """Replace a rule's limits; its sensor and parameter stay fixed."""
+    rule = await _get_threshold_rule(db, rule_id)
+    for key, value in limits.model_dump().items():
+        setattr(rule, key, value)
+    await db.commit()
+    await db.refresh(rule)
+    await _threshold_rules_changed(rule.sensor_id)
+    return ThresholdRuleResponse.model_validate(rule)
+
+
+@app.delete("/api/v1/threshold-rules/{rule_id}")
+async def delete_threshold_rule(rule_id: int, db: AsyncSession = Depends(get_db)):
+    rule = await _get_threshold_rule(db, rule_id)
+    sensor_id = rule.sensor_id
+    await db.delete(rule)
+    await db.commit()
+    await _threshold_rules_changed(sensor_id)
+    return {"status": "deleted"}
+
+
+@app.get("/api/v1/sensors/{sensor_id}/thresholds", response_model=List[EffectiveThreshold])
+def get_sensor_thresholds(sensor_id: int):
+    """Limits this worker currently applies to a sensor, after layering its rules."""
+    return threshold_rules.rules.describe(sensor_id)
+
+
 @app.delete("/api/v1/test-data")
 async def clear_test_data(db: AsyncSession = Depends(get_db)):
     anomalies_stmt = delete(Anomaly).where(
@@ -1059,6 +1715,7 @@ async def clear_test_data(db: AsyncSession = Depends(get_db)):
     anomalies_result = await db.execute(anomalies_stmt)
     alerts_result = await db.execute(alerts_stmt)
     await db.commit()
+    await response_cache.invalidate("anomalies", "alerts")
 
     return {
         "anomalies_deleted": int(getattr(anomalies_result, "rowcount", 0) or 0),
@@ -1079,6 +1736,7 @@ async def acknowledge_alert(
     alert.acknowledged_at = datetime.now(timezone.utc)
     alert.acknowledged_by = username
     await db.commit()
+    await response_cache.invalidate("alerts")
     return {"status": "acknowledged"}
 
 
@@ -0,0 +1,152 @@
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from collections.abc import Awaitable, Callable
+from contextlib import suppress
+from typing import Any, Optional
+
+import redis.asyncio as redis
+
+logger = logging.getLogger(__name__)
+
+EventHandler = Callable[[dict[str, Any]], Any]
+ResetHandler = Callable[[], Awaitable[None] | None]
+
+
+class EventBus:
+    """
+    Fan-out of internal events to every API worker over Redis pub/sub.
+
+    `publish()` runs local handlers immediately and then publishes to Redis,
+    tagged with this process's origin id; the listener skips its own messages so
+    each handler sees an event once. Pub/sub is fire-and-forget: disconnect
+    handlers run as soon as the subscription is lost, so in-memory state that
+    depends on a complete event stream can stop serving, and reset handlers run
+    whenever the subscription is (re)established so that state can rebuild.
+    `publish_reset()` asks every worker to run its reset handlers, e.g. after a
+    bulk write that would be wasteful to send event by event.
+    """
+
+    REDIS_RETRY_SECONDS = 30
+
+    def __init__(self, channel: str, redis_client=None):
+        self.channel = channel
+        self.redis = redis_client
+        self.redis_url = os.getenv("REDIS_URL", "redis://localhost:6379")
+        self.origin = uuid.uuid4().hex
+        self._redis_retry_at = 0.0
+        self._handlers: list[EventHandler] = []
+        self._reset_handlers: list[ResetHandler] = []
+        self._disconnect_handlers: list[ResetHandler] = []
+
+    @property
+    def has_handlers(self) -> bool:
+        return bool(self._handlers)
+
+    def subscribe(self, handler: EventHandler):
+        self._handlers.append(handler)
+
+    def on_reset(self, handler: ResetHandler):
+        self._reset_handlers.append(handler)
+
+    def on_disconnect(self, handler: ResetHandler):
+        self._disconnect_handlers.append(handler)
+
+    async def _dispatch(self, event: dict[str, Any]):
+        for handler in self._handlers:
+            try:
+                result = handler(event)
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as e:
+                logger.error(f"Event handler failed on {self.channel}: {e}")
+
+    async def publish(self, event: dict[str, Any]):
+        await self._dispatch(event)
+        await self._send({"origin": self.origin, "event": event})
+
+    async def publish_reset(self):
+        """Run every worker's reset handlers, this process's included."""
+        await self._reset()
+        await self._send({"origin": self.origin, "reset": True})
+
+    async def _send(self, message: dict[str, Any]):
+        if self.redis is None and time.monotonic() < self._redis_retry_at:
+            return
+        try:
+            if self.redis is None:
+                self.redis = redis.from_url(self.redis_url)
+            await self.redis.publish(self.channel, json.dumps(message))
+        except Exception as e:
+            logger.warning(f"Could not publish to {self.channel}: {e}")
+            self.redis = None
+            self._redis_retry_at = time.monotonic() + self.REDIS_RETRY_SECONDS
+
+    async def _run_hooks(self, handlers: list[ResetHandler], kind: str):
+        for handler in handlers:
+            try:
+                result = handler()
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as e:
+                logger.error(f"{kind} handler failed on {self.channel}: {e}")
+
+    async def _reset(self):
+        await self._run_hooks(self._reset_handlers, "Reset")
+
+    async def handle_message(self, raw: bytes | str):
+        try:
+            message = json.loads(raw)
+        except ValueError:
+            logger.warning(f"Dropping malformed message on {self.channel}")
+            return
+        if message.get("origin") == self.origin:
+            return
+        if message.get("reset"):
+            await self._reset()
+            return
+        await self._dispatch(message.get("event") or {})
+
+    async def listen(self):
+        """Subscribe and dispatch remote events forever, reconnecting with backoff."""
+        retry_delay = 1
+        max_retry_delay = 60
+        client: Optional[redis.Redis] = None
+
+        while True:
+            try:
+                client = redis.from_url(self.redis_url)
+                pubsub = client.pubsub()
+                await pubsub.subscribe(self.channel)
+                logger.info(f"Event bus subscribed to {self.channel}")
+                retry_delay = 1
+                await self._reset()
+
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        await self.handle_message(message["data"])
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(
+                    f"Event bus error on {self.channel}: {e}. Reconnecting in {retry_delay}s..."
+                )
+                # Events published until the next subscribe are lost to this worker.
+                await self._run_hooks(self._disconnect_handlers, "Disconnect")
+                await asyncio.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2, max_retry_delay)
+            finally:
+                if client is not None:
+                    with suppress(Exception):
+                        await client.aclose()
+
+
+reading_events = EventBus("aquamine:readings")
+# {"sensor_id": ...} after a sensor's forecasts were regenerated.
+forecast_events = EventBus("aquamine:forecasts")
+# Any edit of threshold_rules; workers recompile their rule set.
+threshold_rule_events = EventBus("aquamine:threshold-rules")
@@ -59,10 +59,7 @@ class ConnectionManager:
                 retry_delay = min(retry_delay * 2, max_retry_delay)
 
     async def publish_update(self, type: str, data: Dict):
-        """Publish update to Redis."""
-        if not self.redis:
-            self.redis = redis.from_url(self.redis_url)
-
+        """Publish update to Redis, or straight to local clients when it is unreachable."""
         message = json.dumps(
             {
                 "type": type,
@@ -70,7 +67,15 @@ class ConnectionManager:
                 "data": data,
             }
         )
-        await self.redis.publish("aquamine:updates", message)
+        try:
+            if not self.redis:
+                self.redis = redis.from_url(self.redis_url)
+            await self.redis.publish("aquamine:updates", message)
+        except Exception as e:
+            # Single-process deployments (edge nodes) may run without Redis.
+            logger.warning(f"Redis publish failed: {e}. Broadcasting locally.")
+            self.redis = None
+            await self.broadcast(message)
 
 
 manager = ConnectionManager()
@@ -41,6 +41,10 @@ class AnomalyCreate(AnomalyBase):
 class AnomalyResponse(AnomalyBase):
     id: int
     created_at: datetime
+    # Episode extent: last sample, value furthest from the first, samples so far.
+    end_timestamp: Optional[datetime] = None
+    peak_value: Optional[float] = None
+    sample_count: int = 1
 
     model_config = ConfigDict(from_attributes=True)
 
@@ -0,0 +1,36 @@
+from datetime import datetime
+from typing import Optional
+
+from .base import BaseSchema
+
+
+class FleetLatestReading(BaseSchema):
+    timestamp: datetime
+    ph: Optional[float] = None
+    turbidity: Optional[float] = None
+    temperature: Optional[float] = None
+    battery_voltage: Optional[float] = None
+    signal_strength: Optional[int] = None
+
+
+class FleetLastAnomaly(BaseSchema):
+    timestamp: datetime
+    parameter: str
+    value: float
+    anomaly_score: Optional[float] = None
+    detection_method: Optional[str] = None
+
+
+class FleetSensorSnapshot(BaseSchema):
+    id: int
+    sensor_id: str
+    name: str
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    is_active: bool
+    severity: str  # unknown, normal, warning, critical
+    severity_score: float
+    severity_reason: str
+    active_alerts: int
+    latest_reading: Optional[FleetLatestReading] = None
+    last_anomaly: Optional[FleetLastAnomaly] = None
@@ -0,0 +1,29 @@
+from datetime import datetime
+from typing import List, Literal, Optional
+
+from pydantic import ConfigDict
+
+from .base import BaseSchema
+
+
+class HealthIssueResponse(BaseSchema):
+    code: str  # flatline, stuck, erratic, offline, dropout, battery_low, battery_decay, weak_signal
+    severity: Literal["degraded", "faulty"]
+    detail: str
+    parameter: Optional[str] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class SensorHealthResponse(BaseSchema):
+    sensor_id: int
+    status: Literal["unknown", "ok", "degraded", "faulty", "offline"]
+    issues: List[HealthIssueResponse] = []
+    last_seen: Optional[datetime] = None
+    expected_interval_seconds: Optional[float] = None
+    battery_voltage: Optional[float] = None
+    battery_slope_per_day: Optional[float] = None
+    days_to_battery_cutoff: Optional[float] = None
+    signal_strength: Optional[float] = None
+
+    model_config = ConfigDict(from_attributes=True)
@@ -0,0 +1,24 @@
+from datetime import datetime
+from typing import Optional
+
+from pydantic import ConfigDict
+
+from .base import BaseSchema
+
+
+class ParameterResponse(BaseSchema):
+    key: str
+    name: str
+    unit: Optional[str] = None
+    column: Optional[str] = None
+    warning_low: Optional[float] = None
+    critical_low: Optional[float] = None
+    warning_high: Optional[float] = None
+    critical_high: Optional[float] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class ParameterPoint(BaseSchema):
+    timestamp: datetime
+    value: float
@@ -0,0 +1,53 @@
+from datetime import datetime
+from typing import Literal, Optional
+
+from pydantic import ConfigDict, Field, model_validator
+
+from .base import BaseSchema
+
+THRESHOLD_SIDES = ("critical_low", "warning_low", "warning_high", "critical_high")
+
+
+class ThresholdLimitsBase(BaseSchema):
+    warning_low: Optional[float] = None
+    critical_low: Optional[float] = None
+    warning_high: Optional[float] = None
+    critical_high: Optional[float] = None
+    alert_low: bool = True
+    alert_high: bool = True
+
+    @model_validator(mode="after")
+    def check_order(self):
+        bounds = [getattr(self, side) for side in THRESHOLD_SIDES]
+        present = [bound for bound in bounds if bound is not None]
+        if not present:
+            raise ValueError("a rule needs at least one threshold")
+        if present != sorted(present):
+            raise ValueError(
+                "thresholds must be ordered critical_low, warning_low, warning_high, critical_high"
+            )
+        return self
+
+
+class ThresholdRuleCreate(ThresholdLimitsBase):
+    # None applies the rule to every sensor without a rule of its own.
+    sensor_id: Optional[int] = None
+    parameter: str = Field(pattern=r"^[a-z][a-z0-9_]{0,19}$")
+
+
+class ThresholdRuleResponse(ThresholdRuleCreate):
+    id: int
+    updated_at: Optional[datetime] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class EffectiveThreshold(BaseSchema):
+    parameter: str
+    warning_low: Optional[float] = None
+    critical_low: Optional[float] = None
+    warning_high: Optional[float] = None
+    critical_high: Optional[float] = None
+    alert_low: bool
+    alert_high: bool
+    source: Literal["default", "fleet", "sensor"]
@@ -0,0 +1,111 @@
+"""
+Replay stored readings through candidate detector and alerting configurations.
+
+Usage:
+    python -m ai.scripts.backtest --start 2024-01-01 --end 2024-04-01 \\
+        [--sensor 1 --sensor 2] [--configs configs.json] [--events events.json] \\
+        [--workers 8] [--output report.json]
+
+`configs.json` is a list of `BacktestConfig` fields, e.g.
+
+    [{"name": "current"},
+     {"name": "tight turbidity", "cooldown_minutes": 15,
+      "rules": [{"parameter": "turbidity", "warning_high": 30, "critical_high": 80}]}]
+
+and `events.json` a list of known incidents to measure lead time against:
+
+    [{"sensor_id": 1, "timestamp": "2024-02-11T06:00:00Z", "label": "AMD seep"}]
+
+Only reads the database; see `ai.anomaly.backtest`.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+from datetime import datetime, timezone
+
+# Add parent dir to path to import ai modules
+sys.path.append(os.path.join(os.path.dirname(__file__), "../.."))
+
+from ai.anomaly.backtest import (
+    BACKTEST_WORKERS,
+    BacktestConfig,
+    ConfigReport,
+    KnownEvent,
+    run_backtest,
+)
+
+
+def _timestamp(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def load_configs(path: str | None) -> list[BacktestConfig]:
+    if path is None:
+        return [BacktestConfig("current")]
+    with open(path) as f:
+        return [BacktestConfig.from_dict(fields) for fields in json.load(f)]
+
+
+def load_events(path: str | None) -> list[KnownEvent]:
+    if path is None:
+        return []
+    with open(path) as f:
+        return [
+            KnownEvent(event["sensor_id"], _timestamp(event["timestamp"]), event.get("label", ""))
+            for event in json.load(f)
+        ]
+
+
+def print_report(report: ConfigReport) -> None:
+    summary = report.to_dict()
+    print(f"\n{summary['name']}")
+    print(f"  Readings:      {summary['readings']} from {summary['sensors']} sensor(s)")
+    print(f"  Anomalies:     {summary['anomalies']}")
+    for method, count in sorted(summary["anomalies_by_method"].items()):
+        print(f"    {method:<20} {count}")
+    print(f"  Alerts:        {summary['alerts']} ({summary['alerts_by_severity']})")
+    print(f"  Notifications: {summary['notifications']}")
+    for event in summary["events"]:
+        lead = event["alert_lead_minutes"]
+        caught = "missed" if lead is None else f"alert {lead:+.0f} min"
+        label = event["label"] or event["timestamp"]
+        print(f"  Event {label} (sensor {event['sensor_id']}): {caught}")
+
+
+async def backtest(args: argparse.Namespace) -> None:
+    reports = await run_backtest(
+        _timestamp(args.start),
+        _timestamp(args.end),
+        load_configs(args.configs),
+        sensor_ids=args.sensor or None,
+        events=load_events(args.events),
+        workers=args.workers,
+    )
+    for report in reports:
+        print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump([report.to_dict() for report in reports], f, indent=2)
+        print(f"\n✓ Report written to {args.output}")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Backtest anomaly and alert configurations")
+    parser.add_argument("--start", required=True, help="Start of the range (ISO 8601, UTC)")
+    parser.add_argument("--end", required=True, help="End of the range, exclusive")
+    parser.add_argument(
+        "--sensor", type=int, action="append", help="Sensor id to replay (repeatable; default all)"
+    )
+    parser.add_argument("--configs", help="JSON list of configurations (default: current)")
+    parser.add_argument("--events", help="JSON list of known events for lead times")
+    parser.add_argument("--workers", type=int, default=BACKTEST_WORKERS, help="Worker processes")
+    parser.add_argument("--output", help="Write the full report as JSON")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(backtest(parse_args()))
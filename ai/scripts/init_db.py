@@ -5,11 +5,13 @@ import asyncio
 import sys
 import os
 
-# Add parent directory to path
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from sqlalchemy import text
 
-from db.connection import engine, Base
-from db.models import (
+# Add parent dir to path to import ai modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../.."))
+
+from ai.db.connection import engine, Base
+from ai.db.models import (
     Sensor,
     Reading,
     Prediction,
@@ -18,7 +20,87 @@ from db.models import (
     NotificationRecipient,
     UserSettings,
     SensorAlertState,
+    Parameter,
+    ReadingValue,
+    ThresholdRule,
 )
+from ai.db.parameters import DEFAULT_PARAMETERS
+
+# create_all() only creates missing tables; columns added to existing tables
+# are applied here so older deployments pick them up on the next start.
+POSTGRES_UPGRADE_STATEMENTS = [
+    # Columnar forecast points replace the JSON list-of-dicts forecast_values column.
+    "ALTER TABLE predictions ADD COLUMN IF NOT EXISTS point_timestamps TIMESTAMPTZ[]",
+    "ALTER TABLE predictions ADD COLUMN IF NOT EXISTS point_values DOUBLE PRECISION[]",
+    "ALTER TABLE predictions ADD COLUMN IF NOT EXISTS point_lower DOUBLE PRECISION[]",
+    "ALTER TABLE predictions ADD COLUMN IF NOT EXISTS point_upper DOUBLE PRECISION[]",
+    "ALTER TABLE predictions ALTER COLUMN forecast_values DROP NOT NULL",
+    """
+    UPDATE predictions SET
+        point_timestamps = ARRAY(
+            SELECT (p.value->>'timestamp')::timestamptz
+            FROM json_array_elements(forecast_values) WITH ORDINALITY AS p(value, idx)
+            ORDER BY p.idx
+        ),
+        point_values = ARRAY(
+            SELECT (p.value->>'value')::double precision
+            FROM json_array_elements(forecast_values) WITH ORDINALITY AS p(value, idx)
+            ORDER BY p.idx
+        ),
+        point_lower = ARRAY(
+            SELECT (p.value->>'lower')::double precision
+            FROM json_array_elements(forecast_values) WITH ORDINALITY AS p(value, idx)
+            ORDER BY p.idx
+        ),
+        point_upper = ARRAY(
+            SELECT (p.value->>'upper')::double precision
+            FROM json_array_elements(forecast_values) WITH ORDINALITY AS p(value, idx)
+            ORDER BY p.idx
+        ),
+        forecast_values = NULL
+    WHERE point_values IS NULL AND forecast_values IS NOT NULL
+    """,
+    # Point columns were REAL[] at first. Going through numeric keeps the
+    # shortest decimal form, so a stored 7.1 becomes 7.1 and not 7.099999904632568.
+    """
+    DO $$
+    DECLARE
+        col text;
+    BEGIN
+        FOREACH col IN ARRAY ARRAY['point_values', 'point_lower', 'point_upper'] LOOP
+            IF EXISTS (
+                SELECT 1 FROM information_schema.columns
+                WHERE table_name = 'predictions' AND column_name = col AND udt_name = '_float4'
+            ) THEN
+                EXECUTE 'ALTER TABLE predictions ALTER COLUMN ' || quote_ident(col)
+                    || ' TYPE DOUBLE PRECISION[] USING '
+                    || quote_ident(col) || '::numeric[]::double precision[]';
+            END IF;
+        END LOOP;
+    END $$
+    """,
+    (
+        "CREATE INDEX IF NOT EXISTS ix_predictions_sensor_parameter_created "
+        "ON predictions (sensor_id, parameter, created_at DESC)"
+    ),
+    # Keyset pagination indexes for alert and anomaly history.
+    "CREATE INDEX IF NOT EXISTS ix_anomalies_timestamp_id ON anomalies (timestamp DESC, id DESC)",
+    (
+        "CREATE INDEX IF NOT EXISTS ix_anomalies_sensor_timestamp_id "
+        "ON anomalies (sensor_id, timestamp DESC, id DESC)"
+    ),
+    "CREATE INDEX IF NOT EXISTS ix_alerts_created_id ON alerts (created_at DESC, id DESC)",
+    # Anomaly rows became episodes; earlier rows are single-sample episodes.
+    "ALTER TABLE anomalies ADD COLUMN IF NOT EXISTS end_timestamp TIMESTAMPTZ",
+    "ALTER TABLE anomalies ADD COLUMN IF NOT EXISTS peak_value DOUBLE PRECISION",
+    "ALTER TABLE anomalies ADD COLUMN IF NOT EXISTS sample_count INTEGER NOT NULL DEFAULT 1",
+    (
+        "UPDATE anomalies SET end_timestamp = timestamp, peak_value = value "
+        "WHERE end_timestamp IS NULL"
+    ),
+    "ALTER TABLE anomalies ADD COLUMN IF NOT EXISTS closed BOOLEAN NOT NULL DEFAULT TRUE",
+    "CREATE INDEX IF NOT EXISTS ix_anomalies_open ON anomalies (sensor_id) WHERE NOT closed",
+]
 
 _ = (
     Sensor,
@@ -29,9 +111,24 @@ _ = (
     NotificationRecipient,
     UserSettings,
     SensorAlertState,
+    Parameter,
+    ReadingValue,
+    ThresholdRule,
 )
 
 
+async def upgrade_schema():
+    """Bring tables created by older releases up to the current layout."""
+    if engine.dialect.name != "postgresql":
+        return
+
+    async with engine.begin() as conn:
+        for statement in POSTGRES_UPGRADE_STATEMENTS:
+            await conn.execute(text(statement))
+
+    print("✓ Schema upgraded")
+
+
 async def init_db():
     """Create all tables and seed initial data."""
     print("Creating database tables...")
@@ -42,6 +139,8 @@ async def init_db():
 
     print("✓ Tables created successfully")
 
+    await upgrade_schema()
+
     # Seed notification recipients
     print("Seeding notification recipients...")
     from sqlalchemy.ext.asyncio import AsyncSession
@@ -68,6 +167,26 @@ async def init_db():
         else:
             print("✓ Notification recipients already exist")
 
+        # Seed the parameter registry; existing rows (and their edited thresholds) win.
+        result = await session.execute(select(Parameter.key))
+        known = set(result.scalars().all())
+        new_parameters = [spec for spec in DEFAULT_PARAMETERS if spec.key not in known]
+        for spec in new_parameters:
+            session.add(
+                Parameter(
+                    key=spec.key,
+                    name=spec.name,
+                    unit=spec.unit,
+                    column=spec.column,
+                    warning_low=spec.warning_low,
+                    critical_low=spec.critical_low,
+                    warning_high=spec.warning_high,
+                    critical_high=spec.critical_high,
+                )
+            )
+        await session.commit()
+        print(f"✓ Parameter registry seeded ({len(new_parameters)} new)")
+
     print("\n✅ Database initialization complete!")
     print("\nNext steps:")
     print("1. Start the API: docker compose up api")
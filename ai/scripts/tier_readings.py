@@ -0,0 +1,225 @@
+"""
+Move readings older than N months from the database into cold Parquet storage.
+
+Usage:
+    python -m ai.scripts.tier_readings --older-than-months 12 [--dry-run]
+
+Each sensor's old readings are streamed month by month into
+`COLD_STORAGE_DIR/sensor_id=<id>/month=<YYYY-MM>/readings.parquet`, and its
+long-format `reading_values` into `values.parquet` beside it. The manifest
+boundary is advanced only once every partition is on disk, and the database
+then drops exactly the rows found in those partitions, so an interrupted run
+never loses data and can simply be repeated. Rows before the cutoff written
+while the job runs (a new sensor, a backfill, a resend) stay in the database
+until the next run archives them. Run it well inside the hypertables' 2 year
+retention policy.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+from datetime import datetime, timezone
+
+from sqlalchemy import delete, func, select, text, tuple_, union
+
+# Add parent dir to path to import ai modules
+sys.path.append(os.path.join(os.path.dirname(__file__), "../.."))
+
+from ai.db.connection import AsyncSessionLocal, engine
+from ai.db.models import Reading, ReadingValue
+from ai.storage.cold_store import (
+    COLD_COLUMNS,
+    COLD_VALUE_COLUMNS,
+    ColdReadingStore,
+    month_start,
+    months_ago,
+    next_month,
+)
+
+DEFAULT_TIER_MONTHS = int(os.getenv("COLD_TIER_MONTHS", "12"))
+TIER_BATCH_SIZE = 10000
+
+
+async def _archive(query, write) -> tuple[int, list[datetime]]:
+    """Stream `query` (timestamp-ordered) into month partitions via `write(month, rows)`."""
+    archived = 0
+    months: list[datetime] = []
+    pending: list[tuple] = []
+    async with AsyncSessionLocal() as session:
+        result = await session.stream(query)
+        async for partition in result.partitions(TIER_BATCH_SIZE):
+            for row in partition:
+                row_month = month_start(row.timestamp)
+                if months and row_month != months[-1]:
+                    await asyncio.to_thread(write, months[-1], pending)
+                    archived += len(pending)
+                    pending = []
+                if not months or row_month != months[-1]:
+                    months.append(row_month)
+                pending.append(tuple(row))
+
+    if pending:
+        await asyncio.to_thread(write, months[-1], pending)
+        archived += len(pending)
+    return archived, months
+
+
+async def archive_sensor(
+    store: ColdReadingStore, sensor_id: int, cutoff: datetime
+) -> tuple[int, list[datetime]]:
+    """Write one sensor's readings before `cutoff` to its month partitions."""
+    query = (
+        select(*(getattr(Reading, column) for column in COLD_COLUMNS))
+        .where(Reading.sensor_id == sensor_id, Reading.timestamp < cutoff)
+        .order_by(Reading.timestamp)
+        .execution_options(yield_per=TIER_BATCH_SIZE)
+    )
+    return await _archive(query, lambda month, rows: store.write_partition(sensor_id, month, rows))
+
+
+async def archive_sensor_values(
+    store: ColdReadingStore, sensor_id: int, cutoff: datetime
+) -> tuple[int, list[datetime]]:
+    """Write one sensor's long-format values before `cutoff` to its month partitions."""
+    query = (
+        select(*(getattr(ReadingValue, column) for column in COLD_VALUE_COLUMNS))
+        .where(ReadingValue.sensor_id == sensor_id, ReadingValue.timestamp < cutoff)
+        .order_by(ReadingValue.timestamp)
+        .execution_options(yield_per=TIER_BATCH_SIZE)
+    )
+    return await _archive(
+        query, lambda month, rows: store.write_value_partition(sensor_id, month, rows)
+    )
+
+
+async def drop_archived(
+    store: ColdReadingStore,
+    cutoff: datetime,
+    reading_months: dict[int, list[datetime]],
+    value_months: dict[int, list[datetime]],
+) -> int:
+    """
+    Delete the rows found in the cold partitions, one sensor-month per
+    transaction; returns how many rows before `cutoff` are left unarchived.
+    """
+    for sensor_id, months in reading_months.items():
+        for month in months:
+            ids = await asyncio.to_thread(store.archived_ids, sensor_id, month)
+            for offset in range(0, len(ids), TIER_BATCH_SIZE):
+                async with engine.begin() as conn:
+                    await conn.execute(
+                        delete(Reading).where(
+                            Reading.sensor_id == sensor_id,
+                            *_month_range(Reading.timestamp, month, cutoff),
+                            Reading.id.in_(ids[offset : offset + TIER_BATCH_SIZE]),
+                        )
+                    )
+    for sensor_id, months in value_months.items():
+        for month in months:
+            keys = await asyncio.to_thread(store.archived_value_keys, sensor_id, month)
+            for offset in range(0, len(keys), TIER_BATCH_SIZE):
+                async with engine.begin() as conn:
+                    await conn.execute(
+                        delete(ReadingValue).where(
+                            ReadingValue.sensor_id == sensor_id,
+                            *_month_range(ReadingValue.timestamp, month, cutoff),
+                            tuple_(ReadingValue.parameter_id, ReadingValue.timestamp).in_(
+                                keys[offset : offset + TIER_BATCH_SIZE]
+                            ),
+                        )
+                    )
+
+    left = 0
+    for model in (Reading, ReadingValue):
+        left += await _drop_empty_chunks(model, cutoff)
+    return left
+
+
+def _month_range(column, month: datetime, cutoff: datetime):
+    # Lets the planner skip every chunk outside the partition's month.
+    return column >= month, column < min(next_month(month), cutoff)
+
+
+async def _drop_empty_chunks(model, cutoff: datetime) -> int:
+    """
+    Drop the hypertable's chunks before `cutoff` once no row is left in them;
+    returns how many rows remain there.
+    """
+    table = model.__tablename__
+    async with engine.begin() as conn:
+        has_timescale = False
+        if conn.dialect.name == "postgresql":
+            has_timescale = await conn.scalar(
+                text("SELECT 1 FROM pg_extension WHERE extname = 'timescaledb'")
+            )
+        if has_timescale:
+            # Blocks inserts until the commit, so no row can land between the check and the drop.
+            await conn.execute(text(f"LOCK TABLE {table} IN SHARE MODE"))
+        left = await conn.scalar(
+            select(func.count()).select_from(model).where(model.timestamp < cutoff)
+        )
+        if has_timescale and not left:
+            await conn.execute(
+                text(f"SELECT drop_chunks('{table}', older_than => :cutoff)"),
+                {"cutoff": cutoff},
+            )
+        return left
+
+
+async def tier_readings(older_than_months: int, dry_run: bool = False) -> None:
+    store = ColdReadingStore()
+    if not store.available():
+        raise SystemExit("Cold storage requires pyarrow")
+
+    cutoff = months_ago(datetime.now(timezone.utc), older_than_months)
+    print(f"Tiering readings before {cutoff.isoformat()} into {store.root}")
+
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            union(
+                select(Reading.sensor_id).where(Reading.timestamp < cutoff),
+                select(ReadingValue.sensor_id).where(ReadingValue.timestamp < cutoff),
+            )
+        )
+        sensor_ids = sorted(result.scalars().all())
+
+    if dry_run:
+        print(f"Would archive readings for {len(sensor_ids)} sensor(s)")
+        return
+
+    total = 0
+    reading_months: dict[int, list[datetime]] = {}
+    value_months: dict[int, list[datetime]] = {}
+    for sensor_id in sensor_ids:
+        archived, reading_months[sensor_id] = await archive_sensor(store, sensor_id, cutoff)
+        values, value_months[sensor_id] = await archive_sensor_values(store, sensor_id, cutoff)
+        total += archived + values
+        print(f"✓ Sensor {sensor_id}: archived {archived} readings and {values} values")
+
+    store.set_boundary(cutoff)
+    print(f"✓ Cold storage boundary set to {cutoff.isoformat()}")
+
+    left = await drop_archived(store, cutoff, reading_months, value_months)
+    if left:
+        print(f"⚠ {left} rows before the cutoff arrived during the run; rerun to archive them")
+    print(f"\n✅ Tiered {total} rows from {len(sensor_ids)} sensor(s)")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Tier old readings into cold Parquet storage")
+    parser.add_argument(
+        "--older-than-months",
+        type=int,
+        default=DEFAULT_TIER_MONTHS,
+        help="Archive whole months older than this many months",
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true", help="Report what would be archived and exit"
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    asyncio.run(tier_readings(args.older_than_months, args.dry_run))
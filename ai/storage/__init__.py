@@ -0,0 +1,3 @@
+from .cold_store import ColdReadingStore, cold_store
+
+__all__ = ["ColdReadingStore", "cold_store"]
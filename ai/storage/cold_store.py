@@ -0,0 +1,241 @@
+import asyncio
+import importlib
+import json
+import logging
+import os
+import tempfile
+from collections.abc import AsyncIterator, Iterable, Sequence
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Optional
+
+try:
+    pa: Any = importlib.import_module("pyarrow")
+    pq: Any = importlib.import_module("pyarrow.parquet")
+except ModuleNotFoundError:
+    pa = None
+    pq = None
+
+logger = logging.getLogger(__name__)
+
+COLD_COLUMNS = (
+    "id",
+    "timestamp",
+    "ph",
+    "turbidity",
+    "temperature",
+    "battery_voltage",
+    "signal_strength",
+)
+# Long-format `reading_values` rows, archived next to the sensor-month's readings.
+COLD_VALUE_COLUMNS = ("parameter_id", "timestamp", "value")
+COLD_STORAGE_DIR = os.getenv("COLD_STORAGE_DIR", "data/cold_readings")
+
+
+def month_start(value: datetime) -> datetime:
+    value = value.astimezone(timezone.utc)
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_month(value: datetime) -> datetime:
+    if value.month == 12:
+        return value.replace(year=value.year + 1, month=1)
+    return value.replace(month=value.month + 1)
+
+
+def months_ago(value: datetime, months: int) -> datetime:
+    """Start of the calendar month `months` months before `value`'s month."""
+    start = month_start(value)
+    index = start.year * 12 + (start.month - 1) - months
+    return start.replace(year=index // 12, month=index % 12 + 1)
+
+
+def _cold_schema() -> Any:
+    return pa.schema(
+        [
+            ("id", pa.int64()),
+            ("timestamp", pa.timestamp("us", tz="UTC")),
+            ("ph", pa.float64()),
+            ("turbidity", pa.float64()),
+            ("temperature", pa.float64()),
+            ("battery_voltage", pa.float64()),
+            ("signal_strength", pa.int32()),
+        ]
+    )
+
+
+def _cold_value_schema() -> Any:
+    return pa.schema(
+        [
+            ("parameter_id", pa.int64()),
+            ("timestamp", pa.timestamp("us", tz="UTC")),
+            ("value", pa.float64()),
+        ]
+    )
+
+
+class ColdReadingStore:
+    """
+    Parquet archive of readings that have been tiered out of the database.
+
+    Files are partitioned hive-style as `sensor_id=<id>/month=<YYYY-MM>/readings.parquet`,
+    with the month's long-format values in `values.parquet` beside it.
+    `_manifest.json` records the tiering boundary: readings older than it live
+    here, newer ones in the database, so a query window is split at the boundary
+    and never reads a row from both tiers.
+    """
+
+    MANIFEST_NAME = "_manifest.json"
+    PARTITION_FILE = "readings.parquet"
+    VALUES_FILE = "values.parquet"
+
+    def __init__(self, root: Optional[str | Path] = None):
+        self.root = Path(root or COLD_STORAGE_DIR)
+
+    def available(self) -> bool:
+        return pq is not None
+
+    def boundary(self) -> Optional[datetime]:
+        """Readings strictly before this instant have been moved to cold storage."""
+        try:
+            manifest = json.loads((self.root / self.MANIFEST_NAME).read_text())
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Unreadable cold storage manifest: {e}")
+            return None
+        boundary = manifest.get("boundary")
+        return datetime.fromisoformat(boundary) if boundary else None
+
+    def set_boundary(self, boundary: datetime):
+        current = self.boundary()
+        if current is not None and current >= boundary:
+            return
+        self.root.mkdir(parents=True, exist_ok=True)
+        payload = {"boundary": boundary.astimezone(timezone.utc).isoformat()}
+        self._atomic_write(self.root / self.MANIFEST_NAME, json.dumps(payload).encode())
+
+    def partition_path(self, sensor_id: int, month: datetime, name: Optional[str] = None) -> Path:
+        return (
+            self.root
+            / f"sensor_id={sensor_id}"
+            / f"month={month_start(month):%Y-%m}"
+            / (name or self.PARTITION_FILE)
+        )
+
+    def write_partition(self, sensor_id: int, month: datetime, rows: Iterable[Sequence[Any]]):
+        """
+        Merge rows (in COLD_COLUMNS order) into a sensor-month partition.
+
+        Re-running a tiering job is safe: rows already archived are deduplicated on
+        (timestamp, id) and the file is replaced atomically.
+        """
+        self._merge(self.partition_path(sensor_id, month), COLD_COLUMNS, _cold_schema, rows)
+
+    def write_value_partition(self, sensor_id: int, month: datetime, rows: Iterable[Sequence[Any]]):
+        """Merge long-format rows (in COLD_VALUE_COLUMNS order); deduplicated like readings."""
+        path = self.partition_path(sensor_id, month, self.VALUES_FILE)
+        self._merge(path, COLD_VALUE_COLUMNS, _cold_value_schema, rows)
+
+    def archived_ids(self, sensor_id: int, month: datetime) -> list[int]:
+        """Ids of the readings archived in a sensor-month partition."""
+        path = self.partition_path(sensor_id, month)
+        return [row[0] for row in self._read_rows(path)] if path.exists() else []
+
+    def archived_value_keys(self, sensor_id: int, month: datetime) -> list[tuple[int, datetime]]:
+        """(parameter_id, timestamp) of the long-format values archived for a sensor-month."""
+        path = self.partition_path(sensor_id, month, self.VALUES_FILE)
+        if not path.exists():
+            return []
+        return [row[:2] for row in self._read_rows(path, columns=COLD_VALUE_COLUMNS)]
+
+    def _merge(
+        self, path: Path, column_names: Sequence[str], schema_of, rows: Iterable[Sequence[Any]]
+    ):
+        # Rows lead with their key column, then the timestamp.
+        if pq is None:
+            raise RuntimeError("Cold storage requires pyarrow")
+
+        merged: dict[tuple[datetime, int], tuple] = {}
+        if path.exists():
+            for row in self._read_rows(path, columns=column_names):
+                merged[(row[1], row[0])] = row
+        for row in rows:
+            merged[(row[1], row[0])] = tuple(row)
+
+        ordered = [merged[key] for key in sorted(merged)]
+        schema = schema_of()
+        columns = list(zip(*ordered)) if ordered else [()] * len(schema)
+        table = pa.Table.from_arrays(
+            [pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+            schema=schema,
+        )
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        os.close(fd)
+        try:
+            pq.write_table(table, tmp_name, compression="zstd")
+            os.replace(tmp_name, path)
+        finally:
+            if os.path.exists(tmp_name):
+                os.unlink(tmp_name)
+
+    def _read_rows(
+        self,
+        path: Path,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        columns: Sequence[str] = COLD_COLUMNS,
+    ) -> list[tuple]:
+        filters = []
+        if start is not None:
+            filters.append(("timestamp", ">=", start))
+        if end is not None:
+            filters.append(("timestamp", "<", end))
+        table = pq.read_table(path, columns=list(columns), filters=filters or None)
+        table = table.sort_by([("timestamp", "ascending"), (columns[0], "ascending")])
+        return list(zip(*(column.to_pylist() for column in table.columns)))
+
+    def read_range(self, sensor_id: int, start: datetime, end: datetime) -> list[tuple]:
+        """All archived rows for [start, end) in timestamp order."""
+        rows: list[tuple] = []
+        month = month_start(start)
+        while month < end:
+            path = self.partition_path(sensor_id, month)
+            if path.exists():
+                rows.extend(self._read_rows(path, start, end))
+            month = next_month(month)
+        return rows
+
+    async def iter_batches(
+        self, sensor_id: int, start: datetime, end: datetime, batch_size: int
+    ) -> AsyncIterator[list[tuple]]:
+        """Yield archived rows for [start, end), one month partition read at a time."""
+        if pq is None:
+            raise RuntimeError("Cold storage requires pyarrow")
+
+        month = month_start(start)
+        while month < end:
+            path = self.partition_path(sensor_id, month)
+            if path.exists():
+                rows = await asyncio.to_thread(self._read_rows, path, start, end)
+                for offset in range(0, len(rows), batch_size):
+                    yield rows[offset : offset + batch_size]
+            month = next_month(month)
+
+    @staticmethod
+    def _atomic_write(path: Path, data: bytes):
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as handle:
+                handle.write(data)
+                handle.flush()
+                os.fsync(handle.fileno())
+            os.replace(tmp_name, path)
+        finally:
+            if os.path.exists(tmp_name):
+                os.unlink(tmp_name)
+
+
+cold_store = ColdReadingStore()
@@ -1,4 +1,7 @@
+import math
+
 import pytest
+import pytest_asyncio
 from fastapi.testclient import TestClient
 from PIL import Image
 import io
@@ -10,6 +13,120 @@ def force_mock_mode(monkeypatch):
     monkeypatch.setenv("AQUAMINE_FORCE_MOCK", "1")
 
 
+@pytest.fixture(autouse=True)
+def clear_response_cache():
+    """Keep cached responses from leaking between tests."""
+    from ai.cache.response_cache import response_cache
+
+    response_cache.clear_local()
+    yield
+    response_cache.clear_local()
+
+
+@pytest.fixture(autouse=True)
+def clear_anomaly_episodes():
+    """Open episodes point at rows of the test's own database."""
+    from ai.anomaly.episodes import anomaly_episodes
+
+    anomaly_episodes.clear()
+    yield
+    anomaly_episodes.clear()
+
+
+class FakeCacheRedis:
+    """In-memory stand-in for the Redis commands the response cache uses."""
+
+    def __init__(self):
+        self.values = {}
+
+    async def ping(self):
+        return True
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def mget(self, keys):
+        return [self.values.get(key) for key in keys]
+
+    async def set(self, key, value, ex=None):
+        self.values[key] = value
+
+    def pipeline(self, transaction=True):
+        return _FakePipeline(self)
+
+
+class _FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.keys = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def incr(self, key):
+        self.keys.append(key)
+
+    async def execute(self):
+        for key in self.keys:
+            self.redis.values[key] = str(int(self.redis.values.get(key) or 0) + 1).encode()
+
+
+@pytest.fixture
+def cache_redis(monkeypatch):
+    """Back the shared response cache with an in-memory Redis."""
+    from ai.cache.response_cache import response_cache
+
+    redis = FakeCacheRedis()
+    monkeypatch.setattr(response_cache, "redis", redis)
+    return redis
+
+
+@pytest_asyncio.fixture
+async def sqlite_sessions(monkeypatch):
+    """
+    The API on a fresh in-memory SQLite database, seeded with the parameter
+    registry; yields the session factory. Redis stays out of the request path.
+    """
+    from dataclasses import asdict
+
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+
+    from ai.alerts.state_machine import AlertStateMachine
+    from ai.cache.response_cache import response_cache
+    from ai.db.connection import Base, get_db
+    from ai.db.models import Parameter
+    from ai.db.parameters import DEFAULT_PARAMETERS, parameter_registry
+    from ai.db.sqlite_backend import create_sqlite_engine
+    from ai.main import app
+
+    engine = create_sqlite_engine("sqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    factory = async_sessionmaker(engine, expire_on_commit=False)
+    async with factory() as db:
+        db.add_all(Parameter(**asdict(spec)) for spec in DEFAULT_PARAMETERS)
+        await db.commit()
+
+    async def override_get_db():
+        async with factory() as db:
+            yield db
+
+    monkeypatch.setattr("ai.iot.mqtt_bridge.AsyncSessionLocal", factory)
+    monkeypatch.setattr("ai.main.alert_sm", AlertStateMachine())
+    monkeypatch.setattr(response_cache, "_redis_retry_at", math.inf)
+    parameter_registry.invalidate()
+    app.dependency_overrides[get_db] = override_get_db
+    try:
+        yield factory
+    finally:
+        app.dependency_overrides.pop(get_db, None)
+        parameter_registry.invalidate()
+        await engine.dispose()
+
+
 @pytest.fixture
 def client():
     """FastAPI test client."""
@@ -47,3 +47,74 @@ def test_turbidity_thresholds():
     assert len(anomalies) == 1
     assert anomalies[0].parameter == "turbidity"
     assert anomalies[0].detection_method == "threshold_critical"
+
+
+def test_batch_matches_per_reading_checks():
+    import numpy as np
+
+    from ai.db.parameters import ParameterSpec
+
+    detector = AnomalyDetector()
+    specs = {
+        "sulfate": ParameterSpec("sulfate", "Sulfate", warning_high=250.0, critical_high=500.0)
+    }
+    rng = np.random.default_rng(7)
+    count = 500
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    timestamps = [start.replace(minute=i % 60, hour=i // 60 % 24) for i in range(count)]
+    sensor_ids = rng.integers(1, 4, count)
+    values = {
+        "ph": rng.uniform(3.5, 11.0, count),
+        "turbidity": rng.uniform(0.0, 150.0, count),
+        "temperature": rng.uniform(20.0, 45.0, count),
+        "sulfate": rng.uniform(0.0, 700.0, count),
+    }
+    values["ph"][::7] = np.nan
+
+    batch = detector.detect_threshold_batch(sensor_ids, timestamps, values, specs)
+
+    expected = []
+    for i in range(count):
+        reading = {
+            key: (None if np.isnan(column[i]) else column[i]) for key, column in values.items()
+        }
+        sensor_id = int(sensor_ids[i])
+        expected += detector.detect_threshold_anomalies(sensor_id, reading, timestamps[i])
+        expected += detector.detect_registry_anomalies(sensor_id, reading, timestamps[i], specs)
+    assert batch.to_anomalies() == expected
+    assert sum(batch.counts().values()) == len(expected)
+    assert "temperature" not in batch.parameters
+
+
+def test_batch_from_frame():
+    import pandas as pd
+
+    detector = AnomalyDetector()
+    frame = pd.DataFrame(
+        {
+            "sensor_id": [1, 1, 2],
+            "timestamp": pd.to_datetime(
+                ["2024-01-01T00:00Z", "2024-01-01T00:01Z", "2024-01-01T00:02Z"], utc=True
+            ),
+            "ph": [7.0, 4.0, None],
+            "turbidity": [60.0, 20.0, 120.0],
+            "device": ["a", "b", "c"],
+        }
+    )
+
+    batch = detector.detect_threshold_frame(frame)
+
+    assert batch.rows.tolist() == [0, 1, 2]
+    assert [batch.parameters[code] for code in batch.parameter_codes] == [
+        "turbidity",
+        "ph",
+        "turbidity",
+    ]
+    assert batch.critical.tolist() == [False, True, True]
+    result = batch.to_frame()
+    assert result["timestamp"].iloc[2] == pd.Timestamp("2024-01-01T00:02Z")
+    assert result["detection_method"].tolist() == [
+        "threshold_warning",
+        "threshold_critical",
+        "threshold_critical",
+    ]
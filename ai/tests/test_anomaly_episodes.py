@@ -0,0 +1,283 @@
+import math
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import pytest
+import pytest_asyncio
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from ai.alerts.state_machine import AlertStateMachine
+from ai.anomaly.episodes import AnomalyEpisodes
+from ai.cache.response_cache import response_cache
+from ai.db.connection import Base, get_db
+from ai.db.models import Anomaly, Sensor
+from ai.db.sqlite_backend import create_sqlite_engine
+from ai.main import app
+from ai.schemas.alert import AnomalyCreate
+
+NOW = datetime.now(timezone.utc).replace(microsecond=0)
+START = datetime(2024, 3, 1, tzinfo=timezone.utc)
+
+
+@pytest_asyncio.fixture
+async def sessions():
+    engine = create_sqlite_engine("sqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    factory = async_sessionmaker(engine, expire_on_commit=False)
+    async with factory() as db:
+        db.add(Sensor(id=1, sensor_id="S1", name="S1"))
+        await db.commit()
+    try:
+        yield factory
+    finally:
+        await engine.dispose()
+
+
+def _hit(minutes, value=4.2, method="threshold_critical", score=1.0):
+    return AnomalyCreate(
+        sensor_id=1,
+        timestamp=START + timedelta(minutes=minutes),
+        parameter="ph",
+        value=value,
+        anomaly_score=score,
+        detection_method=method,
+    )
+
+
+async def _rows(factory):
+    async with factory() as db:
+        result = await db.execute(select(Anomaly).order_by(Anomaly.id))
+        return result.scalars().all()
+
+
+@pytest.mark.asyncio
+async def test_sustained_breach_is_one_row(sessions):
+    episodes = AnomalyEpisodes(enabled=True, checkpoint_samples=1000)
+    steps = []
+    async with sessions() as db:
+        for minute, value in enumerate([4.2, 4.0, 3.6, 3.9, 4.3]):
+            steps.append(await episodes.record(db, _hit(minute, value, score=5 - value)))
+        await db.commit()
+        (row,) = await _rows(sessions)
+        assert (row.sample_count, row.end_timestamp) == (1, START)
+
+        # pH is reported again without the hit: the episode closes.
+        assert await episodes.close_ended(db, 1, {"ph": 6.9}, []) == 1
+        await db.commit()
+
+    (row,) = await _rows(sessions)
+    assert (row.timestamp, row.end_timestamp) == (START, START + timedelta(minutes=4))
+    assert (row.value, row.peak_value, row.sample_count) == (4.2, 3.6, 5)
+    assert row.anomaly_score == pytest.approx(1.4)
+    # Only the opening hit and the hit after the state machine's cooldown are alertable.
+    assert [step.notify for step in steps] == [True, False, False, False, False]
+    assert [step.written for step in steps] == [True, False, False, False, False]
+    assert episodes.stats()["open"] == 0
+
+
+@pytest.mark.asyncio
+async def test_checkpoints_gaps_and_alert_cadence(sessions):
+    episodes = AnomalyEpisodes(enabled=True, checkpoint_samples=3, max_gap_seconds=600)
+    async with sessions() as db:
+        steps = [await episodes.record(db, _hit(minute)) for minute in range(7)]
+        await db.commit()
+        (row,) = await _rows(sessions)
+        # Opening row plus two checkpoints of three samples.
+        assert row.sample_count == 7
+        assert [step.written for step in steps] == [True, False, False, True, False, False, True]
+        assert [step.notify for step in steps] == [True] + [False] * 4 + [True, False]
+
+        # Silent for longer than the gap: the next hit starts a new episode.
+        await episodes.record(db, _hit(30))
+        # Different detection methods are different episodes.
+        await episodes.record(db, _hit(30, method="ewma"))
+        await db.commit()
+
+    rows = await _rows(sessions)
+    assert [(r.detection_method, r.timestamp.minute) for r in rows] == [
+        ("threshold_critical", 0),
+        ("threshold_critical", 30),
+        ("ewma", 30),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_workers_merge_into_one_episode(sessions):
+    first, second = AnomalyEpisodes(enabled=True), AnomalyEpisodes(enabled=True)
+    async with sessions() as db:
+        await first.record(db, _hit(0, 4.2, score=1.0))
+        await db.commit()
+        await second.record(db, _hit(1, 3.1, score=3.0))
+        await first.record(db, _hit(2, 4.0, score=2.0))
+        await second.checkpoint(db, final=True)
+        await first.checkpoint(db, final=True)
+        await db.commit()
+
+    (row,) = await _rows(sessions)
+    assert (row.sample_count, row.peak_value, row.anomaly_score) == (3, 3.1, 3.0)
+    assert row.end_timestamp == START + timedelta(minutes=2)
+
+
+@pytest.mark.asyncio
+async def test_breach_after_recovery_is_a_new_episode(sessions):
+    first, second = AnomalyEpisodes(enabled=True), AnomalyEpisodes(enabled=True)
+    async with sessions() as db:
+        for minute in (0, 2):
+            await first.record(db, _hit(minute))
+        for _ in (4, 6, 8):
+            await first.close_ended(db, 1, {"ph"}, [])
+        await db.commit()
+        # Within the gap of the closed row, but neither worker continues it.
+        await first.record(db, _hit(10))
+        await second.record(db, _hit(12))
+        await first.checkpoint(db, final=True)
+        await second.checkpoint(db, final=True)
+        await db.commit()
+
+    rows = await _rows(sessions)
+    assert [(r.timestamp.minute, r.sample_count, r.closed) for r in rows] == [
+        (0, 2, True),
+        (10, 2, False),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_recovery_on_another_worker_closes_the_episode(sessions):
+    first, second = AnomalyEpisodes(enabled=True), AnomalyEpisodes(enabled=True)
+    async with sessions() as db:
+        for minute in (0, 2):
+            await first.record(db, _hit(minute))
+        await db.commit()
+        # The recovery reaches a worker that holds no episode.
+        assert await second.close_ended(db, 1, {"ph"}, []) == 1
+        await db.commit()
+        step = await first.record(db, _hit(4))
+        await first.checkpoint(db, final=True)
+        await db.commit()
+
+    assert step == (True, True)
+    rows = await _rows(sessions)
+    assert [(r.timestamp.minute, r.sample_count, r.closed) for r in rows] == [
+        (0, 2, True),
+        (4, 1, False),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_rolled_back_ingest_keeps_episode_state(sessions):
+    episodes = AnomalyEpisodes(enabled=True, checkpoint_samples=1000, checkpoint_seconds=3600)
+    async with sessions() as db:
+        await episodes.record(db, _hit(0))
+        await db.commit()
+        await episodes.record(db, _hit(1))
+        await db.commit()
+        # Past the cooldown, then the transaction fails.
+        assert (await episodes.record(db, _hit(6))).notify is True
+        await db.rollback()
+        assert (await episodes.record(db, _hit(6))).notify is True
+        await db.commit()
+
+        # A rolled-back close leaves the episode open with its samples.
+        await episodes.close_ended(db, 1, {"ph"}, [])
+        await db.rollback()
+        assert episodes.stats() == {"enabled": True, "open": 1, "pending_samples": 2}
+        # So does a rolled-back new episode.
+        await episodes.record(db, _hit(0, method="ewma"))
+        await db.rollback()
+        assert episodes.stats()["open"] == 1
+
+        await episodes.close_ended(db, 1, {"ph"}, [])
+        await db.commit()
+
+    (row,) = await _rows(sessions)
+    assert (row.sample_count, row.closed) == (3, True)
+    assert row.end_timestamp == START + timedelta(minutes=6)
+
+
+@pytest.mark.asyncio
+async def test_deleted_rows_and_disabled_episodes(sessions):
+    episodes = AnomalyEpisodes(enabled=True, checkpoint_samples=2)
+    async with sessions() as db:
+        await episodes.record(db, _hit(0))
+        await episodes.record(db, _hit(1))
+        await db.execute(delete(Anomaly))
+        # A checkpoint finding the row gone forgets the episode...
+        assert await episodes.checkpoint(db, final=True) == 0
+        assert (await episodes.record(db, _hit(2))).written is True
+        await db.execute(delete(Anomaly))
+        # ...and so does the next hit, which starts a new row.
+        assert (await episodes.record(db, _hit(3))).written is True
+        await db.commit()
+
+        legacy = AnomalyEpisodes(enabled=False)
+        for minute in range(4, 7):
+            assert await legacy.record(db, _hit(minute)) == (True, True)
+        await db.commit()
+
+    rows = await _rows(sessions)
+    assert [row.timestamp.minute for row in rows] == [3, 4, 5, 6]
+    assert {row.sample_count for row in rows} == {1}
+
+
+@pytest.mark.asyncio
+async def test_ingest_coalesces_a_sustained_event(sessions, monkeypatch):
+    async def override_get_db():
+        async with sessions() as db:
+            yield db
+
+    monkeypatch.setattr("ai.iot.mqtt_bridge.AsyncSessionLocal", sessions)
+    monkeypatch.setattr("ai.main.alert_sm", AlertStateMachine())
+    monkeypatch.setattr(response_cache, "_redis_retry_at", math.inf)
+    app.dependency_overrides[get_db] = override_get_db
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://edge") as client:
+            for minutes_ago in range(12, -1, -1):
+                ph = 7.0 if minutes_ago == 0 else 4.2 - 0.01 * (minutes_ago % 3)
+                response = await client.post(
+                    "/api/v1/sensors/ingest",
+                    json={
+                        "sensor_id": "S1",
+                        "timestamp": (NOW - timedelta(minutes=minutes_ago)).isoformat(),
+                        "readings": {"ph": ph, "turbidity": 12.0},
+                    },
+                )
+                assert response.status_code == 200, response.text
+            (anomaly,) = (await client.get("/api/v1/anomalies?sensor_id=1")).json()
+            summary = (await client.get("/api/v1/anomaly?sensor_id=1")).json()
+            alerts = (await client.get("/api/v1/alerts")).json()
+    finally:
+        app.dependency_overrides.pop(get_db, None)
+
+    assert anomaly["sample_count"] == 12
+    assert (anomaly["value"], anomaly["peak_value"]) == (4.2, pytest.approx(4.18))
+    assert anomaly["end_timestamp"].startswith(
+        (NOW - timedelta(minutes=1)).isoformat().replace("+00:00", "")
+    )
+    assert summary["severity"] == "critical"
+    # The cooldown runs on the wall clock, so one alert and the recovery, as per reading.
+    assert [alert["severity"] for alert in alerts] == ["info", "critical"]
+
+
+@pytest.mark.asyncio
+async def test_rollback_never_undoes_another_sessions_changes(sessions):
+    episodes = AnomalyEpisodes(enabled=True, checkpoint_samples=1000, checkpoint_seconds=3600)
+    async with sessions() as first, sessions() as second:
+        await episodes.record(first, _hit(0))
+        await first.commit()
+        await episodes.record(first, _hit(1))
+        await episodes.record(second, _hit(2))
+        await second.commit()
+        await first.rollback()
+
+        # Rewinding to before the first session's hit would drop the second's.
+        assert episodes.stats()["open"] == 0
+        # The next hit picks the open row up again.
+        assert await episodes.record(second, _hit(3)) == (False, True)
+        await episodes.checkpoint(second, final=True)
+        await second.commit()
+
+    (row,) = await _rows(sessions)
+    assert (row.sample_count, row.end_timestamp.minute) == (2, 3)
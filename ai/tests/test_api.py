@@ -1,3 +1,4 @@
+import httpx
 import pytest
 import pytest_asyncio
 from fastapi.testclient import TestClient
@@ -32,7 +33,13 @@ def test_health_check(client):
     assert response.json() == {"status": "ok"}
 
 
-def test_ingest_sensor_data(client):
+@pytest.mark.asyncio
+async def test_ingest_sensor_data(sqlite_sessions):
+    from ai.db.models import Sensor
+
+    async with sqlite_sessions() as db:
+        db.add(Sensor(sensor_id="TEST001", name="Test"))
+        await db.commit()
     payload = {
         "sensor_id": "TEST001",
         "timestamp": "2024-01-01T12:00:00Z",
@@ -40,13 +47,15 @@ def test_ingest_sensor_data(client):
         "metadata": {},
     }
 
-    with patch("ai.main.process_mqtt_message", new_callable=AsyncMock) as mock_process:
-        with patch("ai.main.ws_manager.publish_update", new_callable=AsyncMock) as mock_ws:
-            response = client.post("/api/v1/sensors/ingest", json=payload)
-            assert response.status_code == 200
-            assert response.json() == {"status": "ingested"}
-            assert mock_process.called
-            assert mock_ws.called
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as api:
+        with patch("ai.main.process_mqtt_message", new_callable=AsyncMock) as mock_process:
+            with patch("ai.main.ws_manager.publish_update", new_callable=AsyncMock) as mock_ws:
+                response = await api.post("/api/v1/sensors/ingest", json=payload)
+                assert response.status_code == 200
+                assert response.json() == {"status": "ingested", "anomalies_detected": 0}
+                assert mock_process.called
+                assert mock_ws.called
 
 
 def test_acknowledge_alert_not_found(client):
@@ -0,0 +1,214 @@
+import math
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import pytest
+import pytest_asyncio
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from ai.anomaly.backtest import (
+    BacktestConfig,
+    KnownEvent,
+    ReplayAlertStateMachine,
+    run_backtest,
+)
+from ai.anomaly.episodes import AnomalyEpisodes
+from ai.anomaly.health import SensorHealthMonitor
+from ai.anomaly.streaming import StreamingDetectors
+from ai.db.connection import Base
+from ai.db.models import Alert, Anomaly, NotificationRecipient, Reading, Sensor
+from ai.db.sqlite_backend import create_sqlite_engine
+from ai.main import app
+from ai.schemas.threshold import ThresholdRuleCreate
+
+START = datetime(2024, 3, 1, tzinfo=timezone.utc)
+END = START + timedelta(days=3)
+# Sensor 1 turns acidic over 12 hours from here; pH crosses 4.5 at EVENT.
+ONSET = START + timedelta(days=2)
+EVENT = ONSET + timedelta(hours=10)
+
+QUIET = BacktestConfig(
+    "quiet",
+    rules=(
+        ThresholdRuleCreate(parameter="ph", warning_low=3.0),
+        ThresholdRuleCreate(parameter="turbidity", warning_high=500.0),
+    ),
+    streaming=False,
+    rate_of_change=False,
+    multivariate=False,
+)
+
+
+def _readings(sensor_id, acidic):
+    readings = []
+    for step in range(3 * 24 * 6):
+        timestamp = START + timedelta(minutes=10 * step)
+        wobble = 0.02 * ((step * 7) % 5 - 2)
+        ph, turbidity = 7.0 + wobble, 15.0 + 10 * wobble
+        if acidic and timestamp >= ONSET:
+            progress = min((timestamp - ONSET) / timedelta(hours=12), 1.0)
+            ph -= 3.0 * progress
+            turbidity += 110.0 * progress
+        readings.append(
+            Reading(
+                sensor_id=sensor_id,
+                timestamp=timestamp,
+                ph=ph,
+                turbidity=turbidity,
+                temperature=26.0,
+            )
+        )
+    return readings
+
+
+@pytest_asyncio.fixture
+async def database(tmp_path, monkeypatch):
+    url = f"sqlite:///{tmp_path / 'backtest.db'}"
+    engine = create_sqlite_engine(url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    factory = async_sessionmaker(engine, expire_on_commit=False)
+    async with factory() as db:
+        db.add_all(
+            [Sensor(id=1, sensor_id="S1", name="S1"), Sensor(id=2, sensor_id="S2", name="S2")]
+        )
+        db.add_all(
+            [
+                NotificationRecipient(name="Ops", phone="0812", email="ops@example.com"),
+                NotificationRecipient(name="Away", email="away@example.com", is_active=False),
+            ]
+        )
+        db.add_all(_readings(1, acidic=True) + _readings(2, acidic=False))
+        await db.commit()
+    # Worker processes connect through DATABASE_URL.
+    monkeypatch.setenv("DATABASE_URL", url)
+    try:
+        yield factory
+    finally:
+        await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_replay_reports_each_configuration_without_writing(database):
+    current, quiet = await run_backtest(
+        START,
+        END,
+        [BacktestConfig("current"), QUIET],
+        events=[KnownEvent(1, EVENT, "acid seep")],
+        workers=1,
+        session_factory=database,
+    )
+
+    assert (current.sensors, current.readings) == (2, 2 * 3 * 24 * 6)
+    assert current.anomalies["threshold_critical"] > 0
+    assert current.alerts["critical"] >= 1
+    # One active recipient with both channels; recoveries notify too.
+    assert current.notifications == 2 * sum(current.alerts.values())
+    (outcome,) = current.events
+    assert outcome.alert_lead_time > timedelta(hours=1)
+    assert outcome.anomaly_lead_time >= outcome.alert_lead_time
+
+    assert quiet.anomalies == {} and quiet.alerts == {} and quiet.notifications == 0
+    assert quiet.events[0].alert_lead_time is None
+
+    async with database() as db:
+        assert await db.scalar(select(func.count()).select_from(Anomaly)) == 0
+        assert await db.scalar(select(func.count()).select_from(Alert)) == 0
+
+
+@pytest.mark.asyncio
+async def test_process_pool_matches_in_process_replay(database):
+    configs = [BacktestConfig("current"), BacktestConfig("slow cooldown", cooldown_minutes=240)]
+    events = [KnownEvent(1, EVENT, "acid seep")]
+
+    local = await run_backtest(
+        START, END, configs, events=events, workers=1, session_factory=database
+    )
+    pooled = await run_backtest(
+        START, END, configs, events=events, workers=2, session_factory=database
+    )
+
+    assert [report.to_dict() for report in pooled] == [report.to_dict() for report in local]
+    assert sum(local[1].alerts.values()) < sum(local[0].alerts.values())
+
+
+@pytest.mark.asyncio
+async def test_replay_raises_the_alerts_ingest_raised(sqlite_sessions, monkeypatch):
+    episodes = AnomalyEpisodes(enabled=True)
+    monkeypatch.setattr("ai.main.anomaly_episodes", episodes)
+    monkeypatch.setattr("ai.main.sensor_health", SensorHealthMonitor(enabled=True))
+    monkeypatch.setattr("ai.main.anomaly_detector.streaming", StreamingDetectors(enabled=True))
+    # Within one cooldown, so ingest's wall clock and the replay's reading clock agree.
+    start = datetime.now(timezone.utc).replace(microsecond=0) - timedelta(minutes=5)
+    timestamps = [start + timedelta(seconds=4 * i) for i in range(70)]
+
+    transport = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://edge")
+    async with transport as client:
+        for i, timestamp in enumerate(timestamps):
+            # Steady, then a drop that reads as an erratic probe, then steady again.
+            ph = 2.0 if 30 <= i < 55 else 7.0 + 0.05 * math.sin(i * 2.39996)
+            response = await client.post(
+                "/api/v1/sensors/ingest",
+                json={
+                    "sensor_id": "S1",
+                    "timestamp": timestamp.isoformat(),
+                    "readings": {"ph": ph, "turbidity": 15.0 + 2.0 * math.sin(i)},
+                },
+            )
+            assert response.status_code == 200, response.text
+    async with sqlite_sessions() as db:
+        await episodes.checkpoint(db, final=True)
+        await db.commit()
+        result = await db.execute(
+            select(Anomaly.detection_method, func.sum(Anomaly.sample_count)).group_by(
+                Anomaly.detection_method
+            )
+        )
+        ingested = Counter({method: count for method, count in result.all()})
+        result = await db.execute(select(Alert.severity, Alert.message).order_by(Alert.id))
+        alerts = result.all()
+
+    replay, unsuppressed = await run_backtest(
+        timestamps[0],
+        timestamps[-1] + timedelta(seconds=1),
+        [
+            BacktestConfig("ingest", streaming=True, health=True, episodes=True),
+            BacktestConfig("no health", streaming=True, health=False, episodes=True),
+        ],
+        workers=1,
+        session_factory=sqlite_sessions,
+    )
+
+    assert replay.anomalies == ingested
+    assert replay.alerts == Counter(severity for severity, _ in alerts)
+    assert ("critical", "PH critical: 2.00 (probe health: faulty)") in alerts
+    assert alerts[-1].severity == "info"
+    # Without the health check the faulty probe's statistical hits would count.
+    assert sum(unsuppressed.anomalies.values()) > sum(replay.anomalies.values())
+
+
+@pytest.mark.asyncio
+async def test_cooldown_runs_on_the_reading_clock():
+    machine = ReplayAlertStateMachine(cooldown_minutes=5)
+
+    assert await machine.process_anomaly(1, "warning", "", now=START)
+    assert await machine.process_anomaly(1, "warning", "", now=START + timedelta(minutes=4)) is None
+    assert await machine.process_anomaly(1, "warning", "", now=START + timedelta(minutes=5))
+    assert machine.redis is None
+
+
+def test_config_from_json_fields():
+    config = BacktestConfig.from_dict(
+        {
+            "name": "tight",
+            "rules": [{"sensor_id": 3, "parameter": "turbidity", "warning_high": 30}],
+            "rate_rules": [{"parameter": "ph", "warning": -0.2}],
+            "cooldown_minutes": 15,
+        }
+    )
+
+    assert config.rules[0].sensor_id == 3
+    assert config.rate_rules[0].warning == -0.2
+    assert config.streaming is BacktestConfig("default").streaming
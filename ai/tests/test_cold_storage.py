@@ -0,0 +1,128 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from ai.db.connection import Base
+from ai.db.models import Parameter, Reading, ReadingValue, Sensor
+from ai.db.sqlite_backend import create_sqlite_engine
+from ai.export import readings as export_readings
+from ai.scripts import tier_readings
+from ai.storage.cold_store import ColdReadingStore, months_ago
+
+pytest.importorskip("pyarrow")
+
+
+def _row(row_id: int, timestamp: datetime) -> tuple:
+    return (row_id, timestamp, 7.0, 25.0, 27.5, 3.7, -65)
+
+
+def test_partition_merge_is_idempotent(tmp_path):
+    store = ColdReadingStore(tmp_path)
+    base = datetime(2023, 1, 31, 22, tzinfo=timezone.utc)
+    rows = [_row(i, base + timedelta(hours=i)) for i in range(4)]
+
+    store.write_partition(1, base, rows[:2])
+    store.write_partition(1, base, rows[:2])
+    store.write_partition(1, rows[2][1], rows[2:])
+
+    assert (tmp_path / "sensor_id=1" / "month=2023-01" / "readings.parquet").exists()
+    assert (tmp_path / "sensor_id=1" / "month=2023-02" / "readings.parquet").exists()
+    assert [row[0] for row in store.read_range(1, base, base + timedelta(days=2))] == [0, 1, 2, 3]
+    assert [row[0] for row in store.read_range(1, rows[1][1], rows[3][1])] == [1, 2]
+
+
+def test_boundary_only_moves_forward(tmp_path):
+    store = ColdReadingStore(tmp_path)
+    assert store.boundary() is None
+
+    store.set_boundary(datetime(2023, 6, 1, tzinfo=timezone.utc))
+    store.set_boundary(datetime(2023, 3, 1, tzinfo=timezone.utc))
+
+    assert store.boundary() == datetime(2023, 6, 1, tzinfo=timezone.utc)
+
+
+def test_months_ago_crosses_year_boundary():
+    now = datetime(2024, 2, 15, 10, tzinfo=timezone.utc)
+    assert months_ago(now, 3) == datetime(2023, 11, 1, tzinfo=timezone.utc)
+
+
+@pytest.mark.asyncio
+async def test_export_combines_cold_and_hot_rows(tmp_path, monkeypatch):
+    store = ColdReadingStore(tmp_path)
+    boundary = datetime(2023, 2, 1, tzinfo=timezone.utc)
+    store.write_partition(1, boundary - timedelta(days=1), [_row(1, boundary - timedelta(hours=2))])
+    store.set_boundary(boundary)
+    hot_ranges = []
+
+    async def fake_database_batches(sensor_id, start, end, batch_size):
+        hot_ranges.append((start, end))
+        yield [(boundary + timedelta(hours=1), 6.8, 20.0, 27.0, 3.7, -60)]
+
+    monkeypatch.setattr(export_readings, "cold_store", store)
+    monkeypatch.setattr(export_readings, "_iter_database_batches", fake_database_batches)
+
+    start = boundary - timedelta(days=1)
+    end = boundary + timedelta(days=1)
+    batches = [batch async for batch in export_readings.iter_reading_batches(1, start, end)]
+
+    assert [row[0] for batch in batches for row in batch] == [
+        boundary - timedelta(hours=2),
+        boundary + timedelta(hours=1),
+    ]
+    assert len(batches[0][0]) == len(export_readings.EXPORT_COLUMNS)
+    assert hot_ranges == [(boundary, end)]
+
+
+@pytest.mark.asyncio
+async def test_tiering_drops_only_archived_rows(tmp_path, monkeypatch):
+    engine = create_sqlite_engine("sqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    factory = async_sessionmaker(engine, expire_on_commit=False)
+    old = months_ago(datetime.now(timezone.utc), 3)
+    async with factory() as db:
+        db.add_all(
+            [Sensor(id=1, sensor_id="S1", name="S1"), Sensor(id=2, sensor_id="S2", name="S2")]
+        )
+        db.add(Parameter(id=5, key="dissolved_oxygen", name="Dissolved oxygen"))
+        await db.commit()
+        db.add_all(
+            Reading(sensor_id=1, timestamp=old + timedelta(days=i), ph=7.0) for i in range(3)
+        )
+        db.add(ReadingValue(sensor_id=1, parameter_id=5, timestamp=old, value=6.5))
+        await db.commit()
+
+    store = ColdReadingStore(tmp_path)
+    drop_archived = tier_readings.drop_archived
+
+    async def drop_after_late_rows(*args):
+        # A resend and a sensor first seen after the sensor list was taken.
+        async with factory() as db:
+            db.add(Reading(sensor_id=1, timestamp=old + timedelta(hours=1), ph=6.9))
+            db.add(Reading(sensor_id=2, timestamp=old, ph=7.1))
+            db.add(
+                ReadingValue(
+                    sensor_id=1, parameter_id=5, timestamp=old + timedelta(hours=1), value=6.4
+                )
+            )
+            await db.commit()
+        return await drop_archived(*args)
+
+    monkeypatch.setattr(tier_readings, "drop_archived", drop_after_late_rows)
+    monkeypatch.setattr(tier_readings, "ColdReadingStore", lambda: store)
+    monkeypatch.setattr(tier_readings, "AsyncSessionLocal", factory)
+    monkeypatch.setattr(tier_readings, "engine", engine)
+    try:
+        await tier_readings.tier_readings(1)
+        async with factory() as db:
+            readings = (await db.execute(select(Reading.sensor_id, Reading.ph))).all()
+            values = (await db.execute(select(ReadingValue.value))).scalars().all()
+    finally:
+        await engine.dispose()
+
+    assert sorted(readings) == [(1, 6.9), (2, 7.1)]
+    assert values == [6.4]
+    assert len(store.read_range(1, old, old + timedelta(days=3))) == 3
+    assert store.archived_value_keys(1, old) == [(5, old)]
@@ -0,0 +1,125 @@
+import gzip
+import zlib
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from fastapi.testclient import TestClient
+
+from ai.utils import compression
+from ai.utils.compression import CompressionMiddleware, negotiate_encoding
+
+LARGE_BODY = "x" * 5000
+
+
+def _build_app() -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, path_prefix="/api/v1", minimum_size=1000)
+
+    @app.get("/api/v1/large")
+    def large():
+        return PlainTextResponse(LARGE_BODY)
+
+    @app.get("/api/v1/small")
+    def small():
+        return PlainTextResponse("tiny")
+
+    @app.get("/api/v1/gzipped")
+    def gzipped():
+        return Response(gzip.compress(LARGE_BODY.encode()), media_type="application/gzip")
+
+    @app.get("/api/v1/stream")
+    def stream():
+        return StreamingResponse(
+            (chunk for chunk in (b"a" * 3000, b"b" * 3000)), media_type="text/csv"
+        )
+
+    @app.get("/other")
+    def other():
+        return PlainTextResponse(LARGE_BODY)
+
+    return app
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(compression, "brotli", None)
+    return TestClient(_build_app())
+
+
+@pytest.mark.parametrize(
+    ("header", "expected"),
+    [
+        ("gzip, deflate", "gzip"),
+        ("gzip;q=0", None),
+        ("identity", None),
+        ("*", "gzip"),
+        ("", None),
+    ],
+)
+def test_negotiate_encoding_without_brotli(monkeypatch, header, expected):
+    monkeypatch.setattr(compression, "brotli", None)
+    assert negotiate_encoding(header) == expected
+
+
+def test_large_body_is_gzipped(client):
+    response = client.get("/api/v1/large", headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert response.text == LARGE_BODY
+    assert int(response.headers["content-length"]) < len(LARGE_BODY)
+
+
+def test_small_and_unaccepted_bodies_are_left_alone(client):
+    small = client.get("/api/v1/small", headers={"Accept-Encoding": "gzip"})
+    identity = client.get("/api/v1/large", headers={"Accept-Encoding": "identity"})
+
+    assert "content-encoding" not in small.headers
+    assert "content-encoding" not in identity.headers
+    assert "Accept-Encoding" in identity.headers["vary"]
+
+
+def test_already_compressed_and_other_paths_are_skipped(client):
+    gzipped = client.get("/api/v1/gzipped", headers={"Accept-Encoding": "gzip"})
+    other = client.get("/other", headers={"Accept-Encoding": "gzip"})
+
+    assert "content-encoding" not in gzipped.headers
+    assert gzip.decompress(gzipped.content).decode() == LARGE_BODY
+    assert "content-encoding" not in other.headers
+
+
+def test_streaming_response_is_compressed_per_chunk(client):
+    with client.stream("GET", "/api/v1/stream", headers={"Accept-Encoding": "gzip"}) as response:
+        assert response.headers["content-encoding"] == "gzip"
+        assert "content-length" not in response.headers
+        raw = b"".join(response.iter_raw())
+
+    assert zlib.decompress(raw, 31) == b"a" * 3000 + b"b" * 3000
+
+
+def test_brotli_preferred_when_available():
+    brotli = pytest.importorskip("brotli")
+    client = TestClient(_build_app())
+
+    response = client.get("/api/v1/large", headers={"Accept-Encoding": "gzip, br"})
+
+    assert response.headers["content-encoding"] == "br"
+    assert brotli.decompress(response.content).decode() == LARGE_BODY
+
+
+def test_large_bodies_compress_off_the_event_loop(client, monkeypatch):
+    calls = []
+    real_to_thread = compression.asyncio.to_thread
+
+    async def tracking_to_thread(func, *args):
+        calls.append(func)
+        return await real_to_thread(func, *args)
+
+    monkeypatch.setattr(compression, "COMPRESSION_THREAD_THRESHOLD", 1000)
+    monkeypatch.setattr(compression.asyncio, "to_thread", tracking_to_thread)
+
+    response = client.get("/api/v1/large", headers={"Accept-Encoding": "gzip"})
+
+    assert response.text == LARGE_BODY
+    assert calls
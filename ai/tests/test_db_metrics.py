@@ -0,0 +1,106 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from ai.db.instrumentation import (
+    BACKGROUND_LABEL,
+    DatabaseMetrics,
+    Histogram,
+    RouteLabelMiddleware,
+    TimedQueuePool,
+    current_route,
+    db_metrics,
+)
+
+
+def test_histogram_buckets_and_quantiles():
+    histogram = Histogram()
+    for seconds in (0.0002, 0.003, 0.003, 0.2):
+        histogram.observe(seconds)
+
+    cumulative = histogram.cumulative()
+    assert cumulative[0] == 1  # <= 0.5 ms
+    assert cumulative[-1] == 4
+    assert histogram.quantile(0.5) == 0.005
+    assert histogram.quantile(1.0) == 0.25
+
+    histogram.observe(30.0)
+    assert histogram.quantile(1.0) is None
+
+
+def test_slow_log_keeps_the_slowest_statements():
+    metrics = DatabaseMetrics(slow_log_size=2)
+    metrics.slow_threshold = 0.01
+    for seconds, statement in ((0.005, "fast"), (0.02, "a"), (0.5, "b"), (0.05, "c")):
+        metrics.observe_statement("/r", seconds, statement, {"sensor_id": 1})
+
+    slow = metrics.slow_queries()
+    assert [entry["statement"] for entry in slow] == ["b", "c"]
+    assert slow[0]["parameters"] == "{'sensor_id': 1}"
+    assert metrics.statements["/r"].count == 4
+
+
+def test_instrumented_engine_records_statements_and_errors():
+    metrics = DatabaseMetrics()
+    engine = metrics.instrument(create_engine("sqlite://"))
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+        conn.execute(text("SELECT :value"), {"value": 2})
+        with pytest.raises(Exception):
+            conn.execute(text("SELECT * FROM missing_table"))
+
+    assert metrics.statements[BACKGROUND_LABEL].count == 2
+    assert metrics.statement_errors[BACKGROUND_LABEL] == 1
+    assert metrics.pool_status()[0]["pool"] in ("SingletonThreadPool", "StaticPool")
+
+
+def test_statements_are_labelled_with_the_route_template():
+    app = FastAPI()
+    app.add_middleware(RouteLabelMiddleware)
+
+    @app.get("/items/{item_id}")
+    def read_item(item_id: int):
+        return {"route": current_route()}
+
+    response = TestClient(app).get("/items/42")
+
+    assert response.json() == {"route": "/items/{item_id}"}
+    assert current_route() == BACKGROUND_LABEL
+
+
+@pytest.mark.asyncio
+async def test_timed_pool_reports_checkouts(tmp_path):
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}", poolclass=TimedQueuePool, pool_size=2
+    )
+    before = db_metrics.checkout.count
+    async with engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+        assert conn.sync_connection.engine.pool.checkedout() == 1
+    await engine.dispose()
+
+    assert db_metrics.checkout.count == before + 1
+
+
+def test_prometheus_exposition():
+    metrics = DatabaseMetrics()
+    metrics.observe_statement('/a/"b"', 0.002, "SELECT 1", None)
+    metrics.observe_checkout(0.0001)
+
+    body = metrics.render_prometheus()
+
+    assert "# TYPE aquamine_db_statement_seconds histogram" in body
+    assert 'aquamine_db_statement_seconds_bucket{route="/a/\\"b\\"",le="0.0025"} 1' in body
+    assert 'aquamine_db_statement_seconds_count{route="/a/\\"b\\""} 1' in body
+    assert 'aquamine_db_pool_checkout_seconds_bucket{le="+Inf"} 1' in body
+
+
+def test_metrics_endpoint(client):
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert "aquamine_db_pool_checkout_timeouts_total" in response.text
+    assert client.get("/api/v1/debug/db").status_code == 404
@@ -0,0 +1,83 @@
+import asyncio
+import gzip
+import io
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from ai.db.connection import get_db
+from ai.export.readings import EXPORT_COLUMNS, parquet_available, stream_csv, stream_parquet
+from ai.main import app
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def _batches(*batches):
+    async def gen():
+        for batch in batches:
+            yield batch
+
+    return gen()
+
+
+def _collect(stream) -> bytes:
+    async def run():
+        return b"".join([chunk async for chunk in stream])
+
+    return asyncio.run(run())
+
+
+def _rows(count, offset=0):
+    return [
+        (START + timedelta(minutes=offset + i), 7.0, 10.5, 27.0, None, -65) for i in range(count)
+    ]
+
+
+def test_stream_csv_gzip_round_trip():
+    data = _collect(stream_csv(_batches(_rows(2), _rows(1, offset=2)), compress=True))
+
+    lines = gzip.decompress(data).decode().splitlines()
+    assert lines[0] == ",".join(EXPORT_COLUMNS)
+    assert lines[1] == "2024-01-01T00:00:00Z,7.0,10.5,27.0,,-65"
+    assert len(lines) == 4
+
+
+def test_stream_csv_uncompressed():
+    data = _collect(stream_csv(_batches(_rows(1)), compress=False))
+    assert data.decode().startswith("timestamp,ph,")
+
+
+@pytest.mark.skipif(not parquet_available(), reason="pyarrow not installed")
+def test_stream_parquet_writes_one_row_group_per_batch():
+    import pyarrow.parquet as pq
+
+    data = _collect(stream_parquet(_batches(_rows(3), _rows(2, offset=3))))
+
+    parquet_file = pq.ParquetFile(io.BytesIO(data))
+    assert parquet_file.metadata.num_row_groups == 2
+    table = parquet_file.read()
+    assert table.num_rows == 5
+    assert table.column("ph").to_pylist() == [7.0] * 5
+    assert table.column("battery_voltage").null_count == 5
+
+
+def test_export_rejects_inverted_range(client):
+    response = client.get(
+        "/api/v1/sensors/1/readings/export",
+        params={"start": "2024-02-01T00:00:00Z", "end": "2024-01-01T00:00:00Z"},
+    )
+    assert response.status_code == 400
+
+
+def test_export_unknown_sensor_returns_404(client):
+    class Session:
+        async def get(self, _model, _pk):
+            return None
+
+    async def override_get_db():
+        yield Session()
+
+    app.dependency_overrides[get_db] = override_get_db
+    response = client.get("/api/v1/sensors/999/readings/export")
+    assert response.status_code == 404
+    app.dependency_overrides.pop(get_db, None)
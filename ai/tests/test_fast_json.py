@@ -0,0 +1,82 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+from ai.db.connection import get_db
+from ai.main import app
+from ai.schemas.sensor import ReadingResponse
+from ai.utils import fast_json
+
+
+@pytest.fixture(params=["orjson", "stdlib"])
+def encoder(request, monkeypatch):
+    if request.param == "orjson":
+        pytest.importorskip("orjson")
+    else:
+        monkeypatch.setattr(fast_json, "orjson", None)
+    return fast_json
+
+
+def test_datetimes_match_base_schema_format(encoder):
+    aware = datetime(2024, 3, 1, 12, 0, 0, 500, tzinfo=timezone.utc)
+    offset = aware.astimezone(timezone(timedelta(hours=7)))
+    naive = aware.replace(tzinfo=None)
+
+    decoded = json.loads(encoder.dumps([aware, naive]))
+    assert decoded == ["2024-03-01T12:00:00.000500Z"] * 2
+    if encoder.orjson is None:
+        assert json.loads(encoder.dumps(offset)) == "2024-03-01T12:00:00.000500Z"
+
+
+def test_nan_and_numpy_values(encoder):
+    payload = {"values": [1.5, float("nan")], "array": np.array([1.0, 2.0])}
+    assert json.loads(encoder.dumps(payload)) == {"values": [1.5, None], "array": [1.0, 2.0]}
+
+
+def test_dump_records_keys_rows_by_fields(encoder):
+    body = encoder.dump_records(("id", "ph"), [(1, 7.0), (2, None)])
+    assert json.loads(body) == [{"id": 1, "ph": 7.0}, {"id": 2, "ph": None}]
+
+
+class _RowsSession:
+    def __init__(self, rows):
+        self.rows = rows
+
+    async def execute(self, _statement):
+        rows = self.rows
+
+        class _Result:
+            def all(self):
+                return rows
+
+        return _Result()
+
+
+def test_readings_endpoint_matches_response_model(client):
+    timestamp = datetime(2024, 3, 1, 12, tzinfo=timezone.utc)
+    row = (10, timestamp, 6.9, 25.0, 27.1, 3.7, -62)
+
+    async def override_get_db():
+        yield _RowsSession([row])
+
+    app.dependency_overrides[get_db] = override_get_db
+    try:
+        response = client.get("/api/v1/sensors/3/readings", params={"hours": 24})
+    finally:
+        app.dependency_overrides.pop(get_db, None)
+
+    expected = ReadingResponse(
+        id=10,
+        sensor_id=3,
+        timestamp=timestamp,
+        ph=6.9,
+        turbidity=25.0,
+        temperature=27.1,
+        battery_voltage=3.7,
+        signal_strength=-62,
+    )
+    assert response.status_code == 200
+    assert response.json() == [json.loads(expected.model_dump_json())]
+    assert list(response.json()[0]) == list(json.loads(expected.model_dump_json()))
@@ -0,0 +1,101 @@
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from sqlalchemy.dialects import postgresql
+
+from ai.db.connection import get_db
+from ai.main import _fleet_snapshot_query, app
+
+
+def _row(sensor_id: int, **overrides) -> SimpleNamespace:
+    values = dict(
+        Sensor=SimpleNamespace(
+            id=sensor_id,
+            sensor_id=f"ESP32_{sensor_id:03d}",
+            name=f"Sensor {sensor_id}",
+            latitude=None,
+            longitude=None,
+            is_active=True,
+        ),
+        timestamp=None,
+        ph=None,
+        turbidity=None,
+        temperature=None,
+        battery_voltage=None,
+        signal_strength=None,
+        anomaly_timestamp=None,
+        anomaly_parameter=None,
+        anomaly_value=None,
+        anomaly_score=None,
+        detection_method=None,
+        active_alerts=0,
+    )
+    values.update(overrides)
+    return SimpleNamespace(**values)
+
+
+class _FleetSession:
+    def __init__(self, rows):
+        self.rows = rows
+        self.statements = []
+
+    async def execute(self, statement):
+        self.statements.append(statement)
+        rows = self.rows
+
+        class _Result:
+            def all(self):
+                return rows
+
+        return _Result()
+
+
+def test_fleet_snapshot_query_is_single_lateral_statement():
+    sql = str(_fleet_snapshot_query().compile(dialect=postgresql.dialect()))
+
+    assert sql.count("LEFT OUTER JOIN LATERAL") == 2
+    assert "acknowledged_at IS NULL" in sql
+    assert "ORDER BY sensors.id" in sql
+
+
+def test_fleet_snapshot_combines_state_in_one_query(client):
+    now = datetime(2024, 3, 1, 12, tzinfo=timezone.utc)
+    session = _FleetSession(
+        [
+            _row(
+                1,
+                timestamp=now,
+                ph=4.2,
+                turbidity=30.0,
+                temperature=27.0,
+                anomaly_timestamp=now,
+                anomaly_parameter="ph",
+                anomaly_value=4.2,
+                detection_method="threshold_critical",
+                active_alerts=2,
+            ),
+            _row(2),
+        ]
+    )
+
+    async def override_get_db():
+        yield session
+
+    app.dependency_overrides[get_db] = override_get_db
+    try:
+        response = client.get("/api/v1/fleet/snapshot")
+    finally:
+        app.dependency_overrides.pop(get_db, None)
+
+    assert response.status_code == 200
+    assert len(session.statements) == 1
+    first, second = response.json()
+
+    assert first["severity"] == "critical"
+    assert first["active_alerts"] == 2
+    assert first["latest_reading"]["ph"] == 4.2
+    assert first["last_anomaly"]["parameter"] == "ph"
+
+    assert second["severity"] == "unknown"
+    assert second["latest_reading"] is None
+    assert second["last_anomaly"] is None
@@ -0,0 +1,125 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from ai.anomaly.detector import AnomalyDetector
+from ai.anomaly.forecast_residual import ForecastBand, ForecastIntervalIndex
+from ai.db.connection import Base
+from ai.db.models import Prediction, Sensor
+from ai.db.sqlite_backend import create_sqlite_engine
+from ai.db.timeseries import epoch_microseconds
+from ai.schemas.forecast import ForecastPoint
+
+NOW = datetime.now(timezone.utc).replace(microsecond=0)
+HOUR = 3_600_000_000
+
+
+def _prediction(sensor_id, parameter, bands, start=NOW, created_at=NOW, prediction_id=None):
+    """`bands` is one (lower, upper) per hourly step from `start`."""
+    points = [
+        ForecastPoint(timestamp=start + timedelta(hours=i), value=(lo + hi) / 2, lower=lo, upper=hi)
+        for i, (lo, hi) in enumerate(bands)
+    ]
+    prediction = Prediction(
+        id=prediction_id,
+        sensor_id=sensor_id,
+        parameter=parameter,
+        forecast_start=points[0].timestamp,
+        forecast_end=points[-1].timestamp,
+        created_at=created_at,
+    )
+    prediction.set_forecast_points(points)
+    return prediction
+
+
+def test_band_interpolates_between_steps_and_stops_at_the_horizon():
+    band = ForecastBand.from_prediction(_prediction(1, "ph", [(6.0, 7.0), (7.0, 9.0)]))
+    start = epoch_microseconds(NOW)
+
+    assert band.interval(start) == (6.0, 7.0)
+    assert band.interval(start + HOUR // 4) == pytest.approx((6.25, 7.5))
+    assert band.interval(start + HOUR) == (7.0, 9.0)
+    assert band.interval(start - 1) is None
+    assert band.interval(start + HOUR + 1) is None
+
+
+def test_band_skips_points_without_bounds():
+    prediction = _prediction(1, "ph", [(6.0, 7.0), (6.0, 7.0)])
+    prediction.point_lower = [None, 6.0]
+    band = ForecastBand.from_prediction(prediction)
+
+    assert band.times == [epoch_microseconds(NOW + timedelta(hours=1))]
+
+
+def test_only_readings_far_outside_the_band_are_flagged():
+    index = ForecastIntervalIndex(enabled=True, margin=1.0)
+    index.set_predictions([_prediction(1, "ph", [(6.5, 7.5)] * 3)])
+    timestamp = epoch_microseconds(NOW + timedelta(minutes=30))
+
+    assert index.check(1, timestamp, {"ph": 7.4}) == []
+    assert index.check(1, timestamp, {"ph": 7.8}) == []  # outside, but by < a half-width
+    (hit,) = index.check(1, timestamp, {"ph": 5.5, "turbidity": 500.0})
+    assert (hit.parameter, hit.lower, hit.upper) == ("ph", 6.5, 7.5)
+    assert hit.score == pytest.approx(2.0)
+    assert index.check(2, timestamp, {"ph": 1.0}) == []
+
+
+def test_refresh_never_goes_back_to_an_older_prediction():
+    index = ForecastIntervalIndex(enabled=True)
+    newer = _prediction(1, "ph", [(6.0, 7.0)] * 2, created_at=NOW, prediction_id=2)
+    older = _prediction(1, "ph", [(1.0, 2.0)] * 2, created_at=NOW - timedelta(hours=1))
+    index.set_predictions([newer], sensor_id=1)
+    index.set_predictions([older])
+
+    assert index.bands[1]["ph"].prediction_id == 2
+
+    index.set_predictions([], sensor_id=1)
+    assert index.bands == {}
+
+
+@pytest_asyncio.fixture
+async def sessions():
+    engine = create_sqlite_engine("sqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    try:
+        yield async_sessionmaker(engine, expire_on_commit=False)
+    finally:
+        await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_index_loads_latest_unexpired_predictions_from_the_database(sessions):
+    async with sessions() as db:
+        db.add_all(
+            [Sensor(id=1, sensor_id="S1", name="S1"), Sensor(id=2, sensor_id="S2", name="S2")]
+        )
+        db.add_all(
+            [
+                _prediction(1, "ph", [(1.0, 2.0)] * 3, created_at=NOW - timedelta(hours=2)),
+                _prediction(1, "ph", [(6.5, 7.5)] * 3, created_at=NOW - timedelta(hours=1)),
+                _prediction(1, "turbidity", [(0.0, 20.0)] * 3),
+                # Expired: its horizon ended before now.
+                _prediction(2, "ph", [(6.5, 7.5)] * 3, start=NOW - timedelta(days=2)),
+            ]
+        )
+        await db.commit()
+
+    index = ForecastIntervalIndex(enabled=True, session_factory=sessions)
+    await index.load()
+
+    assert {sensor: set(bands) for sensor, bands in index.bands.items()} == {1: {"ph", "turbidity"}}
+    assert index.bands[1]["ph"].lower[0] == 6.5
+
+    async with sessions() as db:
+        db.add(_prediction(1, "ph", [(3.0, 4.0)] * 3, created_at=NOW))
+        await db.commit()
+    await index.apply({"sensor_id": 1})
+
+    detector = AnomalyDetector(forecast_intervals=index)
+    timestamp = NOW + timedelta(hours=1)
+    anomalies = detector.detect_forecast_residual_anomalies(1, {"ph": 7.0}, timestamp)
+    assert [(a.parameter, a.detection_method) for a in anomalies] == [("ph", "forecast_residual")]
+    assert anomalies[0].anomaly_score == pytest.approx(6.0)
@@ -1,3 +1,4 @@
+import asyncio
 import pytest
 import pandas as pd
 from unittest.mock import MagicMock, patch
@@ -67,3 +68,192 @@ def test_validate_data_requirements():
 
         # Should return True but log warning (check logs manually if needed, or mock logger)
         assert client.validate_data_requirements(short_df) is True
+
+
+def test_prediction_stores_points_column_wise():
+    from datetime import datetime, timedelta, timezone
+    from ai.db.models import Prediction
+
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    points = [
+        ForecastPoint(timestamp=start, value=7.0, lower=6.8, upper=7.2),
+        ForecastPoint(timestamp=start + timedelta(hours=1), value=6.9),
+    ]
+    prediction = Prediction(sensor_id=1, parameter="ph")
+    prediction.set_forecast_points(points)
+
+    assert prediction.point_values == [7.0, 6.9]
+    assert prediction.point_lower == [6.8, None]
+    assert prediction.legacy_forecast_values is None
+    assert prediction.forecast_values[1] == {
+        "timestamp": start + timedelta(hours=1),
+        "value": 6.9,
+        "lower": None,
+        "upper": None,
+    }
+
+
+def test_prediction_points_are_double_precision():
+    from sqlalchemy.dialects import postgresql
+    from sqlalchemy.schema import CreateTable
+    from ai.db.models import Prediction
+
+    ddl = str(CreateTable(Prediction.__table__).compile(dialect=postgresql.dialect()))
+    # REAL[] would serve 7.1 back as 7.099999904632568.
+    assert "point_values FLOAT[]" in ddl
+    assert "REAL" not in ddl
+
+
+def test_prediction_reads_legacy_json_points():
+    from ai.db.models import Prediction
+
+    prediction = Prediction(
+        sensor_id=1,
+        parameter="ph",
+        legacy_forecast_values=[
+            {"timestamp": "2024-01-01T00:00:00Z", "value": 7.0, "lower": 6.3, "upper": 7.7},
+            {"timestamp": "2024-01-01T01:00:00Z", "value": None},
+        ],
+    )
+
+    timestamps, values, lower, upper = prediction.point_columns()
+    assert values == [7.0, None]
+    assert len(prediction.forecast_values) == 1
+
+
+def test_format_forecast_points_vectorized_confidence():
+    from datetime import datetime, timezone
+    from ai.db.models import Prediction
+    from ai.main import _format_forecast_points
+
+    ts = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    prediction = Prediction(
+        sensor_id=1,
+        parameter="ph",
+        point_timestamps=[ts, ts, ts],
+        point_values=[7.0, 7.0, None],
+        point_lower=[6.3, None, None],
+        point_upper=[7.7, None, None],
+    )
+
+    points = _format_forecast_points(prediction, data_quality=1.0)
+
+    assert [p["ph_pred"] for p in points] == [7.0, 7.0]
+    assert points[0]["confidence"] == 0.8
+    assert points[1]["confidence"] == 0.7
+    assert _format_forecast_points(None) == []
+
+
+def test_latest_predictions_query_uses_distinct_on():
+    import asyncio
+    from sqlalchemy.dialects import postgresql
+    from ai.main import _get_latest_predictions
+
+    captured = []
+    session = MagicMock()
+
+    async def execute(stmt):
+        captured.append(stmt)
+        return MagicMock()
+
+    session.execute = execute
+    asyncio.run(_get_latest_predictions(session, 1, parameter="ph"))
+
+    sql = str(captured[0].compile(dialect=postgresql.dialect()))
+    assert "DISTINCT ON (predictions.parameter)" in sql
+    assert "ORDER BY predictions.parameter, predictions.created_at DESC" in sql
+
+
+def test_forecast_timeline_query_is_one_statement():
+    from datetime import datetime, timezone
+    from sqlalchemy.dialects import postgresql
+    from ai.main import _forecast_timeline_query
+
+    stmt = _forecast_timeline_query(1, datetime(2024, 1, 8, tzinfo=timezone.utc))
+    sql = str(stmt.compile(dialect=postgresql.dialect()))
+
+    assert sql.count("LEFT OUTER JOIN") == 2
+    assert "min(readings.timestamp)" in sql
+    assert "count(*)" in sql
+    assert "predictions.parameter = " in sql
+
+
+class _TimelineSession:
+    def __init__(self, row):
+        self.row = row
+        self.executed = 0
+
+    async def execute(self, _query):
+        self.executed += 1
+        row = self.row
+
+        class _Result:
+            def one(self):
+                return row
+
+        return _Result()
+
+
+def test_forecast_compatibility_single_round_trip_and_cached(client, cache_redis):
+    from datetime import datetime, timedelta, timezone
+    from ai.cache.response_cache import response_cache
+    from ai.db.connection import get_db
+    from ai.db.models import Prediction, Reading
+    from ai.main import app
+
+    now = datetime(2024, 1, 8, tzinfo=timezone.utc)
+    reading = Reading(sensor_id=1, timestamp=now, ph=7.0, turbidity=10.0, temperature=27.0)
+    prediction = Prediction(
+        sensor_id=1,
+        parameter="ph",
+        point_timestamps=[now + timedelta(hours=1)],
+        point_values=[7.1],
+        point_lower=[6.9],
+        point_upper=[7.3],
+    )
+    session = _TimelineSession((reading, prediction, now - timedelta(hours=48), 24))
+
+    async def override_get_db():
+        yield session
+
+    app.dependency_overrides[get_db] = override_get_db
+    try:
+        first = client.post("/api/v1/forecast", json={"sensor_id": 1})
+        assert first.status_code == 200
+        body = first.json()
+        assert body["history_hours"] == 48
+        assert body["warning"] is None
+        assert body["forecast"][0]["ph_pred"] == 7.1
+        assert body["latest_reading"]["ph"] == 7.0
+
+        second = client.post("/api/v1/forecast", json={"sensor_id": 1})
+        assert second.json() == body
+        assert session.executed == 1
+
+        asyncio.run(response_cache.invalidate("readings:1"))
+        client.post("/api/v1/forecast", json={"sensor_id": 1})
+        assert session.executed == 2
+    finally:
+        app.dependency_overrides.pop(get_db, None)
+
+
+def test_forecast_compatibility_without_data(client, monkeypatch):
+    from ai.cache.response_cache import response_cache
+    from ai.db.connection import get_db
+    from ai.main import app
+
+    monkeypatch.setattr(response_cache, "_redis_retry_at", float("inf"))
+    session = _TimelineSession((None, None, None, 0))
+
+    async def override_get_db():
+        yield session
+
+    app.dependency_overrides[get_db] = override_get_db
+    try:
+        body = client.post("/api/v1/forecast", json={"sensor_id": 2}).json()
+        assert body["forecast"] == []
+        assert body["anomaly"]["severity"] == "unknown"
+        assert body["latest_reading"] is None
+        assert body["warning"].startswith("Insufficient data")
+    finally:
+        app.dependency_overrides.pop(get_db, None)
@@ -0,0 +1,193 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+from ai.cache.hot_window import HotWindow, SensorRingBuffer, reading_event
+from ai.db.timeseries import epoch_microseconds
+from ai.realtime.event_bus import EventBus
+
+NOW = datetime.now(timezone.utc).replace(microsecond=0)
+
+
+def _values(ph=7.1, signal_strength=-70):
+    return {
+        "ph": ph,
+        "turbidity": 12.5,
+        "temperature": 27.3,
+        "battery_voltage": 3.7,
+        "signal_strength": signal_strength,
+    }
+
+
+def _ready_window(max_points=8):
+    window = HotWindow(hours=24, max_points=max_points)
+    window.loaded_from = epoch_microseconds(NOW - timedelta(hours=24))
+    window.ready = True
+    return window
+
+
+def test_ring_buffer_grows_then_evicts_oldest():
+    buffer = SensorRingBuffer(covered_from=0, max_points=100)
+    for i in range(150):
+        assert buffer.append(1_000 + i, i, _values())
+
+    assert buffer.capacity == 100
+    assert buffer.size == 100
+    assert buffer.covered_from == 1_000 + 49 + 1
+    assert buffer.last_timestamp() == 1_149
+    indices = buffer.select(0)
+    assert buffer.ids[indices].tolist() == list(range(50, 150))
+
+
+def test_ring_buffer_rows_restore_decimals_and_nulls():
+    buffer = SensorRingBuffer(covered_from=0)
+    buffer.append(epoch_microseconds(NOW), 7, _values(ph=None, signal_strength=-71))
+    buffer.append(epoch_microseconds(NOW) + 1, 8, _values())
+
+    rows = buffer.rows(buffer.select(0))
+    assert rows[0] == (7, NOW, None, 12.5, 27.3, 3.7, -71)
+    assert rows[1][2] == 7.1
+    assert buffer.values["ph"].dtype == np.float32
+
+
+def test_ring_buffer_skips_duplicates_and_rejects_late_readings():
+    buffer = SensorRingBuffer(covered_from=0)
+    assert buffer.append(10, 1, _values())
+    assert buffer.append(10, 1, _values())
+    assert buffer.size == 1
+    assert not buffer.append(5, 2, _values())
+
+
+def test_window_requires_coverage():
+    window = _ready_window()
+    for minutes in (30, 20, 10):
+        window.apply(reading_event(1, minutes, NOW - timedelta(minutes=minutes), **_values()))
+
+    rows = window.window(1, NOW - timedelta(hours=1))
+    assert [row[0] for row in rows] == [10, 20, 30]
+    assert window.count(1, "ph", NOW - timedelta(minutes=25)) == 2
+    assert window.window(1, NOW - timedelta(hours=48)) is None
+    assert window.window(2, NOW - timedelta(hours=1)) is None
+
+
+def test_eviction_narrows_coverage():
+    window = _ready_window(max_points=2)
+    for minutes in (30, 20, 10):
+        window.apply(reading_event(1, minutes, NOW - timedelta(minutes=minutes), **_values()))
+
+    assert window.window(1, NOW - timedelta(minutes=25)) is not None
+    assert window.window(1, NOW - timedelta(minutes=35)) is None
+    assert [row[0] for row in window.latest(1, 2)] == [10, 20]
+    assert window.latest(1, 3) is None
+
+
+def test_late_reading_resets_sensor():
+    window = _ready_window()
+    window.apply(reading_event(1, 1, NOW - timedelta(minutes=10), **_values()))
+    window.apply(reading_event(1, 2, NOW - timedelta(minutes=20), **_values()))
+
+    assert window.resets == 1
+    assert window.window(1, NOW - timedelta(hours=1)) is None
+    window.apply(reading_event(1, 3, NOW, **_values()))
+    assert [row[0] for row in window.window(1, NOW - timedelta(minutes=5))] == [3]
+
+
+def test_not_ready_window_falls_back():
+    window = HotWindow(hours=24)
+    assert window.window(1, NOW - timedelta(hours=1)) is None
+    assert window.count(1, "ph", NOW - timedelta(hours=1)) is None
+    assert window.latest(1, 1) is None
+
+
+class _LoadSession:
+    def __init__(self, window, rows):
+        self.window = window
+        self.rows = rows
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, statement):
+        rows = self.rows
+        if "sensors" in str(statement):
+            # An event that arrives mid-load must be replayed afterwards.
+            self.window.apply(reading_event(1, 99, NOW, **_values()))
+            rows = [1]
+
+        class _Result:
+            def all(self):
+                return rows
+
+            def scalars(self):
+                return self
+
+        return _Result()
+
+
+@pytest.mark.asyncio
+async def test_load_replays_events_received_during_load():
+    window = HotWindow(hours=24)
+    rows = [(5, NOW - timedelta(hours=1), 7.0, 10.0, 27.0, 3.7, -70)]
+
+    await window.load(lambda: _LoadSession(window, rows))
+
+    assert window.ready
+    assert [row[0] for row in window.window(1, NOW - timedelta(hours=2))] == [99, 5]
+    assert window.stats()["points"] == 2
+
+
+@pytest.mark.asyncio
+async def test_event_bus_skips_its_own_messages():
+    bus = EventBus("test")
+    received = []
+    bus.subscribe(received.append)
+
+    await bus.handle_message(json.dumps({"origin": bus.origin, "event": {"id": 1}}))
+    await bus.handle_message(json.dumps({"origin": "other", "event": {"id": 2}}))
+
+    assert received == [{"id": 2}]
+
+
+@pytest.mark.asyncio
+async def test_disconnect_and_remote_reset():
+    bus = EventBus("test")
+    window = _ready_window()
+    window.apply(reading_event(1, 1, NOW, **_values()))
+    resets = []
+    bus.on_reset(lambda: resets.append(1))
+    bus.on_disconnect(window.mark_stale)
+
+    await bus._run_hooks(bus._disconnect_handlers, "Disconnect")
+    # Other workers' writes may be missed: fall back to the database.
+    assert window.window(1, NOW - timedelta(hours=1)) is None
+
+    await bus.handle_message(json.dumps({"origin": "simulator", "reset": True}))
+    assert resets == [1]
+
+
+@pytest.mark.asyncio
+async def test_load_started_before_missed_events_is_redone():
+    window = HotWindow(hours=24)
+    rows = [(5, NOW - timedelta(hours=1), 7.0, 10.0, 27.0, 3.7, -70)]
+    loads = []
+
+    def session_factory():
+        loads.append(1)
+        if len(loads) == 1:
+            # A reset arrives while the first load is running.
+            window.reload()
+        return _LoadSession(window, rows)
+
+    window.load = lambda: HotWindow.load(window, session_factory)
+    window.reload()
+    await window._load_task
+    assert not window.ready
+    await window._load_task
+
+    assert len(loads) == 2
+    assert window.ready
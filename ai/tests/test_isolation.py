@@ -0,0 +1,133 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from ai.anomaly.detector import AnomalyDetector
+from ai.anomaly.isolation import (
+    ISOLATION_METHOD,
+    IsolationModel,
+    IsolationScorer,
+    train_models,
+    window_features,
+)
+from ai.db.connection import Base
+from ai.db.models import Reading, Sensor
+from ai.db.sqlite_backend import create_sqlite_engine
+from ai.db.timeseries import epoch_microseconds
+
+PARAMETERS = ("ph", "turbidity")
+START = datetime(2024, 3, 1, tzinfo=timezone.utc)
+
+
+def _history(count, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.column_stack([7.0 + rng.normal(0, 0.05, count), 15.0 + rng.normal(0, 1.0, count)])
+
+
+@pytest.fixture(scope="module")
+def model():
+    return IsolationModel.fit(1, PARAMETERS, _history(3000), trees=50, seed=0)
+
+
+def test_window_features_match_the_online_window():
+    values = _history(30)
+    batch = window_features(values, 5)
+    last = window_features(values[-5:], 5)
+
+    assert batch.shape == (26, 4 * len(PARAMETERS))
+    np.testing.assert_allclose(batch[-1:], last)
+    np.testing.assert_allclose(last[0, :2], values[-1])
+    np.testing.assert_allclose(last[0, 6:], values[-1] - values[-2])
+
+
+def test_forest_scores_outliers_above_its_threshold(model):
+    normal = model.score(window_features(_history(2000, seed=1)))
+    recent = _history(20, seed=2)
+    recent[-1] = (5.0, 60.0)
+    outlier = model.score(window_features(recent))[-1]
+
+    assert (normal > model.threshold).mean() < 0.01
+    assert outlier > model.threshold > np.median(normal)
+    # Scoring one row takes the 1-D path; it must agree with the batch path.
+    features = window_features(recent)
+    np.testing.assert_allclose(model.score(features[-1:]), model.score(features)[-1:])
+
+
+def test_artifact_round_trip(model, tmp_path):
+    path = model.save(tmp_path)
+    restored = IsolationModel.load(path)
+    features = window_features(_history(500, seed=3))
+
+    assert path.name == "isolation_sensor_1.npz"
+    assert path.stat().st_size < 100_000
+    assert (restored.parameters, restored.threshold) == (model.parameters, model.threshold)
+    np.testing.assert_array_equal(restored.score(features), model.score(features))
+
+
+def test_online_scoring_matches_batch_scoring(model):
+    scorer = IsolationScorer(enabled=True)
+    scorer.add_model(model)
+    detector = AnomalyDetector(isolation=scorer)
+    values = _history(60, seed=4)
+    values[40] = (5.0, 60.0)
+    timestamps = [START + timedelta(minutes=i) for i in range(len(values))]
+
+    online = []
+    for timestamp, (ph, turbidity) in zip(timestamps, values.tolist()):
+        online += detector.detect_isolation_anomalies(
+            1, {"ph": ph, "turbidity": turbidity}, timestamp
+        )
+    batch = detector.detect_isolation_batch(
+        1,
+        np.array([epoch_microseconds(timestamp) for timestamp in timestamps]),
+        {"ph": values[:, 0], "turbidity": values[:, 1]},
+    )
+
+    assert [a.model_dump() for a in online] == [a.model_dump() for a in batch]
+    assert online[0].timestamp == timestamps[40]
+    assert (online[0].detection_method, online[0].parameter) == (ISOLATION_METHOD, "turbidity")
+    # Late readings and sensors without a model are not scored.
+    assert (
+        scorer.observe(1, epoch_microseconds(timestamps[40]), {"ph": 5.0, "turbidity": 60.0})
+        is None
+    )
+    assert detector.detect_isolation_anomalies(2, {"ph": 1.0}, timestamps[0]) == []
+
+
+@pytest.mark.asyncio
+async def test_training_writes_loadable_models(tmp_path):
+    engine = create_sqlite_engine(f"sqlite:///{tmp_path / 'train.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    factory = async_sessionmaker(engine, expire_on_commit=False)
+    async with factory() as db:
+        db.add_all(
+            [Sensor(id=1, sensor_id="S1", name="S1"), Sensor(id=2, sensor_id="S2", name="S2")]
+        )
+        db.add_all(
+            Reading(
+                sensor_id=1,
+                timestamp=START + timedelta(minutes=i),
+                ph=ph,
+                turbidity=turbidity,
+                temperature=None,
+            )
+            for i, (ph, turbidity) in enumerate(_history(800).tolist())
+        )
+        db.add(Reading(sensor_id=2, timestamp=START, ph=7.0, turbidity=15.0))
+        await db.commit()
+
+    try:
+        (summary,) = await train_models(
+            [1, 2], model_dir=str(tmp_path), workers=1, session_factory=factory, seed=0
+        )
+    finally:
+        await engine.dispose()
+
+    # Temperature was never reported, so sensor 1's model leaves it out.
+    assert (summary["sensor_id"], summary["parameters"]) == (1, ["ph", "turbidity"])
+    scorer = IsolationScorer(enabled=True, model_dir=str(tmp_path))
+    assert scorer.load_models() == 1
+    assert scorer.stats() == {"enabled": True, "models": 1, "warming_up": 1}
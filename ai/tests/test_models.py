@@ -1,22 +1,25 @@
 import pytest
-from sqlalchemy import text
+from sqlalchemy import inspect, text
 from ai.db.connection import engine, Base
 from ai.db.models import Sensor, Reading
+from ai.db.sqlite_backend import create_sqlite_engine
 
 
 @pytest.mark.asyncio
 async def test_create_tables():
     """Test that tables are created successfully."""
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.drop_all)
-        await conn.run_sync(Base.metadata.create_all)
+    # The model layer is dialect-neutral; SQLite keeps this test container-free.
+    sqlite_engine = create_sqlite_engine("sqlite://")
+    try:
+        async with sqlite_engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.run_sync(Base.metadata.create_all)
 
-    # Verify tables exist
-    async with engine.connect() as conn:
-        result = await conn.execute(
-            text("SELECT tablename FROM pg_tables WHERE schemaname = 'public';")
-        )
-        tables = [row[0] for row in result.fetchall()]
+        # Verify tables exist
+        async with sqlite_engine.connect() as conn:
+            tables = await conn.run_sync(lambda sync_conn: inspect(sync_conn).get_table_names())
+    finally:
+        await sqlite_engine.dispose()
 
         assert "sensors" in tables
         assert "readings" in tables
@@ -30,18 +33,24 @@ async def test_create_tables():
 @pytest.mark.asyncio
 async def test_hypertable_creation():
     """Test that readings table is converted to hypertable."""
-    # This might fail if TimescaleDB extension is not loaded or if we are not on a real DB
-    async with engine.connect() as conn:
-        try:
-            # Check if it's a hypertable
-            result = await conn.execute(
-                text(
-                    "SELECT * FROM timescaledb_information.hypertables WHERE hypertable_name = 'readings';"
-                )
+    # This might fail if TimescaleDB extension is not loaded or if we are not on a real DB.
+    # Hypertables only exist on TimescaleDB, so this stays on the configured Postgres.
+    try:
+        conn = await engine.connect()
+    except Exception as e:
+        pytest.skip(f"Skipping hypertable check, database unavailable: {e}")
+    try:
+        # Check if it's a hypertable
+        result = await conn.execute(
+            text(
+                "SELECT * FROM timescaledb_information.hypertables WHERE hypertable_name = 'readings';"
             )
-            row = result.fetchone()
-            # If extension is missing or table not converted, this might be None or query might fail
-            if row:
-                assert row is not None
-        except Exception as e:
-            pytest.skip(f"Skipping hypertable check: {e}")
+        )
+        row = result.fetchone()
+        # If extension is missing or table not converted, this might be None or query might fail
+        if row:
+            assert row is not None
+    except Exception as e:
+        pytest.skip(f"Skipping hypertable check: {e}")
+    finally:
+        await conn.close()
@@ -0,0 +1,136 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+from ai.anomaly.detector import AnomalyDetector
+from ai.anomaly.multivariate import (
+    MAHALANOBIS_AMD_METHOD,
+    MAHALANOBIS_METHOD,
+    MULTIVARIATE_WARMUP,
+    CovarianceState,
+    MultivariateDetector,
+)
+from ai.cache.hot_window import reading_event
+from ai.data_generator.synthetic import AMDWaterQualityGenerator
+
+START = datetime(2024, 3, 1, tzinfo=timezone.utc)
+MINUTE = 60_000_000
+
+
+def _feed(detector, ph, turbidity, sensor_id=1, offset=0):
+    """Observe the pairs one minute apart; returns the hit (or None) per reading."""
+    return [
+        detector.observe(sensor_id, i * MINUTE, {"ph": p, "turbidity": t})
+        for i, (p, t) in enumerate(zip(ph, turbidity), start=offset)
+    ]
+
+
+def _correlated(count, seed=1):
+    """pH and turbidity that normally rise together (e.g. runoff with alkaline sediment)."""
+    rng = np.random.default_rng(seed)
+    common = rng.normal(0, 1, count)
+    ph = 7.0 + 0.1 * (0.9 * common + 0.3 * rng.normal(0, 1, count))
+    turbidity = 15.0 + 4.0 * (0.9 * common + 0.3 * rng.normal(0, 1, count))
+    return ph.tolist(), turbidity.tolist()
+
+
+def test_welford_warm_up_matches_the_sample_covariance():
+    ph, turbidity = _correlated(MULTIVARIATE_WARMUP)
+    state = CovarianceState()
+    for p, t in zip(ph, turbidity):
+        assert state.update(p, t, 0.05, 1.0) is None
+
+    expected = np.cov(ph, turbidity)
+    assert state.warmed_up
+    assert (state.mean_p, state.mean_t) == pytest.approx((np.mean(ph), np.mean(turbidity)))
+    assert (state.var_p, state.cov_pt, state.var_t) == pytest.approx(
+        (expected[0, 0], expected[0, 1], expected[1, 1])
+    )
+
+
+def test_in_control_readings_are_quiet():
+    detector = MultivariateDetector(enabled=True)
+    hits = _feed(detector, *_correlated(1_000))
+
+    assert sum(hit is not None for hit in hits) <= 5
+
+
+def test_pair_breaking_the_correlation_is_flagged_though_each_value_is_ordinary():
+    detector = MultivariateDetector(enabled=True)
+    _feed(detector, *_correlated(300))
+    # Each about 1.5 sigma from its mean, but in opposite directions.
+    hit = detector.observe(1, 300 * MINUTE, {"ph": 6.85, "turbidity": 21.0})
+
+    assert hit is not None
+    assert hit.method == MAHALANOBIS_AMD_METHOD
+    assert hit.distance > 5
+    assert detector.observe(1, 301 * MINUTE, {"ph": 7.15, "turbidity": 21.0}) is None
+
+
+def test_generated_amd_warning_is_flagged_in_the_amd_direction():
+    generator = AMDWaterQualityGenerator(START, days=7, interval_minutes=60)
+    normal = generator.generate_normal_data()
+    warning = generator.generate_warning_data()
+    detector = MultivariateDetector(enabled=True)
+    _feed(detector, normal["ph"], normal["turbidity"])
+
+    hits = _feed(detector, warning["ph"], warning["turbidity"], offset=len(normal))
+    flagged = [hit for hit in hits if hit is not None]
+
+    assert flagged
+    assert {hit.method for hit in flagged[:5]} == {MAHALANOBIS_AMD_METHOD}
+    # Caught while pH is still inside the fixed warning band (>= 5.5).
+    assert flagged[0].ph > 5.5
+
+
+def test_no_verdicts_during_warm_up():
+    detector = MultivariateDetector(enabled=True)
+    hits = _feed(detector, [7.0] * (MULTIVARIATE_WARMUP - 1) + [3.0], [15.0] * MULTIVARIATE_WARMUP)
+
+    assert not any(hits)
+
+
+def test_missing_parameter_is_skipped():
+    detector = MultivariateDetector(enabled=True)
+    assert detector.observe(1, 0, {"ph": 7.0}) is None
+    assert detector.observe(1, 0, {"ph": 7.0, "turbidity": float("nan")}) is None
+    assert detector.states == {}
+
+
+def test_observe_is_idempotent_and_ignores_late_readings():
+    detector = MultivariateDetector(enabled=True)
+    _feed(detector, *_correlated(200))
+    first = detector.observe(1, 200 * MINUTE, {"ph": 6.5, "turbidity": 30.0})
+    count = detector.states[1].count
+
+    assert detector.observe(1, 200 * MINUTE, {"ph": 6.5, "turbidity": 30.0}) == first
+    assert detector.observe(1, 100 * MINUTE, {"ph": 1.0, "turbidity": 1.0}) is None
+    assert detector.states[1].count == count
+
+
+def test_snapshot_round_trip_continues_identically():
+    original = MultivariateDetector(enabled=True)
+    _feed(original, *_correlated(150))
+    restored = MultivariateDetector(enabled=True)
+    restored.restore({key.encode(): value.encode() for key, value in original.snapshot().items()})
+
+    ph, turbidity = _correlated(60, seed=3)
+    ph = [p - 0.01 * i for i, p in enumerate(ph)]
+    assert _feed(restored, ph, turbidity, offset=150) == _feed(original, ph, turbidity, offset=150)
+
+
+def test_detector_reports_hits_applied_from_the_event_bus():
+    detectors = MultivariateDetector(enabled=True)
+    detector = AnomalyDetector(multivariate=detectors)
+    ph, turbidity = _correlated(100)
+    for i, (p, t) in enumerate(zip(ph, turbidity)):
+        detectors.apply(reading_event(1, i, START + timedelta(minutes=i), ph=p, turbidity=t))
+
+    timestamp = START + timedelta(minutes=100)
+    detectors.apply(reading_event(1, 100, timestamp, ph=7.3, turbidity=8.0))
+    (anomaly,) = detector.detect_multivariate_anomalies(1, {"ph": 7.3, "turbidity": 8.0}, timestamp)
+
+    assert (anomaly.parameter, anomaly.value) == ("ph", 7.3)
+    assert anomaly.detection_method == MAHALANOBIS_METHOD
+    assert AnomalyDetector().detect_multivariate_anomalies(1, {"ph": 7.3}, timestamp) == []
@@ -0,0 +1,121 @@
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from ai.db.connection import get_db
+from ai.main import ANOMALY_RESPONSE_FIELDS, app
+from ai.utils.pagination import decode_cursor, encode_cursor, page_cursor
+
+
+class _CapturingSession:
+    def __init__(self, rows):
+        self.rows = rows
+        self.statements = []
+
+    async def execute(self, statement):
+        self.statements.append(statement)
+        rows = self.rows
+
+        class _Result:
+            def scalars(self):
+                return self
+
+            def all(self):
+                return rows
+
+        return _Result()
+
+
+AnomalyRow = namedtuple("AnomalyRow", ANOMALY_RESPONSE_FIELDS)
+
+
+def _anomaly(anomaly_id: int, timestamp: datetime) -> AnomalyRow:
+    return AnomalyRow(
+        id=anomaly_id,
+        sensor_id=1,
+        timestamp=timestamp,
+        parameter="ph",
+        value=4.2,
+        anomaly_score=0.9,
+        detection_method="threshold_critical",
+        created_at=timestamp,
+        end_timestamp=timestamp,
+        peak_value=4.2,
+        sample_count=1,
+    )
+
+
+def test_cursor_round_trip():
+    timestamp = datetime(2024, 3, 1, 12, 30, tzinfo=timezone.utc)
+    assert decode_cursor(encode_cursor(timestamp, 42)) == (timestamp, 42)
+
+
+@pytest.mark.parametrize(
+    "cursor", ["not-a-cursor", "e30", encode_cursor(datetime(2024, 1, 1), 1)[:-3]]
+)
+def test_decode_cursor_rejects_garbage(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+def test_page_cursor_only_when_more_rows():
+    base = datetime(2024, 3, 1, tzinfo=timezone.utc)
+    rows = [_anomaly(i, base - timedelta(minutes=i)) for i in range(3)]
+
+    page, cursor = page_cursor(rows, 3, "timestamp")
+    assert page == rows and cursor is None
+
+    page, cursor = page_cursor(rows, 2, "timestamp")
+    assert [row.id for row in page] == [0, 1]
+    assert decode_cursor(cursor) == (rows[1].timestamp, 1)
+
+
+def test_list_anomalies_seeks_past_cursor(client):
+    base = datetime(2024, 3, 1, tzinfo=timezone.utc)
+    session = _CapturingSession([_anomaly(i, base - timedelta(minutes=i)) for i in range(3)])
+
+    async def override_get_db():
+        yield session
+
+    app.dependency_overrides[get_db] = override_get_db
+    try:
+        cursor = encode_cursor(base, 10)
+        response = client.get(
+            "/api/v1/anomalies", params={"limit": 2, "cursor": cursor, "sensor_id": 1}
+        )
+    finally:
+        app.dependency_overrides.pop(get_db, None)
+
+    assert response.status_code == 200
+    assert [item["id"] for item in response.json()] == [0, 1]
+    assert decode_cursor(response.headers["x-next-cursor"])[1] == 1
+
+    sql = str(session.statements[0].compile(compile_kwargs={"literal_binds": True}))
+    assert "(anomalies.timestamp, anomalies.id) <" in sql
+    assert "ORDER BY anomalies.timestamp DESC, anomalies.id DESC" in sql
+    assert "OFFSET" not in sql
+    assert "LIMIT 3" in sql
+
+
+@pytest.mark.parametrize(
+    "params",
+    [
+        {"cursor": "garbage"},
+        {"start": "2024-03-02T00:00:00Z", "end": "2024-03-01T00:00:00Z"},
+    ],
+)
+def test_list_anomalies_rejects_bad_page_params(client, params):
+    session = _CapturingSession([])
+
+    async def override_get_db():
+        yield session
+
+    app.dependency_overrides[get_db] = override_get_db
+    try:
+        response = client.get("/api/v1/anomalies", params=params)
+    finally:
+        app.dependency_overrides.pop(get_db, None)
+
+    assert response.status_code == 400
+    assert session.statements == []
@@ -0,0 +1,105 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from ai.anomaly.detector import AnomalyDetector
+from ai.db.connection import Base
+from ai.db.models import Parameter, ReadingValue, Sensor
+from ai.db.parameters import ParameterRegistry, ParameterSpec, fetch_parameter_columns
+
+NOW = datetime(2024, 3, 1, 12, tzinfo=timezone.utc)
+
+
+@pytest_asyncio.fixture
+async def session():
+    engine = create_async_engine("sqlite+aiosqlite://")
+    tables = [model.__table__ for model in (Sensor, Parameter, ReadingValue)]
+    async with engine.begin() as conn:
+        await conn.run_sync(lambda sync: Base.metadata.create_all(sync, tables=tables))
+    async with AsyncSession(engine, expire_on_commit=False) as db:
+        db.add(Sensor(id=1, sensor_id="ESP32_TEST", name="Test"))
+        db.add(Parameter(key="ph", name="pH", column="ph"))
+        db.add(Parameter(key="sulfate", name="Sulfate", unit="mg/L", warning_high=250.0))
+        await db.commit()
+        yield db
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_resolve_registers_unknown_keys(session):
+    registry = ParameterRegistry()
+
+    specs = await registry.resolve(session, ["sulfate", "orp", "Bad Key!"])
+
+    assert set(specs) == {"sulfate", "orp"}
+    assert specs["sulfate"].warning_high == 250.0
+    assert specs["orp"].name == "Orp"
+    assert (await registry.get(session, "orp")).id == specs["orp"].id
+
+
+@pytest.mark.asyncio
+async def test_resolve_without_auto_register_drops_unknown(session):
+    registry = ParameterRegistry(auto_register=False)
+
+    specs = await registry.resolve(session, ["sulfate", "orp"])
+
+    assert set(specs) == {"sulfate"}
+
+
+@pytest.mark.asyncio
+async def test_reading_values_keeps_only_long_format_parameters(session):
+    registry = ParameterRegistry()
+
+    rows = await registry.reading_values(
+        session, 1, NOW, {"ph": 6.5, "sulfate": 310.0, "conductivity": None, "orp": 120.0}
+    )
+
+    assert sorted((row["parameter_id"], row["value"]) for row in rows) == sorted(
+        [
+            ((await registry.get(session, "sulfate")).id, 310.0),
+            ((await registry.get(session, "orp")).id, 120.0),
+        ]
+    )
+
+
+@pytest.mark.asyncio
+async def test_fetch_parameter_columns_groups_long_values(session):
+    registry = ParameterRegistry()
+    specs = await registry.resolve(session, ["sulfate", "orp"])
+    for minutes, sulfate in ((30, 200.0), (20, 260.0), (10, 300.0)):
+        session.add(
+            ReadingValue(
+                sensor_id=1,
+                parameter_id=specs["sulfate"].id,
+                timestamp=NOW - timedelta(minutes=minutes),
+                value=sulfate,
+            )
+        )
+    session.add(ReadingValue(sensor_id=1, parameter_id=specs["orp"].id, timestamp=NOW, value=150.0))
+    await session.commit()
+
+    series = await fetch_parameter_columns(
+        session, 1, [specs["sulfate"], specs["orp"]], start=NOW - timedelta(minutes=25)
+    )
+
+    assert series["sulfate"].values["sulfate"].tolist() == [260.0, 300.0]
+    assert series["sulfate"].timestamps[1] - series["sulfate"].timestamps[0] == 600_000_000
+    assert series["orp"].values["orp"].tolist() == [150.0]
+
+
+def test_registry_thresholds_flag_long_format_values():
+    detector = AnomalyDetector()
+    specs = {
+        "sulfate": ParameterSpec("sulfate", "Sulfate", warning_high=250.0, critical_high=500.0),
+        "dissolved_oxygen": ParameterSpec("dissolved_oxygen", "DO", warning_low=5.0),
+        "orp": ParameterSpec("orp", "ORP"),
+    }
+
+    anomalies = detector.detect_registry_anomalies(
+        1, {"sulfate": 600.0, "dissolved_oxygen": 4.0, "orp": -400.0}, NOW, specs
+    )
+
+    methods = {anomaly.parameter: anomaly.detection_method for anomaly in anomalies}
+    assert methods == {"sulfate": "threshold_critical", "dissolved_oxygen": "threshold_warning"}
@@ -0,0 +1,122 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+from ai.anomaly.detector import AnomalyDetector
+from ai.anomaly.rate_of_change import (
+    DEFAULT_RATE_RULES,
+    RateOfChangeDetector,
+    RateRule,
+    RollingSlope,
+    load_rate_rules,
+)
+from ai.cache.hot_window import reading_event
+
+START = datetime(2024, 3, 1, tzinfo=timezone.utc)
+SECOND = 1_000_000
+MINUTE = 60 * SECOND
+
+
+def test_rolling_slope_matches_least_squares_with_irregular_spacing():
+    rng = np.random.default_rng(5)
+    times = np.cumsum(rng.uniform(10, 300, 2_000)) + 1.7e9
+    values = 0.002 * (times - times[0]) + rng.normal(0, 0.5, len(times))
+    slope = RollingSlope(window=3600, max_gap=3600, max_points=10_000)
+
+    for t, x in zip(times, values):
+        slope.add(t, x)
+
+    in_window = times >= times[-1] - 3600
+    expected = np.polyfit(times[in_window] - times[-1], values[in_window], 1)[0]
+    assert len(slope.points) == in_window.sum()
+    assert slope.slope() == pytest.approx(expected, rel=1e-9)
+
+
+def test_slope_waits_for_enough_coverage():
+    slope = RollingSlope(window=3600, max_gap=3600, min_points=4, min_span=0.25)
+    for minute in range(3):
+        slope.add(minute * 60.0, 7.0 - minute)
+    assert slope.slope() is None  # too few points
+    slope.add(600.0, 7.0)
+    assert slope.slope() is None  # 10 minutes < a quarter of the window
+    slope.add(900.0, 7.0)
+    assert slope.slope() is not None
+
+
+def test_gap_clears_the_window():
+    slope = RollingSlope(window=3600, max_gap=1800)
+    for minute in range(0, 60, 5):
+        slope.add(minute * 60.0, 7.0)
+    slope.add(3 * 3600.0, 4.0)
+
+    assert list(slope.points) == [(3 * 3600.0, 4.0)]
+    assert slope.slope() is None
+
+
+def _feed(detector, series, sensor_id=1):
+    """`series` is (minutes, {parameter: value}); returns the hits per reading."""
+    return [
+        detector.observe(sensor_id, int(minutes * MINUTE), values) for minutes, values in series
+    ]
+
+
+def test_fast_acidification_is_critical_but_steady_low_ph_is_not():
+    detector = RateOfChangeDetector(
+        rules=[RateRule("ph", warning=-0.5, critical=-1.0)], enabled=True
+    )
+    falling = [(minute, {"ph": 7.0 - 1.4 * minute / 60}) for minute in range(0, 61, 5)]
+    hits = _feed(detector, falling)
+
+    assert hits[-1][0].severity == "critical"
+    assert hits[-1][0].rate == pytest.approx(-1.4)
+    assert hits[-1][0].value == pytest.approx(5.6)
+
+    steady = [(minute, {"ph": 5.4}) for minute in range(0, 121, 5)]
+    assert not any(_feed(detector, steady, sensor_id=2))
+
+
+def test_turbidity_acceleration():
+    rule = RateRule("turbidity", warning=40.0, critical=100.0, order=2)
+    detector = RateOfChangeDetector(rules=[rule], enabled=True)
+    # x = 30 t^2 (t in hours): slope 60 t NTU/h, acceleration 60 NTU/h^2.
+    series = [(minute, {"turbidity": 10 + 30 * (minute / 60) ** 2}) for minute in range(0, 121, 2)]
+    hits = _feed(detector, series)
+
+    last = hits[-1][0]
+    assert (last.method, last.severity) == ("accel", "warning")
+    assert last.rate == pytest.approx(60.0, rel=1e-6)
+
+
+def test_observe_is_idempotent_and_skips_late_readings():
+    detector = RateOfChangeDetector(rules=[RateRule("ph", warning=-0.5)], enabled=True)
+    _feed(detector, [(minute, {"ph": 7.0 - minute / 30}) for minute in range(0, 31, 5)])
+    (state,) = detector.states[1]
+    size = len(state.slope.points)
+
+    assert detector.observe(1, 30 * MINUTE, {"ph": 6.0}) == [state.last_hit]
+    assert detector.observe(1, 10 * MINUTE, {"ph": 1.0}) == []
+    assert len(state.slope.points) == size
+
+
+def test_detector_reports_rate_anomalies_from_events():
+    rates = RateOfChangeDetector(rules=[RateRule("ph", warning=-0.5, critical=-1.0)], enabled=True)
+    detector = AnomalyDetector(rate_of_change=rates)
+    for minute in range(0, 61, 5):
+        timestamp = START + timedelta(minutes=minute)
+        rates.apply(reading_event(1, minute, timestamp, ph=7.0 - 1.4 * minute / 60))
+
+    anomalies = detector.detect_rate_anomalies(1, {"ph": 5.6}, timestamp)
+
+    assert [anomaly.detection_method for anomaly in anomalies] == ["rate_critical"]
+    assert anomalies[0].anomaly_score == pytest.approx(1.4)
+
+
+def test_rules_from_environment(monkeypatch):
+    monkeypatch.setenv(
+        "RATE_OF_CHANGE_RULES", '[{"parameter": "ph", "warning": -0.3, "window_minutes": 30}]'
+    )
+    assert load_rate_rules() == (RateRule("ph", warning=-0.3, window_minutes=30),)
+
+    monkeypatch.setenv("RATE_OF_CHANGE_RULES", '[{"parameter": "ph"}]')
+    assert load_rate_rules() == DEFAULT_RATE_RULES
@@ -0,0 +1,177 @@
+import asyncio
+
+import pytest
+
+from ai.cache.response_cache import ResponseCache
+
+from .conftest import FakeCacheRedis
+
+
+@pytest.fixture
+def cache():
+    return ResponseCache(redis_client=FakeCacheRedis(), ttl_seconds=60)
+
+
+@pytest.mark.asyncio
+async def test_get_or_load_caches_until_invalidated(cache):
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        return b'{"n": %d}' % len(calls)
+
+    assert await cache.get_or_load(["alerts"], {"limit": 50}, loader) == b'{"n": 1}'
+    assert await cache.get_or_load(["alerts"], {"limit": 50}, loader) == b'{"n": 1}'
+    assert len(calls) == 1
+
+    await cache.invalidate("alerts")
+    assert await cache.get_or_load(["alerts"], {"limit": 50}, loader) == b'{"n": 2}'
+
+
+@pytest.mark.asyncio
+async def test_parameters_and_namespaces_are_isolated(cache):
+    async def loader_a():
+        return b"a"
+
+    async def loader_b():
+        return b"b"
+
+    assert await cache.get_or_load(["alerts"], {"limit": 10}, loader_a) == b"a"
+    assert await cache.get_or_load(["alerts"], {"limit": 20}, loader_b) == b"b"
+
+    await cache.invalidate("sensors")
+    assert await cache.get_or_load(["alerts"], {"limit": 10}, loader_b) == b"a"
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_share_one_load(cache):
+    calls = []
+    release = asyncio.Event()
+
+    async def loader():
+        calls.append(1)
+        await release.wait()
+        return b"[]"
+
+    tasks = [asyncio.create_task(cache.get_or_load(["sensors"], {}, loader)) for _ in range(5)]
+    await asyncio.sleep(0)
+    release.set()
+
+    assert await asyncio.gather(*tasks) == [b"[]"] * 5
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_load_is_not_cached(cache):
+    async def failing():
+        raise RuntimeError("db down")
+
+    async def loader():
+        return b"ok"
+
+    with pytest.raises(RuntimeError):
+        await cache.get_or_load(["sensors"], {}, failing)
+    assert await cache.get_or_load(["sensors"], {}, loader) == b"ok"
+
+
+@pytest.mark.parametrize(
+    ("value", "enabled"),
+    [("0", False), ("false", False), ("OFF", False), (" no ", False), ("1", True), ("", True)],
+)
+def test_enabled_flag_accepts_common_false_values(monkeypatch, value, enabled):
+    monkeypatch.setenv("RESPONSE_CACHE_ENABLED", value)
+    assert ResponseCache().enabled is enabled
+
+
+class _SensorListSession:
+    def __init__(self):
+        self.executed = 0
+
+    async def execute(self, _query):
+        self.executed += 1
+
+        class _Result:
+            def scalars(self):
+                return self
+
+            def all(self):
+                return []
+
+        return _Result()
+
+
+def test_unchanged_poll_returns_304_without_querying(client, cache_redis):
+    from ai.cache.response_cache import response_cache
+    from ai.db.connection import get_db
+    from ai.main import app
+
+    session = _SensorListSession()
+
+    async def override_get_db():
+        yield session
+
+    app.dependency_overrides[get_db] = override_get_db
+    try:
+        first = client.get("/api/v1/sensors")
+        assert first.status_code == 200
+        etag = first.headers["etag"]
+        assert etag.startswith('W/"')
+
+        second = client.get("/api/v1/sensors", headers={"If-None-Match": etag})
+        assert second.status_code == 304
+        assert second.headers["etag"] == etag
+        assert session.executed == 1
+
+        asyncio.run(response_cache.invalidate("sensors"))
+        third = client.get("/api/v1/sensors", headers={"If-None-Match": etag})
+        assert third.status_code == 200
+        assert third.headers["etag"] != etag
+        assert session.executed == 2
+    finally:
+        app.dependency_overrides.pop(get_db, None)
+
+
+@pytest.mark.asyncio
+async def test_without_redis_nothing_is_cached_and_invalidations_are_replayed(monkeypatch):
+    cache = ResponseCache(ttl_seconds=60)
+    cache._redis_retry_at = float("inf")
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        return b"[]"
+
+    assert await cache.generations(["alerts"]) is None
+    await cache.get_or_load(["alerts"], {}, loader)
+    await cache.get_or_load(["alerts"], {}, loader)
+    assert len(calls) == 2
+
+    # Entries cached before the outage must not be served once Redis is back.
+    await cache.invalidate("alerts")
+    redis = FakeCacheRedis()
+    monkeypatch.setattr("ai.cache.response_cache.redis.from_url", lambda *a, **kw: redis)
+    cache._redis_retry_at = 0.0
+    assert await cache.generations(["alerts", "sensors"]) == [1, 0]
+
+
+def test_polls_without_redis_get_no_etag(client, monkeypatch):
+    from ai.cache.response_cache import response_cache
+    from ai.db.connection import get_db
+    from ai.main import app
+
+    monkeypatch.setattr(response_cache, "_redis_retry_at", float("inf"))
+    session = _SensorListSession()
+
+    async def override_get_db():
+        yield session
+
+    app.dependency_overrides[get_db] = override_get_db
+    try:
+        first = client.get("/api/v1/sensors")
+        second = client.get("/api/v1/sensors", headers={"If-None-Match": 'W/"stale"'})
+    finally:
+        app.dependency_overrides.pop(get_db, None)
+
+    assert "etag" not in first.headers
+    assert second.status_code == 200
+    assert session.executed == 2
@@ -0,0 +1,225 @@
+import math
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import pytest
+
+from ai.anomaly.health import (
+    HEALTH_FAULT_PERSIST_READINGS,
+    HEALTH_FLATLINE_READINGS,
+    STATUS_DEGRADED,
+    STATUS_FAULTY,
+    STATUS_OFFLINE,
+    STATUS_OK,
+    SensorHealthMonitor,
+)
+from ai.cache.hot_window import reading_event
+from ai.db.connection import get_db
+from ai.main import app
+
+MINUTE = 60_000_000
+HOUR = 60 * MINUTE
+
+
+def _jitter(i, scale):
+    """Deterministic noise in [-scale, scale]."""
+    return scale * math.sin(i * 2.39996)
+
+
+def _feed(monitor, count, step=5 * MINUTE, start=0, sensor_id=1, **columns):
+    """Observe `count` readings; each column is a function of the reading index."""
+    transitions = []
+    for i in range(start, start + count):
+        values = {column: value(i) for column, value in columns.items()}
+        transitions.append(monitor.observe(sensor_id, i * step, values))
+    return transitions
+
+
+def _healthy(monitor, count=50, **overrides):
+    columns = {
+        "ph": lambda i: 7.0 + _jitter(i, 0.05),
+        "turbidity": lambda i: 15.0 + _jitter(i + 1, 2.0),
+        "battery_voltage": lambda i: 3.9,
+        "signal_strength": lambda i: -70,
+        **overrides,
+    }
+    return _feed(monitor, count, **columns)
+
+
+def _codes(report):
+    return {(issue.code, issue.parameter) for issue in report.issues}
+
+
+def test_healthy_sensor_is_ok():
+    monitor = SensorHealthMonitor(enabled=True)
+    _healthy(monitor)
+    report = monitor.report(1, now=49 * 5 * MINUTE)
+
+    assert (report.status, report.issues) == (STATUS_OK, [])
+    assert report.expected_interval_seconds == pytest.approx(300)
+    assert monitor.faulty_parameters(1) == set()
+
+
+def test_flatlined_probe_is_faulty_and_announced_once():
+    monitor = SensorHealthMonitor(enabled=True)
+    _healthy(monitor)
+    transitions = _feed(monitor, 60, start=50, ph=lambda i: 7.0, turbidity=lambda i: 15.0 + i % 3)
+
+    changes = [t for t in transitions if t is not None]
+    assert [(t.previous, t.status) for t in changes] == [(STATUS_OK, STATUS_FAULTY)]
+    # Both the reading count and the duration (120 min at 5 min) must be reached.
+    assert transitions.index(changes[0]) == max(HEALTH_FLATLINE_READINGS, 25) - 1
+    assert ("flatline", "ph") in _codes(monitor.report(1, now=109 * 5 * MINUTE))
+    assert monitor.faulty_parameters(1) == {"ph"}
+    # A redelivered reading returns the same verdict; a late one is ignored.
+    flatlined = _feed(monitor, 1, start=110, ph=lambda i: 7.0)
+    assert _feed(monitor, 1, start=110, ph=lambda i: 7.0) == flatlined
+    assert monitor.observe(1, 74 * 5 * MINUTE, {"ph": 6.0}) is None
+
+
+def test_implausible_variance_is_stuck_or_erratic():
+    stuck = SensorHealthMonitor(enabled=True)
+    _healthy(stuck, ph=lambda i: 7.0 + _jitter(i, 0.0002))
+    erratic = SensorHealthMonitor(enabled=True)
+    _healthy(erratic, turbidity=lambda i: 15.0 + _jitter(i, 150.0))
+
+    assert stuck.faulty_parameters(1) == {"ph"}
+    assert ("stuck", "ph") in _codes(stuck.report(1, now=0))
+    assert erratic.faulty_parameters(1) == {"turbidity"}
+    assert ("erratic", "turbidity") in _codes(erratic.report(1, now=0))
+
+
+def test_only_a_lasting_fault_suppresses_statistical_hits():
+    monitor = SensorHealthMonitor(enabled=True)
+    _healthy(monitor)
+    _feed(monitor, 1, start=50, ph=lambda i: 2.0, turbidity=lambda i: 15.0)
+
+    assert monitor.faulty_parameters(1) == {"ph"}
+    assert monitor.suppressed_parameters(1) == set()
+
+    _feed(monitor, HEALTH_FAULT_PERSIST_READINGS, start=51, ph=lambda i: 2.0 + _jitter(i, 3.0))
+    assert monitor.suppressed_parameters(1) == {"ph"}
+
+
+def test_gaps_are_dropouts_and_silence_is_offline():
+    monitor = SensorHealthMonitor(enabled=True)
+    _healthy(monitor, count=20)
+    # 40 minutes without a reading at a 5 minute cadence.
+    _feed(monitor, 5, start=28, ph=lambda i: 7.0 + _jitter(i, 0.05))
+    last = 32 * 5 * MINUTE
+
+    report = monitor.report(1, now=last)
+    assert report.status == STATUS_DEGRADED
+    assert ("dropout", None) in _codes(report)
+    assert monitor.report(1, now=last + HOUR).status == STATUS_OFFLINE
+    assert monitor.report(1, now=last + 25 * HOUR).status == STATUS_OFFLINE
+
+
+def test_a_new_cadence_is_learned_after_a_few_long_intervals():
+    monitor = SensorHealthMonitor(enabled=True)
+    _healthy(monitor, count=20)
+    # The sensor is reconfigured to report hourly.
+    _feed(monitor, 10, step=HOUR, start=2, ph=lambda i: 7.0 + _jitter(i, 0.05))
+
+    assert monitor.report(1, now=11 * HOUR).expected_interval_seconds == pytest.approx(
+        3600, rel=0.1
+    )
+    assert monitor.report(1, now=11 * HOUR + 30 * MINUTE).status != STATUS_OFFLINE
+
+
+def test_battery_discharge_trend_projects_the_cutoff():
+    monitor = SensorHealthMonitor(enabled=True)
+    # 0.1 V/day from 4.0 V, hourly for three days.
+    _feed(
+        monitor,
+        72,
+        step=HOUR,
+        ph=lambda i: 7.0 + _jitter(i, 0.05),
+        battery_voltage=lambda i: 4.0 - 0.1 * i / 24 + _jitter(i, 0.005),
+    )
+    report = monitor.report(1, now=71 * HOUR)
+
+    assert report.battery_slope_per_day == pytest.approx(-0.1, rel=0.1)
+    assert report.battery_voltage == pytest.approx(3.7, abs=0.01)
+    assert report.days_to_battery_cutoff == pytest.approx(5.0, rel=0.15)
+    assert ("battery_decay", None) in _codes(report)
+    assert report.status == STATUS_DEGRADED
+
+
+def test_weak_signal_and_low_battery_degrade():
+    monitor = SensorHealthMonitor(enabled=True)
+    _healthy(monitor, battery_voltage=lambda i: 3.3, signal_strength=lambda i: -110)
+    codes = _codes(monitor.report(1, now=49 * 5 * MINUTE))
+
+    assert {("battery_low", None), ("weak_signal", None)} <= codes
+
+
+def test_snapshot_round_trip_and_event_payloads():
+    original = SensorHealthMonitor(enabled=True)
+    for i in range(40):
+        original.apply(
+            reading_event(
+                3,
+                i,
+                datetime(2024, 3, 1, 0, i, tzinfo=timezone.utc),
+                ph=7.0,
+                turbidity=15.0 + _jitter(i, 2.0),
+                battery_voltage=3.8,
+                signal_strength=-80,
+            )
+        )
+    restored = SensorHealthMonitor(enabled=True)
+    restored.restore({key.encode(): value.encode() for key, value in original.snapshot().items()})
+
+    now = original.states[3].last_timestamp
+    assert restored.report(3, now=now) == original.report(3, now=now)
+    assert restored.states[3].status == original.states[3].status
+
+
+@pytest.mark.asyncio
+async def test_health_endpoints(monkeypatch):
+    monitor = SensorHealthMonitor(enabled=True)
+    monkeypatch.setattr("ai.main.sensor_health", monitor)
+    _healthy(monitor, count=30, ph=lambda i: 7.0 + _jitter(i, 0.0002))
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://edge") as client:
+        (fleet,) = (await client.get("/api/v1/fleet/health")).json()
+        sensor = (await client.get("/api/v1/sensors/1/health")).json()
+
+    assert fleet["sensor_id"] == 1
+    # Silent since 1970 by the wall clock.
+    assert sensor["status"] == STATUS_OFFLINE
+    assert {"code": "stuck", "severity": "faulty", "parameter": "ph"}.items() <= next(
+        issue for issue in sensor["issues"] if issue["code"] == "stuck"
+    ).items()
+    assert get_db not in app.dependency_overrides
+
+
+@pytest.mark.asyncio
+async def test_sudden_real_drop_still_raises_a_critical_alert(sqlite_sessions, monkeypatch):
+    monitor = SensorHealthMonitor(enabled=True)
+    monkeypatch.setattr("ai.main.sensor_health", monitor)
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://edge") as client:
+        for i in range(41):
+            ph = 7.0 + _jitter(i, 0.05) if i < 40 else 2.0
+            response = await client.post(
+                "/api/v1/sensors/ingest",
+                json={
+                    "sensor_id": "S1",
+                    "timestamp": (now - timedelta(minutes=5 * (40 - i))).isoformat(),
+                    "readings": {"ph": ph, "turbidity": 15.0 + _jitter(i + 1, 2.0)},
+                },
+            )
+            assert response.status_code == 200, response.text
+        alerts = (await client.get("/api/v1/alerts")).json()
+
+    # The drop inflates the variance past the erratic limit...
+    assert monitor.faulty_parameters(1) == {"ph"}
+    # ...but the breach is an event, not a probe fault, until proven otherwise.
+    (alert,) = alerts
+    assert alert["severity"] == "critical"
+    assert alert["message"] == "PH critical: 2.00 (probe health: faulty)"
@@ -0,0 +1,125 @@
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import pytest
+import pytest_asyncio
+from sqlalchemy import select
+
+from ai.db.connection import dialect_name
+from ai.db.models import Prediction, Reading, Sensor
+from ai.main import app
+from ai.schemas.forecast import ForecastPoint
+
+NOW = datetime.now(timezone.utc).replace(microsecond=0)
+
+
+@pytest_asyncio.fixture
+async def api(sqlite_sessions):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://edge") as client:
+        yield client
+
+
+def _payload(minutes_ago: int, ph: float, **extra):
+    return {
+        "sensor_id": "ESP32_EDGE",
+        "timestamp": (NOW - timedelta(minutes=minutes_ago)).isoformat(),
+        "readings": {"ph": ph, "turbidity": 12.0, "temperature": 27.5, **extra},
+    }
+
+
+@pytest.mark.asyncio
+async def test_schema_and_types_round_trip(sqlite_sessions):
+    async with sqlite_sessions() as db:
+        assert dialect_name(db) == "sqlite"
+        sensor = Sensor(sensor_id="ESP32_EDGE", name="Edge")
+        db.add(sensor)
+        await db.flush()
+        first = Reading(sensor_id=sensor.id, timestamp=NOW.astimezone(timezone(timedelta(hours=7))))
+        second = Reading(sensor_id=sensor.id, timestamp=NOW + timedelta(minutes=1))
+        prediction = Prediction(
+            sensor_id=sensor.id,
+            forecast_start=NOW,
+            forecast_end=NOW + timedelta(hours=1),
+            parameter="ph",
+        )
+        prediction.set_forecast_points(
+            [
+                ForecastPoint(timestamp=NOW, value=6.5, lower=6.0, upper=7.0),
+                ForecastPoint(timestamp=NOW + timedelta(hours=1), value=6.4),
+            ]
+        )
+        db.add_all([first, second, prediction])
+        await db.commit()
+
+    async with sqlite_sessions() as db:
+        readings = (await db.execute(select(Reading).order_by(Reading.id))).scalars().all()
+        assert [reading.id for reading in readings] == [1, 2]
+        assert readings[0].timestamp == NOW
+        assert readings[0].timestamp.tzinfo is not None
+
+        stored = (await db.execute(select(Prediction))).scalar_one()
+        assert stored.point_timestamps == [NOW, NOW + timedelta(hours=1)]
+        assert stored.point_lower == [6.0, None]
+
+
+@pytest.mark.asyncio
+async def test_ingest_to_dashboard_flow(api):
+    for minutes_ago, ph in ((20, 7.0), (10, 6.8), (0, 3.5)):
+        response = await api.post(
+            "/api/v1/sensors/ingest", json=_payload(minutes_ago, ph, sulfate=320.0)
+        )
+        assert response.status_code == 200, response.text
+    assert response.json()["anomalies_detected"] == 2
+
+    sensor_id = (await api.get("/api/v1/sensors")).json()[0]["id"]
+
+    readings = (await api.get(f"/api/v1/sensors/{sensor_id}/readings?hours=1")).json()
+    assert [reading["ph"] for reading in readings] == [3.5, 6.8, 7.0]
+    assert readings[0]["timestamp"].endswith("Z")
+
+    sulfate = (await api.get(f"/api/v1/sensors/{sensor_id}/parameters/sulfate/readings")).json()
+    assert [point["value"] for point in sulfate] == [320.0] * 3
+
+    (snapshot,) = (await api.get("/api/v1/fleet/snapshot")).json()
+    assert snapshot["severity"] == "critical"
+    assert snapshot["latest_reading"]["ph"] == 3.5
+    assert snapshot["active_alerts"] >= 1
+
+    anomalies = (await api.get(f"/api/v1/anomalies?sensor_id={sensor_id}")).json()
+    assert {anomaly["parameter"] for anomaly in anomalies} >= {"ph", "sulfate"}
+    assert (await api.get("/api/v1/alerts")).json()
+
+    generated = await api.post(f"/api/v1/forecast/generate?sensor_id={sensor_id}")
+    assert generated.json()["status"] == "success"
+    forecasts = (await api.get(f"/api/v1/forecast/{sensor_id}")).json()
+    assert {forecast["parameter"] for forecast in forecasts} >= {"ph", "sulfate"}
+
+    timeline = (await api.post("/api/v1/forecast", json={"sensor_id": sensor_id})).json()
+    assert timeline["latest_reading"]["ph"] == 3.5
+    assert timeline["history_hours"] == 1
+    assert timeline["warning"]
+
+
+@pytest.mark.asyncio
+async def test_resent_payload_with_registry_extras(api):
+    # Devices resend on reconnect; the long-format row must not fail the reading.
+    for _ in range(2):
+        response = await api.post("/api/v1/sensors/ingest", json=_payload(5, 7.0, sulfate=320.0))
+        assert response.status_code == 200, response.text
+
+    sensor_id = (await api.get("/api/v1/sensors")).json()[0]["id"]
+    sulfate = (await api.get(f"/api/v1/sensors/{sensor_id}/parameters/sulfate/readings")).json()
+    assert [point["value"] for point in sulfate] == [320.0]
+
+
+@pytest.mark.asyncio
+async def test_low_side_registry_thresholds(api):
+    response = await api.post("/api/v1/sensors/ingest", json=_payload(0, 7.0, dissolved_oxygen=1.5))
+    assert response.json()["anomalies_detected"] == 1
+
+    (anomaly,) = (await api.get("/api/v1/anomalies")).json()
+    assert (anomaly["parameter"], anomaly["detection_method"]) == (
+        "dissolved_oxygen",
+        "threshold_critical",
+    )
@@ -0,0 +1,159 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+from ai.anomaly.detector import AnomalyDetector
+from ai.anomaly.streaming import (
+    CUSUM_METHOD,
+    EWMA_METHOD,
+    STREAMING_WARMUP,
+    ZSCORE_METHOD,
+    StreamingDetectors,
+)
+from ai.cache.hot_window import reading_event
+from ai.db.timeseries import epoch_microseconds
+
+START = datetime(2024, 3, 1, tzinfo=timezone.utc)
+MINUTE = 60_000_000
+
+
+def _feed(detectors, values, sensor_id=1, parameter="ph", offset=0):
+    """Observe `values` one minute apart; returns the methods hit per reading."""
+    methods = []
+    for i, value in enumerate(values, start=offset):
+        hits = detectors.observe(sensor_id, i * MINUTE, {parameter: value})
+        methods.append({hit.method for hit in hits})
+    return methods
+
+
+def _noise(count, mean=7.0, sigma=0.1, seed=1):
+    return (mean + np.random.default_rng(seed).normal(0, sigma, count)).tolist()
+
+
+def test_in_control_signal_is_quiet():
+    detectors = StreamingDetectors(enabled=True)
+    methods = _feed(detectors, _noise(500))
+
+    assert sum(bool(hit) for hit in methods) <= 5
+
+
+def test_flat_signal_relies_on_the_sigma_floor():
+    detectors = StreamingDetectors(enabled=True)
+    methods = _feed(detectors, [7.0] * 100 + [7.01, 7.02, 7.0])
+
+    assert not any(methods)
+
+
+def test_slow_drift_is_caught_by_ewma_and_cusum():
+    detectors = StreamingDetectors(enabled=True)
+    baseline = _noise(200)
+    # 0.01 pH per reading: far below any single-reading jump.
+    drift = [value - 0.01 * i for i, value in enumerate(_noise(80, seed=2))]
+
+    methods = _feed(detectors, baseline + drift)[len(baseline) :]
+    first = {
+        method: next(i for i, hit in enumerate(methods) if method in hit)
+        for method in (EWMA_METHOD, CUSUM_METHOD)
+    }
+
+    assert all(index < 40 for index in first.values())
+    assert min(drift[: max(first.values()) + 1]) > 5.5  # well before the threshold
+
+
+def test_spike_is_caught_by_zscore():
+    detectors = StreamingDetectors(enabled=True)
+    methods = _feed(detectors, _noise(100) + [9.5])
+
+    assert ZSCORE_METHOD in methods[-1]
+
+
+def test_warm_up_suppresses_hits():
+    detectors = StreamingDetectors(enabled=True)
+    methods = _feed(detectors, [7.0] * (STREAMING_WARMUP - 1) + [2.0])
+
+    assert not any(methods)
+
+
+def test_observe_is_idempotent_and_ignores_late_readings():
+    detectors = StreamingDetectors(enabled=True)
+    _feed(detectors, _noise(100))
+    first = detectors.observe(1, 100 * MINUTE, {"ph": 9.5})
+    stream = detectors.streams[(1, "ph")]
+    count = stream.count
+
+    assert detectors.observe(1, 100 * MINUTE, {"ph": 9.5}) == first
+    assert detectors.observe(1, 50 * MINUTE, {"ph": 1.0}) == []
+    assert stream.count == count
+
+
+def test_snapshot_round_trip_continues_identically():
+    original = StreamingDetectors(enabled=True)
+    _feed(original, _noise(150))
+    restored = StreamingDetectors(enabled=True)
+    restored.restore({key.encode(): value.encode() for key, value in original.snapshot().items()})
+
+    tail = _noise(60, mean=6.6, seed=3)
+    assert _feed(restored, tail, offset=150) == _feed(original, tail, offset=150)
+
+
+def test_restore_keeps_newer_local_state():
+    detectors = StreamingDetectors(enabled=True)
+    _feed(detectors, _noise(50))
+    stale = detectors.snapshot()
+    _feed(detectors, _noise(10, seed=4), offset=50)
+    count = detectors.streams[(1, "ph")].count
+
+    detectors.restore(stale)
+
+    assert detectors.streams[(1, "ph")].count == count
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.hashes = {}
+
+    async def hset(self, key, mapping):
+        self.hashes.setdefault(key, {}).update(mapping)
+
+    async def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+
+@pytest.mark.asyncio
+async def test_state_survives_a_restart_through_redis():
+    redis = _FakeRedis()
+    before = StreamingDetectors(enabled=True, redis_client=redis)
+    _feed(before, _noise(100))
+    await before.save()
+
+    after = StreamingDetectors(enabled=True, redis_client=redis)
+    await after.load()
+
+    assert after.streams[(1, "ph")].to_state() == before.streams[(1, "ph")].to_state()
+
+
+def test_detector_reports_hits_applied_from_the_event_bus():
+    detectors = StreamingDetectors(enabled=True)
+    detector = AnomalyDetector(streaming=detectors)
+    for i, value in enumerate(_noise(100)):
+        detectors.apply(reading_event(1, i, START + timedelta(minutes=i), ph=value))
+
+    timestamp = START + timedelta(minutes=100)
+    detectors.apply(reading_event(1, 100, timestamp, ph=9.5, turbidity=None))
+    anomalies = detector.detect_streaming_anomalies(1, {"ph": 9.5}, timestamp)
+
+    assert ZSCORE_METHOD in {anomaly.detection_method for anomaly in anomalies}
+    assert all(anomaly.timestamp == timestamp for anomaly in anomalies)
+    assert detectors.streams[(1, "ph")].last_timestamp == epoch_microseconds(timestamp)
+    assert AnomalyDetector().detect_streaming_anomalies(1, {"ph": 9.5}, timestamp) == []
+
+
+def test_detector_stats_routes(client):
+    stats = client.get("/api/v1/anomaly/detectors/stats").json()
+    legacy = client.get("/api/v1/anomaly/streaming/stats").json()
+
+    assert {"streaming", "rate_of_change", "isolation", "anomaly_episodes"} <= stats.keys()
+    # The old path keeps its shape: streaming stats at the top level.
+    assert legacy["streams"] == stats["streaming"]["streams"]
+    assert legacy["isolation"] == stats["isolation"]
@@ -0,0 +1,214 @@
+import math
+from datetime import datetime, timezone
+
+import httpx
+import numpy as np
+import pandas as pd
+import pytest
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from ai.anomaly.batch import SEVERITY_CRITICAL, SEVERITY_WARNING, ThresholdLimits
+from ai.anomaly.detector import AnomalyDetector
+from ai.anomaly.rules import Rule, RuleSet, ThresholdRules, default_rules, threshold_rules
+from ai.cache.response_cache import response_cache
+from ai.db.connection import Base, get_db
+from ai.db.models import Parameter, Sensor
+from ai.db.parameters import DEFAULT_PARAMETERS, parameter_registry
+from ai.db.sqlite_backend import create_sqlite_engine
+from ai.main import app
+from ai.realtime.event_bus import threshold_rule_events
+
+from .conftest import FakeCacheRedis
+
+NOW = datetime(2024, 3, 1, tzinfo=timezone.utc)
+
+
+def _rules():
+    """Fleet-wide pH band, sensor 7 with a tighter turbidity limit of its own."""
+    return RuleSet(
+        default_rules(),
+        fleet={"ph": Rule(ThresholdLimits(4.0, 5.0, 9.0, 10.0), alert_high=True)},
+        sensors={7: {"turbidity": Rule(ThresholdLimits(None, None, 20.0, 40.0))}},
+    )
+
+
+def test_defaults_keep_high_ph_and_temperature_status_only():
+    rules = RuleSet(default_rules())
+    reading = {"ph": 9.5, "turbidity": 60.0, "temperature": 41.0}
+
+    assert [(hit.parameter, hit.severity) for hit in rules.classify(1, reading)] == [
+        ("turbidity", SEVERITY_WARNING)
+    ]
+    assert [
+        (hit.parameter, hit.severity) for hit in rules.classify(1, reading, enforced_only=False)
+    ] == [("ph", SEVERITY_WARNING), ("turbidity", SEVERITY_WARNING), ("temperature", 2)]
+    assert set(rules.limits()) == {"ph", "turbidity"}
+    assert rules.limits()["ph"] == ThresholdLimits(4.5, 5.5, None, None)
+
+
+def test_sensor_rules_override_fleet_rules_which_override_defaults():
+    rules = _rules()
+
+    # The fleet rule alerts on high pH; turbidity 30 is below the default 50.
+    assert [
+        (hit.parameter, hit.severity) for hit in rules.classify(1, {"ph": 9.5, "turbidity": 30.0})
+    ] == [("ph", SEVERITY_WARNING)]
+    assert rules.classify(7, {"turbidity": 30.0})[0].severity == SEVERITY_WARNING
+    assert rules.classify(7, {"turbidity": 45.0})[0].severity == SEVERITY_CRITICAL
+    # Sensor 7 only overrides turbidity; the fleet pH rule still applies to it.
+    assert rules.limits(7)["ph"] == ThresholdLimits(4.0, 5.0, 9.0, 10.0)
+    assert rules.classify(None, {"ph": None, "turbidity": float("nan")}) == []
+
+
+def test_rule_sets_built_from_defaults_do_not_share_rules():
+    first, second = RuleSet(default_rules()), RuleSet(default_rules())
+    first.fleet["ph"] = Rule(ThresholdLimits(6.0, 6.5, None, None))
+    first.sensors[7] = {}
+
+    assert (second.fleet, second.sensors) == ({}, {})
+
+
+def test_describe_reports_where_each_limit_comes_from():
+    sources = {row["parameter"]: row["source"] for row in _rules().describe(7)}
+
+    assert sources == {"ph": "fleet", "turbidity": "sensor", "temperature": "default"}
+    (temperature,) = [row for row in _rules().describe() if row["parameter"] == "temperature"]
+    assert temperature["critical_high"] == 40.0
+    assert (temperature["alert_low"], temperature["alert_high"]) == (False, False)
+
+
+def test_batch_detection_matches_per_reading_detection():
+    rules = ThresholdRules()
+    rules.rules = _rules()
+    detector = AnomalyDetector(rules=rules)
+    rng = np.random.default_rng(3)
+    size = 400
+    frame = pd.DataFrame(
+        {
+            "sensor_id": rng.choice([1, 7, 9], size),
+            "timestamp": pd.date_range(NOW, periods=size, freq="min"),
+            "ph": rng.uniform(3.0, 11.0, size),
+            "turbidity": rng.uniform(0.0, 120.0, size),
+            "temperature": rng.uniform(20.0, 45.0, size),
+        }
+    )
+
+    batch = detector.detect_threshold_frame(frame).to_anomalies()
+    single = [
+        anomaly
+        for row in frame.itertuples(index=False)
+        for anomaly in detector.detect_threshold_anomalies(
+            int(row.sensor_id),
+            {"ph": row.ph, "turbidity": row.turbidity, "temperature": row.temperature},
+            row.timestamp.to_pydatetime(),
+        )
+    ]
+
+    key = lambda a: (a.timestamp, a.parameter, a.detection_method)  # noqa: E731
+    assert sorted(map(key, batch)) == sorted(map(key, single))
+
+
+@pytest_asyncio.fixture
+async def api(monkeypatch):
+    engine = create_sqlite_engine("sqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    factory = async_sessionmaker(engine, expire_on_commit=False)
+    async with factory() as db:
+        db.add_all(
+            Parameter(
+                key=spec.key,
+                name=spec.name,
+                column=spec.column,
+                warning_high=spec.warning_high,
+                critical_high=spec.critical_high,
+            )
+            for spec in DEFAULT_PARAMETERS
+        )
+        db.add(Sensor(id=1, sensor_id="S1", name="S1"))
+        await db.commit()
+
+    async def override_get_db():
+        async with factory() as db:
+            yield db
+
+    # The lifespan does not run under ASGITransport: wire the reload by hand.
+    monkeypatch.setattr(threshold_rules, "session_factory", factory)
+    monkeypatch.setattr(threshold_rules, "rules", threshold_rules.rules)
+    monkeypatch.setattr(threshold_rule_events, "_handlers", [threshold_rules.apply])
+    monkeypatch.setattr(threshold_rule_events, "_redis_retry_at", math.inf)
+    monkeypatch.setattr(response_cache, "redis", FakeCacheRedis())
+    parameter_registry.invalidate()
+    app.dependency_overrides[get_db] = override_get_db
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://edge") as client:
+            yield client
+    finally:
+        app.dependency_overrides.pop(get_db, None)
+        parameter_registry.invalidate()
+        await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_rule_edits_are_applied_without_a_restart(api):
+    response = await api.post(
+        "/api/v1/threshold-rules",
+        json={"sensor_id": 1, "parameter": "turbidity", "warning_high": 20.0},
+    )
+    assert response.status_code == 201
+    rule_id = response.json()["id"]
+    assert threshold_rules.rules.classify(1, {"turbidity": 30.0})[0].severity == SEVERITY_WARNING
+    assert threshold_rules.rules.classify(2, {"turbidity": 30.0}) == []
+
+    duplicate = await api.post(
+        "/api/v1/threshold-rules",
+        json={"sensor_id": 1, "parameter": "turbidity", "warning_high": 5},
+    )
+    assert duplicate.status_code == 409
+
+    response = await api.put(
+        f"/api/v1/threshold-rules/{rule_id}", json={"warning_high": 20.0, "critical_high": 25.0}
+    )
+    assert response.status_code == 200
+    effective = {
+        row["parameter"]: row for row in (await api.get("/api/v1/sensors/1/thresholds")).json()
+    }
+    assert effective["turbidity"]["critical_high"] == 25.0
+    assert effective["turbidity"]["source"] == "sensor"
+    assert effective["conductivity"]["source"] == "default"
+
+    assert (await api.delete(f"/api/v1/threshold-rules/{rule_id}")).status_code == 200
+    assert threshold_rules.rules.classify(1, {"turbidity": 30.0}) == []
+    assert (await api.get("/api/v1/threshold-rules")).json() == []
+
+
+@pytest.mark.asyncio
+async def test_fleet_rule_edits_invalidate_every_sensors_forecast_views(api):
+    etag = (await api.get("/api/v1/forecast/1")).headers["etag"]
+    unchanged = await api.get("/api/v1/forecast/1", headers={"If-None-Match": etag})
+    assert unchanged.status_code == 304
+
+    response = await api.post(
+        "/api/v1/threshold-rules", json={"parameter": "turbidity", "warning_high": 20.0}
+    )
+    assert response.status_code == 201
+    # A fleet rule has no sensor of its own, yet changes every sensor's anomaly state.
+    refreshed = await api.get("/api/v1/forecast/1", headers={"If-None-Match": etag})
+    assert refreshed.status_code == 200
+
+    await api.delete(f"/api/v1/threshold-rules/{response.json()['id']}")
+
+
+@pytest.mark.asyncio
+async def test_invalid_rules_are_rejected(api):
+    unordered = {"parameter": "ph", "warning_low": 4.0, "critical_low": 5.0}
+    assert (await api.post("/api/v1/threshold-rules", json=unordered)).status_code == 422
+    empty = {"parameter": "ph"}
+    assert (await api.post("/api/v1/threshold-rules", json=empty)).status_code == 422
+    unknown_sensor = {"sensor_id": 99, "parameter": "ph", "warning_low": 5.0}
+    assert (await api.post("/api/v1/threshold-rules", json=unknown_sensor)).status_code == 404
+    unknown_parameter = {"parameter": "lead", "warning_high": 0.01}
+    assert (await api.post("/api/v1/threshold-rules", json=unknown_parameter)).status_code == 404
+    assert (await api.delete("/api/v1/threshold-rules/123")).status_code == 404
@@ -0,0 +1,65 @@
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+
+from ai.db.timeseries import epoch_microseconds, fetch_reading_rows, rows_to_columns
+
+
+class _RowsSession:
+    def __init__(self, rows):
+        self.rows = rows
+        self.statements = []
+
+    async def execute(self, statement):
+        self.statements.append(statement)
+        rows = self.rows
+
+        class _Result:
+            def all(self):
+                return rows
+
+        return _Result()
+
+
+def test_epoch_microseconds_treats_naive_as_utc():
+    aware = datetime(2024, 3, 1, 12, 0, 0, 500, tzinfo=timezone.utc)
+    assert epoch_microseconds(aware) == 1709294400000500
+    assert epoch_microseconds(aware.replace(tzinfo=None)) == 1709294400000500
+
+
+def test_rows_to_columns_maps_nulls_to_nan():
+    first = datetime(2024, 3, 1, tzinfo=timezone.utc)
+    second = datetime(2024, 3, 1, 0, 1, tzinfo=timezone.utc)
+    columns = rows_to_columns(
+        [(first, 7.0, None, 27.0), (second, None, 30.0, 27.5)],
+        ("ph", "turbidity", "temperature"),
+    )
+
+    assert len(columns) == 2
+    assert columns.timestamps.dtype == np.int64
+    assert columns.timestamps[1] - columns.timestamps[0] == 60_000_000
+    assert np.isnan(columns.values["ph"][1])
+    assert np.isnan(columns.values["turbidity"][0])
+    assert columns.values["temperature"].tolist() == [27.0, 27.5]
+
+
+def test_rows_to_columns_empty():
+    columns = rows_to_columns([], ("ph",))
+    assert len(columns) == 0
+    assert columns.values["ph"].dtype == np.float64
+
+
+@pytest.mark.asyncio
+async def test_fetch_reading_rows_selects_columns_not_entities():
+    session = _RowsSession([(1, datetime(2024, 3, 1, tzinfo=timezone.utc), 7.0)])
+
+    rows = await fetch_reading_rows(
+        session, 1, columns=("id", "timestamp", "ph"), descending=True, limit=5
+    )
+
+    assert rows == [(1, datetime(2024, 3, 1, tzinfo=timezone.utc), 7.0)]
+    sql = str(session.statements[0].compile(compile_kwargs={"literal_binds": True}))
+    assert sql.startswith("SELECT readings.id, readings.timestamp, readings.ph \nFROM readings")
+    assert "ORDER BY readings.timestamp DESC" in sql
+    assert "LIMIT 5" in sql
@@ -0,0 +1,11 @@
+import os
+
+FALSE_VALUES = frozenset({"0", "false", "no", "off"})
+
+
+def env_flag(name: str, default: bool = True) -> bool:
+    """Read an on/off setting; 0/false/no/off (any case) turn it off, anything else on."""
+    value = os.getenv(name)
+    if value is None or not value.strip():
+        return default
+    return value.strip().lower() not in FALSE_VALUES
@@ -0,0 +1,67 @@
+"""
+JSON encoding for large list responses, bypassing response_model revalidation.
+
+Uses orjson when it is installed and falls back to the standard library
+otherwise. Datetimes are written the same way `BaseSchema` writes them:
+ISO 8601 in UTC with a trailing "Z", naive values taken as UTC.
+"""
+
+import importlib
+import json
+import math
+from collections.abc import Iterable, Sequence
+from datetime import datetime
+from typing import Any
+
+from fastapi.responses import Response
+
+from ..schemas.base import format_datetime
+
+try:
+    orjson: Any = importlib.import_module("orjson")
+except ModuleNotFoundError:
+    orjson = None
+
+_ORJSON_OPTIONS = (
+    orjson.OPT_UTC_Z | orjson.OPT_NAIVE_UTC | orjson.OPT_SERIALIZE_NUMPY if orjson else 0
+)
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return format_datetime(value)
+    if hasattr(value, "tolist"):  # NumPy scalars and arrays
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _replace_nan(value: Any) -> Any:
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if isinstance(value, list):
+        return [_replace_nan(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _replace_nan(item) for key, item in value.items()}
+    return value
+
+
+def dumps(value: Any) -> bytes:
+    """Encode `value` as UTF-8 JSON; NaN is written as null."""
+    if orjson is not None:
+        return orjson.dumps(value, option=_ORJSON_OPTIONS)
+    return json.dumps(
+        _replace_nan(value), default=_default, separators=(",", ":"), allow_nan=False
+    ).encode()
+
+
+def dump_records(fields: Sequence[str], rows: Iterable[Sequence[Any]]) -> bytes:
+    """Encode row tuples as a JSON array of objects keyed by `fields`."""
+    return dumps([dict(zip(fields, row)) for row in rows])
+
+
+def json_records_response(
+    fields: Sequence[str], rows: Iterable[Sequence[Any]], headers=None
+) -> Response:
+    return Response(
+        content=dump_records(fields, rows), media_type="application/json", headers=headers
+    )
@@ -0,0 +1,43 @@
+import base64
+import binascii
+import json
+from datetime import datetime, timezone
+from typing import Optional
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+MAX_PAGE_SIZE = 1000
+
+
+def encode_cursor(timestamp: datetime, row_id: int) -> str:
+    """Opaque keyset cursor pointing just past (timestamp, id) in descending order."""
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    payload = json.dumps({"t": timestamp.isoformat(), "id": row_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """Inverse of `encode_cursor`; raises ValueError for anything it did not produce."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        timestamp = datetime.fromisoformat(payload["t"])
+        row_id = int(payload["id"])
+    except (binascii.Error, UnicodeDecodeError, TypeError, KeyError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+    if timestamp.tzinfo is None:
+        raise ValueError("Invalid cursor")
+    return timestamp, row_id
+
+
+def page_cursor(rows: list, limit: int, timestamp_attr: str) -> tuple[list, Optional[str]]:
+    """
+    Trim a `limit + 1` result to one page and build the cursor for the next one.
+
+    Returns the cursor only when an extra row proved there is more to read.
+    """
+    if len(rows) <= limit:
+        return rows, None
+    page = rows[:limit]
+    last = page[-1]
+    return page, encode_cursor(getattr(last, timestamp_attr), last.id)
@@ -187,6 +187,48 @@ export async function fetchSensors(): Promise<Sensor[]> {
   return response.json();
 }
 
+export interface FleetSensorSnapshot {
+  id: number;
+  sensor_id: string;
+  name: string;
+  latitude: number | null;
+  longitude: number | null;
+  is_active: boolean;
+  severity: "unknown" | "normal" | "warning" | "critical";
+  severity_score: number;
+  severity_reason: string;
+  active_alerts: number;
+  latest_reading: {
+    timestamp: string;
+    ph: number | null;
+    turbidity: number | null;
+    temperature: number | null;
+    battery_voltage: number | null;
+    signal_strength: number | null;
+  } | null;
+  last_anomaly: {
+    timestamp: string;
+    parameter: string;
+    value: number;
+    anomaly_score: number | null;
+    detection_method: string | null;
+  } | null;
+}
+
+export async function fetchFleetSnapshot(): Promise<FleetSensorSnapshot[]> {
+  const response = await fetch(`${API_BASE}/api/v1/fleet/snapshot`);
+
+  if (!response.ok) {
+    const error: ErrorResponse = await response.json().catch(() => ({
+      error: "Unknown error",
+      detail: `Server returned ${response.status} ${response.statusText}`
+    }));
+    throw new Error(error.detail || error.error);
+  }
+
+  return response.json();
+}
+
 export async function acknowledgeAlert(alertId: number): Promise<Alert> {
   const response = await fetch(`${API_BASE}/api/v1/alerts/${alertId}/acknowledge`, {
     method: "POST"
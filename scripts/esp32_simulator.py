@@ -15,8 +15,11 @@ from sqlalchemy import select
 ROOT_DIR = Path(__file__).resolve().parents[1]
 sys.path.append(str(ROOT_DIR))
 
+from ai.cache.hot_window import reading_event
+from ai.cache.response_cache import response_cache
 from ai.db.connection import AsyncSessionLocal
 from ai.db.models import Reading, Sensor
+from ai.realtime.event_bus import reading_events
 
 
 DEFAULT_SENSOR_ID = "ESP32_AMD_001"
@@ -108,6 +111,7 @@ async def _ensure_sensor(session, sensor_id: str) -> Sensor:
     session.add(sensor)
     await session.commit()
     await session.refresh(sensor)
+    await response_cache.invalidate("sensors")
     return sensor
 
 
@@ -127,7 +131,12 @@ async def _insert_readings(sensor_id: int, readings: Iterable[SimulatorReading])
         ]
         session.add_all(db_readings)
         await session.commit()
-        return len(db_readings)
+    # Cached list and snapshot responses (and their ETags) are keyed on these generations.
+    await response_cache.invalidate("readings", f"readings:{sensor_id}")
+    # Readings bypass the ingest endpoint. One reset has each API worker reload
+    # its hot window once, instead of one published event per inserted row.
+    await reading_events.publish_reset()
+    return len(db_readings)
 
 
 async def run_backfill(args: argparse.Namespace) -> None:
@@ -159,10 +168,23 @@ async def run_realtime(args: argparse.Namespace) -> None:
         while True:
             timestamp = datetime.now(timezone.utc)
             reading = _build_reading(timestamp, args.scenario)
-            session.add(
-                Reading(
-                    sensor_id=sensor.id,
-                    timestamp=reading.timestamp,
+            db_reading = Reading(
+                sensor_id=sensor.id,
+                timestamp=reading.timestamp,
+                ph=reading.ph,
+                turbidity=reading.turbidity,
+                temperature=reading.temperature,
+                battery_voltage=reading.battery_voltage,
+                signal_strength=reading.signal_strength,
+            )
+            session.add(db_reading)
+            await session.commit()
+            await response_cache.invalidate("readings", f"readings:{sensor.id}")
+            await reading_events.publish(
+                reading_event(
+                    sensor.id,
+                    db_reading.id,
+                    reading.timestamp,
                     ph=reading.ph,
                     turbidity=reading.turbidity,
                     temperature=reading.temperature,
@@ -170,7 +192,6 @@ async def run_realtime(args: argparse.Namespace) -> None:
                     signal_strength=reading.signal_strength,
                 )
             )
-            await session.commit()
             count += 1
             print(
                 "Sent reading "